@@ -7,7 +7,12 @@ Auteur : André-Pierre LIMOUZIN
 Version : 2 - 05.2020
 """
 from abc import abstractmethod
+import io
+import os
+import shutil
 import xml.dom.minidom as XMLDOM
+import xml.sax as XMLSAX
+from xml.sax.saxutils import quoteattr, XMLGenerator
 from common_apl.errors import ConstructorError, ClassMethodError
 
 
@@ -65,6 +70,13 @@ class XmlObjectAdapter(IXmlObject):
     Elle implémente l'interface IXmlObject pour obliger les adapteurs à
     implémenter  une méthode read pour la lecture et une méthode write pour
     l'écriture.
+
+    Pour être utilisé par un XmlStreamLoader, un adaptateur surcharge en
+    outre les méthodes readStart, getChildAdapter, readChild et readEnd.
+    L'objet métier est alors construit au fil des événements de lecture,
+    sans que le document XML ne soit chargé en mémoire.
+    De même, pour être utilisé par un XmlStreamWriter, un adaptateur
+    surcharge la méthode writeStream.
     """
     def __init__(self):
         """
@@ -84,6 +96,44 @@ class XmlObjectAdapter(IXmlObject):
         """
         return None
 
+    def readStart(self, attributes):
+        """
+        Cette méthode est invoquée par un XmlStreamLoader à l'ouverture de
+        l'élément XML lu par l'adaptateur.
+
+        :param attributes: Attributs SAX de l'élément XML.
+        """
+        pass
+
+    def getChildAdapter(self, name):
+        """
+        Cette méthode est invoquée par un XmlStreamLoader à l'ouverture d'un
+        élément fils de l'élément lu par l'adaptateur.
+
+        :param name: Nom de l'élément fils.
+        :return: Adaptateur chargé de lire l'élément fils ou None pour l'ignorer.
+        """
+        return None
+
+    def readChild(self, name, o):
+        """
+        Cette méthode est invoquée par un XmlStreamLoader à la fermeture d'un
+        élément fils lu par l'adaptateur retourné par getChildAdapter.
+
+        :param name: Nom de l'élément fils.
+        :param o: Objet métier construit par l'adaptateur de l'élément fils.
+        """
+        pass
+
+    def readEnd(self):
+        """
+        Cette méthode est invoquée par un XmlStreamLoader à la fermeture de
+        l'élément XML lu par l'adaptateur.
+
+        :return: Objet métier construit par l'adaptateur.
+        """
+        return None
+
     def write(self, xml_document, o):
         """
         Cette méthode permet d'écrire l'objet métier o passé en paramètre dans le document XML xml_document passé
@@ -98,6 +148,16 @@ class XmlObjectAdapter(IXmlObject):
         """
         return None
 
+    def writeStream(self, xml_writer, o):
+        """
+        Cette méthode permet d'écrire l'objet métier o au fil de l'eau avec
+        le XmlStreamWriter passé en paramètre, sans construire d'élément DOM.
+
+        :param xml_writer: XmlStreamWriter dans lequel l'objet est écrit.
+        :param o: Objet métier à écrire.
+        """
+        pass
+
 
 #
 #
@@ -159,6 +219,466 @@ class XmlDocumentLoader(object):
 
 
 
+#
+#
+##############################################################################
+class XmlStreamLoader(XMLSAX.handler.ContentHandler):
+    """
+    Cette classe permet de charger un document XML au fil de l'eau avec SAX.
+
+    Contrairement au XmlDocumentLoader, le document n'est jamais chargé en mémoire sous la forme d'un DOM. Les
+    objets métier sont construits au fur et à mesure de la lecture par les adaptateurs (voir les méthodes readStart,
+    getChildAdapter, readChild et readEnd de la classe XmlObjectAdapter). La mémoire utilisée ne dépend donc que de
+    la taille des objets métier construits.
+    """
+
+    __BUFFER_SIZE = 65536
+
+    def __init__(self, xml_document_name, buffer_size=__BUFFER_SIZE):
+        """
+        Constructeur du chargeur de document XML.
+
+        :param xml_document_name: Nom du fichier du document XML.
+        :param buffer_size: Taille des blocs lus dans le fichier.
+        """
+        super().__init__()
+        self.__doc_name = xml_document_name
+        self.__buffer_size = buffer_size
+        self.__stack = []
+        self.__objects = []
+        self.__result = None
+
+    def load(self, adapter):
+        """
+        Lecture complète du document XML.
+
+        :param adapter: Adaptateur de l'élément racine.
+        :return: Objet métier construit par l'adaptateur de l'élément racine.
+        """
+        for o in self.iterload(adapter):
+            pass
+        return self.__result
+
+    def iterload(self, adapter):
+        """
+        Lecture du document XML par blocs.
+
+        Les objets métier construits pour les fils de l'élément racine sont retournés dès que leur élément est
+        fermé, ce qui permet de les traiter sans attendre la fin de la lecture.
+
+        :param adapter: Adaptateur de l'élément racine.
+        :return: Générateur des objets métier des fils de l'élément racine.
+        """
+        self.__stack = []
+        self.__objects = []
+        self.__result = None
+        self.__root_adapter = adapter
+        parser = XMLSAX.make_parser()
+        parser.setContentHandler(self)
+        with open(self.__doc_name, "rb") as document:
+            data = document.read(self.__buffer_size)
+            while len(data) > 0:
+                parser.feed(data)
+                yield from self.__flush()
+                data = document.read(self.__buffer_size)
+        parser.close()
+        yield from self.__flush()
+
+    def __flush(self):
+        """
+        Retourne les objets métier construits depuis le dernier appel.
+        """
+        objects = self.__objects
+        self.__objects = []
+        return objects
+
+    def startElement(self, name, attributes):
+        """
+        Ouverture d'un élément XML (ContentHandler SAX).
+        """
+        if len(self.__stack) == 0:
+            adapter = self.__root_adapter
+        elif self.__stack[-1] is not None:
+            adapter = self.__stack[-1].getChildAdapter(name)
+        else:
+            adapter = None
+        if adapter is not None:
+            adapter.readStart(attributes)
+        self.__stack.append(adapter)
+
+    def endElement(self, name):
+        """
+        Fermeture d'un élément XML (ContentHandler SAX).
+        """
+        adapter = self.__stack.pop()
+        if adapter is None:
+            return
+        o = adapter.readEnd()
+        if len(self.__stack) == 0:
+            self.__result = o
+            return
+        self.__stack[-1].readChild(name, o)
+        if len(self.__stack) == 1:
+            self.__objects.append(o)
+
+    @staticmethod
+    def get_bool_attribute(attributes, attribute_name, default_value):
+        """
+        Récupération de la valeur d'un attribut SAX au format booléen.
+        Si l'attribut n'existe pas, c'est la valeur par défaut qui est retournée.
+
+        :param attributes: Attributs SAX de l'élément.
+        :param attribute_name: Nom de l'attribut.
+        :param default_value: Valeur par défaut de l'attribut.
+        :return: Valeur booléenne de l'attribut.
+        """
+        value = attributes.get(attribute_name)
+        if value is None:
+            return default_value
+        return value.strip().lower() in ("true", "1")
+
+    @staticmethod
+    def get_int_attribute(attributes, attribute_name, default_value):
+        """
+        Récupération de la valeur d'un attribut SAX au format Integer.
+        Si l'attribut n'existe pas, c'est la valeur par défaut qui est retournée.
+
+        :param attributes: Attributs SAX de l'élément.
+        :param attribute_name: Nom de l'attribut.
+        :param default_value: Valeur par défaut de l'attribut.
+        :return: Valeur entière de l'attribut.
+        """
+        value = attributes.get(attribute_name)
+        return default_value if value is None else int(value)
+
+    @staticmethod
+    def get_float_attribute(attributes, attribute_name, default_value):
+        """
+        Récupération de la valeur d'un attribut SAX au format Float.
+        Si l'attribut n'existe pas, c'est la valeur par défaut qui est retournée.
+
+        :param attributes: Attributs SAX de l'élément.
+        :param attribute_name: Nom de l'attribut.
+        :param default_value: Valeur par défaut de l'attribut.
+        :return: Valeur virgule flottante de l'attribut.
+        """
+        value = attributes.get(attribute_name)
+        return default_value if value is None else float(value)
+
+    @staticmethod
+    def get_tuple_attribute(attributes, attribute_name, default_value, sep=","):
+        """
+        Récupération de la valeur d'un attribut SAX au format Tuple.
+        Si l'attribut n'existe pas, c'est la valeur par défaut qui est retournée.
+
+        :param attributes: Attributs SAX de l'élément.
+        :param attribute_name: Nom de l'attribut.
+        :param default_value: Valeur par défaut de l'attribut.
+        :param sep : Caractère utilisé comme séparateur.
+        :return: Tuple des chaines de caractères de l'attribut.
+        """
+        value = attributes.get(attribute_name)
+        return default_value if value is None else tuple(value.split(sep))
+
+
+#
+#
+##############################################################################
+class XmlStreamWriter(object):
+    """
+    Cette classe permet d'écrire un document XML au fil de l'eau.
+
+    Les éléments sont directement écrits dans le fichier par un XMLGenerator SAX. Ni DOM, ni chaine de caractères
+    contenant le document complet ne sont construits : la mémoire utilisée ne dépend pas de la taille du document.
+    Les adaptateurs écrivent les objets métier par leur méthode writeStream.
+    """
+
+    __ENCODING = "utf-8"
+
+    def __init__(self, output, encoding=__ENCODING, indent=None):
+        """
+        Constructeur de l'écrivain.
+
+        :param output: Fichier (ouvert en écriture) dans lequel le document est écrit.
+        :param encoding: Encodage du document.
+        :param indent: Chaine utilisée pour indenter les éléments ou None pour un document sur une seule ligne.
+        """
+        self.__generator = XMLGenerator(output, encoding, short_empty_elements=True)
+        self.__indent = indent
+        self.__depth = 0
+        self.__has_children = False
+
+    def startDocument(self):
+        """
+        Ecriture de l'en-tête du document.
+        """
+        self.__generator.startDocument()
+
+    def endDocument(self):
+        """
+        Fin du document.
+        """
+        if self.__indent is not None:
+            self.__generator.ignorableWhitespace("\n")
+        self.__generator.endDocument()
+
+    def startElement(self, name, attributes=None):
+        """
+        Ouverture d'un élément XML.
+
+        :param name: Nom de l'élément.
+        :param attributes: Dictionnaire des attributs de l'élément (les valeurs sont converties en chaines).
+        """
+        if self.__indent is not None and (self.__depth > 0 or self.__has_children):
+            self.__generator.ignorableWhitespace("\n" + self.__indent * self.__depth)
+        values = {}
+        if attributes is not None:
+            for key in attributes:
+                values[key] = str(attributes[key])
+        self.__generator.startElement(name, values)
+        self.__depth += 1
+        self.__has_children = False
+
+    def endElement(self, name):
+        """
+        Fermeture d'un élément XML.
+
+        :param name: Nom de l'élément.
+        """
+        self.__depth -= 1
+        if self.__indent is not None and self.__has_children:
+            self.__generator.ignorableWhitespace("\n" + self.__indent * self.__depth)
+        self.__generator.endElement(name)
+        self.__has_children = True
+
+    def element(self, name, attributes=None):
+        """
+        Ecriture d'un élément XML sans contenu.
+
+        :param name: Nom de l'élément.
+        :param attributes: Dictionnaire des attributs de l'élément.
+        """
+        self.startElement(name, attributes)
+        self.endElement(name)
+
+    def characters(self, content):
+        """
+        Ecriture d'un texte dans l'élément courant.
+
+        :param content: Texte à écrire.
+        """
+        self.__generator.characters(content)
+
+    def write(self, adapter, o):
+        """
+        Ecriture d'un objet métier par son adaptateur.
+
+        :param adapter: Adaptateur de l'objet métier.
+        :param o: Objet métier à écrire.
+        """
+        adapter.writeStream(self, o)
+
+    @staticmethod
+    def save(xml_document_name, adapter, o, indent="\t"):
+        """
+        Ecriture d'un document XML dont l'élément racine est l'objet métier o.
+
+        Le document est écrit dans un fichier temporaire, puis renommé, afin qu'un lecteur concurrent ne voie jamais
+        un document à moitié écrit.
+
+        :param xml_document_name: Nom du fichier du document XML.
+        :param adapter: Adaptateur de l'objet métier.
+        :param o: Objet métier à écrire.
+        :param indent: Chaine utilisée pour indenter les éléments.
+        """
+        temp_name = xml_document_name + ".tmp"
+        with open(temp_name, "w", encoding=XmlStreamWriter.__ENCODING) as document:
+            writer = XmlStreamWriter(document, indent=indent)
+            writer.startDocument()
+            writer.write(adapter, o)
+            writer.endDocument()
+        os.replace(temp_name, xml_document_name)
+
+    @staticmethod
+    def dumps(adapter, o, indent=None):
+        """
+        Sérialisation en mémoire d'un document XML dont l'élément racine est l'objet métier o.
+
+        :param adapter: Adaptateur de l'objet métier.
+        :param o: Objet métier à écrire.
+        :param indent: Chaine utilisée pour indenter les éléments ou None pour un document sur une seule ligne.
+        :return: Document XML encodé (bytes).
+        """
+        output = io.BytesIO()
+        writer = XmlStreamWriter(output, indent=indent)
+        writer.startDocument()
+        writer.write(adapter, o)
+        writer.endDocument()
+        return output.getvalue()
+
+
+#
+#
+##############################################################################
+class XmlJournal(object):
+    """
+    Cette classe gère un journal XML en ajout seul.
+
+    Le journal est un fichier texte dont chaque ligne contient un élément XML complet (un fragment). Chaque ajout est
+    écrit à la fin du fichier puis forcé sur le disque. Son coût ne dépend donc que de la taille du fragment ajouté,
+    et non de la taille du document complet.
+
+    Le document XML complet n'est qu'une vue du journal. Il est reconstitué à la demande par la méthode materialize,
+    qui recopie les fragments tels quels entre les balises de l'élément racine, sans construire de DOM.
+    """
+
+    __DEFAULT_ROOT_NAME = "root"
+    __ENCODING = "utf-8"
+
+    def __init__(self, journal_name, root_name=__DEFAULT_ROOT_NAME, reset=False):
+        """
+        Constructeur du journal.
+
+        Si le journal existe déjà et que reset est faux, les nouveaux fragments sont ajoutés à la suite des anciens.
+        Une dernière ligne incomplète (suite à un arrêt brutal pendant une écriture) est alors supprimée.
+
+        :param journal_name: Nom du fichier du journal.
+        :param root_name: Nom de l'élément racine du document matérialisé (root par défaut).
+        :param reset: Si vrai, le journal est vidé à l'ouverture.
+        """
+        self.__journal_name = journal_name
+        self.__root_name = root_name
+        if not reset:
+            self.__repair()
+        self.__file = open(journal_name, "w" if reset else "a", encoding=XmlJournal.__ENCODING)
+        self.__dirty = True
+
+    @property
+    def journalName(self):
+        """
+        :return: Nom du fichier du journal.
+        """
+        return self.__journal_name
+
+    @property
+    def rootName(self):
+        """
+        :return: Nom de l'élément racine du document matérialisé.
+        """
+        return self.__root_name
+
+    @property
+    def isDirty(self):
+        """
+        :return: Vrai si des fragments ont été ajoutés depuis la dernière matérialisation.
+        """
+        return self.__dirty
+
+    def __repair(self):
+        """
+        Supprime la dernière ligne du journal si elle est incomplète.
+        """
+        if not os.path.exists(self.__journal_name):
+            return
+        with open(self.__journal_name, "rb+") as journal:
+            content = journal.read()
+            if len(content) > 0 and not content.endswith(b"\n"):
+                journal.truncate(content.rfind(b"\n") + 1)
+
+    def append(self, element):
+        """
+        Ajout d'un fragment à la fin du journal.
+
+        :param element: Elément XML DOM ou chaine de caractères contenant un élément XML complet.
+        """
+        self.__file.write(XmlJournal.__fragment(element).replace("\n", "&#10;") + "\n")
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+        self.__dirty = True
+
+    def rewrite(self, elements):
+        """
+        Remplacement de tous les fragments du journal.
+
+        Le nouveau journal est écrit dans un fichier temporaire, puis renommé : en cas d'arrêt brutal, le journal
+        contient soit les anciens fragments, soit les nouveaux. Les ajouts suivants sont écrits à la suite des nouveaux
+        fragments.
+
+        :param elements: Séquence d'éléments XML DOM ou de chaines de caractères contenant un élément XML complet.
+        """
+        temp_name = self.__journal_name + ".tmp"
+        with open(temp_name, "w", encoding=XmlJournal.__ENCODING) as journal:
+            for element in elements:
+                journal.write(XmlJournal.__fragment(element).replace("\n", "&#10;") + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+        self.__file.close()
+        os.replace(temp_name, self.__journal_name)
+        self.__file = open(self.__journal_name, "a", encoding=XmlJournal.__ENCODING)
+        self.__dirty = True
+
+    @staticmethod
+    def __fragment(element):
+        """
+        :return: Chaine de caractères de l'élément XML.
+        """
+        if element.__class__ is XMLDOM.Element:
+            return element.toxml()
+        if element.__class__ is str:
+            return element
+        raise ClassMethodError(XmlJournal, "append", element)
+
+    def fragments(self):
+        """
+        Enumère les fragments du journal dans leur ordre d'ajout.
+
+        :return: Générateur de chaines de caractères, une par fragment.
+        """
+        with open(self.__journal_name, "r", encoding=XmlJournal.__ENCODING) as journal:
+            for line in journal:
+                if line.endswith("\n"):
+                    yield line[:-1]
+
+    def materialize(self, xml_document_name, attributes=None, force=False, trailer=None):
+        """
+        Reconstitution du document XML complet à partir du journal.
+
+        Le document est d'abord écrit dans un fichier temporaire, puis renommé. Un lecteur concurrent voit donc soit
+        l'ancienne version, soit la nouvelle, mais jamais un document à moitié écrit.
+        Si aucun fragment n'a été ajouté depuis la dernière matérialisation, rien n'est fait.
+
+        :param xml_document_name: Nom du fichier du document XML à produire.
+        :param attributes: Dictionnaire des attributs de l'élément racine.
+        :param force: Si vrai, le document est reconstitué même si le journal n'a pas changé.
+        :param trailer: Contenu XML non journalisé écrit après les fragments.
+        :return: Vrai si le document a été reconstitué.
+        """
+        if not (self.__dirty or force):
+            return False
+        root = self.__root_name
+        if attributes is not None:
+            for name in attributes:
+                root = root + " {0}={1}".format(name, quoteattr(str(attributes[name])))
+        temp_name = xml_document_name + ".tmp"
+        with open(temp_name, "w", encoding=XmlJournal.__ENCODING) as document:
+            document.write('<?xml version="1.0" encoding="{0}"?>\n'.format(XmlJournal.__ENCODING))
+            document.write("<{0}>\n".format(root))
+            with open(self.__journal_name, "r", encoding=XmlJournal.__ENCODING) as journal:
+                shutil.copyfileobj(journal, document)
+            if trailer is not None:
+                document.write(trailer)
+            document.write("</{0}>\n".format(self.__root_name))
+        os.replace(temp_name, xml_document_name)
+        self.__dirty = False
+        return True
+
+    def close(self):
+        """
+        Fermeture du journal.
+        """
+        self.__file.close()
+
+
 #
 #
 ##############################################################################
@@ -258,7 +778,7 @@ class XmlParser(object):
             raise ClassMethodError(XmlParser, "get_bool_attribute", element, attribute_name, default_value)
         if element.hasAttribute(attribute_name):
             value = element.getAttribute(attribute_name)
-            return bool(value)
+            return value.strip().lower() in ("true", "1")
         else:
             return default_value
 
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+"""
+Ce module définit la couche d'abstraction matérielle du robot Explorer.
+
+Les moteurs et capteurs ne sont plus instanciés à l'import des modules mais
+fournis par un objet RobotDevices passé au robot. La classe EV3Devices
+fournit les équipements ev3dev2 de la brique EV3 (importés seulement à la
+première utilisation). Le module simulator fournit une implémentation
+simulée permettant d'exécuter le robot sur un PC.
+
+Auteur : André-Pierre LIMOUZIN
+Version : 1.0 - 10.2026
+"""
+
+from abc import ABC, abstractmethod
+import time
+
+
+#
+#
+##############################################################################
+class RobotDevices(ABC):
+    """
+    Cette classe est la racine du polymorphisme des fabriques d'équipements
+    du robot Explorer.
+
+    Le mouvement du robot est assuré par deux grand servo-moteurs
+    connectés respectivement sur les port B et C.
+    Le mouvement rotatif du capteur ultra-son est assuré par une servo-
+    moteur connecté sur le port A.
+    Le capteur Infra-rouge est connecté sur le port 4.
+    Le capteur Ultra-son est connecté sur le port 3.
+
+    Chaque équipement n'est instancié qu'une fois et partagé par toutes les
+    tâches du robot. La fabrique fournit aussi l'horloge du robot, ce qui
+    permet à la simulation de s'exécuter plus vite que le temps réel.
+
+    La classe est abstraite : une fabrique qui ne fournit pas tous les
+    équipements ne peut pas être instanciée.
+    """
+    def __init__(self):
+        """
+        Initialisation de la fabrique.
+        """
+        self.__devices = {}
+
+    def _get(self, name, factory):
+        """
+        Renvoie l'équipement nommé name, instancié par factory au premier appel.
+        """
+        if name not in self.__devices:
+            self.__devices[name] = factory()
+        return self.__devices[name]
+
+    def movingMotors(self):
+        """
+        :return: Moteurs de déplacement pilotés en direction (MoveSteering).
+        """
+        return self._get("movingMotors", self._createMovingMotors)
+
+    def tankMotors(self):
+        """
+        :return: Moteurs de déplacement pilotés chenille par chenille (MoveTank).
+        """
+        return self._get("tankMotors", self._createTankMotors)
+
+    def usMotor(self):
+        """
+        :return: Moteur de rotation du capteur ultra-son (MediumMotor).
+        """
+        return self._get("usMotor", self._createUSMotor)
+
+    def irSensor(self):
+        """
+        :return: Capteur infra-rouge (InfraredSensor).
+        """
+        return self._get("irSensor", self._createIRSensor)
+
+    def usSensor(self):
+        """
+        :return: Capteur ultra-son (UltrasonicSensor).
+        """
+        return self._get("usSensor", self._createUSSensor)
+
+    @abstractmethod
+    def _createMovingMotors(self):
+        """
+        Instanciation de l'équipement, à surcharger par chaque fabrique.
+
+        :return: Moteurs de déplacement pilotés en direction (MoveSteering).
+        """
+        pass
+
+    @abstractmethod
+    def _createTankMotors(self):
+        """
+        Instanciation de l'équipement, à surcharger par chaque fabrique.
+
+        :return: Moteurs de déplacement pilotés chenille par chenille (MoveTank).
+        """
+        pass
+
+    @abstractmethod
+    def _createUSMotor(self):
+        """
+        Instanciation de l'équipement, à surcharger par chaque fabrique.
+
+        :return: Moteur de rotation du capteur ultra-son (MediumMotor).
+        """
+        pass
+
+    @abstractmethod
+    def _createIRSensor(self):
+        """
+        Instanciation de l'équipement, à surcharger par chaque fabrique.
+
+        :return: Capteur infra-rouge (InfraredSensor).
+        """
+        pass
+
+    @abstractmethod
+    def _createUSSensor(self):
+        """
+        Instanciation de l'équipement, à surcharger par chaque fabrique.
+
+        :return: Capteur ultra-son (UltrasonicSensor).
+        """
+        pass
+
+    def time(self):
+        """
+        :return: Heure courante de l'horloge du robot en secondes.
+        """
+        return time.time()
+
+    def sleep(self, seconds):
+        """
+        Attente selon l'horloge du robot.
+
+        :param seconds: Durée de l'attente en secondes.
+        """
+        time.sleep(seconds)
+
+
+#
+#
+##############################################################################
+class EV3Devices(RobotDevices):
+    """
+    Cette classe fournit les équipements ev3dev2 de la brique EV3.
+    Le package ev3dev2 n'est importé qu'à la première instanciation d'un
+    équipement.
+    """
+    def _createMovingMotors(self):
+        from ev3dev2.motor import MoveSteering, OUTPUT_B, OUTPUT_C
+        return MoveSteering(OUTPUT_B, OUTPUT_C)
+
+    def _createTankMotors(self):
+        from ev3dev2.motor import MoveTank, OUTPUT_B, OUTPUT_C
+        return MoveTank(OUTPUT_B, OUTPUT_C)
+
+    def _createUSMotor(self):
+        from ev3dev2.motor import MediumMotor, OUTPUT_A
+        return MediumMotor(OUTPUT_A)
+
+    def _createIRSensor(self):
+        from ev3dev2.sensor import INPUT_4
+        from ev3dev2.sensor.lego import InfraredSensor
+        return InfraredSensor(INPUT_4)
+
+    def _createUSSensor(self):
+        from ev3dev2.sensor import INPUT_3
+        from ev3dev2.sensor.lego import UltrasonicSensor
+        return UltrasonicSensor(INPUT_3)
@@ -5,13 +5,16 @@ Test des moteurs EV3.
 Auteur : André-Pierre LIMOUZIN
 Version : 1.0 - 06.2020
 """
+import sys
+
 from surveyor import RobotSurveyor, SurveyTask
-from httpd import WebServerTask
+from httpd import MapWebServerTask
 from explorer_tasks import StartStopTask
 
 if __name__ == '__main__':
-    robot = RobotSurveyor()
-    WebServerTask(robot)
+    # Option --resume : reprise du relevé enregistré dans le journal.
+    robot = RobotSurveyor(resume="--resume" in sys.argv[1:])
+    MapWebServerTask(robot)
     survey = SurveyTask(robot)
     StartStopTask(robot, survey)
     #IRControlledTankTask(robot)
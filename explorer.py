@@ -10,14 +10,8 @@ import sys
 import time
 import math
 
-from ev3dev2.motor import MoveTank, MoveSteering, OUTPUT_B, OUTPUT_C
-from ev3dev2.motor import MediumMotor, OUTPUT_A
-from ev3dev2.sensor.lego import InfraredSensor
-from ev3dev2.sensor import INPUT_4
-from ev3dev2.sensor.lego import UltrasonicSensor
-from ev3dev2.sensor import INPUT_3
-
 import lego
+from devices import EV3Devices
 from robot import Robot
 
 
@@ -48,31 +42,38 @@ class RobotExplorer(Robot):
     par rapport à la position centrale du robot.
     Le capteur Ultra-Son est également excentré de US_DISTORTION par
     rapport à son axe de rotation.
+
+    Les moteurs et capteurs sont fournis par une fabrique RobotDevices
+    (par défaut EV3Devices, les équipements ev3dev2 de la brique).
     """
-    DEFAULT_MOVING_MOTORS = MoveSteering(OUTPUT_B, OUTPUT_C)
-    DEFAULT_US_MOTOR = MediumMotor(OUTPUT_A)
-    DEFAULT_IR_SENSOR = InfraredSensor(INPUT_4)
-    DEFAULT_US_SENSOR = UltrasonicSensor(INPUT_3)
     US_ECCENTRICITY = (0, 12 * lego.U)
     US_DISTORTION = 4 * lego.U
     CATERPILLAR_SPACING = 22 * lego.U
     CATERPILLAR_RADIUS = 2 * lego.U
     US_GEARS_REDUCTION = -3
 
-    def __init__(self, motors=DEFAULT_MOVING_MOTORS, usmotor=DEFAULT_US_MOTOR,
-                irsensor=DEFAULT_IR_SENSOR, ussensor=DEFAULT_US_SENSOR):
+    def __init__(self, motors=None, usmotor=None, irsensor=None, ussensor=None, devices=None):
         """
         Construction du robot.
+        Les équipements non précisés sont fournis par la fabrique devices.
         :param motors: Jeu de moteurs utilisés pour déplacer le robot.
         :param usmotors:  Moteur utilisé pour la rotation du capteur Ultra-sons.
         :param irsensor: Capteur Infra-rouge utilisé par la télécommande.
         :param ussensor: Capteur Ultra-son uutilisé pour la télémetrie.
+        :param devices: Fabrique RobotDevices (EV3Devices par défaut).
         """
         super().__init__()
-        self.__motors = motors
-        self.__usmotor = usmotor
-        self.__ussensor = ussensor
-        self.__irsensor = irsensor
+        if devices is None:
+            devices = EV3Devices()
+        self.__devices = devices
+        self.__motors = motors if motors is not None else devices.movingMotors()
+        self.__usmotor = usmotor if usmotor is not None else devices.usMotor()
+        self.__ussensor = ussensor if ussensor is not None else devices.usSensor()
+        self.__irsensor = irsensor if irsensor is not None else devices.irSensor()
+
+    @property
+    def devices(self):
+        return self.__devices
 
     @property
     def Motors(self):
@@ -10,13 +10,6 @@ Version : 1.0 - 05.2020
 import sys
 import time
 
-from ev3dev2.motor import MoveTank, MoveSteering, OUTPUT_B, OUTPUT_C
-from ev3dev2.motor import MediumMotor, OUTPUT_A
-from ev3dev2.sensor.lego import InfraredSensor
-from ev3dev2.sensor import INPUT_4
-from ev3dev2.sensor.lego import UltrasonicSensor
-from ev3dev2.sensor import INPUT_3
-
 import lego
 from httpd import WebServerTask
 from robot import Robot, RobotTask
@@ -36,27 +29,26 @@ class IRControlledTankTask(RobotTask):
     La chenille de gauche est commandée par les boutons rouges de la
     télécommande, la chenille de droite par les boutons bleus.
     """
-    DEFAULT_MOTORS = MoveTank(OUTPUT_B, OUTPUT_C)
     DEFAULT_CHANNEL = 1
     DEFAULT_SPEED = 50
 
-    def __init__(self, robot, motors=DEFAULT_MOTORS, channel=DEFAULT_CHANNEL,
+    def __init__(self, robot, motors=None, channel=DEFAULT_CHANNEL,
                 speed=DEFAULT_SPEED):
         """
         Constructeur du robot.
 
         Par défaut, le groupe de moteurs est immplémenté par un MoveTank
-        ev3dev. Les moteurs controlant les chenilles sont connecté aux
-        ports OUTPUT_B et OUTPUT_C. Le capteur infra-rouge est connecté
-        au port INPUT_4.
+        fourni par les équipements du robot. Les moteurs controlant les
+        chenilles sont connecté aux ports OUTPUT_B et OUTPUT_C. Le capteur
+        infra-rouge est connecté au port INPUT_4.
 
         :param robot: Robot prorpiétaire de la tâche.
-        :param irsenseor: Capteur infra-rouge utilisé.
+        :param motors: Couple de moteur utilisé.
         :param channel: Canal de la télécommande infra-rouge utilisé.
         :param speed: Vitesse de moteur.
         """
         super().__init__(robot)
-        self._motors = motors
+        self._motors = motors if motors is not None else robot.devices.tankMotors()
         self._irsensor = robot.IRSensor
         self._channel = channel
         self._speed = speed
@@ -128,13 +120,12 @@ class IRBeaconFollowingTask(RobotTask):
     celle-ci est activée.
     """
     DEFAULT_CHANNEL = 1
-    DEFAULT_MOTORS = MoveSteering(OUTPUT_B, OUTPUT_C)
 
-    def __init__(self, robot, channel=DEFAULT_CHANNEL, motors=DEFAULT_MOTORS):
+    def __init__(self, robot, channel=DEFAULT_CHANNEL, motors=None):
         super().__init__(robot)
         self._irsensor = robot.IRSensor
         self._channel = channel
-        self._motors = motors
+        self._motors = motors if motors is not None else robot.Motors
 
 
     def loop(self):
@@ -159,5 +150,5 @@ class IRBeaconFollowingTask(RobotTask):
             print("distance=", distance, file=sys.stderr)
         else:
             self._motors.on(0, 0)
-        time.sleep(0.1)
+        self.robot.devices.sleep(0.1)
 
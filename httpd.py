@@ -4,18 +4,366 @@
 Ce module définit les classes permettant d'activer un serveur Web en tâche
 parallèle dans un robot.
 
+Par défaut, les requêtes sont traitées en parallèle par un nombre borné de
+threads (PooledHTTPServer) : un téléchargement lent ne bloque pas les autres
+clients, sans pour autant multiplier les threads qui concurrencent les
+tâches du robot sur la brique EV3.
+
+La carte d'un robot Surveyor peut être servie directement depuis sa
+mémoire (MapWebServerTask) : elle n'est sérialisée qu'une fois par
+version, et les requêtes conditionnelles d'un client déjà à jour
+reçoivent la réponse 304. Les modifications de la carte sont poussées aux
+navigateurs sous forme de deltas (Server-Sent Events). Pour les grandes
+cartes, le visualiseur ne demande que la région visible, à un niveau de
+détail adapté à l'échelle (MapRegions).
+
+Les réponses sont compressées (gzip) pour les clients qui l'acceptent : les
+fichiers du site sont compressés au démarrage et conservés en mémoire, la
+carte est compressée une fois par version.
+
 Auteur : André-Pierre LIMOUZIN
 Version : 1.0 - 05.2020
 """
 
 import sys
 import os
+import queue
+import selectors
 import time
+import email.utils
+import gzip
+import math
+import http
 import http.server
+import urllib.parse
+import zlib
+from collections import deque
+from threading import Condition, Lock, Thread
 from robot import RobotTask, Robot
+from common_apl.xmlio import XmlStreamWriter
+from survey_codec import SurveyMapBinaryAdapter, SurveyMapJsonAdapter, SurveyMapRegionJsonAdapter
+from survey_xmlio import SurveyMapAdapter, SurveyMapDeltaAdapter
 import xml.etree.ElementTree as ET
 
 
+#
+#
+##############################################################################
+class PooledHTTPServer(http.server.HTTPServer):
+    """
+    Cette classe définit un serveur HTTP dont les requêtes sont traitées
+    par un groupe borné de threads.
+
+    Les connexions acceptées sont rangées dans une file d'attente bornée,
+    consommée par workers threads. Lorsque la file est pleine, la connexion
+    est fermée immédiatement : le serveur est surchargé. Les connexions
+    en attente d'acceptation par le système sont limitées par backlog, et
+    chaque socket client est soumise au délai timeout.
+
+    Une connexion de longue durée (flux d'évènements, par exemple) peut
+    être détachée (voir detach) : son thread de traitement est libéré pour
+    les autres requêtes. Une connexion maintenue (keep-alive) inactive est
+    fermée dès qu'une autre connexion attend un thread (voir waitRequest).
+    """
+    DEFAULT_WORKERS = 4
+    DEFAULT_BACKLOG = 16
+    DEFAULT_QUEUE_SIZE = 32
+    DEFAULT_TIMEOUT = 10
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, address, handler, workers=DEFAULT_WORKERS, backlog=DEFAULT_BACKLOG,
+                 queueSize=DEFAULT_QUEUE_SIZE, timeout=DEFAULT_TIMEOUT):
+        """
+        Initialisation du serveur et lancement des threads de traitement.
+
+        :param address: Tuple (hôte, port) d'écoute.
+        :param handler: Classe du handler des requêtes.
+        :param workers: Nombre de threads de traitement.
+        :param backlog: Taille de la file d'écoute du système.
+        :param queueSize: Nombre de connexions acceptées en attente de traitement.
+        :param timeout: Délai d'inactivité d'une connexion en secondes.
+        """
+        self.request_queue_size = backlog
+        self.__timeout = timeout
+        super().__init__(address, handler)
+        self.__requests = queue.Queue(queueSize)
+        self.__detached = set()
+        self.__lock = Lock()
+        self.__workers = []
+        for k in range(workers):
+            worker = Thread(target=self.__work, name="HttpWorker-{0}".format(k), daemon=True)
+            worker.start()
+            self.__workers.append(worker)
+
+    def get_request(self):
+        """
+        Acceptation d'une connexion, soumise au délai d'inactivité.
+        """
+        request, clientAddress = super().get_request()
+        request.settimeout(self.__timeout)
+        return request, clientAddress
+
+    def process_request(self, request, client_address):
+        """
+        La requête est confiée aux threads de traitement, ou refusée si la
+        file d'attente est pleine.
+        """
+        try:
+            self.__requests.put_nowait((request, client_address))
+        except queue.Full:
+            print("HTTP server overloaded, connection from {0} closed".format(client_address), file=sys.stderr)
+            self.shutdown_request(request)
+
+    def __work(self):
+        """
+        Boucle d'un thread de traitement.
+        """
+        while True:
+            item = self.__requests.get()
+            if item is None:
+                return
+            request, clientAddress = item
+            try:
+                self.finish_request(request, clientAddress)
+            except Exception:
+                self.handle_error(request, clientAddress)
+            finally:
+                with self.__lock:
+                    detached = request in self.__detached
+                    self.__detached.discard(request)
+                if not detached:
+                    self.shutdown_request(request)
+
+    def waitRequest(self, request, rfile):
+        """
+        Attente de la requête suivante d'une connexion maintenue.
+
+        La connexion n'occupe son thread de traitement que tant qu'aucune
+        autre connexion n'attend dans la file : sinon, elle doit être
+        fermée pour rendre le thread aux connexions en attente. Le délai
+        d'inactivité est celui de la socket.
+
+        :param request: Socket de la connexion.
+        :param rfile: Flux de lecture de la connexion, dont les données déjà
+        reçues sont examinées.
+        :return: Vrai si une requête est disponible, faux si la connexion
+        doit être fermée.
+        """
+        timeout = request.gettimeout()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # Une requête peut déjà se trouver dans le tampon de lecture (pipelining).
+        request.settimeout(0.0)
+        try:
+            if len(rfile.peek(1)) > 0:
+                return True
+        finally:
+            request.settimeout(timeout)
+        with selectors.DefaultSelector() as selector:
+            selector.register(request, selectors.EVENT_READ)
+            while self.__requests.empty():
+                delay = PooledHTTPServer.POLL_INTERVAL
+                if deadline is not None:
+                    delay = min(delay, deadline - time.monotonic())
+                    if delay <= 0:
+                        return False
+                if len(selector.select(delay)) > 0:
+                    return True
+        return False
+
+    def detach(self, request):
+        """
+        Détachement d'une connexion de son thread de traitement : elle n'est
+        pas fermée à la fin de la requête. Elle doit être servie par un
+        autre thread, puis fermée par shutdown_request.
+
+        :param request: Socket de la requête en cours de traitement.
+        """
+        with self.__lock:
+            self.__detached.add(request)
+
+    def server_close(self):
+        """
+        Fermeture du serveur et arrêt des threads de traitement.
+        """
+        super().server_close()
+        for worker in self.__workers:
+            self.__requests.put(None)
+
+
+#
+#
+##############################################################################
+class CompressedAssets:
+    """
+    Cette classe maintient en mémoire la version compressée (gzip) des
+    fichiers statiques du site Web.
+
+    Les fichiers du répertoire du site sont compressés une fois pour
+    toutes au démarrage du serveur ; les autres le sont à leur première
+    demande. Un fichier modifié sur disque (date ou taille) est compressé
+    à nouveau. Seuls les fichiers texte (EXTENSIONS) de moins de MAX_SIZE
+    octets sont compressés.
+    """
+    EXTENSIONS = (".html", ".htm", ".js", ".css", ".xml", ".json", ".svg", ".txt")
+    MAX_SIZE = 1 << 20
+    LEVEL = 6
+
+    def __init__(self, directory=None, extensions=EXTENSIONS, maxSize=MAX_SIZE):
+        """
+        :param directory: Répertoire dont les fichiers sont compressés au démarrage (aucun par défaut).
+        :param extensions: Extensions des fichiers compressés.
+        :param maxSize: Taille maximale d'un fichier compressé.
+        """
+        self.__extensions = extensions
+        self.__maxSize = maxSize
+        self.__lock = Lock()
+        self.__entries = {}
+        if directory is not None and os.path.isdir(directory):
+            for root, dirs, files in os.walk(directory):
+                for name in files:
+                    self.get(os.path.join(root, name))
+
+    def get(self, path):
+        """
+        :param path: Chemin du fichier.
+        :return: Tuple (contenu compressé, date de modification, taille
+        non compressée) ou None si le fichier n'est pas compressé.
+        """
+        if not path.endswith(self.__extensions):
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_size > self.__maxSize:
+            return None
+        path = os.path.abspath(path)
+        with self.__lock:
+            entry = self.__entries.get(path)
+        if entry is not None and entry[1] == stat.st_mtime and entry[2] == stat.st_size:
+            return entry
+        try:
+            with open(path, "rb") as file:
+                content = file.read()
+        except OSError:
+            return None
+        entry = (gzip.compress(content, CompressedAssets.LEVEL), stat.st_mtime, len(content))
+        with self.__lock:
+            self.__entries[path] = entry
+        return entry
+
+
+#
+#
+##############################################################################
+class GzipHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """
+    Cette classe définit un handler HTTP de fichiers qui envoie leur
+    version compressée (voir CompressedAssets) aux clients qui acceptent
+    l'encodage gzip. Les autres requêtes sont servies normalement.
+    """
+    assets = None
+
+    def handle(self):
+        """
+        Traitement des requêtes d'une connexion. Sur un PooledHTTPServer,
+        la requête suivante d'une connexion maintenue est attendue par
+        PooledHTTPServer.waitRequest.
+        """
+        waitRequest = getattr(self.server, "waitRequest", None)
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            if waitRequest is not None and not waitRequest(self.request, self.rfile):
+                break
+            self.handle_one_request()
+
+    def do_GET(self):
+        if not self._sendCompressedFile(True):
+            super().do_GET()
+
+    def do_HEAD(self):
+        if not self._sendCompressedFile(False):
+            super().do_HEAD()
+
+    def _acceptsGzip(self):
+        """
+        :return: Vrai si l'en-tête Accept-Encoding de la requête accepte
+        gzip. Une mention explicite de gzip l'emporte sur le joker *.
+        """
+        accept = self.headers.get("Accept-Encoding")
+        if accept is None:
+            return False
+        qualities = {}
+        for coding in accept.split(","):
+            parameters = coding.split(";")
+            name = parameters[0].strip().lower()
+            quality = 1.0
+            for parameter in parameters[1:]:
+                key, _, value = parameter.partition("=")
+                if key.strip() == "q":
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            qualities[name] = quality
+        for name in ("gzip", "x-gzip", "*"):
+            if name in qualities:
+                return qualities[name] > 0
+        return False
+
+    def _isNotModified(self, etag, lastModified):
+        """
+        :param etag: ETag de la version courante.
+        :param lastModified: Date de la version courante (secondes) ou None.
+        :return: Vrai si la version détenue par le client est la version courante.
+        """
+        noneMatch = self.headers.get("If-None-Match")
+        if noneMatch is not None:
+            return noneMatch.strip() == "*" or etag in [tag.strip() for tag in noneMatch.split(",")]
+        modifiedSince = self.headers.get("If-Modified-Since")
+        if modifiedSince is not None and lastModified is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(modifiedSince)
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return False
+            return since.timestamp() >= lastModified
+        return False
+
+    def _sendCompressedFile(self, withBody):
+        """
+        Réponse compressée à une requête sur un fichier.
+
+        :param withBody: Si faux, seuls les en-têtes sont envoyés (HEAD).
+        :return: Faux si le fichier doit être servi sans compression.
+        """
+        if self.assets is None or not self._acceptsGzip():
+            return False
+        path = self.translate_path(self.path)
+        entry = self.assets.get(path)
+        if entry is None:
+            return False
+        body, mtime, size = entry
+        etag = '"{0:x}-{1:x}-gz"'.format(int(mtime), size)
+        if self._isNotModified(etag, int(mtime)):
+            self.send_response(http.HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.send_header("Vary", "Accept-Encoding")
+            self.end_headers()
+            return True
+        self.send_response(http.HTTPStatus.OK)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.date_time_string(int(mtime)))
+        self.send_header("Vary", "Accept-Encoding")
+        self.end_headers()
+        if withBody:
+            self.wfile.write(body)
+        return True
+
+
 #
 #
 ##############################################################################
@@ -28,8 +376,13 @@ class WebServerTask(RobotTask):
     """
 
     DEFAULT_NAME = "RobotWeb"
+    KEEP_ALIVE_TIMEOUT = 5
+    ASSETS_DIRECTORY = "www"
 
-    def __init__(self, robot, webport=8000, name=DEFAULT_NAME, auto=True):
+    def __init__(self, robot, webport=8000, name=DEFAULT_NAME, auto=True, concurrent=True,
+                 workers=PooledHTTPServer.DEFAULT_WORKERS, backlog=PooledHTTPServer.DEFAULT_BACKLOG,
+                 timeout=PooledHTTPServer.DEFAULT_TIMEOUT, keepAlive=True, compress=True,
+                 assetsDirectory=ASSETS_DIRECTORY):
         """
         Initialisation de la tâche.
 
@@ -38,17 +391,42 @@ class WebServerTask(RobotTask):
         :param webport: Port réseau utilisé par le serveur Web (8000 par défaut)
         :param name: Nom de la tâche ("RobotWeb" par défaut).
         :param auto: Indicateur si la tâche est automaitquement démarrée.
+        :param concurrent: Si vrai, les requêtes sont traitées en parallèle
+        (voir PooledHTTPServer). Sinon, elles sont traitées une à une.
+        :param workers: Nombre de threads de traitement en mode concurrent.
+        :param backlog: Taille de la file d'écoute du système.
+        :param timeout: Délai d'inactivité d'une connexion en secondes.
+        :param keepAlive: Si vrai, les connexions sont maintenues entre deux
+        requêtes (HTTP/1.1) pendant au plus KEEP_ALIVE_TIMEOUT secondes, et
+        en mode concurrent tant qu'aucun autre client n'attend.
+        :param compress: Si vrai, les réponses sont compressées (gzip) pour
+        les clients qui l'acceptent (voir GzipHTTPRequestHandler).
+        :param assetsDirectory: Répertoire des fichiers du site, compressés
+        au démarrage du serveur.
         """
         super().__init__(robot, name=name, auto=auto)
-        server = http.server.HTTPServer
-        self._httpd = server(("", webport), self._getHttpHandler())
+        handler = self._getHttpHandler()
+        attributes = {"timeout": timeout}
+        if compress and issubclass(handler, GzipHTTPRequestHandler):
+            attributes["assets"] = CompressedAssets(assetsDirectory)
+        if keepAlive:
+            attributes["protocol_version"] = "HTTP/1.1"
+            attributes["timeout"] = min(timeout, WebServerTask.KEEP_ALIVE_TIMEOUT)
+        handler = type(handler.__name__, (handler,), attributes)
+        if concurrent:
+            self._httpd = PooledHTTPServer(("", webport), handler, workers, backlog, timeout=timeout)
+        else:
+            self._httpd = http.server.HTTPServer(("", webport), handler, bind_and_activate=False)
+            self._httpd.request_queue_size = backlog
+            self._httpd.server_bind()
+            self._httpd.server_activate()
 
     def _getHttpHandler(self):
         """
         Création d'un handler pour le service Web.
         :return: Handler du service HTTP.
         """
-        return http.server.SimpleHTTPRequestHandler
+        return GzipHTTPRequestHandler
 
     def setup(self):
         """
@@ -90,17 +468,23 @@ class CGIWebServerTask(WebServerTask):
     """
     DEFAULT_NAME = "RobotWeb"
 
-    def __init__(self, robot, webport=8000, name=DEFAULT_NAME, auto=True):
+    def __init__(self, robot, webport=8000, name=DEFAULT_NAME, auto=True, concurrent=True,
+                 workers=PooledHTTPServer.DEFAULT_WORKERS):
         """
         Initialisation de la tâche.
 
-        Un serveur Web CGI est instancié.
+        Un serveur Web CGI est instancié. La longueur de la réponse d'un
+        script CGI n'étant pas connue à l'avance, les connexions ne sont
+        pas maintenues entre deux requêtes.
         :param robot: Robot propriétaire de de la tâche.
         :param webport: Port réseau utilisé par le serveur Web (8000 par défaut)
         :param name: Nom de la tâche ("RobotWeb" par défaut).
         :param auto: Indicateur si la tâche est automaitquement démarrée.
+        :param concurrent: Si vrai, les requêtes sont traitées en parallèle.
+        :param workers: Nombre de threads de traitement en mode concurrent.
         """
-        super().__init__(robot, webport=webport, name=name, auto=auto)
+        super().__init__(robot, webport=webport, name=name, auto=auto, concurrent=concurrent,
+                         workers=workers, keepAlive=False)
 
     def _getHttpHandler(self):
         """
@@ -112,6 +496,621 @@ class CGIWebServerTask(WebServerTask):
         return handler
 
 
+#
+#
+##############################################################################
+class MapSnapshot:
+    """
+    Cette classe maintient la sérialisation d'une carte en mémoire.
+
+    La carte n'est sérialisée qu'une fois par version (voir
+    SurveyMap.version), à la première requête qui suit sa modification.
+    Toutes les requêtes d'une même version partagent le même document,
+    identifié par un ETag et daté par Last-Modified. Chaque format de la
+    carte (XML, JSON, binaire) a son propre MapSnapshot, désigné par name.
+
+    La carte est modifiée par la tâche du robot pendant que les threads du
+    serveur la lisent : si une modification est en cours ou survient
+    pendant la sérialisation (voir SurveyMap.revision), le document est
+    sérialisé à nouveau. Après MAX_ATTEMPTS tentatives, le document
+    précédent est conservé ; s'il n'y en a pas, la requête reçoit la
+    réponse 503.
+    """
+    MAX_ATTEMPTS = 3
+    RETRY_DELAY = 0.05
+
+    def __init__(self, surveyMap, serialize, contentType, name="xml"):
+        """
+        :param surveyMap: SurveyMap à servir.
+        :param serialize: Fonction serialize(surveyMap) retournant le document (bytes).
+        :param contentType: Type MIME du document.
+        :param name: Nom du format, utilisé dans l'ETag et par le paramètre format des requêtes.
+        """
+        self.__map = surveyMap
+        self.__serialize = serialize
+        self.__contentType = contentType
+        self.__name = name
+        self.__lock = Lock()
+        self.__epoch = int(time.time())
+        self.__version = None
+        self.__body = None
+        self.__gzipBody = None
+        self.__etag = None
+        self.__lastModified = None
+
+    @staticmethod
+    def read(surveyMap, serialize, attempts, delay):
+        """
+        Sérialisation cohérente d'une carte modifiée par un autre thread.
+
+        La sérialisation est retenue si aucune modification n'était en
+        cours à son début et si aucune n'a commencé depuis (voir
+        SurveyMap.revision). Sinon, elle est reprise après delay secondes.
+
+        :param surveyMap: SurveyMap à sérialiser.
+        :param serialize: Fonction serialize(surveyMap) retournant le document.
+        :param attempts: Nombre maximal de tentatives.
+        :param delay: Attente en secondes avant une nouvelle tentative.
+        :return: Tuple (document, version de la carte), ou None si aucune
+        tentative n'a abouti.
+        """
+        for attempt in range(attempts):
+            if attempt > 0:
+                time.sleep(delay)
+            revision = surveyMap.revision
+            version = surveyMap.version
+            if revision % 2 == 1:
+                continue
+            try:
+                body = serialize(surveyMap)
+            except (RuntimeError, IndexError):
+                # Carte modifiée pendant la lecture de ses murs ou de ses stations.
+                continue
+            if revision == surveyMap.revision:
+                return (body, version)
+        return None
+
+    @property
+    def contentType(self):
+        return self.__contentType
+
+    @property
+    def mediaType(self):
+        """
+        :return: Type MIME du document, sans ses paramètres.
+        """
+        return self.__contentType.split(";")[0].strip()
+
+    @property
+    def name(self):
+        return self.__name
+
+    def get(self, compressed=False):
+        """
+        :param compressed: Si vrai, le document est compressé (gzip). Il
+        n'est compressé qu'une fois par version, à la première demande.
+        :return: Tuple (document, ETag, Last-Modified) de la version
+        courante de la carte, ou None si la carte n'a pas pu être lue.
+        Last-Modified est exprimé en secondes depuis l'époque.
+        """
+        with self.__lock:
+            if self.__version != self.__map.version:
+                self.__build()
+            if self.__body is None:
+                return None
+            if not compressed:
+                return (self.__body, self.__etag, self.__lastModified)
+            if self.__gzipBody is None:
+                self.__gzipBody = gzip.compress(self.__body, CompressedAssets.LEVEL)
+            return (self.__gzipBody, self.__etag[:-1] + '-gz"', self.__lastModified)
+
+    def __build(self):
+        """
+        Sérialisation de la version courante de la carte.
+        """
+        body = MapSnapshot.read(self.__map, self.__serialize, MapSnapshot.MAX_ATTEMPTS, MapSnapshot.RETRY_DELAY)
+        if body is None:
+            return
+        body, version = body
+        self.__version = version
+        self.__body = body
+        self.__gzipBody = None
+        self.__etag = '"{0:x}-{1}-{2}"'.format(self.__epoch, version, self.__name)
+        # Last-Modified est à la seconde près : deux versions successives doivent avoir des dates différentes.
+        now = int(time.time())
+        self.__lastModified = now if self.__lastModified is None else max(now, self.__lastModified + 1)
+
+
+#
+#
+##############################################################################
+class MapRegions:
+    """
+    Cette classe sert les régions (rectangle et niveau de détail) d'une
+    carte, au format JSON (voir SurveyMapRegionJsonAdapter). Les niveaux de
+    détail sont calculés une fois par version de la carte.
+
+    L'ETag d'une région ne dépend que de la version de la carte et de la
+    région demandée : une requête conditionnelle sur une carte inchangée
+    reçoit la réponse 304 sans que la région soit recalculée.
+    """
+    MAX_ATTEMPTS = 3
+    RETRY_DELAY = 0.05
+    CONTENT_TYPE = "application/json"
+
+    def __init__(self, surveyMap):
+        """
+        :param surveyMap: SurveyMap dont les régions sont servies.
+        """
+        self.__map = surveyMap
+        self.__adapter = SurveyMapRegionJsonAdapter(surveyMap)
+        self.__epoch = int(time.time())
+
+    def region(self, box, lod):
+        """
+        :param box: Tuple (minX, minY, maxX, maxY) ou None pour toute la carte.
+        :param lod: Résolution demandée en cm, ramenée à celle d'un niveau de détail disponible (voir
+        survey_lod.SurveyMapDecimator), 0 pour tous les points.
+        :return: Tuple (minX, minY, maxX, maxY, lod) de la région.
+        """
+        if box is None:
+            surveyMap = self.__map
+            box = (surveyMap.minX or 0.0, surveyMap.minY or 0.0, surveyMap.maxX or 0.0, surveyMap.maxY or 0.0)
+        return tuple(box) + (self.__adapter.decimator.resolution(lod),)
+
+    def etag(self, region, compressed=False, version=None):
+        """
+        :param region: Tuple (minX, minY, maxX, maxY, lod) de la région.
+        :param compressed: Si vrai, ETag de la région compressée.
+        :param version: Version de la carte (version courante par défaut).
+        :return: ETag de la région pour cette version de la carte.
+        """
+        if version is None:
+            version = self.__map.version
+        key = zlib.crc32(repr(region).encode())
+        return '"{0:x}-{1}-{2:x}{3}"'.format(self.__epoch, version, key, "-gz" if compressed else "")
+
+    def get(self, region, compressed=False):
+        """
+        :param region: Tuple (minX, minY, maxX, maxY, lod) de la région.
+        :param compressed: Si vrai, le document est compressé (gzip).
+        :return: Tuple (document, ETag) de la région, ou None si la carte
+        n'a pas pu être lue (voir MapSnapshot.read).
+        """
+        body = MapSnapshot.read(self.__map, lambda surveyMap: self.__adapter.dumps(region), MapRegions.MAX_ATTEMPTS,
+                       MapRegions.RETRY_DELAY)
+        if body is None:
+            return None
+        body, version = body
+        etag = self.etag(region, compressed, version)
+        if compressed:
+            body = gzip.compress(body, CompressedAssets.LEVEL)
+        return (body, etag)
+
+
+#
+#
+##############################################################################
+class MapEventChannel:
+    """
+    Cette classe diffuse les modifications de la carte aux clients
+    abonnés (Server-Sent Events).
+
+    A chaque modification (voir SurveyMap.addChangeListener), seul le delta
+    est sérialisé (voir SurveyMapDeltaAdapter), une seule fois pour tous
+    les clients. Les HISTORY derniers deltas sont conservés : un client qui
+    se reconnecte reçoit ceux qu'il a manqués. Un client trop en retard
+    doit recharger la carte complète.
+
+    Chaque flux ouvert occupe un thread : leur nombre est limité à
+    maxStreams (voir acquire).
+    """
+    HISTORY = 64
+    MAX_STREAMS = 8
+
+    def __init__(self, surveyMap, history=HISTORY, maxStreams=MAX_STREAMS):
+        """
+        :param surveyMap: SurveyMap dont les modifications sont diffusées.
+        :param history: Nombre de deltas conservés.
+        :param maxStreams: Nombre maximal de flux ouverts simultanément.
+        """
+        self.__map = surveyMap
+        self.__condition = Condition()
+        self.__events = deque(maxlen=history)
+        self.__closed = False
+        self.__streams = 0
+        self.__maxStreams = maxStreams
+        surveyMap.addChangeListener(self.__onChange)
+
+    @property
+    def version(self):
+        return self.__map.version
+
+    def __onChange(self, ranks, walls, removed):
+        """
+        Sérialisation et publication d'un delta de la carte.
+        Invoqué par la tâche du robot juste après la modification.
+        """
+        data = XmlStreamWriter.dumps(SurveyMapDeltaAdapter(self.__map), (ranks, walls, removed))
+        with self.__condition:
+            self.__events.append((self.__map.version, data))
+            self.__condition.notify_all()
+
+    def wait(self, since, timeout):
+        """
+        Attente des deltas postérieurs à une version de la carte.
+
+        :param since: Version de la carte détenue par le client.
+        :param timeout: Délai d'attente maximal en secondes.
+        :return: Liste des tuples (version, delta) postérieurs à since (vide
+        si le délai est écoulé ou le canal fermé), ou None si des deltas
+        ne sont plus disponibles.
+        """
+        with self.__condition:
+            self.__condition.wait_for(lambda: self.__closed or self.__map.version != since, timeout)
+            latest = self.__map.version
+            if since == latest or self.__closed:
+                return []
+            first = self.__events[0][0] if len(self.__events) > 0 else latest + 1
+            if since > latest or since < first - 1:
+                return None
+            return [event for event in self.__events if event[0] > since]
+
+    @property
+    def closed(self):
+        return self.__closed
+
+    @property
+    def streams(self):
+        """
+        :return: Nombre de flux ouverts.
+        """
+        return self.__streams
+
+    def acquire(self):
+        """
+        Réservation d'un flux.
+
+        :return: Faux si maxStreams flux sont déjà ouverts.
+        """
+        with self.__condition:
+            if self.__streams >= self.__maxStreams:
+                return False
+            self.__streams += 1
+            return True
+
+    def release(self):
+        """
+        Libération d'un flux réservé par acquire.
+        """
+        with self.__condition:
+            self.__streams -= 1
+
+    def stream(self, write, since, heartbeat):
+        """
+        Diffusion des deltas postérieurs à since (format Server-Sent
+        Events), jusqu'à la fermeture du canal ou la déconnexion du client.
+
+        :param write: Fonction d'écriture des octets vers le client.
+        :param since: Version de la carte détenue par le client.
+        :param heartbeat: Délai en secondes au-delà duquel un commentaire
+        est envoyé pour maintenir la connexion.
+        """
+        try:
+            while not self.__closed:
+                events = self.wait(since, heartbeat)
+                if events is None:
+                    since = self.version
+                    write("event: reset\nid: {0}\ndata: {0}\n\n".format(since).encode())
+                elif len(events) == 0:
+                    write(b": heartbeat\n\n")
+                for version, data in events or []:
+                    lines = b"".join(b"data: " + line + b"\n" for line in data.splitlines())
+                    write("event: delta\nid: {0}\n".format(version).encode() + lines + b"\n")
+                    since = version
+        except (ConnectionError, OSError):
+            # Client déconnecté.
+            pass
+
+    def close(self):
+        """
+        Fermeture du canal : les clients en attente sont libérés.
+        """
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+
+#
+#
+##############################################################################
+class MapHTTPRequestHandler(GzipHTTPRequestHandler):
+    """
+    Cette classe définit un handler HTTP qui sert la carte du robot depuis
+    la mémoire, sans passer par le document XML enregistré sur disque.
+
+    Les requêtes de mapPath sont servies à partir de l'un des
+    mapSnapshots : celui désigné par le paramètre format de la requête,
+    sinon celui que l'en-tête Accept préfère, sinon le premier. Il est
+    compressé si le client l'accepte. Une requête conditionnelle
+    (If-None-Match ou If-Modified-Since) sur une version inchangée reçoit
+    la réponse 304.
+
+    Les requêtes de regionPath retournent la partie de la carte contenue
+    dans le rectangle (minX, minY, maxX, maxY) au niveau de détail lod
+    (voir MapRegions). Sans rectangle, toute la carte est retournée.
+
+    Les requêtes de eventsPath ouvrent un flux Server-Sent Events qui
+    transmet les deltas de mapEvents postérieurs à la version since (ou
+    Last-Event-ID lors d'une reconnexion). Un évènement reset indique au
+    client qu'il doit recharger la carte complète. Chaque flux est servi
+    par son propre thread, hors des threads de traitement du serveur (voir
+    PooledHTTPServer.detach), et le nombre de flux est limité (voir
+    MapEventChannel.acquire) : au-delà, la réponse est 503.
+
+    Les autres requêtes sont servies comme des fichiers (voir
+    GzipHTTPRequestHandler).
+    """
+    HEARTBEAT = 15
+    mapPath = None
+    mapSnapshots = None
+    regionPath = None
+    mapRegions = None
+    eventsPath = None
+    mapEvents = None
+
+    def do_GET(self):
+        if self._isMapRequest():
+            self._sendMap(True)
+        elif self.mapRegions is not None and urllib.parse.urlsplit(self.path).path == self.regionPath:
+            self._sendRegion(True)
+        elif self.mapEvents is not None and urllib.parse.urlsplit(self.path).path == self.eventsPath:
+            self._sendEvents()
+        else:
+            super().do_GET()
+
+    def do_HEAD(self):
+        if self._isMapRequest():
+            self._sendMap(False)
+        elif self.mapRegions is not None and urllib.parse.urlsplit(self.path).path == self.regionPath:
+            self._sendRegion(False)
+        else:
+            super().do_HEAD()
+
+    def _isMapRequest(self):
+        """
+        :return: Vrai si la requête porte sur la carte.
+        """
+        return self.mapSnapshots is not None and urllib.parse.urlsplit(self.path).path == self.mapPath
+
+    def _selectSnapshot(self):
+        """
+        Négociation du format de la carte.
+
+        :return: MapSnapshot du format retenu.
+        """
+        formats = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query).get("format")
+        if formats is not None:
+            for snapshot in self.mapSnapshots:
+                if snapshot.name == formats[0]:
+                    return snapshot
+        accept = self.headers.get("Accept")
+        if accept is None:
+            return self.mapSnapshots[0]
+        qualities = {}
+        for mediaRange in accept.split(","):
+            parameters = mediaRange.split(";")
+            quality = 1.0
+            for parameter in parameters[1:]:
+                key, _, value = parameter.partition("=")
+                if key.strip() == "q":
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            qualities[parameters[0].strip().lower()] = quality
+        # La qualité d'un format est celle du type le plus précis qui le
+        # désigne (type exact, type/*, */*). A qualité égale, un type
+        # explicite l'emporte sur un type générique.
+        best, bestRank = self.mapSnapshots[0], (0.0, 0)
+        for snapshot in self.mapSnapshots:
+            ranges = (snapshot.mediaType, snapshot.mediaType.split("/")[0] + "/*", "*/*")
+            for precision, mediaType in enumerate(ranges):
+                if mediaType in qualities:
+                    rank = (qualities[mediaType], len(ranges) - precision)
+                    if rank[0] > 0 and rank > bestRank:
+                        best, bestRank = snapshot, rank
+                    break
+        return best
+
+    def _sendMap(self, withBody):
+        """
+        Réponse à une requête sur la carte.
+
+        :param withBody: Si faux, seuls les en-têtes sont envoyés (HEAD).
+        """
+        snapshot = self._selectSnapshot()
+        compressed = self._acceptsGzip()
+        document = snapshot.get(compressed)
+        if document is None:
+            self.send_error(http.HTTPStatus.SERVICE_UNAVAILABLE, "Map is being modified")
+            return
+        body, etag, lastModified = document
+        if self._isNotModified(etag, lastModified):
+            self.send_response(http.HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Vary", "Accept, Accept-Encoding")
+            self.end_headers()
+            return
+        self.send_response(http.HTTPStatus.OK)
+        self.send_header("Content-Type", snapshot.contentType)
+        if compressed:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.date_time_string(lastModified))
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept, Accept-Encoding")
+        self.end_headers()
+        if withBody:
+            self.wfile.write(body)
+
+    def _sendRegion(self, withBody):
+        """
+        Réponse à une requête sur une région de la carte.
+
+        :param withBody: Si faux, seuls les en-têtes sont envoyés.
+        """
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        try:
+            box = [float(query[name][0]) for name in ("minX", "minY", "maxX", "maxY") if name in query]
+            lod = float(query.get("lod", ["0"])[0])
+        except ValueError:
+            self.send_error(http.HTTPStatus.BAD_REQUEST, "Invalid region")
+            return
+        if len(box) not in (0, 4) or not all(math.isfinite(value) for value in box + [lod]) or \
+                (len(box) == 4 and (box[0] > box[2] or box[1] > box[3])):
+            self.send_error(http.HTTPStatus.BAD_REQUEST, "Invalid region")
+            return
+        region = self.mapRegions.region(box if len(box) == 4 else None, lod)
+        compressed = self._acceptsGzip()
+        if self._isNotModified(self.mapRegions.etag(region, compressed), None):
+            self.send_response(http.HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", self.mapRegions.etag(region, compressed))
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Vary", "Accept-Encoding")
+            self.end_headers()
+            return
+        document = self.mapRegions.get(region, compressed)
+        if document is None:
+            self.send_error(http.HTTPStatus.SERVICE_UNAVAILABLE, "Map is being modified")
+            return
+        body, etag = document
+        self.send_response(http.HTTPStatus.OK)
+        self.send_header("Content-Type", MapRegions.CONTENT_TYPE)
+        if compressed:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
+        self.end_headers()
+        if withBody:
+            self.wfile.write(body)
+
+    def _sendEvents(self):
+        """
+        Ouverture d'un flux des deltas de la carte.
+
+        Sur un PooledHTTPServer, la connexion est détachée et le flux est
+        servi par un thread dédié : le thread de traitement est aussitôt
+        libéré. Sinon, le flux est servi jusqu'à la déconnexion du client.
+        """
+        since = self.headers.get("Last-Event-ID")
+        if since is None:
+            since = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query).get("since", [None])[0]
+        try:
+            since = int(since)
+        except (TypeError, ValueError):
+            since = self.mapEvents.version
+        if not self.mapEvents.acquire():
+            self.send_error(http.HTTPStatus.SERVICE_UNAVAILABLE, "Too many event streams")
+            return
+        detached = False
+        try:
+            self.send_response(http.HTTPStatus.OK)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            self.wfile.flush()
+            self.close_connection = True
+            detach = getattr(self.server, "detach", None)
+            if detach is None:
+                self.mapEvents.stream(self.wfile.write, since, MapHTTPRequestHandler.HEARTBEAT)
+                return
+            detach(self.request)
+            detached = True
+            Thread(target=MapHTTPRequestHandler.__serveEvents, name="HttpEvents", daemon=True,
+                   args=(self.mapEvents, self.server, self.request, since)).start()
+        finally:
+            if not detached:
+                self.mapEvents.release()
+
+    @staticmethod
+    def __serveEvents(mapEvents, server, request, since):
+        """
+        Boucle du thread d'un flux détaché.
+        """
+        try:
+            mapEvents.stream(request.sendall, since, MapHTTPRequestHandler.HEARTBEAT)
+        finally:
+            mapEvents.release()
+            server.shutdown_request(request)
+
+
+#
+#
+##############################################################################
+class MapWebServerTask(WebServerTask):
+    """
+    Cette classe définit un Serveur Web qui expose la carte relevée par un
+    robot Surveyor directement depuis sa mémoire, ainsi que le flux de ses
+    modifications (voir MapHTTPRequestHandler). Les autres ressources sont
+    servies comme des fichiers.
+
+    La carte est disponible en XML (par défaut), en JSON et dans le format
+    binaire de survey_codec.
+    """
+    MAP_PATH = "/www/map.xml"
+    REGION_PATH = "/www/map.region"
+    EVENTS_PATH = "/www/map.events"
+
+    def __init__(self, robot, webport=8000, name=WebServerTask.DEFAULT_NAME, auto=True, mapPath=MAP_PATH,
+                 regionPath=REGION_PATH, eventsPath=EVENTS_PATH, **options):
+        """
+        Initialisation de la tâche.
+
+        :param robot: Robot propriétaire de la tâche (exposant la carte par son attribut map).
+        :param webport: Port réseau utilisé par le serveur Web (8000 par défaut)
+        :param name: Nom de la tâche ("RobotWeb" par défaut).
+        :param auto: Indicateur si la tâche est automaitquement démarrée.
+        :param mapPath: Chemin de l'URL de la carte.
+        :param regionPath: Chemin de l'URL des régions de la carte.
+        :param eventsPath: Chemin de l'URL du flux des modifications de la carte.
+        :param options: Options du serveur (voir WebServerTask).
+        """
+        self._mapPath = mapPath
+        self._regionPath = regionPath
+        self._mapRegions = MapRegions(robot.map)
+        self._eventsPath = eventsPath
+        self._mapEvents = MapEventChannel(robot.map)
+        self._mapSnapshots = [
+            MapSnapshot(robot.map, lambda surveyMap: XmlStreamWriter.dumps(SurveyMapAdapter(), surveyMap),
+                        "text/xml; charset=utf-8", "xml"),
+            MapSnapshot(robot.map, SurveyMapJsonAdapter().dumps, "application/json", "json"),
+            MapSnapshot(robot.map, SurveyMapBinaryAdapter().dumps, SurveyMapBinaryAdapter.MEDIA_TYPE, "bin")]
+        super().__init__(robot, webport=webport, name=name, auto=auto, **options)
+
+    def _getHttpHandler(self):
+        """
+        Création d'un handler pour le service Web.
+        :return: Handler du service HTTP.
+        """
+        return type("MapHTTPRequestHandler", (MapHTTPRequestHandler,),
+                    {"mapPath": self._mapPath, "mapSnapshots": self._mapSnapshots,
+                     "regionPath": self._regionPath, "mapRegions": self._mapRegions,
+                     "eventsPath": self._eventsPath, "mapEvents": self._mapEvents})
+
+    def stop(self):
+        """
+        Les flux de modifications en cours sont fermés avant l'arrêt du
+        serveur.
+        """
+        self._mapEvents.close()
+        super().stop()
+
+
 #
 #
 ##############################################################################
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+"""
+Ce module définit l'odométrie du robot explorer.
+
+La pose du robot (position et orientation) est intégrée à partir des
+compteurs de position des moteurs des chenilles (ports B et C), et non des
+déplacements commandés : un déplacement interrompu ou une chenille bloquée
+sont donc pris en compte. Les compteurs sont échantillonnés à fréquence
+fixe par une tâche de fond ; chaque échantillon produit une pose datée,
+conservée dans un historique borné.
+
+La consultation de la pose ne bloque jamais : elle ne fait que lire la
+dernière pose calculée (ou interpoler l'historique).
+
+Auteur : André-Pierre LIMOUZIN
+Version : 1.0 - 10.2026
+"""
+
+from collections import deque
+import math
+from threading import Lock
+
+from robot import RobotTask
+from survey_model import Angle
+
+
+#
+#
+##############################################################################
+class OdometryPose:
+    """
+    Cette classe modélise une pose datée du robot.
+    """
+    __slots__ = ("_timestamp", "_x", "_y", "_orientation", "_isReset")
+
+    def __init__(self, timestamp, x, y, orientation, isReset=False):
+        """
+        :param timestamp: Instant de l'échantillon en secondes.
+        :param x: Abscisse du robot.
+        :param y: Ordonnée du robot.
+        :param orientation: Orientation (topographique) du robot en radians.
+        :param isReset: Vrai si la pose résulte d'un recalage (voir Odometry.reset).
+        """
+        self._timestamp = timestamp
+        self._x = x
+        self._y = y
+        self._orientation = orientation
+        self._isReset = isReset
+
+    @property
+    def timestamp(self):
+        return self._timestamp
+
+    @property
+    def X(self):
+        return self._x
+
+    @property
+    def Y(self):
+        return self._y
+
+    @property
+    def position(self):
+        return (self._x, self._y)
+
+    @property
+    def orientation(self):
+        return Angle(radians=self._orientation)
+
+    @property
+    def isReset(self):
+        return self._isReset
+
+    def __str__(self):
+        return "OdometryPose(t={0:.2f}, x={1:.1f}, y={2:.1f}, orientation={3:.1f}°)".format(
+            self._timestamp, self._x, self._y, math.degrees(self._orientation))
+
+
+#
+#
+##############################################################################
+class Odometry:
+    """
+    Cette classe intègre la cinématique d'une base à deux chenilles à
+    partir des compteurs de position de ses moteurs.
+
+    Entre deux échantillons, les vitesses des chenilles sont supposées
+    constantes : le déplacement est un arc de cercle, de corde
+    2.ds/dTheta.sin(dTheta/2) dans la direction moyenne.
+    """
+    COUNT_PER_ROT = 360
+    HISTORY = 512
+
+    def __init__(self, leftMotor, rightMotor, devices, spacing, radius, history=HISTORY):
+        """
+        :param leftMotor: Moteur de la chenille gauche (port B).
+        :param rightMotor: Moteur de la chenille droite (port C).
+        :param devices: RobotDevices fournissant l'horloge du robot.
+        :param spacing: Ecartement des chenilles en cm.
+        :param radius: Rayon des roues motrices en cm.
+        :param history: Nombre de poses conservées.
+        """
+        self.__left = leftMotor
+        self.__right = rightMotor
+        self.__devices = devices
+        self.__spacing = spacing
+        self.__factor = 2 * math.pi * radius / Odometry.COUNT_PER_ROT
+        self.__lock = Lock()
+        self.__lastLeft = leftMotor.position
+        self.__lastRight = rightMotor.position
+        self.__pose = OdometryPose(devices.time(), 0.0, 0.0, 0.0)
+        self.__history = deque([self.__pose], maxlen=history)
+
+    @property
+    def pose(self):
+        """
+        :return: Dernière OdometryPose calculée.
+        """
+        return self.__pose
+
+    def update(self):
+        """
+        Echantillonnage des compteurs et intégration du déplacement.
+
+        :return: Nouvelle OdometryPose.
+        """
+        with self.__lock:
+            left = self.__left.position
+            right = self.__right.position
+            timestamp = self.__devices.time()
+            dl = (left - self.__lastLeft) * self.__factor
+            dr = (right - self.__lastRight) * self.__factor
+            self.__lastLeft = left
+            self.__lastRight = right
+            pose = self.__pose
+            ds = (dl + dr) / 2.0
+            dTheta = (dl - dr) / self.__spacing
+            if abs(dTheta) < 1e-9:
+                chord = ds
+            else:
+                chord = 2.0 * ds / dTheta * math.sin(dTheta / 2.0)
+            heading = pose._orientation + dTheta / 2.0
+            orientation = math.atan2(math.sin(pose._orientation + dTheta), math.cos(pose._orientation + dTheta))
+            pose = OdometryPose(timestamp, pose._x + chord * math.sin(heading),
+                                pose._y + chord * math.cos(heading), orientation)
+            self.__history.append(pose)
+            self.__pose = pose
+            return pose
+
+    def reset(self, x, y, orientation):
+        """
+        Recalage de la pose courante (après correction de la pose d'une
+        station, par exemple). L'intégration se poursuit à partir de
+        cette pose.
+
+        :param x: Abscisse du robot.
+        :param y: Ordonnée du robot.
+        :param orientation: Angle (topographique) du robot.
+        """
+        with self.__lock:
+            self.__pose = OdometryPose(self.__devices.time(), x, y, orientation.radians, True)
+            self.__history.append(self.__pose)
+
+    def history(self, since=None):
+        """
+        :param since: Instant à partir duquel les poses sont retournées
+        (toutes par défaut).
+        :return: Liste des OdometryPose conservées, de la plus ancienne à
+        la plus récente.
+        """
+        with self.__lock:
+            poses = list(self.__history)
+        if since is None:
+            return poses
+        return [pose for pose in poses if pose.timestamp >= since]
+
+    def poseAt(self, timestamp):
+        """
+        Estimation de la pose à un instant donné, par interpolation
+        linéaire entre les deux échantillons qui l'encadrent. Les poses
+        séparées par un recalage ne sont pas interpolées : avant le
+        recalage, la pose est celle de l'échantillon précédent.
+
+        :param timestamp: Instant en secondes.
+        :return: OdometryPose (la plus ancienne ou la plus récente si
+        l'instant est hors de l'historique).
+        """
+        with self.__lock:
+            poses = list(self.__history)
+        if timestamp <= poses[0].timestamp:
+            return poses[0]
+        for k in range(1, len(poses)):
+            after = poses[k]
+            if after.timestamp >= timestamp:
+                before = poses[k - 1]
+                if after.isReset and timestamp < after.timestamp:
+                    return OdometryPose(timestamp, before._x, before._y, before._orientation)
+                span = after.timestamp - before.timestamp
+                t = (timestamp - before.timestamp) / span if span > 0 else 1.0
+                dTheta = math.atan2(math.sin(after._orientation - before._orientation),
+                                    math.cos(after._orientation - before._orientation))
+                return OdometryPose(timestamp, before._x + t * (after._x - before._x),
+                                    before._y + t * (after._y - before._y),
+                                    before._orientation + t * dTheta)
+        return poses[-1]
+
+
+#
+#
+##############################################################################
+class OdometryTask(RobotTask):
+    """
+    Cette tâche de fond échantillonne l'odométrie du robot à fréquence
+    fixe.
+    """
+    DEFAULT_NAME = "Odometry"
+    DEFAULT_PERIOD = 0.02
+
+    def __init__(self, robot, odometry, period=DEFAULT_PERIOD, name=DEFAULT_NAME, auto=True):
+        """
+        :param robot: Robot propriétaire de la tâche.
+        :param odometry: Odometry à échantillonner.
+        :param period: Période d'échantillonnage en secondes.
+        :param name: Nom de la tâche.
+        :param auto: Indicateur si la tâche est automatiquement démarrée.
+        """
+        super().__init__(robot, name, auto)
+        self._odometry = odometry
+        self._period = period
+
+    def loop(self):
+        """
+        Echantillonnage puis attente de la période suivante.
+        """
+        start = self.robot.devices.time()
+        self._odometry.update()
+        self.robot.devices.sleep(max(0.0, self._period - (self.robot.devices.time() - start)))
@@ -0,0 +1,699 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+"""
+Ce module définit une simulation du robot Explorer.
+
+Les moteurs et capteurs ev3dev2 (MoveSteering, MoveTank, MediumMotor,
+UltrasonicSensor et InfraredSensor) sont simulés dans un monde 2D composé
+de polygones. Le temps est virtuel : avec un facteur d'échelle nul, les
+attentes ne consomment aucun temps réel, ce qui permet d'exécuter les
+tâches du robot plus vite que le temps réel sur un PC.
+
+Les angles sont topographiques : ils sont comptés dans le sens horaire à
+partir de l'axe des ordonnées.
+
+Auteur : André-Pierre LIMOUZIN
+Version : 1.0 - 10.2026
+"""
+
+import math
+import random
+import threading
+import time
+
+from devices import RobotDevices
+
+
+#
+#
+##############################################################################
+class SimClock:
+    """
+    Cette classe modélise l'horloge virtuelle de la simulation.
+
+    Chaque attente fait avancer le temps virtuel de sa durée, et le temps
+    réel de sa durée multipliée par timeScale (0 : aucune attente réelle,
+    1 : temps réel).
+    """
+    def __init__(self, timeScale=0.0):
+        """
+        Initialisation de l'horloge à l'instant 0.
+
+        :param timeScale: Rapport entre temps réel et temps virtuel.
+        """
+        self.__timeScale = timeScale
+        self.__now = 0.0
+        self.__lock = threading.Lock()
+
+    @property
+    def timeScale(self):
+        return self.__timeScale
+
+    def time(self):
+        """
+        :return: Instant virtuel courant en secondes.
+        """
+        with self.__lock:
+            return self.__now
+
+    def sleep(self, seconds):
+        """
+        Avance du temps virtuel de seconds.
+
+        :param seconds: Durée de l'attente en secondes.
+        """
+        if seconds <= 0:
+            return
+        if self.__timeScale > 0:
+            time.sleep(seconds * self.__timeScale)
+        with self.__lock:
+            self.__now += seconds
+
+
+#
+#
+##############################################################################
+class SimWorld:
+    """
+    Cette classe modélise le monde 2D dans lequel évolue le robot simulé.
+
+    Le monde est un ensemble de polygones fermés (murs de la pièce et
+    obstacles), décrits par la liste de leurs sommets (x, y) en cm.
+    """
+    def __init__(self, polygons=()):
+        """
+        Initialisation du monde.
+
+        :param polygons: Séquence de polygones.
+        """
+        self.__segments = []
+        for polygon in polygons:
+            self.addPolygon(polygon)
+
+    @staticmethod
+    def room(width, height, obstacles=()):
+        """
+        Construction d'une pièce rectangulaire centrée sur l'origine.
+
+        :param width: Largeur de la pièce en cm.
+        :param height: Profondeur de la pièce en cm.
+        :param obstacles: Séquence de polygones placés dans la pièce.
+        :return: Objet SimWorld.
+        """
+        w = width / 2.0
+        h = height / 2.0
+        world = SimWorld([((-w, -h), (w, -h), (w, h), (-w, h))])
+        for obstacle in obstacles:
+            world.addPolygon(obstacle)
+        return world
+
+    @property
+    def segments(self):
+        return self.__segments
+
+    def addPolygon(self, polygon):
+        """
+        Ajout d'un polygone fermé.
+
+        :param polygon: Séquence des sommets (x, y) du polygone.
+        """
+        for k in range(len(polygon)):
+            x1, y1 = polygon[k]
+            x2, y2 = polygon[(k + 1) % len(polygon)]
+            self.__segments.append((float(x1), float(y1), float(x2), float(y2)))
+
+    def raycast(self, x, y, angle, maxRange=math.inf):
+        """
+        Lancer d'un rayon.
+
+        :param x: Abscisse de l'origine du rayon.
+        :param y: Ordonnée de l'origine du rayon.
+        :param angle: Direction topographique du rayon en degrés.
+        :param maxRange: Portée maximale du rayon.
+        :return: Distance du premier segment rencontré ou None.
+        """
+        dx = math.sin(math.radians(angle))
+        dy = math.cos(math.radians(angle))
+        best = maxRange
+        for x1, y1, x2, y2 in self.__segments:
+            ex = x2 - x1
+            ey = y2 - y1
+            denominator = dx * ey - dy * ex
+            if denominator == 0:
+                continue
+            t = ((x1 - x) * ey - (y1 - y) * ex) / denominator
+            u = ((x1 - x) * dy - (y1 - y) * dx) / denominator
+            if 0 <= t < best and 0 <= u <= 1:
+                best = t
+        return None if best == maxRange else best
+
+
+#
+#
+##############################################################################
+class SimMotor:
+    """
+    Cette classe simule un servo-moteur EV3.
+
+    La position (en degrés) est calculée à partir de la vitesse et de
+    l'horloge virtuelle : un mouvement non bloquant se poursuit pendant
+    que l'appelant fait autre chose.
+    """
+    MAX_SPEED = 1050
+
+    def __init__(self, clock, address, maxSpeed=MAX_SPEED):
+        """
+        Initialisation du moteur.
+
+        :param clock: Horloge virtuelle.
+        :param address: Port du moteur.
+        :param maxSpeed: Vitesse à 100% en degrés par seconde.
+        """
+        self.__clock = clock
+        self.__address = address
+        self.__maxSpeed = maxSpeed
+        self.__position = 0.0
+        self.__speed = 0.0
+        self.__last = clock.time()
+        self.__until = None
+        self.__lock = threading.Lock()
+
+    @property
+    def address(self):
+        return self.__address
+
+    @property
+    def max_speed(self):
+        return self.__maxSpeed
+
+    def __update(self):
+        """
+        Intégration de la position jusqu'à l'instant courant.
+        """
+        now = self.__clock.time()
+        end = now if self.__until is None else min(now, self.__until)
+        if end > self.__last:
+            self.__position += self.__speed * (end - self.__last)
+        self.__last = max(self.__last, end)
+        if self.__until is not None and now >= self.__until:
+            self.__speed = 0.0
+            self.__until = None
+            self.__last = now
+
+    @property
+    def position(self):
+        with self.__lock:
+            self.__update()
+            return int(round(self.__position))
+
+    @property
+    def degrees(self):
+        """
+        :return: Position exacte (non arrondie) en degrés.
+        """
+        with self.__lock:
+            self.__update()
+            return self.__position
+
+    @property
+    def speed(self):
+        with self.__lock:
+            self.__update()
+            return self.__speed
+
+    @property
+    def is_running(self):
+        return self.speed != 0
+
+    def __start(self, speed, duration):
+        with self.__lock:
+            self.__update()
+            self.__speed = max(-self.__maxSpeed, min(self.__maxSpeed, speed * self.__maxSpeed / 100.0))
+            self.__until = None if duration is None else self.__clock.time() + duration
+
+    def on(self, speed, brake=True, block=False):
+        """
+        Rotation continue à speed % de la vitesse maximale.
+        """
+        self.__start(speed, None)
+
+    def on_for_degrees(self, speed, degrees, brake=True, block=True):
+        """
+        Rotation de degrees degrés. Le sens est donné par le produit des
+        signes de speed et de degrees.
+        """
+        dps = abs(speed) * self.__maxSpeed / 100.0
+        if dps == 0 or degrees == 0:
+            return
+        dps = min(dps, self.__maxSpeed)
+        direction = 1 if (speed > 0) == (degrees > 0) else -1
+        duration = abs(degrees) / dps
+        self.__start(direction * dps * 100.0 / self.__maxSpeed, duration)
+        if block:
+            self.__clock.sleep(duration)
+
+    def on_for_seconds(self, speed, seconds, brake=True, block=True):
+        """
+        Rotation pendant seconds secondes.
+        """
+        if seconds <= 0:
+            return
+        self.__start(speed, seconds)
+        if block:
+            self.__clock.sleep(seconds)
+
+    def off(self, brake=True):
+        with self.__lock:
+            self.__update()
+            self.__speed = 0.0
+            self.__until = None
+
+    def wait_until_not_moving(self, timeout=None):
+        """
+        Attente de la fin du mouvement en cours.
+        :return: Faux si le moteur tourne toujours à l'expiration de timeout.
+        """
+        with self.__lock:
+            self.__update()
+            if self.__until is None:
+                return self.__speed == 0
+            remaining = self.__until - self.__clock.time()
+        if timeout is not None and remaining > timeout / 1000.0:
+            self.__clock.sleep(timeout / 1000.0)
+            return False
+        self.__clock.sleep(remaining)
+        return True
+
+
+#
+#
+##############################################################################
+class SimMediumMotor(SimMotor):
+    """
+    Cette classe simule un moteur moyen EV3 (MediumMotor).
+    """
+    MAX_SPEED = 1560
+
+    def __init__(self, clock, address="outA"):
+        super().__init__(clock, address, SimMediumMotor.MAX_SPEED)
+
+
+#
+#
+##############################################################################
+class SimBody:
+    """
+    Cette classe simule le déplacement du robot : une base à deux
+    chenilles dont la pose (x, y, orientation) est intégrée à partir des
+    positions des moteurs B et C.
+
+    Le glissement des chenilles est simulé par un bruit gaussien
+    multiplicatif d'écart-type slip sur chaque déplacement.
+    """
+    def __init__(self, clock, spacing, radius, pose=(0.0, 0.0, 0.0), slip=0.0, rng=None):
+        """
+        Initialisation de la base.
+
+        :param clock: Horloge virtuelle.
+        :param spacing: Ecartement des chenilles en cm.
+        :param radius: Rayon des roues motrices en cm.
+        :param pose: Pose initiale (x, y, orientation en degrés).
+        :param slip: Ecart-type relatif du glissement.
+        :param rng: Générateur aléatoire.
+        """
+        self.__spacing = spacing
+        self.__radius = radius
+        self.__x = float(pose[0])
+        self.__y = float(pose[1])
+        self.__theta = math.radians(pose[2])
+        self.__slip = slip
+        self.__rng = rng if rng is not None else random.Random()
+        self.__left = SimMotor(clock, "outB")
+        self.__right = SimMotor(clock, "outC")
+        self.__lastLeft = 0.0
+        self.__lastRight = 0.0
+        self.__lock = threading.Lock()
+
+    @property
+    def left_motor(self):
+        return self.__left
+
+    @property
+    def right_motor(self):
+        return self.__right
+
+    @property
+    def pose(self):
+        """
+        :return: Pose réelle (x, y, orientation en degrés) du robot.
+        """
+        self.update()
+        return (self.__x, self.__y, math.degrees(self.__theta))
+
+    def update(self):
+        """
+        Intégration de la pose depuis la dernière mise à jour.
+        La vitesse des moteurs étant constante entre deux commandes, le
+        déplacement est un arc de cercle.
+        """
+        with self.__lock:
+            left = self.__left.degrees
+            right = self.__right.degrees
+            dl = math.radians(left - self.__lastLeft) * self.__radius
+            dr = math.radians(right - self.__lastRight) * self.__radius
+            self.__lastLeft = left
+            self.__lastRight = right
+            if dl == 0 and dr == 0:
+                return
+            ds = (dl + dr) / 2.0
+            dtheta = (dl - dr) / self.__spacing
+            if self.__slip > 0:
+                ds *= 1.0 + self.__rng.gauss(0.0, self.__slip)
+                dtheta *= 1.0 + self.__rng.gauss(0.0, self.__slip)
+            if abs(dtheta) < 1e-9:
+                chord = ds
+            else:
+                chord = 2.0 * ds / dtheta * math.sin(dtheta / 2.0)
+            heading = self.__theta + dtheta / 2.0
+            self.__x += chord * math.sin(heading)
+            self.__y += chord * math.cos(heading)
+            self.__theta += dtheta
+
+
+#
+#
+##############################################################################
+class SimMoveTank:
+    """
+    Cette classe simule un MoveTank ev3dev2 : les deux chenilles sont
+    commandées individuellement.
+    """
+    def __init__(self, body):
+        """
+        :param body: SimBody dont les moteurs sont commandés.
+        """
+        self._body = body
+
+    @property
+    def left_motor(self):
+        return self._body.left_motor
+
+    @property
+    def right_motor(self):
+        return self._body.right_motor
+
+    @property
+    def is_running(self):
+        return self.left_motor.is_running or self.right_motor.is_running
+
+    def on_for_degrees(self, left_speed, right_speed, degrees, brake=True, block=True):
+        """
+        Rotation des chenilles. Le moteur le plus rapide tourne de degrees
+        degrés, l'autre proportionnellement.
+        """
+        self._body.update()
+        fastest = max(abs(left_speed), abs(right_speed))
+        if fastest == 0 or degrees == 0:
+            return
+        self.left_motor.on_for_degrees(left_speed, degrees * abs(left_speed) / fastest, brake, False)
+        self.right_motor.on_for_degrees(right_speed, degrees * abs(right_speed) / fastest, brake, False)
+        if block:
+            self.wait_until_not_moving()
+
+    def on(self, left_speed, right_speed):
+        self._body.update()
+        self.left_motor.on(left_speed)
+        self.right_motor.on(right_speed)
+
+    def off(self, brake=True):
+        self._body.update()
+        self.left_motor.off(brake)
+        self.right_motor.off(brake)
+
+    def wait_until_not_moving(self, timeout=None):
+        self.left_motor.wait_until_not_moving(timeout)
+        self.right_motor.wait_until_not_moving(timeout)
+        self._body.update()
+
+
+#
+#
+##############################################################################
+class SimMoveSteering(SimMoveTank):
+    """
+    Cette classe simule un MoveSteering ev3dev2 : les chenilles sont
+    commandées par une direction (-100 à 100) et une vitesse.
+    """
+    @staticmethod
+    def get_speed_steering(steering, speed):
+        """
+        Conversion d'une direction et d'une vitesse en vitesses des
+        chenilles (même formule que ev3dev2).
+
+        :return: Tuple (vitesse gauche, vitesse droite).
+        """
+        left = speed
+        right = speed
+        factor = (50 - abs(float(steering))) / 50
+        if steering >= 0:
+            right *= factor
+        else:
+            left *= factor
+        return (left, right)
+
+    def on_for_degrees(self, steering, speed, degrees, brake=True, block=True):
+        left, right = SimMoveSteering.get_speed_steering(steering, speed)
+        super().on_for_degrees(left, right, degrees, brake, block)
+
+    def on(self, steering, speed):
+        left, right = SimMoveSteering.get_speed_steering(steering, speed)
+        super().on(left, right)
+
+
+#
+#
+##############################################################################
+class SimUltrasonicSensor:
+    """
+    Cette classe simule le capteur ultra-son.
+
+    La mesure est la distance du premier obstacle dans un cône de demi-
+    angle beamWidth / 2 (échantillonné par rays rayons), bruitée d'un bruit
+    gaussien d'écart-type noise, saturée à MAX_RANGE. Chaque lecture dure
+    latency secondes de temps virtuel.
+    """
+    MAX_RANGE = 255.0
+
+    def __init__(self, clock, world, body, usMotor, eccentricity, distortion, reduction,
+                 noise=0.5, latency=0.03, beamWidth=10.0, rays=5, rng=None):
+        """
+        :param clock: Horloge virtuelle.
+        :param world: SimWorld observé.
+        :param body: SimBody portant le capteur.
+        :param usMotor: Moteur de rotation du capteur.
+        :param eccentricity: Position (x, y) de l'axe de rotation dans le référentiel du robot.
+        :param distortion: Distance entre le capteur et son axe de rotation.
+        :param reduction: Rapport de réduction entre le moteur et le capteur.
+        :param noise: Ecart-type du bruit de mesure en cm.
+        :param latency: Durée d'une lecture en secondes.
+        :param beamWidth: Ouverture du faisceau en degrés.
+        :param rays: Nombre de rayons lancés dans le faisceau.
+        :param rng: Générateur aléatoire.
+        """
+        self.__clock = clock
+        self.__world = world
+        self.__body = body
+        self.__usMotor = usMotor
+        self.__eccentricity = eccentricity
+        self.__distortion = distortion
+        self.__reduction = reduction
+        self.__noise = noise
+        self.__latency = latency
+        self.__beamWidth = beamWidth
+        self.__rays = rays
+        self.__rng = rng if rng is not None else random.Random()
+
+    @property
+    def distance_centimeters(self):
+        self.__clock.sleep(self.__latency)
+        x, y, theta = self.__body.pose
+        ex, ey = self.__eccentricity
+        rad = math.radians(theta)
+        ax = x + ex * math.cos(rad) + ey * math.sin(rad)
+        ay = y - ex * math.sin(rad) + ey * math.cos(rad)
+        direction = theta + self.__usMotor.degrees / self.__reduction
+        sx = ax + self.__distortion * math.sin(math.radians(direction))
+        sy = ay + self.__distortion * math.cos(math.radians(direction))
+        best = None
+        for k in range(self.__rays):
+            offset = 0.0 if self.__rays == 1 else self.__beamWidth * (k / (self.__rays - 1) - 0.5)
+            distance = self.__world.raycast(sx, sy, direction + offset, SimUltrasonicSensor.MAX_RANGE)
+            if distance is not None and (best is None or distance < best):
+                best = distance
+        if best is None:
+            return SimUltrasonicSensor.MAX_RANGE
+        if self.__noise > 0:
+            best += self.__rng.gauss(0.0, self.__noise)
+        return round(max(0.0, min(SimUltrasonicSensor.MAX_RANGE, best)), 1)
+
+
+#
+#
+##############################################################################
+class SimInfraredSensor:
+    """
+    Cette classe simule le capteur infra-rouge et la télécommande.
+
+    L'appui sur les boutons et la balise sont scriptés par les méthodes
+    press et setBeacon.
+    """
+    MODE_IR_PROX = "IR-PROX"
+    MODE_IR_SEEK = "IR-SEEK"
+    MODE_IR_REMOTE = "IR-REMOTE"
+
+    def __init__(self, clock):
+        self.__clock = clock
+        self.__buttons = {}
+        self.__beacons = {}
+        self.mode = SimInfraredSensor.MODE_IR_PROX
+
+    def press(self, channel, button, duration=0.1):
+        """
+        Appui sur un bouton de la télécommande.
+
+        :param channel: Canal de la télécommande.
+        :param button: Nom du bouton (top_left, bottom_left, top_right,
+        bottom_right ou beacon).
+        :param duration: Durée de l'appui en secondes.
+        """
+        self.__buttons[(channel, button)] = self.__clock.time() + duration
+
+    def setBeacon(self, channel, heading=None, distance=None):
+        """
+        Activation (ou désactivation si heading est None) de la balise.
+        """
+        if heading is None:
+            self.__beacons.pop(channel, None)
+        else:
+            self.__beacons[channel] = (heading, distance)
+
+    def __pressed(self, channel, button):
+        return self.__buttons.get((channel, button), -1) >= self.__clock.time()
+
+    def top_left(self, channel=1):
+        return self.__pressed(channel, "top_left")
+
+    def bottom_left(self, channel=1):
+        return self.__pressed(channel, "bottom_left")
+
+    def top_right(self, channel=1):
+        return self.__pressed(channel, "top_right")
+
+    def bottom_right(self, channel=1):
+        return self.__pressed(channel, "bottom_right")
+
+    def beacon(self, channel=1):
+        return self.__pressed(channel, "beacon") or channel in self.__beacons
+
+    def heading(self, channel=1):
+        return self.__beacons.get(channel, (0, None))[0]
+
+    def distance(self, channel=1):
+        return self.__beacons.get(channel, (0, None))[1]
+
+
+#
+#
+##############################################################################
+class SimulatedDevices(RobotDevices):
+    """
+    Cette classe fournit les équipements simulés du robot Explorer dans un
+    SimWorld.
+    """
+    def __init__(self, world, pose=(0.0, 0.0, 0.0), timeScale=0.0, noise=0.5, latency=0.03,
+                 slip=0.0, seed=None):
+        """
+        Initialisation de la simulation.
+
+        :param world: SimWorld dans lequel évolue le robot.
+        :param pose: Pose initiale (x, y, orientation en degrés) du robot.
+        :param timeScale: Rapport entre temps réel et temps virtuel.
+        :param noise: Ecart-type du bruit du capteur ultra-son en cm.
+        :param latency: Durée d'une lecture du capteur ultra-son en secondes.
+        :param slip: Ecart-type relatif du glissement des chenilles.
+        :param seed: Graine du générateur aléatoire.
+        """
+        from explorer import RobotExplorer
+        super().__init__()
+        self.__world = world
+        self.__clock = SimClock(timeScale)
+        self.__rng = random.Random(seed)
+        self.__body = SimBody(self.__clock, RobotExplorer.CATERPILLAR_SPACING,
+                              RobotExplorer.CATERPILLAR_RADIUS, pose, slip, self.__rng)
+        self.__noise = noise
+        self.__latency = latency
+
+    @property
+    def world(self):
+        return self.__world
+
+    @property
+    def clock(self):
+        return self.__clock
+
+    @property
+    def body(self):
+        return self.__body
+
+    def _createMovingMotors(self):
+        return SimMoveSteering(self.__body)
+
+    def _createTankMotors(self):
+        return SimMoveTank(self.__body)
+
+    def _createUSMotor(self):
+        return SimMediumMotor(self.__clock)
+
+    def _createIRSensor(self):
+        return SimInfraredSensor(self.__clock)
+
+    def _createUSSensor(self):
+        from explorer import RobotExplorer
+        return SimUltrasonicSensor(self.__clock, self.__world, self.__body, self.usMotor(),
+                                   RobotExplorer.US_ECCENTRICITY, RobotExplorer.US_DISTORTION,
+                                   RobotExplorer.US_GEARS_REDUCTION, self.__noise, self.__latency,
+                                   rng=self.__rng)
+
+    def time(self):
+        return self.__clock.time()
+
+    def sleep(self, seconds):
+        self.__clock.sleep(seconds)
+
+
+#
+#
+##############################################################################
+if __name__ == '__main__':
+    import os
+    import sys
+    import tempfile
+    from surveyor import RobotSurveyor, SurveyTask
+
+    stations = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    world = SimWorld.room(400, 300, [((60, 40), (120, 40), (120, 90), (60, 90))])
+    devices = SimulatedDevices(world, seed=1)
+    directory = tempfile.mkdtemp()
+    robot = RobotSurveyor(devices=devices,
+                          mapDocumentName=os.path.join(directory, "map.xml"),
+                          mapJournalName=os.path.join(directory, "map.journal"))
+    survey = SurveyTask(robot)
+    start = time.time()
+    for k in range(stations):
+        survey.loop()
+    elapsed = time.time() - start
+    points = sum(len(robot.map[i]) for i in range(len(robot.map)))
+    print("{0} stations, {1} points".format(len(robot.map), points))
+    print("Temps simulé : {0:.1f}s, temps réel : {1:.2f}s".format(devices.time(), elapsed))
+    print("Pose réelle : {0}, pose estimée : {1}".format(devices.body.pose, robot.position))
+    print("Carte : {0}".format(os.path.join(directory, "map.xml")))
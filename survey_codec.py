@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+"""
+Ce module définit les formats compacts d'échange d'une SurveyMap, en
+complément du document XML (voir survey_xmlio).
+
+* Le format JSON reprend les noms des attributs XML, mais les points d'une
+  station sont rangés en colonnes et les coordonnées sont arrondies à
+  DIGITS décimales.
+* Le format binaire range les mêmes colonnes en float32 (little-endian),
+  la validité des points étant codée par un bit.
+* Une région de la carte (rectangle et niveau de détail) peut être écrite
+  en JSON, pour n'envoyer au navigateur que la partie visible, réduite à
+  la résolution de l'affichage (voir survey_lod).
+
+Comme dans le document XML, les murs des stations ne sont pas écrits : ils
+sont recalculés à la lecture. Les murs de la carte sont écrits pour les
+clients, mais ne sont pas relus.
+
+Auteur : André-Pierre LIMOUZIN
+Version : 1.0 - 10.2026
+"""
+
+from array import array
+import json
+import math
+import struct
+import sys
+
+from survey_lod import SurveyMapDecimator
+from survey_model import SurveyMap, SurveyNode, SurveyPoint, Angle
+from survey_xmlio import MapWallAdapter, SurveyMapAdapter, SurveyNodeAdapter, SurveyPointAdapter, WallAdapter
+
+
+#
+#
+##############################################################################
+class SurveyNodeColumns:
+    """
+    Cette classe expose les points d'un SurveyNode en colonnes, quel que
+    soit son mode de stockage (voir SurveyPointArray).
+    """
+    def __init__(self, surveyNode):
+        """
+        :param surveyNode: SurveyNode dont les points sont exposés.
+        """
+        columns = surveyNode.columns
+        if columns is not None:
+            self.xs, self.ys = columns.xs, columns.ys
+            self.angles, self.distances, self.valids = columns.angles, columns.distances, columns.valids
+        else:
+            points = [surveyNode[iPoint] for iPoint in range(len(surveyNode))]
+            self.xs = [float(point.X) for point in points]
+            self.ys = [float(point.Y) for point in points]
+            self.angles = [float(point.rawAngle) for point in points]
+            self.distances = [float(point.rawDistance) for point in points]
+            self.valids = [point.isValid for point in points]
+
+
+#
+#
+##############################################################################
+class SurveyNodeJsonAdapter:
+    """
+    Cette classe est un adaptateur pour permettre la lecture et l'écriture
+    d'un SurveyNode en JSON.
+    """
+    ATTR_POINTS = "points"
+    DIGITS = 2
+
+    def __init__(self, surveyMap):
+        """
+        Constructeur de l'adaptateur.
+
+        :param surveyMap: SurveyMap propriétaire de SurveyNode.
+        """
+        self.__map = surveyMap
+
+    def read(self, data):
+        """
+        Lecture d'un SurveyNode.
+        :param data: Dictionnaire JSON du SurveyNode.
+        :return: Objet SurveyNode lu.
+        """
+        surveyNode = SurveyNode(self.__map, data[SurveyNodeAdapter.ATTR_X], data[SurveyNodeAdapter.ATTR_Y],
+                                Angle(degrees=data[SurveyNodeAdapter.ATTR_ORIENTATION]),
+                                tuple(data[SurveyNodeAdapter.ATTR_OFFSET]))
+        points = data[SurveyNodeJsonAdapter.ATTR_POINTS]
+        for x, y, angle, distance, valid in zip(points[SurveyPointAdapter.ATTR_X], points[SurveyPointAdapter.ATTR_Y],
+                                                points[SurveyPointAdapter.ATTR_ANGLE],
+                                                points[SurveyPointAdapter.ATTR_DISTANCE],
+                                                points[SurveyPointAdapter.ATTR_VALID]):
+            surveyPoint = SurveyPoint(surveyNode, angle, distance, x, y)
+            surveyPoint.isValid = bool(valid)
+            surveyNode.addPoint(surveyPoint)
+        surveyNode.computeWallData()
+        return surveyNode
+
+    def write(self, surveyNode):
+        """
+        Ecriture d'un SurveyNode.
+        :param surveyNode: Objet SurveyNode à écrire.
+        :return: Dictionnaire JSON du SurveyNode.
+        """
+        digits = SurveyNodeJsonAdapter.DIGITS
+        columns = SurveyNodeColumns(surveyNode)
+        return {
+            SurveyNodeAdapter.ATTR_X: round(float(surveyNode.X), digits),
+            SurveyNodeAdapter.ATTR_Y: round(float(surveyNode.Y), digits),
+            SurveyNodeAdapter.ATTR_ORIENTATION: round(float(surveyNode.orientation.degrees), digits),
+            SurveyNodeAdapter.ATTR_OFFSET: list(surveyNode.offset),
+            SurveyNodeJsonAdapter.ATTR_POINTS: {
+                SurveyPointAdapter.ATTR_X: [round(value, digits) for value in columns.xs],
+                SurveyPointAdapter.ATTR_Y: [round(value, digits) for value in columns.ys],
+                SurveyPointAdapter.ATTR_ANGLE: [round(value, digits) for value in columns.angles],
+                SurveyPointAdapter.ATTR_DISTANCE: [round(value, digits) for value in columns.distances],
+                SurveyPointAdapter.ATTR_VALID: [1 if valid else 0 for valid in columns.valids]}}
+
+
+#
+#
+##############################################################################
+class MapWallJsonAdapter:
+    """
+    Cette classe est un adaptateur pour permettre l'écriture d'un MapWall
+    en JSON (voir MapWallAdapter).
+    """
+    COEFFICIENT_DIGITS = 6
+
+    def write(self, wall):
+        """
+        Ecriture d'un MapWall.
+        :param wall: Objet MapWall à écrire.
+        :return: Dictionnaire JSON du MapWall.
+        """
+        digits = SurveyNodeJsonAdapter.DIGITS
+        return {
+            MapWallAdapter.ATTR_ID: id(wall),
+            WallAdapter.ATTR_A: round(float(wall.A), MapWallJsonAdapter.COEFFICIENT_DIGITS),
+            WallAdapter.ATTR_B: round(float(wall.B), MapWallJsonAdapter.COEFFICIENT_DIGITS),
+            WallAdapter.ATTR_C: round(float(wall.C), digits),
+            WallAdapter.ATTR_Q: round(float(wall.Q), MapWallJsonAdapter.COEFFICIENT_DIGITS),
+            MapWallAdapter.ATTR_COUNT: len(wall),
+            MapWallAdapter.ATTR_WALLS: len(wall.walls),
+            WallAdapter.PT1_TAG_NAME: [round(float(wall.Pt1.X), digits), round(float(wall.Pt1.Y), digits)],
+            WallAdapter.PT2_TAG_NAME: [round(float(wall.Pt2.X), digits), round(float(wall.Pt2.Y), digits)]}
+
+
+#
+#
+##############################################################################
+class SurveyMapJsonAdapter:
+    """
+    Cette classe est un adaptateur pour permettre la lecture et l'écriture
+    d'une SurveyMap en JSON.
+    """
+    ATTR_NODES = "nodes"
+    ATTR_WALLS = "walls"
+
+    def __init__(self, compact=False):
+        """
+        Constructeur de l'adaptateur.
+
+        :param compact: Si vrai, les points de la SurveyMap lue sont stockés en colonnes.
+        """
+        self.__compact = compact
+
+    def read(self, data):
+        """
+        Lecture d'une SurveyMap.
+        :param data: Dictionnaire JSON de la SurveyMap.
+        :return: Objet SurveyMap lu.
+        """
+        surveyMap = SurveyMap(self.__compact)
+        nodeAdapter = SurveyNodeJsonAdapter(surveyMap)
+        for node in data[SurveyMapJsonAdapter.ATTR_NODES]:
+            surveyMap.addNode(nodeAdapter.read(node))
+        return surveyMap
+
+    def write(self, surveyMap):
+        """
+        Ecriture d'une SurveyMap.
+        :param surveyMap: Objet SurveyMap à écrire.
+        :return: Dictionnaire JSON de la SurveyMap.
+        """
+        data = {key: round(value, SurveyNodeJsonAdapter.DIGITS)
+                for key, value in SurveyMapAdapter.getBounds(surveyMap).items()}
+        data[SurveyMapAdapter.ATTR_VERSION] = surveyMap.version
+        nodeAdapter = SurveyNodeJsonAdapter(surveyMap)
+        data[SurveyMapJsonAdapter.ATTR_NODES] = [nodeAdapter.write(surveyMap[iNode]) for iNode in range(len(surveyMap))]
+        wallAdapter = MapWallJsonAdapter()
+        data[SurveyMapJsonAdapter.ATTR_WALLS] = [wallAdapter.write(wall) for wall in surveyMap.walls]
+        return data
+
+    def dumps(self, surveyMap):
+        """
+        :param surveyMap: Objet SurveyMap à écrire.
+        :return: Document JSON (bytes, UTF-8) de la SurveyMap, sans espace.
+        """
+        return json.dumps(self.write(surveyMap), separators=(",", ":")).encode("utf-8")
+
+    def loads(self, document):
+        """
+        :param document: Document JSON (bytes ou str).
+        :return: Objet SurveyMap lu.
+        """
+        return self.read(json.loads(document))
+
+
+#
+#
+##############################################################################
+class SurveyMapRegionJsonAdapter:
+    """
+    Cette classe est un adaptateur pour permettre l'écriture en JSON de la
+    partie d'une SurveyMap contenue dans un rectangle.
+
+    Le document a la forme de celui de SurveyMapJsonAdapter (dimensions de
+    toute la carte, stations et murs), complété du rectangle (box) et du
+    niveau de détail (lod). Seuls sont écrits :
+
+    * les murs de la carte qui intersectent le rectangle ;
+    * les stations situées dans le rectangle ou dont au moins un point y
+      est retenu, avec leur rang (rank) et les seuls points retenus
+      (coordonnées et validité) ;
+    * si lod est positif, les points du niveau de détail correspondant
+      (voir survey_lod.SurveyMapDecimator), aucun point aux résolutions
+      grossières.
+
+    Les points de la carte complète et les murs sont recherchés avec
+    l'index spatial de la carte.
+    """
+    ATTR_BOX = "box"
+    ATTR_LOD = "lod"
+    ATTR_RANK = "rank"
+
+    def __init__(self, surveyMap, decimator=None):
+        """
+        Constructeur de l'adaptateur.
+
+        :param surveyMap: SurveyMap dont les régions sont écrites.
+        :param decimator: SurveyMapDecimator de la carte, créé s'il n'est
+        pas fourni.
+        """
+        self.__map = surveyMap
+        self.__decimator = SurveyMapDecimator(surveyMap) if decimator is None else decimator
+
+    @property
+    def decimator(self):
+        return self.__decimator
+
+    def write(self, region):
+        """
+        Ecriture d'une région de la SurveyMap.
+        :param region: Tuple (minX, minY, maxX, maxY, lod) de la région.
+        :return: Dictionnaire JSON de la région.
+        """
+        minX, minY, maxX, maxY, lod = region
+        digits = SurveyNodeJsonAdapter.DIGITS
+        surveyMap = self.__map
+        level = self.__decimator.level(lod)
+        if level is None:
+            ranks = {id(surveyMap[iNode]): iNode for iNode in range(len(surveyMap))}
+            columns = {}
+            for point in surveyMap.getPointsInBox(minX, minY, maxX, maxY):
+                rank = ranks.get(id(point.parentNode))
+                if rank is None:
+                    continue
+                column = columns.setdefault(rank, ([], [], []))
+                column[0].append(round(float(point.X), digits))
+                column[1].append(round(float(point.Y), digits))
+                column[2].append(1 if point.isValid else 0)
+        else:
+            columns = {}
+            for rank, (xs, ys, valids) in level.pointsInBox(minX, minY, maxX, maxY).items():
+                columns[rank] = ([round(float(x), digits) for x in xs], [round(float(y), digits) for y in ys], valids)
+        for iNode in range(len(surveyMap)):
+            if minX <= surveyMap[iNode].X <= maxX and minY <= surveyMap[iNode].Y <= maxY:
+                columns.setdefault(iNode, ([], [], []))
+        nodes = []
+        for rank in sorted(columns):
+            surveyNode = surveyMap[rank]
+            xs, ys, valids = columns[rank]
+            nodes.append({
+                SurveyMapRegionJsonAdapter.ATTR_RANK: rank,
+                SurveyNodeAdapter.ATTR_X: round(float(surveyNode.X), digits),
+                SurveyNodeAdapter.ATTR_Y: round(float(surveyNode.Y), digits),
+                SurveyNodeAdapter.ATTR_ORIENTATION: round(float(surveyNode.orientation.degrees), digits),
+                SurveyNodeAdapter.ATTR_OFFSET: list(surveyNode.offset),
+                SurveyNodeJsonAdapter.ATTR_POINTS: {
+                    SurveyPointAdapter.ATTR_X: xs,
+                    SurveyPointAdapter.ATTR_Y: ys,
+                    SurveyPointAdapter.ATTR_VALID: valids}})
+        data = {key: round(value, digits) for key, value in SurveyMapAdapter.getBounds(surveyMap).items()}
+        data[SurveyMapAdapter.ATTR_VERSION] = surveyMap.version
+        data[SurveyMapRegionJsonAdapter.ATTR_BOX] = [minX, minY, maxX, maxY]
+        data[SurveyMapRegionJsonAdapter.ATTR_LOD] = lod
+        data[SurveyMapJsonAdapter.ATTR_NODES] = nodes
+        wallAdapter = MapWallJsonAdapter()
+        data[SurveyMapJsonAdapter.ATTR_WALLS] = [wallAdapter.write(wall)
+                                                 for wall in surveyMap.getWallsInBox(minX, minY, maxX, maxY)]
+        return data
+
+    def dumps(self, region):
+        """
+        :param region: Tuple (minX, minY, maxX, maxY, lod) de la région.
+        :return: Document JSON (bytes, UTF-8) de la région, sans espace.
+        """
+        return json.dumps(self.write(region), separators=(",", ":")).encode("utf-8")
+
+
+#
+#
+##############################################################################
+class SurveyMapBinaryAdapter:
+    """
+    Cette classe est un adaptateur pour permettre la lecture et l'écriture
+    d'une SurveyMap dans un format binaire compact.
+
+    Toutes les valeurs sont little-endian :
+
+    * en-tête : MAGIC, FORMAT (uint16), version de la carte (uint32),
+      minX, maxX, minY, maxY (float32, NaN si la carte est vide), nombre de
+      stations et nombre de murs (uint32) ;
+    * station : x, y, orientation en degrés, décalage (float32), nombre de
+      points n (uint32), puis les colonnes x, y, angle et distance (n
+      float32 chacune) et la validité des points (bits, ceil(n / 8)
+      octets) ;
+    * mur de la carte : identifiant (uint64), A, B, C, Q (float32), nombre
+      de points et nombre de murs de station (uint32), extrémités (float32).
+    """
+    MAGIC = b"SMAP"
+    FORMAT = 1
+    MEDIA_TYPE = "application/x-survey-map"
+    HEADER = struct.Struct("<4sHIffffII")
+    NODE = struct.Struct("<fffffI")
+    WALL = struct.Struct("<QffffIIffff")
+
+    def __init__(self, compact=False):
+        """
+        Constructeur de l'adaptateur.
+
+        :param compact: Si vrai, les points de la SurveyMap lue sont stockés en colonnes.
+        """
+        self.__compact = compact
+
+    @staticmethod
+    def __float32(values):
+        """
+        :return: Colonne de valeurs codée en float32 little-endian.
+        """
+        column = array("f", values)
+        if sys.byteorder != "little":
+            column.byteswap()
+        return column.tobytes()
+
+    @staticmethod
+    def __readFloat32(document, offset, count):
+        """
+        :return: Tuple (valeurs, position suivante) d'une colonne float32.
+        """
+        column = array("f")
+        column.frombytes(document[offset:offset + 4 * count])
+        if sys.byteorder != "little":
+            column.byteswap()
+        return (column.tolist(), offset + 4 * count)
+
+    @staticmethod
+    def __bounds(value):
+        return math.nan if value is None else float(value)
+
+    def dumps(self, surveyMap):
+        """
+        :param surveyMap: Objet SurveyMap à écrire.
+        :return: Document binaire (bytes) de la SurveyMap.
+        """
+        walls = surveyMap.walls
+        chunks = [SurveyMapBinaryAdapter.HEADER.pack(
+            SurveyMapBinaryAdapter.MAGIC, SurveyMapBinaryAdapter.FORMAT, surveyMap.version,
+            self.__bounds(surveyMap.minX), self.__bounds(surveyMap.maxX),
+            self.__bounds(surveyMap.minY), self.__bounds(surveyMap.maxY), len(surveyMap), len(walls))]
+        for iNode in range(len(surveyMap)):
+            surveyNode = surveyMap[iNode]
+            columns = SurveyNodeColumns(surveyNode)
+            count = len(columns.xs)
+            chunks.append(SurveyMapBinaryAdapter.NODE.pack(
+                surveyNode.X, surveyNode.Y, surveyNode.orientation.degrees,
+                surveyNode.offset[0], surveyNode.offset[1], count))
+            for column in (columns.xs, columns.ys, columns.angles, columns.distances):
+                chunks.append(self.__float32(column))
+            bits = bytearray((count + 7) // 8)
+            for iPoint, valid in enumerate(columns.valids):
+                if valid:
+                    bits[iPoint >> 3] |= 1 << (iPoint & 7)
+            chunks.append(bytes(bits))
+        for wall in walls:
+            chunks.append(SurveyMapBinaryAdapter.WALL.pack(
+                id(wall), wall.A, wall.B, wall.C, wall.Q, len(wall), len(wall.walls),
+                wall.Pt1.X, wall.Pt1.Y, wall.Pt2.X, wall.Pt2.Y))
+        return b"".join(chunks)
+
+    def loads(self, document):
+        """
+        :param document: Document binaire (bytes) d'une SurveyMap.
+        :return: Objet SurveyMap lu.
+        """
+        magic, fmt, version, minX, maxX, minY, maxY, nodeCount, wallCount = \
+            SurveyMapBinaryAdapter.HEADER.unpack_from(document, 0)
+        if magic != SurveyMapBinaryAdapter.MAGIC or fmt != SurveyMapBinaryAdapter.FORMAT:
+            raise ValueError("Not a survey map document (format {0})".format(fmt))
+        offset = SurveyMapBinaryAdapter.HEADER.size
+        surveyMap = SurveyMap(self.__compact)
+        for iNode in range(nodeCount):
+            x, y, orientation, offsetX, offsetY, count = SurveyMapBinaryAdapter.NODE.unpack_from(document, offset)
+            offset += SurveyMapBinaryAdapter.NODE.size
+            xs, offset = self.__readFloat32(document, offset, count)
+            ys, offset = self.__readFloat32(document, offset, count)
+            angles, offset = self.__readFloat32(document, offset, count)
+            distances, offset = self.__readFloat32(document, offset, count)
+            bits = document[offset:offset + (count + 7) // 8]
+            offset += (count + 7) // 8
+            surveyNode = SurveyNode(surveyMap, x, y, Angle(degrees=orientation), (offsetX, offsetY))
+            for iPoint in range(count):
+                surveyPoint = SurveyPoint(surveyNode, angles[iPoint], distances[iPoint], xs[iPoint], ys[iPoint])
+                surveyPoint.isValid = bool(bits[iPoint >> 3] & (1 << (iPoint & 7)))
+                surveyNode.addPoint(surveyPoint)
+            surveyNode.computeWallData()
+            surveyMap.addNode(surveyNode)
+        return surveyMap
+
+
+#
+#
+##############################################################################
+if __name__ == '__main__':
+    from survey_xmlio import SurveyMapDocument
+    surveyMap = SurveyMapDocument(sys.argv[1] if len(sys.argv) > 1 else "www/map.xml").load()
+    print("JSON : {0} octets".format(len(SurveyMapJsonAdapter().dumps(surveyMap))), file=sys.stderr)
+    print("Binaire : {0} octets".format(len(SurveyMapBinaryAdapter().dumps(surveyMap))), file=sys.stderr)
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+"""
+Ce module définit la détection des frontières d'exploration du robot
+explorer.
+
+Une frontière est une cellule libre de la grille d'occupation voisine d'une
+cellule inconnue : c'est la limite entre l'espace exploré et l'espace
+inexploré. Les cellules frontières contigües sont regroupées en frontières,
+classées selon le gain d'information espéré rapporté au coût du
+déplacement, c'est-à-dire à la longueur du chemin trouvé par le
+planificateur.
+
+Auteur : André-Pierre LIMOUZIN
+Version : 1.0 - 10.2026
+"""
+
+import math
+
+from survey_grid import OccupancyGrid
+from survey_planner import DStarLitePlanner
+
+
+#
+#
+##############################################################################
+class Frontier:
+    """
+    Cette classe modélise une frontière : un ensemble de cellules frontières
+    contigües.
+
+    La destination de la frontière est une cellule libre dont aucune
+    cellule occupée n'est à moins de robotRadius : une cellule frontière
+    longe souvent un mur, et le planificateur refuserait de s'y rendre.
+    Elle est recherchée parmi les cellules de la frontière, puis parmi les
+    cellules libres de plus en plus éloignées de la frontière, du côté
+    exploré, jusqu'à TARGET_DEPTH cellules.
+    """
+    TARGET_DEPTH = 5
+
+    def __init__(self, grid, cells, robotRadius=0):
+        """
+        Initialisation de la frontière.
+
+        :param grid: OccupancyGrid à laquelle appartiennent les cellules.
+        :param cells: Liste des indices (i, j) des cellules de la frontière.
+        :param robotRadius: Distance minimale en cm entre la destination et
+        une cellule occupée.
+        """
+        self.__cells = cells
+        xs = [grid.cellCenter(i, j)[0] for i, j in cells]
+        ys = [grid.cellCenter(i, j)[1] for i, j in cells]
+        self.__centroid = (sum(xs) / len(cells), sum(ys) / len(cells))
+        self.__target = self.__findTarget(grid, int(math.ceil(robotRadius / grid.cellSize)))
+        self.__gain = len(cells) * grid.cellSize
+
+    def __findTarget(self, grid, radius):
+        """
+        Recherche de la destination, la plus proche possible du centre de
+        gravité de la frontière (qui peut lui-même être inconnu ou occupé).
+
+        :param grid: OccupancyGrid de la frontière.
+        :param radius: Distance minimale en cellules à une cellule occupée.
+        :return: Centre (x, y) de la cellule retenue ou None.
+        """
+        cx, cy = self.__centroid
+        layer = list(self.__cells)
+        seen = set(layer)
+        for depth in range(Frontier.TARGET_DEPTH + 1):
+            layer.sort(key=lambda cell: math.hypot(grid.cellCenter(cell[0], cell[1])[0] - cx,
+                                                   grid.cellCenter(cell[0], cell[1])[1] - cy))
+            for i, j in layer:
+                if Frontier.isClear(grid, i, j, radius):
+                    return grid.cellCenter(i, j)
+            following = []
+            for i, j in layer:
+                for neighbor in ((i + 1, j), (i - 1, j), (i, j + 1), (i, j - 1)):
+                    if neighbor not in seen and grid.cellState(neighbor[0], neighbor[1]) == OccupancyGrid.FREE:
+                        seen.add(neighbor)
+                        following.append(neighbor)
+            layer = following
+        return None
+
+    @staticmethod
+    def isClear(grid, i, j, radius):
+        """
+        :return: Vrai si aucune cellule occupée n'est à moins de radius
+        cellules de la cellule (i, j).
+        """
+        for di in range(-radius, radius + 1):
+            for dj in range(-radius, radius + 1):
+                if di * di + dj * dj <= radius * radius and \
+                        grid.cellState(i + di, j + dj) == OccupancyGrid.OCCUPIED:
+                    return False
+        return True
+
+    @property
+    def cells(self):
+        return self.__cells
+
+    @property
+    def centroid(self):
+        return self.__centroid
+
+    @property
+    def target(self):
+        """
+        :return: Position (x, y) à atteindre pour explorer la frontière, ou
+        None si aucune cellule de la frontière n'est assez dégagée.
+        """
+        return self.__target
+
+    @property
+    def gain(self):
+        """
+        :return: Gain d'information espéré (longueur de la frontière en cm).
+        """
+        return self.__gain
+
+    def __len__(self):
+        return len(self.__cells)
+
+
+#
+#
+##############################################################################
+class FrontierDetector:
+    """
+    Cette classe maintient l'ensemble des cellules frontières d'une
+    OccupancyGrid.
+
+    Le détecteur s'abonne aux mises à jour de la grille : seules les
+    cellules modifiées par une station et leurs voisines sont réévaluées.
+    Les destinations déjà visitées, ou qui n'ont pas pu être atteintes,
+    sont mémorisées pour ne pas y revenir.
+
+    Le coût d'une frontière est la longueur du chemin planifié jusqu'à sa
+    destination. Ce chemin n'est pas plus court que la ligne droite : les
+    frontières sont planifiées dans l'ordre de leur score à vol d'oiseau,
+    jusqu'à ce que la meilleure frontière planifiée ne puisse plus être
+    dépassée, et au plus MAX_PLANNED fois par classement.
+    """
+    MIN_FRONTIER_SIZE = 3
+    MIN_DISTANCE = 20
+    VISITED_RADIUS = 30
+    MAX_PLANNED = 5
+
+    __NEIGHBORS4 = ((1, 0), (-1, 0), (0, 1), (0, -1))
+    __NEIGHBORS8 = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+
+    def __init__(self, grid, robotRadius=DStarLitePlanner.ROBOT_RADIUS, planner=None):
+        """
+        Initialisation du détecteur.
+
+        :param grid: OccupancyGrid dont les frontières sont détectées.
+        :param robotRadius: Rayon du robot en cm : les destinations des
+        frontières en sont éloignées des obstacles.
+        :param planner: DStarLitePlanner de la grille qui évalue le coût des
+        déplacements (aucun : distance à vol d'oiseau).
+        """
+        self.__grid = grid
+        self.__robotRadius = robotRadius
+        self.__planner = planner
+        self.__cells = set()
+        self.__visited = []
+        iMin, jMin, iMax, jMax = grid.bounds
+        self.__onGridChanged([(i, j) for i in range(iMin, iMax + 1) for j in range(jMin, jMax + 1)])
+        grid.addChangeListener(self.__onGridChanged)
+
+    @property
+    def frontierCells(self):
+        """
+        :return: Ensemble des indices (i, j) des cellules frontières.
+        """
+        return self.__cells
+
+    def isFrontierCell(self, i, j):
+        """
+        :return: Vrai si la cellule (i, j) est libre et voisine d'une cellule inconnue.
+        """
+        grid = self.__grid
+        if grid.cellState(i, j) != OccupancyGrid.FREE:
+            return False
+        for di, dj in FrontierDetector.__NEIGHBORS4:
+            if grid.cellState(i + di, j + dj) == OccupancyGrid.UNKNOWN:
+                return True
+        return False
+
+    def __onGridChanged(self, changes):
+        """
+        Réévaluation des cellules modifiées et de leurs voisines.
+        """
+        candidates = set(changes)
+        for i, j in changes:
+            for di, dj in FrontierDetector.__NEIGHBORS4:
+                candidates.add((i + di, j + dj))
+        for i, j in candidates:
+            if self.isFrontierCell(i, j):
+                self.__cells.add((i, j))
+            else:
+                self.__cells.discard((i, j))
+
+    def markVisited(self, position):
+        """
+        Mémorise une destination atteinte ou inaccessible. Les frontières
+        dont la destination en est proche ne sont plus proposées.
+
+        :param position: Position (x, y) visitée.
+        """
+        self.__visited.append((position[0], position[1]))
+
+    def __isVisited(self, target):
+        for x, y in self.__visited:
+            if math.hypot(target[0] - x, target[1] - y) < FrontierDetector.VISITED_RADIUS:
+                return True
+        return False
+
+    def getFrontiers(self):
+        """
+        Regroupement des cellules frontières contigües (8-connexité).
+
+        :return: Liste des frontières d'au moins MIN_FRONTIER_SIZE cellules.
+        """
+        frontiers = []
+        remaining = set(self.__cells)
+        while len(remaining) > 0:
+            seed = remaining.pop()
+            cells = [seed]
+            stack = [seed]
+            while len(stack) > 0:
+                i, j = stack.pop()
+                for di, dj in FrontierDetector.__NEIGHBORS8:
+                    neighbor = (i + di, j + dj)
+                    if neighbor in remaining:
+                        remaining.remove(neighbor)
+                        cells.append(neighbor)
+                        stack.append(neighbor)
+            if len(cells) >= FrontierDetector.MIN_FRONTIER_SIZE:
+                frontiers.append(Frontier(self.__grid, cells, self.__robotRadius))
+        return frontiers
+
+    def rankFrontiers(self, position):
+        """
+        Classement des frontières par gain d'information rapporté au coût
+        du déplacement depuis position.
+
+        Les frontières sans destination sont ignorées. Celles dont la
+        destination est inaccessible sont marquées visitées. Le score des
+        frontières qui n'ont pas été planifiées est calculé à vol d'oiseau.
+
+        :param position: Position (x, y) du robot.
+        :return: Liste de tuples (score, frontière) par score décroissant.
+        """
+        candidates = []
+        for frontier in self.getFrontiers():
+            target = frontier.target
+            if target is None:
+                continue
+            cost = math.hypot(target[0] - position[0], target[1] - position[1])
+            if cost < FrontierDetector.MIN_DISTANCE or self.__isVisited(target):
+                continue
+            candidates.append((frontier.gain / cost, frontier))
+        candidates.sort(key=lambda item: item[0], reverse=True)
+        if self.__planner is None:
+            return candidates
+        ranking = []
+        best = 0.0
+        count = 0
+        while count < len(candidates) and count < FrontierDetector.MAX_PLANNED and candidates[count][0] > best:
+            frontier = candidates[count][1]
+            count += 1
+            cost = self.pathLength(position, frontier.target)
+            if cost is None:
+                self.markVisited(frontier.target)
+                continue
+            score = frontier.gain / max(cost, FrontierDetector.MIN_DISTANCE)
+            ranking.append((score, frontier))
+            best = max(best, score)
+        ranking.extend(candidates[count:])
+        ranking.sort(key=lambda item: item[0], reverse=True)
+        return ranking
+
+    def pathLength(self, position, target):
+        """
+        :param position: Position (x, y) de départ.
+        :param target: Position (x, y) de destination.
+        :return: Longueur en cm du chemin planifié, ou None si la
+        destination est inaccessible.
+        """
+        waypoints = self.__planner.plan(position, target)
+        if waypoints is None:
+            return None
+        length = 0.0
+        x, y = position
+        for waypoint in waypoints:
+            length += math.hypot(waypoint[0] - x, waypoint[1] - y)
+            x, y = waypoint
+        return length
+
+    def bestFrontier(self, position):
+        """
+        :param position: Position (x, y) du robot.
+        :return: Frontière la plus intéressante ou None si l'exploration est terminée.
+        """
+        ranking = self.rankFrontiers(position)
+        if len(ranking) == 0:
+            return None
+        return ranking[0][1]
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+"""
+Ce module définit le graphe des poses des stations du robot explorer et son
+optimisation.
+
+Chaque station est un sommet du graphe : sa pose (x, y, orientation).
+Chaque arête est une mesure de la pose relative de deux stations :
+* l'estime (odométrie) des déplacements effectués entre deux stations
+  successives,
+* le recalage (voir survey_matching) d'une station sur la précédente,
+* le recalage d'une station sur une station ancienne voisine, lorsque le
+  robot repasse dans une zone déjà relevée (fermeture de boucle).
+
+Les mesures étant contradictoires, les poses sont ajustées par moindres
+carrés (Gauss-Newton). Le système normal est creux (un bloc 3x3 par arête)
+et il est résolu par gradient conjugué, sans jamais former de matrice
+pleine.
+
+Auteur : André-Pierre LIMOUZIN
+Version : 1.0 - 10.2026
+"""
+
+import math
+import sys
+
+from survey_model import Angle
+
+
+#
+#
+##############################################################################
+class PoseEdge:
+    """
+    Cette classe modélise une arête du graphe des poses : la pose de la
+    station j mesurée dans le référentiel de la station i.
+
+    La pose relative (dx, dy, dTheta) est exprimée dans le référentiel du
+    robot : dx vers la droite, dy vers l'avant et dTheta en radians dans le
+    sens topographique.
+    """
+    def __init__(self, i, j, relative, information):
+        """
+        :param i: Rang de la station d'origine.
+        :param j: Rang de la station d'arrivée.
+        :param relative: Pose relative mesurée (dx, dy, dTheta).
+        :param information: Poids (translation, rotation) de la mesure :
+        inverses des variances.
+        """
+        self.__i = i
+        self.__j = j
+        self.__relative = relative
+        self.__information = information
+
+    @property
+    def i(self):
+        return self.__i
+
+    @property
+    def j(self):
+        return self.__j
+
+    @property
+    def relative(self):
+        return self.__relative
+
+    @property
+    def information(self):
+        return self.__information
+
+
+#
+#
+##############################################################################
+class PoseGraph:
+    """
+    Cette classe modélise le graphe des poses et son optimisation.
+
+    La première pose est fixe : elle définit le référentiel de la carte.
+    """
+    MAX_ITERATIONS = 10
+    TOLERANCE = 1e-3
+    CG_ITERATIONS = 200
+    CG_TOLERANCE = 1e-10
+
+    def __init__(self):
+        self.__poses = []
+        self.__edges = []
+
+    @property
+    def edges(self):
+        return self.__edges
+
+    def __len__(self):
+        return len(self.__poses)
+
+    def pose(self, rank):
+        """
+        :return: Pose (x, y, orientation) d'une station, orientation en
+        radians.
+        """
+        return self.__poses[rank]
+
+    def addPose(self, x, y, orientation):
+        """
+        Ajout d'un sommet.
+
+        :param orientation: Angle (topographique) de la station.
+        :return: Rang de la pose ajoutée.
+        """
+        self.__poses.append((x, y, orientation.radians))
+        return len(self.__poses) - 1
+
+    def addEdge(self, i, j, relative, information):
+        """
+        Ajout d'une mesure de la pose de j relativement à i.
+        """
+        self.__edges.append(PoseEdge(i, j, relative, information))
+
+    @staticmethod
+    def relativePose(pose1, pose2):
+        """
+        :return: Pose (dx, dy, dTheta) de pose2 dans le référentiel de pose1.
+        """
+        x1, y1, o1 = pose1
+        x2, y2, o2 = pose2
+        c = math.cos(o1)
+        s = math.sin(o1)
+        dx = x2 - x1
+        dy = y2 - y1
+        return (c * dx - s * dy, s * dx + c * dy, PoseGraph.__wrap(o2 - o1))
+
+    @staticmethod
+    def __wrap(angle):
+        return math.atan2(math.sin(angle), math.cos(angle))
+
+    def error(self):
+        """
+        :return: Somme pondérée des carrés des écarts aux mesures.
+        """
+        total = 0.0
+        for edge in self.__edges:
+            e = self.__residual(edge)
+            wt, wr = edge.information
+            total += wt * (e[0] * e[0] + e[1] * e[1]) + wr * e[2] * e[2]
+        return total
+
+    def __residual(self, edge):
+        dx, dy, dTheta = PoseGraph.relativePose(self.__poses[edge.i], self.__poses[edge.j])
+        zx, zy, zTheta = edge.relative
+        return (dx - zx, dy - zy, PoseGraph.__wrap(dTheta - zTheta))
+
+    def optimize(self):
+        """
+        Optimisation des poses (Gauss-Newton).
+
+        :return: Nombre d'itérations effectuées.
+        """
+        count = len(self.__poses)
+        iteration = 0
+        for iteration in range(1, PoseGraph.MAX_ITERATIONS + 1):
+            h = [dict() for k in range(count)]
+            b = [[0.0, 0.0, 0.0] for k in range(count)]
+            for edge in self.__edges:
+                self.__linearize(edge, h, b)
+            delta = PoseGraph.__solve(h, b, count)
+            step = 0.0
+            for k in range(1, count):
+                x, y, o = self.__poses[k]
+                d = delta[k]
+                self.__poses[k] = (x + d[0], y + d[1], PoseGraph.__wrap(o + d[2]))
+                step = max(step, abs(d[0]), abs(d[1]), abs(d[2]))
+            if step < PoseGraph.TOLERANCE:
+                break
+        return iteration
+
+    def __linearize(self, edge, h, b):
+        """
+        Ajout de la contribution d'une arête au système normal H.dx = -b.
+        """
+        i = edge.i
+        j = edge.j
+        xi, yi, oi = self.__poses[i]
+        xj, yj, oj = self.__poses[j]
+        c = math.cos(oi)
+        s = math.sin(oi)
+        dx = xj - xi
+        dy = yj - yi
+        jacobians = {
+            i: ((-c, s, -s * dx - c * dy), (-s, -c, c * dx - s * dy), (0.0, 0.0, -1.0)),
+            j: ((c, -s, 0.0), (s, c, 0.0), (0.0, 0.0, 1.0))}
+        e = self.__residual(edge)
+        wt, wr = edge.information
+        weights = (wt, wt, wr)
+        for a in (i, j):
+            ja = jacobians[a]
+            for r in range(3):
+                b[a][r] += sum(ja[k][r] * weights[k] * e[k] for k in range(3))
+            for c2 in (i, j):
+                jc = jacobians[c2]
+                block = h[a].get(c2)
+                if block is None:
+                    block = [[0.0] * 3 for k in range(3)]
+                    h[a][c2] = block
+                for r in range(3):
+                    for q in range(3):
+                        block[r][q] += sum(ja[k][r] * weights[k] * jc[k][q] for k in range(3))
+
+    @staticmethod
+    def __solve(h, b, count):
+        """
+        Résolution de H.dx = -b par gradient conjugué préconditionné
+        (diagonale), la première pose étant fixe.
+
+        :return: Liste des incréments (dx, dy, dTheta) de chaque pose.
+        """
+        def product(v):
+            result = [[0.0, 0.0, 0.0] for k in range(count)]
+            for a in range(1, count):
+                out = result[a]
+                for c, block in h[a].items():
+                    if c == 0:
+                        continue
+                    vc = v[c]
+                    for r in range(3):
+                        out[r] += block[r][0] * vc[0] + block[r][1] * vc[1] + block[r][2] * vc[2]
+            return result
+
+        def dot(u, v):
+            return sum(u[k][0] * v[k][0] + u[k][1] * v[k][1] + u[k][2] * v[k][2] for k in range(1, count))
+
+        diagonal = [[1.0, 1.0, 1.0] for k in range(count)]
+        for a in range(1, count):
+            block = h[a].get(a)
+            if block is not None:
+                diagonal[a] = [1.0 / block[r][r] if block[r][r] > 0 else 1.0 for r in range(3)]
+        x = [[0.0, 0.0, 0.0] for k in range(count)]
+        r = [[-b[k][0], -b[k][1], -b[k][2]] if k > 0 else [0.0, 0.0, 0.0] for k in range(count)]
+        z = [[diagonal[k][q] * r[k][q] for q in range(3)] for k in range(count)]
+        p = [row[:] for row in z]
+        rz = dot(r, z)
+        for iteration in range(PoseGraph.CG_ITERATIONS):
+            if dot(r, r) < PoseGraph.CG_TOLERANCE:
+                break
+            hp = product(p)
+            php = dot(p, hp)
+            if php <= 0:
+                break
+            alpha = rz / php
+            for k in range(1, count):
+                for q in range(3):
+                    x[k][q] += alpha * p[k][q]
+                    r[k][q] -= alpha * hp[k][q]
+            z = [[diagonal[k][q] * r[k][q] for q in range(3)] for k in range(count)]
+            rzNew = dot(r, z)
+            beta = rzNew / rz
+            rz = rzNew
+            for k in range(1, count):
+                for q in range(3):
+                    p[k][q] = z[k][q] + beta * p[k][q]
+        return x
+
+
+#
+#
+##############################################################################
+class SurveyPoseGraph:
+    """
+    Cette classe tient à jour le graphe des poses des stations d'une
+    SurveyMap et corrige la carte lorsqu'une boucle est fermée.
+
+    A chaque station ajoutée à la carte, l'arête d'estime la relie à la
+    station précédente. La station est ensuite recalée sur les stations
+    anciennes (au moins LOOP_MIN_GAP stations plus tôt) situées à moins de
+    LOOP_RADIUS. Chaque recalage réussi ajoute une arête de fermeture de
+    boucle et déclenche l'optimisation du graphe. Seules les stations dont
+    la pose a changé de plus de MOVE_TOLERANCE (ou MOVE_ANGLE) sont alors
+    reconstruites (voir SurveyMap.relocateNodes).
+    """
+    ODOMETRY_SIGMA = (5.0, math.radians(5))
+    MATCH_SIGMA = (2.0, math.radians(1))
+    LOOP_SIGMA = (2.0, math.radians(1))
+    LOOP_RADIUS = 100.0
+    LOOP_MIN_GAP = 3
+    LOOP_CANDIDATES = 2
+    MOVE_TOLERANCE = 0.5
+    MOVE_ANGLE = math.radians(0.2)
+
+    def __init__(self, surveyMap, matcher):
+        """
+        :param surveyMap: SurveyMap dont les stations sont les sommets.
+        :param matcher: ScanMatcher utilisé pour détecter les boucles.
+        """
+        self.__map = surveyMap
+        self.__matcher = matcher
+        self.__graph = PoseGraph()
+        self.__loops = 0
+
+    @property
+    def graph(self):
+        return self.__graph
+
+    @property
+    def loops(self):
+        """
+        :return: Nombre de boucles fermées.
+        """
+        return self.__loops
+
+    @staticmethod
+    def __information(sigma):
+        return (1.0 / (sigma[0] * sigma[0]), 1.0 / (sigma[1] * sigma[1]))
+
+    @staticmethod
+    def __pose(node):
+        return (node.X, node.Y, node.orientation.radians)
+
+    def addNode(self, node, odometry, matched=False):
+        """
+        Ajout au graphe d'une station qui vient d'être ajoutée à la carte.
+
+        :param node: SurveyNode ajouté (dernière station de la carte).
+        :param odometry: Pose (x, y, orientation) estimée par l'estime, avant
+        recalage.
+        :param matched: Vrai si la pose de la station a été recalée sur la
+        carte.
+        :return: Liste des SurveyNode reconstruits après fermeture de
+        boucle (vide si aucune boucle n'a été fermée).
+        """
+        graph = self.__graph
+        rank = graph.addPose(node.X, node.Y, node.orientation)
+        if rank > 0:
+            previous = graph.pose(rank - 1)
+            x, y, orientation = odometry
+            graph.addEdge(rank - 1, rank, PoseGraph.relativePose(previous, (x, y, orientation.radians)),
+                          SurveyPoseGraph.__information(SurveyPoseGraph.ODOMETRY_SIGMA))
+            if matched:
+                graph.addEdge(rank - 1, rank, PoseGraph.relativePose(previous, graph.pose(rank)),
+                              SurveyPoseGraph.__information(SurveyPoseGraph.MATCH_SIGMA))
+        closed = False
+        for candidate in self.__loopCandidates(rank):
+            match = self.__matcher.match(node, self.__map[candidate])
+            if match is None:
+                continue
+            x, y = match.transform(node.X, node.Y)
+            corrected = (x, y, node.orientation.radians - match.rotation)
+            graph.addEdge(candidate, rank, PoseGraph.relativePose(graph.pose(candidate), corrected),
+                          SurveyPoseGraph.__information(SurveyPoseGraph.LOOP_SIGMA))
+            self.__loops += 1
+            closed = True
+        if not closed:
+            return []
+        print("Fermeture de boucle : {0} itérations".format(graph.optimize()), file=sys.stderr)
+        return self.__map.relocateNodes(self.__movedPoses())
+
+    def restoreNode(self, node):
+        """
+        Ajout au graphe d'une station rejouée depuis le journal (voir
+        SurveyMapJournal.load). Les mesures qui ont fixé sa pose sont
+        perdues : elle est reliée à la station précédente par leur pose
+        relative enregistrée, sans recherche de boucle.
+
+        :param node: SurveyNode rejoué (dernière station de la carte).
+        """
+        graph = self.__graph
+        rank = graph.addPose(node.X, node.Y, node.orientation)
+        if rank > 0:
+            graph.addEdge(rank - 1, rank, PoseGraph.relativePose(graph.pose(rank - 1), graph.pose(rank)),
+                          SurveyPoseGraph.__information(SurveyPoseGraph.ODOMETRY_SIGMA))
+
+    def __loopCandidates(self, rank):
+        """
+        :return: Rangs des stations anciennes les plus proches de la station
+        rank, à moins de LOOP_RADIUS.
+        """
+        x, y, o = self.__graph.pose(rank)
+        candidates = []
+        for k in range(rank - SurveyPoseGraph.LOOP_MIN_GAP + 1):
+            xk, yk, ok = self.__graph.pose(k)
+            distance = math.hypot(xk - x, yk - y)
+            if distance < SurveyPoseGraph.LOOP_RADIUS:
+                candidates.append((distance, k))
+        candidates.sort()
+        return [k for distance, k in candidates[:SurveyPoseGraph.LOOP_CANDIDATES]]
+
+    def __movedPoses(self):
+        """
+        :return: Dictionnaire rang -> (x, y, orientation) des stations dont
+        la pose optimisée s'écarte de leur pose dans la carte.
+        """
+        poses = {}
+        for rank in range(len(self.__graph)):
+            node = self.__map[rank]
+            x, y, o = self.__graph.pose(rank)
+            if math.hypot(x - node.X, y - node.Y) > SurveyPoseGraph.MOVE_TOLERANCE or \
+                    abs(math.atan2(math.sin(o - node.orientation.radians),
+                                   math.cos(o - node.orientation.radians))) > SurveyPoseGraph.MOVE_ANGLE:
+                poses[rank] = (x, y, Angle(radians=o))
+        return poses
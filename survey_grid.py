@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+"""
+Ce module définit la grille d'occupation construite à partir des relevés du
+robot explorer.
+
+La grille découpe l'espace en cellules carrées. Chaque cellule contient le
+logarithme du rapport de chances (log-odds) qu'elle soit occupée. A chaque
+station, un rayon est lancé depuis le centre du tour d'horizon vers chaque
+point relevé : les cellules traversées sont marquées libres, la cellule du
+point est marquée occupée.
+
+Les cellules sont repérées par des indices absolus (i, j) = (x // cellSize,
+y // cellSize), si bien que l'agrandissement de la grille ne change pas
+l'identité des cellules.
+
+Auteur : André-Pierre LIMOUZIN
+Version : 1.0 - 10.2026
+"""
+
+from array import array
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # La grille est alors stockée dans un array('f').
+
+
+#
+#
+##############################################################################
+class OccupancyGrid:
+    """
+    Cette classe modélise une grille d'occupation en log-odds.
+
+    La grille est stockée dans un tableau numpy s'il est disponible, dans
+    un array('f') sinon. Elle s'agrandit (par doublement) pour couvrir les
+    dimensions de la SurveyMap, et elle est mise à jour de façon
+    incrémentale à chaque station. La consultation d'une cellule est en
+    temps constant.
+    """
+    DEFAULT_CELL_SIZE = 10
+    MAX_RANGE = 250
+    LOG_ODDS_OCCUPIED = 0.85
+    LOG_ODDS_FREE = -0.4
+    LOG_ODDS_MIN = -4.0
+    LOG_ODDS_MAX = 4.0
+    OCCUPIED_THRESHOLD = 0.5
+    FREE_THRESHOLD = -0.3
+
+    FREE = -1
+    UNKNOWN = 0
+    OCCUPIED = 1
+
+    def __init__(self, cellSize=DEFAULT_CELL_SIZE, maxRange=MAX_RANGE):
+        """
+        Initialisation d'une grille vide.
+
+        :param cellSize: Côté d'une cellule en cm.
+        :param maxRange: Portée du capteur. Une mesure au-delà de cette
+        distance (écho saturé) ne marque pas d'obstacle.
+        """
+        self.__cellSize = float(cellSize)
+        self.__maxRange = maxRange
+        self.__i0 = 0
+        self.__j0 = 0
+        self.__width = 0
+        self.__height = 0
+        self.__cells = self.__allocate(0, 0)
+        self.__changes = set()
+        self.__listeners = []
+        self.__version = 0
+
+    @property
+    def cellSize(self):
+        return self.__cellSize
+
+    @property
+    def version(self):
+        """
+        :return: Compteur incrémenté à chaque mise à jour de la grille.
+        """
+        return self.__version
+
+    @property
+    def bounds(self):
+        """
+        :return: Tuple (iMin, jMin, iMax, jMax) des indices des cellules de la grille.
+        """
+        return (self.__i0, self.__j0, self.__i0 + self.__width - 1, self.__j0 + self.__height - 1)
+
+    def __allocate(self, width, height):
+        if numpy is not None:
+            return numpy.zeros((height, width), dtype=numpy.float32)
+        return array('f', bytes(4 * width * height))
+
+    def cellOf(self, x, y):
+        """
+        :return: Indices (i, j) de la cellule contenant le point (x, y).
+        """
+        return (int(math.floor(x / self.__cellSize)), int(math.floor(y / self.__cellSize)))
+
+    def cellCenter(self, i, j):
+        """
+        :return: Coordonnées (x, y) du centre de la cellule (i, j).
+        """
+        return ((i + 0.5) * self.__cellSize, (j + 0.5) * self.__cellSize)
+
+    def contains(self, i, j):
+        """
+        :return: Vrai si la cellule (i, j) est dans la grille.
+        """
+        return 0 <= i - self.__i0 < self.__width and 0 <= j - self.__j0 < self.__height
+
+    def ensure(self, x, y):
+        """
+        Agrandissement de la grille pour qu'elle contienne le point (x, y).
+        La taille est au moins doublée dans la direction agrandie, ce qui
+        rend le coût des agrandissements constant en moyenne.
+
+        :param x: Abscisse du point.
+        :param y: Ordonnée du point.
+        """
+        i, j = self.cellOf(x, y)
+        if self.contains(i, j):
+            return
+        if self.__width == 0:
+            iMin, jMin, iMax, jMax = i - 8, j - 8, i + 8, j + 8
+        else:
+            iMin, jMin, iMax, jMax = self.bounds
+            if i < iMin:
+                iMin = min(i, iMin - self.__width)
+            if i > iMax:
+                iMax = max(i, iMax + self.__width)
+            if j < jMin:
+                jMin = min(j, jMin - self.__height)
+            if j > jMax:
+                jMax = max(j, jMax + self.__height)
+        width = iMax - iMin + 1
+        height = jMax - jMin + 1
+        cells = self.__allocate(width, height)
+        di = self.__i0 - iMin
+        dj = self.__j0 - jMin
+        if numpy is not None:
+            cells[dj:dj + self.__height, di:di + self.__width] = self.__cells
+        else:
+            for row in range(self.__height):
+                start = (row + dj) * width + di
+                cells[start:start + self.__width] = self.__cells[row * self.__width:(row + 1) * self.__width]
+        self.__cells = cells
+        self.__i0 = iMin
+        self.__j0 = jMin
+        self.__width = width
+        self.__height = height
+
+    def cellLogOdds(self, i, j):
+        """
+        :return: Log-odds de la cellule (i, j), 0 si elle est hors de la grille.
+        """
+        if not self.contains(i, j):
+            return 0.0
+        if numpy is not None:
+            return float(self.__cells[j - self.__j0, i - self.__i0])
+        return self.__cells[(j - self.__j0) * self.__width + i - self.__i0]
+
+    def logOdds(self, x, y):
+        """
+        :return: Log-odds de la cellule contenant le point (x, y).
+        """
+        i, j = self.cellOf(x, y)
+        return self.cellLogOdds(i, j)
+
+    def probability(self, x, y):
+        """
+        :return: Probabilité d'occupation de la cellule contenant le point (x, y).
+        """
+        return 1.0 - 1.0 / (1.0 + math.exp(self.logOdds(x, y)))
+
+    def cellState(self, i, j):
+        """
+        :return: Etat (FREE, UNKNOWN ou OCCUPIED) de la cellule (i, j).
+        """
+        value = self.cellLogOdds(i, j)
+        if value >= OccupancyGrid.OCCUPIED_THRESHOLD:
+            return OccupancyGrid.OCCUPIED
+        if value <= OccupancyGrid.FREE_THRESHOLD:
+            return OccupancyGrid.FREE
+        return OccupancyGrid.UNKNOWN
+
+    def state(self, x, y):
+        """
+        :return: Etat (FREE, UNKNOWN ou OCCUPIED) de la cellule contenant le point (x, y).
+        """
+        i, j = self.cellOf(x, y)
+        return self.cellState(i, j)
+
+    def isOccupied(self, x, y):
+        return self.state(x, y) == OccupancyGrid.OCCUPIED
+
+    def isFree(self, x, y):
+        return self.state(x, y) == OccupancyGrid.FREE
+
+    def addChangeListener(self, listener):
+        """
+        Abonnement aux mises à jour de la grille.
+        Après chaque station intégrée, le listener est invoqué avec
+        l'ensemble des indices (i, j) des cellules modifiées.
+
+        :param listener: Fonction à un paramètre.
+        """
+        self.__listeners.append(listener)
+
+    def integrateNode(self, node):
+        """
+        Mise à jour de la grille avec les mesures d'une station.
+
+        Les directions des mesures hors de portée sont intégrées comme des
+        rayons libres de longueur maxRange.
+
+        :param node: SurveyNode dont les points sont intégrés.
+        """
+        if self.__integrate(node):
+            self.__notify()
+
+    def rebuild(self, nodes):
+        """
+        Reconstruction de la grille à partir de toutes les stations, après
+        le déplacement de certaines d'entre elles. Les log-odds étant
+        bornés, la contribution d'une station ne peut pas être retirée.
+
+        :param nodes: Séquence des SurveyNode de la carte.
+        """
+        if numpy is not None:
+            changed = numpy.nonzero(self.__cells)
+            for j, i in zip(changed[0].tolist(), changed[1].tolist()):
+                self.__changes.add((i + self.__i0, j + self.__j0))
+            self.__cells[:] = 0
+        else:
+            for offset in range(len(self.__cells)):
+                if self.__cells[offset] != 0:
+                    self.__changes.add((offset % self.__width + self.__i0, offset // self.__width + self.__j0))
+                    self.__cells[offset] = 0
+        for node in nodes:
+            self.__integrate(node)
+        self.__notify()
+
+    def __integrate(self, node):
+        """
+        Lancer des rayons d'une station, sans notification.
+        :return: Vrai si la station contient des mesures.
+        """
+        outOfRange = node.outOfRangeAngles
+        if len(node) == 0 and len(outOfRange) == 0:
+            return False
+        ox, oy = node.sensorOrigin
+        columns = node.columns
+        if columns is not None:
+            xs, ys, distances = list(columns.xs), list(columns.ys), list(columns.distances)
+        else:
+            xs = [node[i].X for i in range(len(node))]
+            ys = [node[i].Y for i in range(len(node))]
+            distances = [node[i].rawDistance for i in range(len(node))]
+        orientation = node.orientation.radians
+        for angle in outOfRange:
+            direction = math.radians(angle) + orientation
+            xs.append(ox + self.__maxRange * math.sin(direction))
+            ys.append(oy + self.__maxRange * math.cos(direction))
+            distances.append(self.__maxRange)
+        self.ensure(ox, oy)
+        for k in range(len(xs)):
+            self.ensure(xs[k], ys[k])
+        if numpy is not None:
+            self.__integrateVectorized(ox, oy, xs, ys, distances)
+        else:
+            self.__integrateScalar(ox, oy, xs, ys, distances)
+        return True
+
+    def __notify(self):
+        """
+        Notification des cellules modifiées aux auditeurs de la grille.
+        """
+        self.__version += 1
+        changes = self.__changes
+        self.__changes = set()
+        for listener in self.__listeners:
+            listener(changes)
+
+    def __integrateScalar(self, ox, oy, xs, ys, distances):
+        """
+        Lancer de rayons cellule par cellule (algorithme de Bresenham).
+        """
+        cells = self.__cells
+        width = self.__width
+        i0 = self.__i0
+        j0 = self.__j0
+        changes = self.__changes
+        oi, oj = self.cellOf(ox, oy)
+        for k in range(len(xs)):
+            hi, hj = self.cellOf(xs[k], ys[k])
+            for i, j in OccupancyGrid.__traverse(oi, oj, hi, hj):
+                offset = (j - j0) * width + i - i0
+                cells[offset] = max(OccupancyGrid.LOG_ODDS_MIN, cells[offset] + OccupancyGrid.LOG_ODDS_FREE)
+                changes.add((i, j))
+            if distances[k] < self.__maxRange:
+                offset = (hj - j0) * width + hi - i0
+                cells[offset] = min(OccupancyGrid.LOG_ODDS_MAX, cells[offset] + OccupancyGrid.LOG_ODDS_OCCUPIED)
+                changes.add((hi, hj))
+
+    @staticmethod
+    def __traverse(i1, j1, i2, j2):
+        """
+        Enumère les cellules de (i1, j1) à (i2, j2), cellule d'arrivée exclue.
+        """
+        di = abs(i2 - i1)
+        dj = -abs(j2 - j1)
+        si = 1 if i1 < i2 else -1
+        sj = 1 if j1 < j2 else -1
+        error = di + dj
+        i, j = i1, j1
+        while i != i2 or j != j2:
+            yield (i, j)
+            e2 = 2 * error
+            if e2 >= dj:
+                error += dj
+                i += si
+            if e2 <= di:
+                error += di
+                j += sj
+
+    def __integrateVectorized(self, ox, oy, xs, ys, distances):
+        """
+        Lancer de tous les rayons de la station avec numpy. Les rayons
+        avancent ensemble, cellule par cellule (algorithme de Bresenham),
+        puis les mises à jour sont appliquées dans l'ordre des rayons :
+        chaque cellule est bornée après chacune de ses mises à jour, comme
+        dans le calcul scalaire, dont le résultat est identique.
+        """
+        width = self.__width
+        oi, oj = self.cellOf(ox, oy)
+        hi = numpy.floor(numpy.asarray(xs, dtype=float) / self.__cellSize).astype(numpy.int64)
+        hj = numpy.floor(numpy.asarray(ys, dtype=float) / self.__cellSize).astype(numpy.int64)
+        hits = numpy.asarray(distances, dtype=float) < self.__maxRange
+        di = numpy.abs(hi - oi)
+        dj = -numpy.abs(hj - oj)
+        si = numpy.where(oi < hi, 1, -1)
+        sj = numpy.where(oj < hj, 1, -1)
+        error = di + dj
+        i = numpy.full(len(hi), oi, dtype=numpy.int64)
+        j = numpy.full(len(hj), oj, dtype=numpy.int64)
+        rays = numpy.arange(len(hi))
+        # Rang de chaque mise à jour dans la suite du calcul scalaire :
+        # les cellules traversées par un rayon, puis sa cellule d'arrivée.
+        stride = int(numpy.maximum(di, -dj).max()) + 1
+        cells = []
+        orders = []
+        step = 0
+        active = (i != hi) | (j != hj)
+        while active.any():
+            cells.append(((j - self.__j0) * width + i - self.__i0)[active])
+            orders.append(rays[active] * stride + step)
+            e2 = 2 * error
+            stepI = active & (e2 >= dj)
+            stepJ = active & (e2 <= di)
+            error += numpy.where(stepI, dj, 0) + numpy.where(stepJ, di, 0)
+            i += numpy.where(stepI, si, 0)
+            j += numpy.where(stepJ, sj, 0)
+            active = (i != hi) | (j != hj)
+            step += 1
+        freeCount = sum(len(free) for free in cells)
+        cells.append(((hj - self.__j0) * width + hi - self.__i0)[hits])
+        orders.append(rays[hits] * stride + stride - 1)
+        cells = numpy.concatenate(cells)
+        orders = numpy.concatenate(orders)
+        deltas = numpy.full(len(cells), OccupancyGrid.LOG_ODDS_OCCUPIED)
+        deltas[:freeCount] = OccupancyGrid.LOG_ODDS_FREE
+        if len(cells) == 0:
+            return
+        # Les mises à jour sont regroupées par cellule, dans l'ordre, puis
+        # appliquées par rang : les cellules d'un même rang sont distinctes.
+        order = numpy.lexsort((orders, cells))
+        cells = cells[order]
+        deltas = deltas[order]
+        starts = numpy.flatnonzero(numpy.concatenate(([True], cells[1:] != cells[:-1])))
+        counts = numpy.diff(numpy.append(starts, len(cells)))
+        ranks = numpy.arange(len(cells)) - numpy.repeat(starts, counts)
+        order = numpy.argsort(ranks, kind="stable")
+        bounds = numpy.cumsum(numpy.bincount(ranks))
+        flat = self.__cells.reshape(-1)
+        first = 0
+        for last in bounds.tolist():
+            updated = cells[order[first:last]]
+            values = flat[updated].astype(numpy.float64) + deltas[order[first:last]]
+            flat[updated] = numpy.clip(values, OccupancyGrid.LOG_ODDS_MIN, OccupancyGrid.LOG_ODDS_MAX)
+            first = last
+        for cell in cells[starts].tolist():
+            self.__changes.add((cell % width + self.__i0, cell // width + self.__j0))
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+"""
+Ce module définit l'index spatial des objets d'une carte relevée par le
+robot explorer.
+
+L'index est une grille uniforme : l'espace est découpé en cellules carrées
+et chaque cellule référence les points et les murs qui la traversent. Les
+recherches (plus proche voisin, rayon, rectangle) n'explorent donc que les
+cellules voisines de la zone recherchée, quelle que soit la taille de la
+carte.
+
+Auteur : André-Pierre LIMOUZIN
+Version : 1.0 - 10.2026
+"""
+
+import math
+
+
+#
+#
+##############################################################################
+class SurveyGridIndex:
+    """
+    Cette classe modélise un index spatial en grille uniforme sur les
+    points et les murs d'une SurveyMap.
+
+    Les objets indexés doivent exposer les propriétés X et Y (points) ou
+    Pt1 et Pt2 (murs). L'index est mis à jour de façon incrémentale à
+    chaque ajout d'une station dans la carte.
+    """
+    DEFAULT_CELL_SIZE = 25
+
+    def __init__(self, cellSize=DEFAULT_CELL_SIZE):
+        """
+        Initialisation de l'index.
+
+        :param cellSize: Côté d'une cellule de la grille en cm.
+        """
+        self.__cellSize = float(cellSize)
+        self.__pointCells = {}
+        self.__wallCells = {}
+        self.__wallKeys = {}
+        self.__pointCount = 0
+        self.__minCell = None
+        self.__maxCell = None
+
+    @property
+    def cellSize(self):
+        return self.__cellSize
+
+    @property
+    def pointCount(self):
+        return self.__pointCount
+
+    @property
+    def wallCount(self):
+        return len(self.__wallKeys)
+
+    def cellOf(self, x, y):
+        """
+        :return: Clé (i, j) de la cellule contenant le point (x, y).
+        """
+        return (int(math.floor(x / self.__cellSize)), int(math.floor(y / self.__cellSize)))
+
+    def __extend(self, key):
+        """
+        Mise à jour de l'étendue des cellules occupées.
+        """
+        if self.__minCell is None:
+            self.__minCell = key
+            self.__maxCell = key
+        else:
+            self.__minCell = (min(self.__minCell[0], key[0]), min(self.__minCell[1], key[1]))
+            self.__maxCell = (max(self.__maxCell[0], key[0]), max(self.__maxCell[1], key[1]))
+
+    def insertPoint(self, point):
+        """
+        Ajout d'un point dans l'index.
+
+        :param point: SurveyPoint (ou SurveyPointView) à indexer.
+        """
+        key = self.cellOf(point.X, point.Y)
+        cell = self.__pointCells.get(key)
+        if cell is None:
+            cell = []
+            self.__pointCells[key] = cell
+        cell.append(point)
+        self.__pointCount += 1
+        self.__extend(key)
+
+    def removePoints(self, node):
+        """
+        Retrait de l'index de tous les points d'une station.
+
+        Les points sont reconnus par leur station (propriété parentNode),
+        ce qui convient aussi aux SurveyPointView, recréées à chaque accès.
+
+        :param node: SurveyNode dont les points sont retirés.
+        """
+        if len(node) == 0:
+            return
+        xs = [node[iPoint].X for iPoint in range(len(node))]
+        ys = [node[iPoint].Y for iPoint in range(len(node))]
+        for key in list(self.__keysInBox(min(xs), min(ys), max(xs), max(ys))):
+            cell = self.__pointCells.get(key)
+            if cell is None:
+                continue
+            kept = [point for point in cell if point.parentNode is not node]
+            self.__pointCount -= len(cell) - len(kept)
+            if len(kept) > 0:
+                self.__pointCells[key] = kept
+            else:
+                del self.__pointCells[key]
+
+    def __segmentCells(self, x1, y1, x2, y2):
+        """
+        Parcours exact des cellules traversées par un segment (algorithme
+        d'Amanatides et Woo) : à chaque pas, le segment franchit la plus
+        proche des frontières verticale et horizontale de la cellule
+        courante. Lorsqu'il passe par un coin, les deux cellules qui le
+        bordent sont également retenues.
+
+        :return: Ensemble des clés des cellules traversées par un segment.
+        """
+        size = self.__cellSize
+        i, j = self.cellOf(x1, y1)
+        iEnd, jEnd = self.cellOf(x2, y2)
+        dx = x2 - x1
+        dy = y2 - y1
+        si = 1 if dx > 0 else -1
+        sj = 1 if dy > 0 else -1
+        if dx != 0:
+            tMaxX = ((i + (1 if dx > 0 else 0)) * size - x1) / dx
+            tDeltaX = size / abs(dx)
+        else:
+            tMaxX = tDeltaX = math.inf
+        if dy != 0:
+            tMaxY = ((j + (1 if dy > 0 else 0)) * size - y1) / dy
+            tDeltaY = size / abs(dy)
+        else:
+            tMaxY = tDeltaY = math.inf
+        keys = {(i, j)}
+        # Le nombre de pas est borné par la distance de Manhattan entre les
+        # cellules extrêmes, ce qui protège des erreurs d'arrondi.
+        for step in range(abs(iEnd - i) + abs(jEnd - j)):
+            if (i, j) == (iEnd, jEnd):
+                break
+            if tMaxX < tMaxY:
+                i += si
+                tMaxX += tDeltaX
+            elif tMaxY < tMaxX:
+                j += sj
+                tMaxY += tDeltaY
+            else:
+                keys.add((i + si, j))
+                keys.add((i, j + sj))
+                i += si
+                j += sj
+                tMaxX += tDeltaX
+                tMaxY += tDeltaY
+            keys.add((i, j))
+        keys.add((iEnd, jEnd))
+        return keys
+
+    def insertWall(self, wall):
+        """
+        Ajout d'un mur dans l'index.
+        Le mur est référencé par toutes les cellules traversées par le
+        segment [Pt1, Pt2].
+
+        :param wall: Wall à indexer.
+        """
+        keys = self.__segmentCells(wall.Pt1.X, wall.Pt1.Y, wall.Pt2.X, wall.Pt2.Y)
+        for key in keys:
+            cell = self.__wallCells.get(key)
+            if cell is None:
+                cell = []
+                self.__wallCells[key] = cell
+            cell.append(wall)
+            self.__extend(key)
+        self.__wallKeys[id(wall)] = keys
+
+    def removeWall(self, wall):
+        """
+        Retrait d'un mur de l'index.
+
+        :param wall: Wall à retirer.
+        """
+        keys = self.__wallKeys.pop(id(wall), None)
+        if keys is None:
+            return
+        for key in keys:
+            cell = self.__wallCells[key]
+            cell.remove(wall)
+            if len(cell) == 0:
+                del self.__wallCells[key]
+
+    def insertNode(self, node):
+        """
+        Ajout de tous les points et murs d'une station dans l'index.
+
+        :param node: SurveyNode à indexer.
+        """
+        for iPoint in range(len(node)):
+            self.insertPoint(node[iPoint])
+        for wall in node.walls:
+            self.insertWall(wall)
+
+    def __keysInBox(self, minX, minY, maxX, maxY):
+        """
+        :return: Générateur des clés des cellules recouvrant un rectangle.
+        """
+        if self.__minCell is None:
+            return
+        i1, j1 = self.cellOf(minX, minY)
+        i2, j2 = self.cellOf(maxX, maxY)
+        i1 = max(i1, self.__minCell[0])
+        j1 = max(j1, self.__minCell[1])
+        i2 = min(i2, self.__maxCell[0])
+        j2 = min(j2, self.__maxCell[1])
+        for i in range(i1, i2 + 1):
+            for j in range(j1, j2 + 1):
+                yield (i, j)
+
+    def pointsInBox(self, minX, minY, maxX, maxY):
+        """
+        :return: Liste des points contenus dans le rectangle.
+        """
+        points = []
+        for key in self.__keysInBox(minX, minY, maxX, maxY):
+            for point in self.__pointCells.get(key, ()):
+                if minX <= point.X <= maxX and minY <= point.Y <= maxY:
+                    points.append(point)
+        return points
+
+    def pointsInRadius(self, x, y, radius):
+        """
+        :return: Liste des points situés à moins de radius du point (x, y).
+        """
+        return [point for point in self.pointsInBox(x - radius, y - radius, x + radius, y + radius)
+                if math.hypot(point.X - x, point.Y - y) <= radius]
+
+    def wallsInBox(self, minX, minY, maxX, maxY):
+        """
+        :return: Liste des murs dont une cellule recouvre le rectangle et
+        dont le segment intersecte le rectangle.
+        """
+        walls = {}
+        for key in self.__keysInBox(minX, minY, maxX, maxY):
+            for wall in self.__wallCells.get(key, ()):
+                if id(wall) not in walls and SurveyGridIndex.segmentIntersectsBox(
+                        wall.Pt1.X, wall.Pt1.Y, wall.Pt2.X, wall.Pt2.Y, minX, minY, maxX, maxY):
+                    walls[id(wall)] = wall
+        return list(walls.values())
+
+    def wallsInRadius(self, x, y, radius):
+        """
+        :return: Liste des murs situés à moins de radius du point (x, y).
+        """
+        return [wall for wall in self.wallsInBox(x - radius, y - radius, x + radius, y + radius)
+                if SurveyGridIndex.segmentDistance(x, y, wall.Pt1.X, wall.Pt1.Y, wall.Pt2.X, wall.Pt2.Y) <= radius]
+
+    def __nearest(self, cells, x, y, distance, maxRadius):
+        """
+        Recherche du plus proche objet par parcours de couronnes de cellules
+        de plus en plus éloignées.
+        La recherche s'arrête dès que la couronne suivante ne peut plus
+        contenir d'objet plus proche que le meilleur trouvé.
+        """
+        if self.__minCell is None:
+            return None
+        ci, cj = self.cellOf(x, y)
+        maxRing = max(abs(ci - self.__minCell[0]), abs(ci - self.__maxCell[0]),
+                      abs(cj - self.__minCell[1]), abs(cj - self.__maxCell[1]))
+        if maxRadius is not None:
+            maxRing = min(maxRing, int(math.ceil(maxRadius / self.__cellSize)) + 1)
+        best = None
+        bestDist = maxRadius if maxRadius is not None else math.inf
+        for ring in range(maxRing + 1):
+            if best is not None and bestDist <= (ring - 1) * self.__cellSize:
+                break
+            for i in range(ci - ring, ci + ring + 1):
+                for j in range(cj - ring, cj + ring + 1):
+                    if max(abs(i - ci), abs(j - cj)) != ring:
+                        continue
+                    for o in cells.get((i, j), ()):
+                        dist = distance(o)
+                        if dist <= bestDist:
+                            best = o
+                            bestDist = dist
+        return best
+
+    def nearestPoint(self, x, y, maxRadius=None, validOnly=False):
+        """
+        Recherche du point le plus proche de (x, y).
+
+        :param x: Abscisse de la position.
+        :param y: Ordonnée de la position.
+        :param maxRadius: Distance maximale de recherche (illimitée par défaut).
+        :param validOnly: Si vrai, seuls les points valides sont retenus.
+        :return: Point le plus proche ou None.
+        """
+        if validOnly:
+            distance = lambda p: math.hypot(p.X - x, p.Y - y) if p.isValid else math.inf
+        else:
+            distance = lambda p: math.hypot(p.X - x, p.Y - y)
+        return self.__nearest(self.__pointCells, x, y, distance, maxRadius)
+
+    def nearestWall(self, x, y, maxRadius=None):
+        """
+        Recherche du mur dont le segment est le plus proche de (x, y).
+
+        :param x: Abscisse de la position.
+        :param y: Ordonnée de la position.
+        :param maxRadius: Distance maximale de recherche (illimitée par défaut).
+        :return: Mur le plus proche ou None.
+        """
+        distance = lambda w: SurveyGridIndex.segmentDistance(x, y, w.Pt1.X, w.Pt1.Y, w.Pt2.X, w.Pt2.Y)
+        return self.__nearest(self.__wallCells, x, y, distance, maxRadius)
+
+    @staticmethod
+    def segmentDistance(x, y, x1, y1, x2, y2):
+        """
+        :return: Distance du point (x, y) au segment [(x1, y1), (x2, y2)].
+        """
+        dx = x2 - x1
+        dy = y2 - y1
+        length2 = dx * dx + dy * dy
+        if length2 == 0:
+            return math.hypot(x - x1, y - y1)
+        t = max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / length2))
+        return math.hypot(x - x1 - t * dx, y - y1 - t * dy)
+
+    @staticmethod
+    def segmentIntersectsBox(x1, y1, x2, y2, minX, minY, maxX, maxY):
+        """
+        Teste si un segment intersecte un rectangle (algorithme de
+        Liang-Barsky).
+
+        :return: Vrai si le segment a au moins un point dans le rectangle.
+        """
+        t0 = 0.0
+        t1 = 1.0
+        dx = x2 - x1
+        dy = y2 - y1
+        for p, q in ((-dx, x1 - minX), (dx, maxX - x1), (-dy, y1 - minY), (dy, maxY - y1)):
+            if p == 0:
+                if q < 0:
+                    return False
+            else:
+                t = q / p
+                if p < 0:
+                    t0 = max(t0, t)
+                else:
+                    t1 = min(t1, t)
+                if t0 > t1:
+                    return False
+        return True
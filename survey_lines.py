@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+"""
+Ce module définit l'extraction incrémentale des murs relevés par le robot
+explorer.
+
+Les moments d'un nuage de points (moyennes, variances et covariance) sont
+mis à jour à chaque point ajouté, si bien que la droite des moindres
+carrés d'un mur est disponible à tout instant sans reparcourir ses points.
+La droite est calculée par moindres carrés totaux (axe principal du
+nuage), ce qui ne privilégie aucune orientation.
+
+L'extracteur découpe les suites de points proches en segments au fil du
+tour d'horizon (split) et fusionne deux segments consécutifs alignés
+(merge). Les murs sont publiés dès qu'un segment est terminé.
+
+Auteur : André-Pierre LIMOUZIN
+Version : 1.0 - 10.2026
+"""
+
+import math
+
+
+#
+#
+##############################################################################
+class LineMoments:
+    """
+    Cette classe modélise les moments d'ordre 1 et 2 d'un nuage de points,
+    mis à jour de façon incrémentale (algorithme de Welford).
+
+    Les moments de deux nuages peuvent être fusionnés sans reparcourir
+    les points.
+    """
+    def __init__(self):
+        self.__n = 0
+        self.__mx = 0.0
+        self.__my = 0.0
+        self.__sxx = 0.0
+        self.__syy = 0.0
+        self.__sxy = 0.0
+
+    def copy(self):
+        """
+        :return: Copie des moments.
+        """
+        moments = LineMoments()
+        moments.__n = self.__n
+        moments.__mx = self.__mx
+        moments.__my = self.__my
+        moments.__sxx = self.__sxx
+        moments.__syy = self.__syy
+        moments.__sxy = self.__sxy
+        return moments
+
+    def add(self, x, y):
+        """
+        Ajout d'un point.
+        """
+        self.__n += 1
+        dx = x - self.__mx
+        dy = y - self.__my
+        self.__mx += dx / self.__n
+        self.__my += dy / self.__n
+        self.__sxx += dx * (x - self.__mx)
+        self.__syy += dy * (y - self.__my)
+        self.__sxy += dx * (y - self.__my)
+
+    def remove(self, x, y):
+        """
+        Retrait d'un point précédemment ajouté.
+        """
+        if self.__n <= 1:
+            self.__n = 0
+            self.__mx = self.__my = 0.0
+            self.__sxx = self.__syy = self.__sxy = 0.0
+            return
+        n = self.__n - 1
+        mx = (self.__n * self.__mx - x) / n
+        my = (self.__n * self.__my - y) / n
+        self.__sxx -= (x - mx) * (x - self.__mx)
+        self.__syy -= (y - my) * (y - self.__my)
+        self.__sxy -= (x - mx) * (y - self.__my)
+        self.__n = n
+        self.__mx = mx
+        self.__my = my
+
+    def merge(self, other):
+        """
+        Fusion avec les moments d'un autre nuage de points.
+
+        :param other: LineMoments à fusionner.
+        """
+        if other.__n == 0:
+            return
+        if self.__n == 0:
+            self.__n, self.__mx, self.__my = other.__n, other.__mx, other.__my
+            self.__sxx, self.__syy, self.__sxy = other.__sxx, other.__syy, other.__sxy
+            return
+        n = self.__n + other.__n
+        dx = other.__mx - self.__mx
+        dy = other.__my - self.__my
+        weight = self.__n * other.__n / n
+        self.__sxx += other.__sxx + dx * dx * weight
+        self.__syy += other.__syy + dy * dy * weight
+        self.__sxy += other.__sxy + dx * dy * weight
+        self.__mx += dx * other.__n / n
+        self.__my += dy * other.__n / n
+        self.__n = n
+
+    def __len__(self):
+        return self.__n
+
+    @property
+    def count(self):
+        return self.__n
+
+    @property
+    def mean(self):
+        """
+        :return: Centre de gravité (Mx, My) du nuage.
+        """
+        return (self.__mx, self.__my)
+
+    @property
+    def variances(self):
+        """
+        :return: Tuple (Vx, Vy, Cxy) des variances et de la covariance.
+        """
+        if self.__n == 0:
+            return (0.0, 0.0, 0.0)
+        return (self.__sxx / self.__n, self.__syy / self.__n, self.__sxy / self.__n)
+
+    @property
+    def eigenvalues(self):
+        """
+        :return: Valeurs propres (l1, l2), l1 >= l2, de la matrice de covariance.
+        """
+        vx, vy, cxy = self.variances
+        delta = math.sqrt((vx - vy) * (vx - vy) + 4 * cxy * cxy)
+        return ((vx + vy + delta) / 2, max(0.0, (vx + vy - delta) / 2))
+
+    @property
+    def direction(self):
+        """
+        :return: Vecteur unitaire (ux, uy) de l'axe principal du nuage.
+        """
+        vx, vy, cxy = self.variances
+        theta = 0.5 * math.atan2(2 * cxy, vx - vy)
+        return (math.cos(theta), math.sin(theta))
+
+    @property
+    def line(self):
+        """
+        :return: Coefficients (A, B, C) de la droite Ax + By = C, avec
+        (A, B) vecteur normal unitaire.
+        """
+        ux, uy = self.direction
+        return (-uy, ux, -uy * self.__mx + ux * self.__my)
+
+    @property
+    def alignment(self):
+        """
+        :return: Coefficient d'alignement 1 - l2 / l1 (1 : points alignés,
+        0 : nuage isotrope).
+        """
+        l1, l2 = self.eigenvalues
+        if l1 <= 0:
+            return 1.0
+        return 1.0 - l2 / l1
+
+    @property
+    def rms(self):
+        """
+        :return: Ecart quadratique moyen des points à la droite.
+        """
+        return math.sqrt(self.eigenvalues[1])
+
+    def distance(self, x, y):
+        """
+        :return: Distance du point (x, y) à la droite.
+        """
+        a, b, c = self.line
+        return abs(a * x + b * y - c)
+
+    def project(self, x, y):
+        """
+        :return: Projection (x, y) du point sur la droite.
+        """
+        ux, uy = self.direction
+        t = (x - self.__mx) * ux + (y - self.__my) * uy
+        return (self.__mx + t * ux, self.__my + t * uy)
+
+
+#
+#
+##############################################################################
+class LineExtractor:
+    """
+    Cette classe découpe au fil de l'eau une suite de points en segments
+    de droite (split-and-merge incrémental).
+
+    * Deux points consécutifs distants de plus de threshold appartiennent
+      à deux suites différentes.
+    * Un point éloigné de plus de tolerance de la droite du segment en
+      cours (d'au moins MIN_POINTS points) termine le segment ; le segment
+      suivant commence au dernier point du précédent (coin).
+    * Un segment terminé est fusionné avec le segment précédent de la même
+      suite si tous leurs points extrêmes sont à moins de tolerance de la
+      droite commune (cas d'une mesure aberrante).
+
+    Les segments d'au moins MIN_POINTS points sont transmis à la fonction
+    publish(points, moments), qui renvoie l'objet publié. Un objet publié
+    remplacé par une fusion est transmis à la fonction retract(objet).
+    """
+    MIN_POINTS = 3
+    SPLIT_TOLERANCE = 4.0
+
+    def __init__(self, publish, retract, threshold, tolerance=SPLIT_TOLERANCE):
+        """
+        :param publish: Fonction de publication d'un segment.
+        :param retract: Fonction de retrait d'un segment publié.
+        :param threshold: Distance maximale entre deux points d'une suite.
+        :param tolerance: Distance maximale d'un point à la droite de son segment.
+        """
+        self.__publish = publish
+        self.__retract = retract
+        self.__threshold = threshold
+        self.__tolerance = tolerance
+        self.__points = []
+        self.__moments = LineMoments()
+        self.__previous = None
+
+    def add(self, point):
+        """
+        Prise en compte d'un nouveau point (objet exposant X et Y).
+        """
+        points = self.__points
+        if len(points) == 0 or math.hypot(point.X - points[-1].X, point.Y - points[-1].Y) >= self.__threshold:
+            self.__closeSegment()
+            self.__previous = None
+        elif len(points) >= LineExtractor.MIN_POINTS and \
+                self.__moments.distance(point.X, point.Y) > self.__tolerance:
+            corner = points[-1]
+            self.__closeSegment()
+            self.__points = [corner]
+            self.__moments.add(corner.X, corner.Y)
+        self.__points.append(point)
+        self.__moments.add(point.X, point.Y)
+
+    def finish(self):
+        """
+        Fin de la suite de points : le segment en cours est publié.
+        """
+        self.__closeSegment()
+        self.__previous = None
+
+    def __closeSegment(self):
+        points = self.__points
+        moments = self.__moments
+        self.__points = []
+        self.__moments = LineMoments()
+        if len(points) < LineExtractor.MIN_POINTS:
+            return
+        previous = self.__previous
+        if previous is not None:
+            merged = previous[1].copy()
+            merged.merge(moments)
+            mergedPoints = previous[0] + points
+            if points[0] is previous[0][-1]:
+                merged.remove(points[0].X, points[0].Y)
+                mergedPoints = previous[0] + points[1:]
+            ends = (previous[0][0], previous[0][-1], points[0], points[-1])
+            if all(merged.distance(p.X, p.Y) <= self.__tolerance for p in ends):
+                self.__retract(previous[2])
+                points = mergedPoints
+                moments = merged
+        self.__previous = (points, moments, self.__publish(points, moments))
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+"""
+Ce module définit les niveaux de détail (LOD) d'une carte relevée par le
+robot explorer.
+
+Une station contribue tous ses points bruts à la carte, alors que la
+plupart d'entre eux sont alignés sur un mur. Pour l'affichage (et
+l'export) à une résolution donnée, la carte est réduite :
+* les suites de points d'un mur de station sont simplifiées par
+  l'algorithme de Douglas-Peucker (tolérance : la moitié de la
+  résolution) ;
+* les autres points sont regroupés, station par station, par cellule
+  d'une grille dont le côté est la résolution, chaque cellule étant
+  remplacée par le barycentre de ses points : un point retenu reste
+  rattaché à la station qui l'a mesuré ;
+* aux résolutions grossières, seuls les murs de la carte sont conservés.
+
+Les niveaux sont calculés à la demande et conservés jusqu'à la
+modification suivante de la carte.
+
+Auteur : André-Pierre LIMOUZIN
+Version : 1.0 - 10.2026
+"""
+
+import math
+from threading import Lock
+
+
+#
+#
+##############################################################################
+class SurveyMapLevel:
+    """
+    Cette classe modélise la représentation réduite d'une SurveyMap à une
+    résolution donnée.
+
+    Les points retenus sont rangés en colonnes (x, y, validité) par rang de
+    station. Au niveau « murs seuls », aucune station n'a de point.
+    """
+    def __init__(self, version, resolution, wallsOnly, columns):
+        """
+        :param version: Version de la carte réduite.
+        :param resolution: Résolution du niveau en cm.
+        :param wallsOnly: Vrai si seuls les murs sont conservés.
+        :param columns: Dictionnaire rang -> (xs, ys, valids) des points
+        retenus.
+        """
+        self.__version = version
+        self.__resolution = resolution
+        self.__wallsOnly = wallsOnly
+        self.__columns = columns
+
+    @property
+    def version(self):
+        return self.__version
+
+    @property
+    def resolution(self):
+        return self.__resolution
+
+    @property
+    def wallsOnly(self):
+        return self.__wallsOnly
+
+    @property
+    def pointCount(self):
+        return sum(len(xs) for xs, ys, valids in self.__columns.values())
+
+    def columns(self, rank):
+        """
+        :return: Colonnes (xs, ys, valids) des points retenus de la station
+        rank (listes vides si aucun).
+        """
+        return self.__columns.get(rank, ([], [], []))
+
+    def pointsInBox(self, minX, minY, maxX, maxY):
+        """
+        :return: Dictionnaire rang -> (xs, ys, valids) des points retenus
+        contenus dans le rectangle.
+        """
+        result = {}
+        for rank, (xs, ys, valids) in self.__columns.items():
+            for k in range(len(xs)):
+                if minX <= xs[k] <= maxX and minY <= ys[k] <= maxY:
+                    column = result.setdefault(rank, ([], [], []))
+                    column[0].append(xs[k])
+                    column[1].append(ys[k])
+                    column[2].append(valids[k])
+        return result
+
+
+#
+#
+##############################################################################
+class SurveyMapDecimator:
+    """
+    Cette classe calcule et conserve les niveaux de détail d'une
+    SurveyMap.
+
+    Les résolutions disponibles sont celles de RESOLUTIONS : une
+    résolution demandée est ramenée à la plus grande résolution disponible
+    qui ne la dépasse pas (0 : carte complète). A partir de WALLS_ONLY cm,
+    seuls les murs sont conservés.
+
+    Les niveaux calculés sont conservés tant que la version de la carte ne
+    change pas. Le calcul peut être demandé par plusieurs threads (serveur
+    Web) : il est protégé par un verrou.
+    """
+    RESOLUTIONS = (2, 5, 10, 20, 50)
+    WALLS_ONLY = 20
+
+    def __init__(self, surveyMap, resolutions=RESOLUTIONS, wallsOnly=WALLS_ONLY):
+        """
+        :param surveyMap: SurveyMap à réduire.
+        :param resolutions: Résolutions disponibles en cm.
+        :param wallsOnly: Résolution à partir de laquelle seuls les murs
+        sont conservés (None : jamais).
+        """
+        self.__map = surveyMap
+        self.__resolutions = sorted(resolutions)
+        self.__wallsOnly = wallsOnly
+        self.__lock = Lock()
+        self.__version = None
+        self.__levels = {}
+
+    @property
+    def resolutions(self):
+        return self.__resolutions
+
+    def resolution(self, lod):
+        """
+        :param lod: Résolution demandée en cm.
+        :return: Plus grande résolution disponible inférieure ou égale à
+        lod, 0 si aucune.
+        """
+        result = 0
+        for resolution in self.__resolutions:
+            if resolution <= lod:
+                result = resolution
+        return result
+
+    def level(self, lod):
+        """
+        :param lod: Résolution demandée en cm.
+        :return: SurveyMapLevel de la résolution disponible (voir
+        resolution), None pour la carte complète.
+        """
+        resolution = self.resolution(lod)
+        if resolution == 0:
+            return None
+        with self.__lock:
+            version = self.__map.version
+            if version != self.__version:
+                self.__levels.clear()
+                self.__version = version
+            level = self.__levels.get(resolution)
+            if level is None:
+                revision = self.__map.revision
+                level = self.__decimate(version, resolution)
+                if revision % 2 == 0 and self.__map.revision == revision:
+                    self.__levels[resolution] = level
+            return level
+
+    def __decimate(self, version, resolution):
+        """
+        Calcul d'un niveau de détail.
+
+        :param version: Version courante de la carte.
+        :param resolution: Résolution en cm.
+        :return: SurveyMapLevel.
+        """
+        surveyMap = self.__map
+        if self.__wallsOnly is not None and resolution >= self.__wallsOnly:
+            return SurveyMapLevel(version, resolution, True, {})
+        columns = {}
+        cells = {}
+        tolerance = resolution / 2.0
+        for rank in range(len(surveyMap)):
+            surveyNode = surveyMap[rank]
+            column = ([], [], [])
+            onWall = set()
+            for wall in surveyNode.walls:
+                run = [(wall[k].X, wall[k].Y) for k in range(len(wall))]
+                onWall.update(run)
+                for x, y in SurveyMapDecimator.douglasPeucker(run, tolerance):
+                    column[0].append(x)
+                    column[1].append(y)
+                    column[2].append(1)
+            for k in range(len(surveyNode)):
+                point = surveyNode[k]
+                if (point.X, point.Y) in onWall:
+                    continue
+                valid = 1 if point.isValid else 0
+                key = (rank, math.floor(point.X / resolution), math.floor(point.Y / resolution), valid)
+                cell = cells.get(key)
+                if cell is None:
+                    cells[key] = [point.X, point.Y, 1]
+                else:
+                    cell[0] += point.X
+                    cell[1] += point.Y
+                    cell[2] += 1
+            columns[rank] = column
+        for (rank, cx, cy, valid), (sumX, sumY, count) in cells.items():
+            column = columns[rank]
+            column[0].append(sumX / count)
+            column[1].append(sumY / count)
+            column[2].append(valid)
+        return SurveyMapLevel(version, resolution, False, columns)
+
+    @staticmethod
+    def douglasPeucker(points, tolerance):
+        """
+        Simplification d'une suite de points (algorithme de
+        Douglas-Peucker, sans récursion).
+
+        :param points: Liste de tuples (x, y).
+        :param tolerance: Ecart maximal en cm entre un point retiré et le
+        segment qui le remplace.
+        :return: Liste des points retenus, dans l'ordre (extrémités
+        comprises).
+        """
+        count = len(points)
+        if count < 3:
+            return list(points)
+        keep = [False] * count
+        keep[0] = keep[count - 1] = True
+        stack = [(0, count - 1)]
+        while stack:
+            first, last = stack.pop()
+            x1, y1 = points[first]
+            x2, y2 = points[last]
+            dx = x2 - x1
+            dy = y2 - y1
+            length = math.hypot(dx, dy)
+            farthest = None
+            distance = tolerance
+            for k in range(first + 1, last):
+                x, y = points[k]
+                if length > 0:
+                    d = abs(dy * (x - x1) - dx * (y - y1)) / length
+                else:
+                    d = math.hypot(x - x1, y - y1)
+                if d > distance:
+                    farthest = k
+                    distance = d
+            if farthest is not None:
+                keep[farthest] = True
+                stack.append((first, farthest))
+                stack.append((farthest, last))
+        return [points[k] for k in range(count) if keep[k]]
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+"""
+Ce module définit le recalage (scan matching) des tours d'horizon du robot
+explorer.
+
+La position et l'orientation du robot sont estimées à l'estime, à partir
+des seules commandes de déplacement : l'erreur s'accumule à chaque
+station. Avant d'ajouter une station à la carte, ses points sont alignés
+sur ceux des stations précédentes par l'algorithme ICP (Iterative Closest
+Point) : chaque point est apparié à son plus proche voisin, puis la
+transformation rigide qui minimise l'écart entre les paires est calculée
+par moindres carrés. Les deux étapes sont répétées jusqu'à convergence.
+
+La recherche des plus proches voisins est vectorisée avec numpy s'il est
+disponible, sinon elle utilise un index spatial en grille. Les itérations
+s'arrêtent dès que la correction devient négligeable.
+
+Auteur : André-Pierre LIMOUZIN
+Version : 1.0 - 10.2026
+"""
+
+import math
+
+from survey_index import SurveyGridIndex
+from survey_lines import LineMoments
+from survey_model import Angle
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # Les plus proches voisins sont alors recherchés avec un index.
+
+
+#
+#
+##############################################################################
+class ScanMatch:
+    """
+    Cette classe modélise le résultat d'un recalage : la transformation
+    rigide p' = R(rotation).p + (tx, ty) à appliquer aux points d'une
+    station, exprimée dans le référentiel de l'espace.
+
+    La rotation est exprimée dans le sens trigonométrique : elle diminue
+    d'autant l'orientation (topographique) de la station.
+    """
+    def __init__(self, rotation, tx, ty, error, matches, iterations, converged, conditioning=1.0):
+        """
+        :param rotation: Rotation en radians (sens trigonométrique).
+        :param tx: Translation selon l'axe des abscisses.
+        :param ty: Translation selon l'axe des ordonnées.
+        :param error: Ecart quadratique moyen des paires appariées.
+        :param matches: Nombre de paires appariées.
+        :param iterations: Nombre d'itérations effectuées.
+        :param converged: Vrai si les itérations se sont arrêtées sur une
+        correction négligeable.
+        :param conditioning: Conditionnement du système normal (rapport de
+        ses valeurs propres extrêmes, entre 0 et 1).
+        """
+        self.__rotation = rotation
+        self.__tx = tx
+        self.__ty = ty
+        self.__error = error
+        self.__matches = matches
+        self.__iterations = iterations
+        self.__converged = converged
+        self.__conditioning = conditioning
+
+    @property
+    def rotation(self):
+        return self.__rotation
+
+    @property
+    def translation(self):
+        return (self.__tx, self.__ty)
+
+    @property
+    def error(self):
+        return self.__error
+
+    @property
+    def matches(self):
+        return self.__matches
+
+    @property
+    def iterations(self):
+        return self.__iterations
+
+    @property
+    def converged(self):
+        return self.__converged
+
+    @property
+    def conditioning(self):
+        """
+        :return: Rapport de la plus petite à la plus grande valeur propre du
+        système normal (rotation exprimée en déplacement des points) : voisin
+        de 0 lorsque les paires ne contraignent pas toutes les directions
+        (paires toutes appariées au même mur, par exemple).
+        """
+        return self.__conditioning
+
+    def transform(self, x, y):
+        """
+        :return: Image (x, y) du point par la transformation.
+        """
+        c = math.cos(self.__rotation)
+        s = math.sin(self.__rotation)
+        return (c * x - s * y + self.__tx, s * x + c * y + self.__ty)
+
+    def apply(self, node):
+        """
+        Application de la correction à une station.
+
+        :param node: SurveyNode à recaler.
+        :return: SurveyNode reconstruit dans la pose corrigée.
+        """
+        x, y = self.transform(node.X, node.Y)
+        return node.relocated(x, y, node.orientation - Angle(radians=self.__rotation))
+
+    def __str__(self):
+        return "ScanMatch(rotation={0:.2f}°, translation=({1:.1f},{2:.1f}), error={3:.2f}, " \
+               "matches={4}, iterations={5}, conditioning={6:.3f})".format(
+                   math.degrees(self.__rotation), self.__tx, self.__ty, self.__error, self.__matches,
+                   self.__iterations, self.__conditioning)
+
+
+#
+#
+##############################################################################
+class ScanMatcher:
+    """
+    Cette classe recale une nouvelle station sur les points des stations
+    déjà présentes dans la carte (ICP point à droite).
+
+    Les points relevés étant espacés de plusieurs centimètres (20 à 40 cm
+    sur un mur à 1 ou 2 m pour un balayage tous les 10°), un point n'a
+    généralement pas de correspondant exact : l'écart d'une paire est donc
+    mesuré à la droite locale du point de référence (calculée sur ses
+    voisins dans un rayon NORMAL_RADIUS), ce qui laisse la paire glisser le
+    long du mur. Un point de référence isolé n'est pas apparié : l'écart à
+    un point voisin dépend surtout de l'espacement des mesures, et l'ICP
+    le réduirait en déformant la pose.
+
+    Tous les points relevés sont utilisés, et pas seulement les points
+    valides (chaînés à leur voisin) : avec un balayage tous les 10°, seuls
+    les points à moins d'un mètre environ sont valides. Une paire n'est
+    retenue que si ses points sont distants de moins de maxDistance.
+    Le recalage est refusé (match retourne None) :
+    * si les itérations n'ont pas convergé ;
+    * s'il repose sur moins de minMatches paires, ou sur moins de
+      minOverlap des points de la station (une station éloignée voit
+      surtout des murs encore inconnus) ;
+    * si l'écart quadratique moyen final dépasse maxError ;
+    * si le conditionnement du système normal est inférieur à
+      MIN_CONDITIONING (paires toutes appariées au même mur, par exemple :
+      la pose n'est pas contrainte le long du mur) ;
+    * si la correction dépasse MAX_TRANSLATION ou MAX_ROTATION.
+    Une telle correction relève d'un mauvais appariement plutôt que de la
+    dérive de l'estime : il vaut mieux conserver l'estime.
+    """
+    MAX_DISTANCE = 20.0
+    MAX_ITERATIONS = 20
+    MIN_MATCHES = 8
+    MIN_OVERLAP = 0.3
+    MAX_ERROR = 4.5
+    MIN_CONDITIONING = 0.03
+    NORMAL_RADIUS = 40.0
+    MIN_ALIGNMENT = 0.9
+    TRANSLATION_TOLERANCE = 0.5
+    ROTATION_TOLERANCE = math.radians(0.2)
+    MAX_TRANSLATION = 30.0
+    MAX_ROTATION = math.radians(15)
+
+    def __init__(self, surveyMap, maxDistance=MAX_DISTANCE, maxIterations=MAX_ITERATIONS,
+                 minMatches=MIN_MATCHES, minOverlap=MIN_OVERLAP, maxError=MAX_ERROR):
+        """
+        :param surveyMap: SurveyMap contenant les stations de référence.
+        :param maxDistance: Distance maximale entre deux points appariés.
+        :param maxIterations: Nombre maximal d'itérations.
+        :param minMatches: Nombre minimal de paires.
+        :param minOverlap: Part minimale des points de la station appariés.
+        :param maxError: Ecart quadratique moyen maximal des paires en cm.
+        """
+        self.__map = surveyMap
+        self.__maxDistance = maxDistance
+        self.__maxIterations = maxIterations
+        self.__minMatches = minMatches
+        self.__minOverlap = minOverlap
+        self.__maxError = maxError
+
+    def match(self, node, reference=None):
+        """
+        Recalage d'une station sur la carte, ou sur une seule station de
+        la carte (détection d'une boucle, par exemple).
+
+        :param node: SurveyNode à recaler.
+        :param reference: SurveyNode de référence (toutes les stations de
+        la carte par défaut).
+        :return: ScanMatch ou None si le recalage n'est pas possible.
+        """
+        xs = []
+        ys = []
+        for iPoint in range(len(node)):
+            point = node[iPoint]
+            xs.append(point.X)
+            ys.append(point.Y)
+        if len(xs) < self.__minMatches:
+            return None
+        margin = ScanMatcher.MAX_TRANSLATION + self.__maxDistance
+        minX, minY = min(xs) - margin, min(ys) - margin
+        maxX, maxY = max(xs) + margin, max(ys) + margin
+        if reference is None:
+            candidates = self.__map.getPointsInBox(minX, minY, maxX, maxY)
+        else:
+            candidates = [reference[iPoint] for iPoint in range(len(reference))]
+        references = [point for point in candidates if point.parentNode is not node and
+                      minX <= point.X <= maxX and minY <= point.Y <= maxY]
+        if len(references) < self.__minMatches:
+            return None
+        index = SurveyGridIndex(self.__maxDistance)
+        for point in references:
+            index.insertPoint(point)
+        normals = [self.__normal(index, point) for point in references]
+        if numpy is not None:
+            nearest = self.__vectorNearest(references)
+        else:
+            nearest = self.__indexNearest(index, references)
+        result = self.__iterate(xs, ys, references, normals, nearest)
+        if result is None or not result.converged or result.error > self.__maxError or \
+                result.matches < self.__minOverlap * len(xs) or \
+                result.conditioning < ScanMatcher.MIN_CONDITIONING:
+            return None
+        x, y = result.transform(node.X, node.Y)
+        if math.hypot(x - node.X, y - node.Y) > ScanMatcher.MAX_TRANSLATION or \
+                abs(result.rotation) > ScanMatcher.MAX_ROTATION:
+            return None
+        return result
+
+    @staticmethod
+    def __normal(index, point):
+        """
+        :return: Vecteur normal unitaire de la droite locale au point de
+        référence, ou None si ses voisins ne sont pas alignés.
+        """
+        moments = LineMoments()
+        for neighbour in index.pointsInRadius(point.X, point.Y, ScanMatcher.NORMAL_RADIUS):
+            moments.add(neighbour.X, neighbour.Y)
+        if len(moments) < 3 or moments.alignment < ScanMatcher.MIN_ALIGNMENT:
+            return None
+        a, b, c = moments.line
+        return (a, b)
+
+    def __vectorNearest(self, references):
+        """
+        :return: Fonction d'appariement vectorisée : pour chaque point, rang
+        du plus proche point de référence et distance.
+        """
+        rxs = numpy.array([point.X for point in references])
+        rys = numpy.array([point.Y for point in references])
+
+        def nearest(xs, ys):
+            qxs = numpy.asarray(xs)
+            qys = numpy.asarray(ys)
+            d2 = (qxs[:, None] - rxs[None, :]) ** 2 + (qys[:, None] - rys[None, :]) ** 2
+            indices = numpy.argmin(d2, axis=1)
+            distances = numpy.sqrt(d2[numpy.arange(len(qxs)), indices])
+            return indices.tolist(), distances.tolist()
+        return nearest
+
+    def __indexNearest(self, index, references):
+        """
+        :return: Fonction d'appariement par l'index spatial : pour chaque
+        point, rang du plus proche point de référence et distance.
+        """
+        ranks = {id(point): rank for rank, point in enumerate(references)}
+        maxDistance = self.__maxDistance
+
+        def nearest(xs, ys):
+            indices = []
+            distances = []
+            for x, y in zip(xs, ys):
+                point = index.nearestPoint(x, y, maxDistance)
+                if point is None:
+                    indices.append(0)
+                    distances.append(math.inf)
+                else:
+                    indices.append(ranks[id(point)])
+                    distances.append(math.hypot(point.X - x, point.Y - y))
+            return indices, distances
+        return nearest
+
+    def __iterate(self, xs, ys, references, normals, nearest):
+        """
+        Itérations ICP.
+
+        A chaque itération, la transformation incrémentale (rotation autour
+        du centre des points appariés, puis translation) est obtenue par
+        moindres carrés linéarisés sur les écarts des paires (système
+        normal 3x3), puis composée avec la transformation cumulée.
+        """
+        rotation = 0.0
+        tx = ty = 0.0
+        error = 0.0
+        matches = 0
+        conditioning = 0.0
+        qxs = list(xs)
+        qys = list(ys)
+        iteration = 0
+        for iteration in range(1, self.__maxIterations + 1):
+            indices, distances = nearest(qxs, qys)
+            pairs = [i for i in range(len(qxs))
+                     if distances[i] <= self.__maxDistance and normals[indices[i]] is not None]
+            if len(pairs) < self.__minMatches:
+                if iteration == 1:
+                    return None
+                break
+            matches = len(pairs)
+            mx = sum(qxs[i] for i in pairs) / matches
+            my = sum(qys[i] for i in pairs) / matches
+            radius = math.sqrt(sum((qxs[i] - mx) ** 2 + (qys[i] - my) ** 2 for i in pairs) / matches)
+            h = [[0.0] * 3 for k in range(3)]
+            g = [0.0] * 3
+            squares = 0.0
+            for i in pairs:
+                reference = references[indices[i]]
+                ex = qxs[i] - reference.X
+                ey = qys[i] - reference.Y
+                px = -(qys[i] - my)
+                py = qxs[i] - mx
+                nx, ny = normals[indices[i]]
+                e = nx * ex + ny * ey
+                j = (nx * px + ny * py, nx, ny)
+                squares += e * e
+                for r in range(3):
+                    g[r] += j[r] * e
+                    for c in range(3):
+                        h[r][c] += j[r] * j[c]
+            error = math.sqrt(squares / matches)
+            conditioning = ScanMatcher.__conditioning(h, radius)
+            solution = ScanMatcher.__solve(h, [-v for v in g])
+            if solution is None:
+                break
+            dRotation, ux, uy = solution
+            c = math.cos(dRotation)
+            s = math.sin(dRotation)
+            dtx = mx - (c * mx - s * my) + ux
+            dty = my - (s * mx + c * my) + uy
+            qxs, qys = [c * x - s * y + dtx for x, y in zip(qxs, qys)], \
+                       [s * x + c * y + dty for x, y in zip(qxs, qys)]
+            rotation += dRotation
+            tx, ty = c * tx - s * ty + dtx, s * tx + c * ty + dty
+            if abs(dRotation) < ScanMatcher.ROTATION_TOLERANCE and \
+                    math.hypot(ux, uy) < ScanMatcher.TRANSLATION_TOLERANCE:
+                return ScanMatch(rotation, tx, ty, error, matches, iteration, True, conditioning)
+        return ScanMatch(rotation, tx, ty, error, matches, iteration, False, conditioning)
+
+    @staticmethod
+    def __conditioning(h, radius):
+        """
+        Conditionnement du système normal : la ligne et la colonne de la
+        rotation sont ramenées à l'échelle des translations (déplacement
+        d'un point à la distance radius du centre), puis les valeurs
+        propres de la matrice symétrique 3x3 sont calculées par la méthode
+        trigonométrique.
+
+        :return: Rapport de la plus petite à la plus grande valeur propre.
+        """
+        scale = (1.0 / radius if radius > 0 else 1.0, 1.0, 1.0)
+        m = [[h[r][c] * scale[r] * scale[c] for c in range(3)] for r in range(3)]
+        q = (m[0][0] + m[1][1] + m[2][2]) / 3.0
+        p1 = m[0][1] ** 2 + m[0][2] ** 2 + m[1][2] ** 2
+        p2 = sum((m[k][k] - q) ** 2 for k in range(3)) + 2.0 * p1
+        if p2 <= 0:
+            return 1.0 if q > 0 else 0.0
+        p = math.sqrt(p2 / 6.0)
+        b = [[(m[r][c] - (q if r == c else 0.0)) / p for c in range(3)] for r in range(3)]
+        det = b[0][0] * (b[1][1] * b[2][2] - b[1][2] * b[2][1]) - \
+            b[0][1] * (b[1][0] * b[2][2] - b[1][2] * b[2][0]) + \
+            b[0][2] * (b[1][0] * b[2][1] - b[1][1] * b[2][0])
+        phi = math.acos(max(-1.0, min(1.0, det / 2.0))) / 3.0
+        largest = q + 2.0 * p * math.cos(phi)
+        smallest = q + 2.0 * p * math.cos(phi + 2.0 * math.pi / 3.0)
+        return max(0.0, smallest) / largest if largest > 0 else 0.0
+
+    @staticmethod
+    def __solve(h, b):
+        """
+        Résolution d'un système linéaire 3x3 (pivot de Gauss partiel).
+
+        :return: Solution ou None si le système est singulier (paires
+        toutes appariées au même mur, par exemple).
+        """
+        m = [h[r][:] + [b[r]] for r in range(3)]
+        for k in range(3):
+            pivot = max(range(k, 3), key=lambda r: abs(m[r][k]))
+            if abs(m[pivot][k]) < 1e-9:
+                return None
+            m[k], m[pivot] = m[pivot], m[k]
+            for r in range(k + 1, 3):
+                f = m[r][k] / m[k][k]
+                for c in range(k, 4):
+                    m[r][c] -= f * m[k][c]
+        x = [0.0] * 3
+        for k in range(2, -1, -1):
+            x[k] = (m[k][3] - sum(m[k][c] * x[c] for c in range(k + 1, 3))) / m[k][k]
+        return x
@@ -11,9 +11,20 @@ Version : 1.0 - 05.2020
 """
 
 from abc import abstractmethod
+from array import array
 import math
 import sys
 
+from common_apl.errors import MethodError
+from survey_grid import OccupancyGrid
+from survey_index import SurveyGridIndex
+from survey_lines import LineExtractor, LineMoments
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # Les conversions par lots sont alors effectuées en Python.
+
 #
 #
 ##############################################################################
@@ -202,6 +213,179 @@ class SurveyPoint(SurveyBasePoint):
         return "({0},{1}) - [a={2}, d={3}, valid={4}]".format(self.X, self.Y, self.__angle, self.__dist, self.isValid)
 
 
+#
+#
+##############################################################################
+class SurveyPointView:
+    """
+    Cette classe est une vue légère sur un point stocké dans un objet
+    SurveyPointArray.
+
+    Elle expose les mêmes propriétés qu'un SurveyPoint, mais les valeurs
+    sont lues (et l'indicateur isValid écrit) directement dans les colonnes
+    du tableau. Une vue est créée à chaque accès et ne coûte que deux
+    références.
+    """
+    __slots__ = ("_columns", "_index")
+
+    def __init__(self, columns, index):
+        """
+        Initialisation de la vue.
+
+        :param columns: SurveyPointArray contenant le point.
+        :param index: Rang du point dans le tableau.
+        """
+        self._columns = columns
+        self._index = index
+
+    @property
+    def containerMap(self):
+        return self._columns.parentNode.containerMap
+
+    @property
+    def parentNode(self):
+        return self._columns.parentNode
+
+    @property
+    def X(self):
+        return self._columns.xs[self._index]
+
+    @property
+    def Y(self):
+        return self._columns.ys[self._index]
+
+    @property
+    def position(self):
+        return (self.X, self.Y)
+
+    @property
+    def rawAngle(self):
+        return self._columns.angles[self._index]
+
+    @property
+    def rawDistance(self):
+        return self._columns.distances[self._index]
+
+    @property
+    def isValid(self):
+        return self._columns.valids[self._index] != 0
+
+    @isValid.setter
+    def isValid(self, value):
+        self._columns.valids[self._index] = 1 if value else 0
+
+    def __str__(self):
+        return "({0},{1}) - [a={2}, d={3}, valid={4}]".format(
+            self.X, self.Y, self.rawAngle, self.rawDistance, self.isValid)
+
+
+#
+#
+##############################################################################
+class SurveyPointArray:
+    """
+    Cette classe est une représentation compacte des points d'un tour
+    d'horizon.
+
+    Au lieu d'un objet SurveyPoint par mesure, les données sont rangées
+    dans des colonnes parallèles (array) : angle, distance, abscisse,
+    ordonnée et validité. Le tableau est exposé comme une séquence de
+    SurveyPointView.
+    """
+    def __init__(self, surveyNode):
+        """
+        Initialisation du tableau.
+
+        :param surveyNode: Tour d'horizon auquel appartiennent les points.
+        """
+        self.__node = surveyNode
+        self.angles = array('d')
+        self.distances = array('d')
+        self.xs = array('d')
+        self.ys = array('d')
+        self.valids = array('b')
+
+    @property
+    def parentNode(self):
+        return self.__node
+
+    def __len__(self):
+        return len(self.xs)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [SurveyPointView(self, index) for index in range(*key.indices(len(self.xs)))]
+        if key < 0:
+            key += len(self.xs)
+        if key < 0 or key >= len(self.xs):
+            raise IndexError("SurveyPointArray index out of range")
+        return SurveyPointView(self, key)
+
+    def append(self, angle, distance, x, y, isValid=False):
+        """
+        Ajout d'un point à la fin du tableau.
+
+        :param angle: Angle en degré dans le référentiel du robot.
+        :param distance: distance du point avec la station.
+        :param x: Abscisse du point.
+        :param y: Ordonnée du Point.
+        :param isValid: Validité du point.
+        :return: Vue sur le point ajouté.
+        """
+        self.angles.append(angle)
+        self.distances.append(distance)
+        self.xs.append(x)
+        self.ys.append(y)
+        self.valids.append(1 if isValid else 0)
+        return SurveyPointView(self, len(self.xs) - 1)
+
+    def extend(self, angles, distances, xs, ys, valids):
+        """
+        Ajout d'un lot de points à la fin du tableau.
+
+        :param angles: Angles en degré dans le référentiel du robot.
+        :param distances: Distances des points avec la station.
+        :param xs: Abscisses des points.
+        :param ys: Ordonnées des points.
+        :param valids: Validités des points.
+        """
+        self.angles.extend(angles)
+        self.distances.extend(distances)
+        self.xs.extend(xs)
+        self.ys.extend(ys)
+        self.valids.extend(1 if valid else 0 for valid in valids)
+
+
+#
+#
+##############################################################################
+class WallEnd:
+    """
+    Cette classe modélise une extrémité de mur : un simple couple de
+    coordonnées, sans les données brutes d'un SurveyPoint.
+    """
+    __slots__ = ("_x", "_y")
+
+    def __init__(self, x, y):
+        self._x = x
+        self._y = y
+
+    @property
+    def X(self):
+        return self._x
+
+    @property
+    def Y(self):
+        return self._y
+
+    @property
+    def position(self):
+        return (self._x, self._y)
+
+    def __str__(self):
+        return "WallEnd(x={0}, y={1})".format(self._x, self._y)
+
+
 #
 #
 ##############################################################################
@@ -211,15 +395,25 @@ class Wall(SurveyObject):
     station.
 
     Un mur est constitué d'une collection de points successifs dont l'écart
-    ne dépasse pas un seuil déterminé.
+    ne dépasse pas un seuil déterminé et qui sont alignés (voir
+    survey_lines.LineExtractor).
     """
-    def __init__(self, surveyNode, points):
+    def __init__(self, surveyNode, points, moments=None):
         """
         Initialisation du Wall.
         :param surveyNode: Sation de laquelle dépend le mur.
+        :param points: Points du mur.
+        :param moments: LineMoments des points, calculés à partir des
+        points s'ils ne sont pas fournis.
         """
         super().__init__(surveyNode._map)
+        self.__node = surveyNode
         self.__points = points
+        if moments is None:
+            moments = LineMoments()
+            for point in points:
+                moments.add(point.X, point.Y)
+        self.__moments = moments
         self.__isLeftWall = False
         self.__isFrontWall = False
         self.__isRightWall = False
@@ -227,28 +421,18 @@ class Wall(SurveyObject):
 
     def __computeWall(self):
         """
-        Calcul des éléments géométrique du mur à partir du tableau de points.
-        L'alignement des points n'étant pas avéré du fait des imprécisions de
-        mesure, un droite est calculée selon la loi des moindres carrés.
+        Calcul des éléments géométrique du mur à partir des moments des
+        points. L'alignement des points n'étant pas avéré du fait des
+        imprécisions de mesure, la droite est celle des moindres carrés
+        totaux (axe principal du nuage de points).
         A l'issus du calcul, la class Wall est en mesure d'exposer :
         * Les coéficients A et B de la droite Ax + By = C
         * Les point P1 et P2 correspondant aux extrémitésdu segment
-        * Un coéfficient Q exprimant la corrélation de la droite.
+        * Un coéfficient Q exprimant l'alignement des points.
         """
-        Sx = 0.0
-        Sy = 0.0
-        Sxx = 0.0
-        Syy = 0.0
-        Sxy = 0.0
         countLeftPoints = 0
         countRightPoints = 0
-        for iPoint in range (len(self.__points)):
-            point = self.__points[iPoint]
-            Sx += point.X
-            Sy += point.Y
-            Sxx += point.X * point.X
-            Syy += point.Y * point.Y
-            Sxy += point.X * point.Y
+        for point in self.__points:
             if point.rawAngle < 0:
                 countLeftPoints += 1
             if point.rawAngle > 0:
@@ -259,32 +443,23 @@ class Wall(SurveyObject):
             self.__isLeftWall = True
         else:
             self.__isFrontWall = True
-        # Calcul des moyennes pour Xi et Yi
-        Mx = Sx / len(self.__points)
-        My = Sy / len(self.__points)
-        # Calcul des variances pour Xi et Yi
-        Vx = Sxx / len(self.__points) - Mx * Mx
-        Vy = Syy / len(self.__points) - My * My
-        # Calculde la covariance de Xi & Yi
-        Cxy = Sxy /len(self.__points) - Mx * My
+        self.__A, self.__B, self.__C = self.__moments.line
+        self.__Q = self.__moments.alignment
         point1 = self.__points[0]
         point2 = self.__points[len(self.__points) - 1]
-        if (Vx > Vy):
-            self.__A = Cxy / Vx
-            self.__B = -1.0
-            self.__C = self.__A * Mx - My
-            self.__pt1 = SurveyPoint(point1.parentNode, point1.rawAngle, point1.rawDistance, point1.X, self.__A * point1.X - self.__C)
-            self.__pt2 = SurveyPoint(point2.parentNode, point2.rawAngle, point2.rawDistance, point2.X, self.__A * point2.X - self.__C)
-        else:
-            self.__A = -1.0
-            self.__B = Cxy / Vy
-            self.__C = self.__B * My - Mx
-            self.__pt1 = SurveyPoint(point1.parentNode, point1.rawAngle, point1.rawDistance, self.__B * point1.Y - self.__C, point1.Y)
-            self.__pt2 = SurveyPoint(point2.parentNode, point2.rawAngle, point2.rawDistance, self.__B * point2.Y - self.__C, point2.Y)
-        self.__Q = abs(Cxy / (math.sqrt(Vx) * math.sqrt(Vy)))
-        dx = self.__pt2.X - self.__pt1.X
-        dy = self.__pt2.Y - self.__pt1.Y
-        self.__orientation = Angle(radians=math.atan2(dx, dy))
+        x1, y1 = self.__moments.project(point1.X, point1.Y)
+        x2, y2 = self.__moments.project(point2.X, point2.Y)
+        self.__pt1 = WallEnd(x1, y1)
+        self.__pt2 = WallEnd(x2, y2)
+        self.__orientation = Angle(radians=math.atan2(x2 - x1, y2 - y1))
+
+    @property
+    def parentNode(self):
+        return self.__node
+
+    @property
+    def moments(self):
+        return self.__moments
 
     @property
     def Pt1(self):
@@ -332,6 +507,20 @@ class Wall(SurveyObject):
     def __getitem__(self, key):
         return self.__points[key]
 
+    @staticmethod
+    def alignment(xs, ys):
+        """
+        Calcule le coefficient d'alignement d'un nuage de points (voir Q).
+
+        :param xs: Abscisses des points.
+        :param ys: Ordonnées des points.
+        :return: Coefficient d'alignement entre 0 et 1.
+        """
+        moments = LineMoments()
+        for i in range(len(xs)):
+            moments.add(xs[i], ys[i])
+        return moments.alignment
+
     def distanceFrom(self, point):
         """
         Calcule la distance du point passé en paramètre au mur.
@@ -339,7 +528,156 @@ class Wall(SurveyObject):
         :param point: Point dont il faut calculer la distance.
         :return: Distance du point par rapport au mur.
         """
-        return math.fabs(self.A * point.X + self.B * point.Y + self.C) / (math.sqrt(self.A * self.A + self.B * self.B))
+        return math.fabs(self.A * point.X + self.B * point.Y - self.C)
+
+
+#
+#
+##############################################################################
+class MapWall(SurveyObject):
+    """
+    Cette classe modélise un mur de la carte : la fusion des murs relevés
+    par les différentes stations qui correspondent au même mur physique.
+
+    La droite du mur est calculée à partir des moments fusionnés de tous
+    les points des murs fusionnés. Les extrémités sont les projections
+    extrêmes des extrémités de ces murs sur la droite.
+
+    Deux murs sont fusionnés s'ils sont presque parallèles (écart angulaire
+    inférieur à MERGE_ANGLE), si les extrémités de l'un sont à moins de
+    MERGE_DISTANCE de la droite de l'autre et s'ils se recouvrent ou ne sont
+    séparés que de MERGE_GAP au plus.
+    """
+    MERGE_ANGLE = 10
+    MERGE_DISTANCE = 8
+    MERGE_GAP = 15
+
+    def __init__(self, surveyMap, wall):
+        """
+        Initialisation du MapWall à partir d'un mur de station.
+
+        :param surveyMap: SurveyMap à laquelle appartient le mur.
+        :param wall: Wall relevé par une station.
+        """
+        super().__init__(surveyMap)
+        self.__moments = wall.moments.copy()
+        self.__walls = [wall]
+        self.__computeWall((wall.Pt1, wall.Pt2))
+
+    def __computeWall(self, ends):
+        """
+        Calcul de la droite et des extrémités du mur.
+        :param ends: Extrémités candidates (objets exposant X et Y).
+        """
+        self.__A, self.__B, self.__C = self.__moments.line
+        ux, uy = self.__moments.direction
+        mx, my = self.__moments.mean
+        ts = [(end.X - mx) * ux + (end.Y - my) * uy for end in ends]
+        t1 = min(ts)
+        t2 = max(ts)
+        self.__pt1 = WallEnd(mx + t1 * ux, my + t1 * uy)
+        self.__pt2 = WallEnd(mx + t2 * ux, my + t2 * uy)
+
+    @property
+    def Pt1(self):
+        return self.__pt1
+
+    @property
+    def Pt2(self):
+        return self.__pt2
+
+    @property
+    def A(self):
+        return self.__A
+
+    @property
+    def B(self):
+        return self.__B
+
+    @property
+    def C(self):
+        return self.__C
+
+    @property
+    def Q(self):
+        return self.__moments.alignment
+
+    @property
+    def moments(self):
+        return self.__moments
+
+    @property
+    def walls(self):
+        """
+        :return: Liste des murs de station fusionnés dans ce mur.
+        """
+        return self.__walls
+
+    @property
+    def length(self):
+        return math.hypot(self.__pt2.X - self.__pt1.X, self.__pt2.Y - self.__pt1.Y)
+
+    @property
+    def orientation(self):
+        return Angle(radians=math.atan2(self.__pt2.X - self.__pt1.X, self.__pt2.Y - self.__pt1.Y))
+
+    @property
+    def isLeftWall(self):
+        """
+        :return: Position du mur pour la dernière station qui l'a relevé.
+        """
+        return self.__walls[-1].isLeftWall
+
+    @property
+    def isFrontWall(self):
+        return self.__walls[-1].isFrontWall
+
+    @property
+    def isRightWall(self):
+        return self.__walls[-1].isRightWall
+
+    def __len__(self):
+        return len(self.__moments)
+
+    def distanceFrom(self, point):
+        """
+        Calcule la distance du point passé en paramètre à la droite du mur.
+        """
+        return math.fabs(self.__A * point.X + self.__B * point.Y - self.__C)
+
+    def canMerge(self, other):
+        """
+        :param other: MapWall candidat à la fusion.
+        :return: Vrai si les deux murs correspondent au même mur physique.
+        """
+        ux, uy = self.__moments.direction
+        vx, vy = other.moments.direction
+        if abs(ux * vy - uy * vx) > math.sin(math.radians(MapWall.MERGE_ANGLE)):
+            return False
+        for end in (other.Pt1, other.Pt2):
+            if self.distanceFrom(end) > MapWall.MERGE_DISTANCE:
+                return False
+        for end in (self.__pt1, self.__pt2):
+            if other.distanceFrom(end) > MapWall.MERGE_DISTANCE:
+                return False
+        mx, my = self.__moments.mean
+        a1 = (self.__pt1.X - mx) * ux + (self.__pt1.Y - my) * uy
+        a2 = (self.__pt2.X - mx) * ux + (self.__pt2.Y - my) * uy
+        b1 = (other.Pt1.X - mx) * ux + (other.Pt1.Y - my) * uy
+        b2 = (other.Pt2.X - mx) * ux + (other.Pt2.Y - my) * uy
+        gap = max(min(b1, b2) - max(a1, a2), min(a1, a2) - max(b1, b2))
+        return gap <= MapWall.MERGE_GAP
+
+    def merge(self, other):
+        """
+        Fusion d'un autre MapWall dans ce mur.
+
+        :param other: MapWall à fusionner.
+        """
+        ends = (self.__pt1, self.__pt2, other.Pt1, other.Pt2)
+        self.__moments.merge(other.moments)
+        self.__walls.extend(other.walls)
+        self.__computeWall(ends)
 
 
 #
@@ -363,10 +701,12 @@ class SurveyNode(SurveyBasePoint):
     Le SurveyNode est exposé comme un tableau de SurveyPoint. Il est donc
     possible d'utiliser l'opérateur [] pour obtenir le point d'un rang
     donné.
+    En mode compact, les points sont rangés dans un SurveyPointArray et
+    l'opérateur [] retourne des SurveyPointView.
     """
     THRESHOLD = 15
 
-    def __init__(self, map, x, y, orientation, offset):
+    def __init__(self, map, x, y, orientation, offset, compact=None):
         """
         Initialisation d'un SurveyNode.
 
@@ -375,11 +715,17 @@ class SurveyNode(SurveyBasePoint):
         :param y: Ordonnée du Point.
         :param orientation: Orientation du tour d'horizon (en degrés).
         :param offset: Tuple exprimant le décalage du centre du tour d'horizon.
+        :param compact: Si vrai, les points sont stockés en colonnes. Par
+        défaut, c'est le mode de la Map qui est utilisé.
         """
         super().__init__(map, x, y)
         self.__orientation = Angle(orientation.radians)
-        self.__points = []
+        if compact is None:
+            compact = map.compact
+        self.__points = SurveyPointArray(self) if compact else []
         self.__walls = []
+        self.__extractor = LineExtractor(self.__publishWall, self.__retractWall, SurveyNode.THRESHOLD)
+        self.__outOfRange = []
         self.__offset = offset
         self.__correction = (
             offset[0] * self.__orientation.cos + offset[1] * self.__orientation.sin,
@@ -397,14 +743,41 @@ class SurveyNode(SurveyBasePoint):
     def offset(self):
         return self.__offset
 
+    @property
+    def sensorOrigin(self):
+        """
+        :return: Position (x, y) du centre du tour d'horizon, corrigée du
+        décalage offset, d'où sont issues les mesures.
+        """
+        return (self._x + self.__correction[0], self._y + self.__correction[1])
+
     @property
     def lastPoint(self):
         return self.__lastPoint
 
+    @property
+    def isCompact(self):
+        return isinstance(self.__points, SurveyPointArray)
+
+    @property
+    def columns(self):
+        """
+        :return: SurveyPointArray des points en mode compact, None sinon.
+        """
+        return self.__points if self.isCompact else None
+
     @property
     def walls(self):
         return self.__walls
 
+    @property
+    def outOfRangeAngles(self):
+        """
+        :return: Liste des angles (dans le référentiel du robot) des mesures
+        hors de portée.
+        """
+        return self.__outOfRange
+
     @property
     def hasLeftWall(self):
         return self.__leftWall is not None
@@ -439,12 +812,24 @@ class SurveyNode(SurveyBasePoint):
         """
         Ajout d'un point dans le tour d'horizon.
         Le point passé en paramètre doit êter instancié auparavant.
+        En mode compact, ses données sont recopiées dans les colonnes.
         :param point: Point à ajouter.
         """
-        self.__points.append(point)
+        if self.isCompact:
+            point = self.__points.append(point.rawAngle, point.rawDistance, point.X, point.Y, point.isValid)
+        else:
+            self.__points.append(point)
+        self.__registerPoint(point)
+
+    def __registerPoint(self, point):
+        """
+        Prise en compte d'un point ajouté dans le tour d'horizon.
+        :param point: Point ajouté.
+        """
         self._map.updateSize(point.X, point.Y)
         self.validatePoint(point)
         self.__lastPoint = point
+        self.__extractor.add(point)
 
     def addPolarPoint(self, angle, distance):
         """
@@ -456,7 +841,102 @@ class SurveyNode(SurveyBasePoint):
         rAngle = Angle(degrees=angle) + self.__orientation
         x = self._x + distance * rAngle.sin + self.__correction[0]
         y = self._y + distance * rAngle.cos + self.__correction[1]
-        self.addPoint(SurveyPoint(self, angle, distance, x, y))
+        if self.isCompact:
+            self.__registerPoint(self.__points.append(angle, distance, x, y))
+        else:
+            self.addPoint(SurveyPoint(self, angle, distance, x, y))
+
+    def addOutOfRange(self, angle):
+        """
+        Mémorise la direction d'une mesure hors de portée.
+        Aucun point n'est créé : la direction n'est utilisée que pour
+        marquer l'espace libre dans la grille d'occupation. Elle n'est pas
+        enregistrée dans le document XML.
+        :param angle: Angle en degré dans le référentiel du robot.
+        """
+        self.__outOfRange.append(angle)
+
+    def addPolarPoints(self, angles, distances):
+        """
+        Ajout d'un lot de points dans le tour d'horizon.
+
+        Les coordonnées polaires de tout un tour d'horizon sont converties
+        en une seule passe (vectorisée avec numpy s'il est disponible). La
+        validation des points et la mise à jour des dimensions de la Map
+        sont également effectuées en bloc. Le résultat est identique à
+        celui d'appels successifs à addPolarPoint.
+
+        :param angles: Séquence d'angles en degré dans le référentiel du robot.
+        :param distances: Séquence de distances avec le centre du tour d'horizon.
+        """
+        count = len(angles)
+        if count != len(distances):
+            raise MethodError(self, "addPolarPoints", angles, distances)
+        if count == 0:
+            return
+        x0 = self._x + self.__correction[0]
+        y0 = self._y + self.__correction[1]
+        orientation = self.__orientation.radians
+        if numpy is not None:
+            rAngles = numpy.radians(numpy.asarray(angles, dtype=float)) + orientation
+            rDistances = numpy.asarray(distances, dtype=float)
+            vxs = x0 + rDistances * numpy.sin(rAngles)
+            vys = y0 + rDistances * numpy.cos(rAngles)
+            vclose = numpy.hypot(numpy.diff(vxs), numpy.diff(vys)) < SurveyNode.THRESHOLD
+            xs = vxs.tolist()
+            ys = vys.tolist()
+            close = [False] + vclose.tolist()
+        else:
+            sin = math.sin
+            cos = math.cos
+            rad = math.pi / 180.0
+            xs = [x0 + d * sin(a * rad + orientation) for a, d in zip(angles, distances)]
+            ys = [y0 + d * cos(a * rad + orientation) for a, d in zip(angles, distances)]
+            close = [False] + [math.hypot(xs[i] - xs[i - 1], ys[i] - ys[i - 1]) < SurveyNode.THRESHOLD
+                               for i in range(1, count)]
+        if self.__lastPoint is not None:
+            close[0] = math.hypot(xs[0] - self.__lastPoint.X, ys[0] - self.__lastPoint.Y) < SurveyNode.THRESHOLD
+            if close[0]:
+                self.__lastPoint.isValid = True
+        valids = [close[i] or (i + 1 < count and close[i + 1]) for i in range(count)]
+        self._map.updateSize(min(xs), min(ys))
+        self._map.updateSize(max(xs), max(ys))
+        first = len(self.__points)
+        if self.isCompact:
+            self.__points.extend(angles, distances, xs, ys, valids)
+        else:
+            for i in range(count):
+                point = SurveyPoint(self, angles[i], distances[i], xs[i], ys[i])
+                point.isValid = valids[i]
+                self.__points.append(point)
+        for i in range(first, len(self.__points)):
+            self.__extractor.add(self.__points[i])
+        self.__lastPoint = self.__points[len(self.__points) - 1]
+
+    def relocated(self, x, y, orientation):
+        """
+        Reconstruit la station à une autre position (pose corrigée).
+
+        Les coordonnées d'un point ne sont jamais modifiées : une nouvelle
+        station est créée et les mesures brutes (angles et distances) y sont
+        rejouées. Les points, leur validité et les murs sont donc recalculés
+        dans la nouvelle pose.
+
+        :param x: Abscisse de la station.
+        :param y: Ordonnée de la station.
+        :param orientation: Orientation (Angle) du tour d'horizon.
+        :return: Nouveau SurveyNode (non ajouté à la Map).
+        """
+        node = SurveyNode(self._map, x, y, orientation, self.__offset, self.isCompact)
+        if self.isCompact:
+            node.addPolarPoints(self.__points.angles, self.__points.distances)
+        else:
+            node.addPolarPoints([point.rawAngle for point in self.__points],
+                                [point.rawDistance for point in self.__points])
+        for angle in self.__outOfRange:
+            node.addOutOfRange(angle)
+        node.computeWallData()
+        return node
 
     def validatePoint(self, point):
         """
@@ -488,6 +968,11 @@ class SurveyNode(SurveyBasePoint):
         """
         :return: Point le plus proche de la station
         """
+        if self.isCompact:
+            distances = self.__points.distances
+            if len(distances) == 0:
+                return None
+            return self.__points[distances.index(min(distances))]
         dist = 0
         point = None
         for iPoint in range(len(self.__points)):
@@ -499,47 +984,43 @@ class SurveyNode(SurveyBasePoint):
 
     def computeWallData(self):
         """
-        Calcule les coéficients d'équation d'éventuels murs relevés par la
-        station.
+        Termine le calcul des murs relevés par la station.
 
-        Un mur est la droite de corrélation entre une suite non interrompue
-        de points valides trouvés dans une station.
+        Les murs sont extraits au fil de l'ajout des points (voir
+        survey_lines.LineExtractor) : un mur est publié dans la liste walls
+        dès que la suite de points alignés qui le constitue est terminée.
+        Cette méthode publie le dernier mur en cours, à la fin du tour
+        d'horizon.
         """
-        wallPoints = None
-        for iPoint in range(len(self.__points)):
-            point = self.__points[iPoint]
-            if point.isValid:
-                if wallPoints is None:
-                    wallPoints = []
-                    wallPoints.append(point)
-                else:
-                    lastPoint = wallPoints[len(wallPoints) - 1]
-                    dx = point.X - lastPoint.X
-                    dy = point.Y - lastPoint.Y
-                    dist = math.sqrt(dx * dx + dy * dy)
-                    if dist < SurveyNode.THRESHOLD:
-                        wallPoints.append(point)
-                    else:
-                        self.__addWall(wallPoints)
-                        wallPoints = []
-                        wallPoints.append(point)
-            else:
-                if wallPoints is not None:
-                    self.__addWall(wallPoints)
-                    wallPoints = None
-        if wallPoints is not None:
-            self.__addWall(wallPoints)
-
-    def __addWall(self, wallPoints):
+        self.__extractor.finish()
+
+    def __publishWall(self, wallPoints, moments):
         """
         Ajoute un nouveau mur dans le tour d'horizon.
-        Pour qu cela soit possible, il faut que le tableau de points
-        passé en paramètre contienne au moins trois SurveyPoints.
-        :param wallPoints: Tableau de SurveyPoint.
+        :param wallPoints: Tableau de SurveyPoint (au moins trois).
+        :param moments: LineMoments des points.
+        :return: Mur ajouté.
+        """
+        wall = Wall(self, wallPoints, moments)
+        self.__walls.append(wall)
+        if wall.isLeftWall:
+            self.__leftWall = wall
+        if wall.isFrontWall:
+            self.__frontWall = wall
+        if wall.isRightWall:
+            self.__rightWall = wall
+        return wall
+
+    def __retractWall(self, wall):
         """
-        if wallPoints != None and len(wallPoints) > 2:
-            wall = Wall(self, wallPoints)
-            self.__walls.append(wall)
+        Retire un mur remplacé par la fusion de deux murs alignés.
+        :param wall: Mur à retirer.
+        """
+        self.__walls.remove(wall)
+        self.__leftWall = None
+        self.__frontWall = None
+        self.__rightWall = None
+        for wall in self.__walls:
             if wall.isLeftWall:
                 self.__leftWall = wall
             if wall.isFrontWall:
@@ -576,13 +1057,80 @@ class SurveyMap(SurveyObject):
     possible d'utiliser l'opérateur [] pour obtenir la station d'un rang
     donné.
     """
-    def __init__(self):
+    def __init__(self, compact=False, indexCellSize=SurveyGridIndex.DEFAULT_CELL_SIZE,
+                 gridCellSize=OccupancyGrid.DEFAULT_CELL_SIZE):
+        """
+        Initialisation d'une SurveyMap.
+
+        :param compact: Si vrai, les points des stations sont stockés par
+        défaut en colonnes (voir SurveyPointArray).
+        :param indexCellSize: Côté des cellules de l'index spatial en cm.
+        :param gridCellSize: Côté des cellules de la grille d'occupation en cm.
+        """
         super().__init__(self)
+        self.__compact = compact
         self.__nodes = []
+        self.__index = SurveyGridIndex(indexCellSize)
+        self.__grid = OccupancyGrid(gridCellSize)
+        self.__walls = {}
         self.__minX = None
         self.__maxX = None
         self.__minY = None
         self.__maxY = None
+        self.__version = 0
+        self.__revision = 0
+        self.__listeners = []
+        self.__addedWalls = {}
+        self.__removedWalls = set()
+
+    @property
+    def compact(self):
+        return self.__compact
+
+    @property
+    def version(self):
+        """
+        :return: Compteur incrémenté à chaque modification de la carte
+        (station ajoutée ou stations déplacées).
+        """
+        return self.__version
+
+    @property
+    def revision(self):
+        """
+        :return: Compteur incrémenté au début et à la fin de chaque
+        modification de la carte : il est impair pendant une modification.
+        Une lecture de la carte par un autre thread est cohérente si
+        revision est pair et inchangé à son début et à sa fin.
+        """
+        return self.__revision
+
+    def addChangeListener(self, listener):
+        """
+        Abonnement aux modifications de la carte.
+        Après chaque station ajoutée ou chaque groupe de stations
+        déplacées, le listener est invoqué avec la liste des rangs des
+        stations concernées, la liste des MapWall créés ou modifiés et la
+        liste des identifiants (id) des MapWall supprimés.
+
+        :param listener: Fonction à trois paramètres.
+        """
+        self.__listeners.append(listener)
+
+    @property
+    def index(self):
+        return self.__index
+
+    @property
+    def grid(self):
+        return self.__grid
+
+    @property
+    def walls(self):
+        """
+        :return: Liste des murs de la carte (MapWall), sans doublon.
+        """
+        return list(self.__walls.values())
 
     @property
     def minX(self):
@@ -616,6 +1164,7 @@ class SurveyMap(SurveyObject):
             self.__minY = y
         if self.__maxY == None or y > self.__maxY:
             self.__maxY = y
+        self.__grid.ensure(x, y)
 
     def addNode(self, node):
         """
@@ -623,8 +1172,149 @@ class SurveyMap(SurveyObject):
 
         :param node: SurveyNode à ajouter.
         """
-        self.__nodes.append(node)
-        self.updateSize(node.X, node.Y)
+        self.__revision += 1
+        try:
+            self.__nodes.append(node)
+            self.updateSize(node.X, node.Y)
+            for iPoint in range(len(node)):
+                self.__index.insertPoint(node[iPoint])
+            for wall in node.walls:
+                self.__mergeWall(wall)
+            self.__grid.integrateNode(node)
+        finally:
+            self.__endChange()
+        self.__notify([len(self.__nodes) - 1])
+
+    def relocateNodes(self, poses):
+        """
+        Déplacement de stations de la carte (après optimisation du graphe
+        des poses, par exemple).
+
+        Seules les stations déplacées sont reconstruites (voir
+        SurveyNode.relocated) et réindexées. Seuls les murs de la carte
+        issus de ces stations sont recalculés : ils sont dissous, puis
+        leurs murs de station sont fusionnés à nouveau. La grille
+        d'occupation, dont les log-odds sont bornés, est reconstruite.
+
+        :param poses: Dictionnaire rang -> (x, y, orientation) des stations
+        à déplacer.
+        :return: Liste des SurveyNode reconstruits.
+        """
+        if len(poses) == 0:
+            return []
+        self.__revision += 1
+        try:
+            moved = {}
+            for rank in sorted(poses):
+                x, y, orientation = poses[rank]
+                old = self.__nodes[rank]
+                node = old.relocated(x, y, orientation)
+                self.__index.removePoints(old)
+                for iPoint in range(len(node)):
+                    self.__index.insertPoint(node[iPoint])
+                self.__nodes[rank] = node
+                moved[id(old)] = node
+            walls = []
+            for mapWall in list(self.__walls.values()):
+                if any(id(wall.parentNode) in moved for wall in mapWall.walls):
+                    self.__index.removeWall(mapWall)
+                    del self.__walls[id(mapWall)]
+                    self.__removedWalls.add(id(mapWall))
+                    walls.extend(wall for wall in mapWall.walls if id(wall.parentNode) not in moved)
+            for node in moved.values():
+                walls.extend(node.walls)
+            for wall in walls:
+                self.__mergeWall(wall)
+            self.__grid.rebuild(self.__nodes)
+        finally:
+            self.__endChange()
+        self.__notify(sorted(poses))
+        return list(moved.values())
+
+    def __endChange(self):
+        """
+        Fin d'une modification de la carte : la version est incrémentée
+        avant que revision redevienne pair.
+        """
+        self.__version += 1
+        self.__revision += 1
+
+    def __notify(self, ranks):
+        """
+        Notification d'une modification de la carte à ses auditeurs.
+
+        :param ranks: Rangs des stations ajoutées ou déplacées.
+        """
+        walls = list(self.__addedWalls.values())
+        removed = list(self.__removedWalls)
+        self.__addedWalls = {}
+        self.__removedWalls = set()
+        for listener in self.__listeners:
+            listener(ranks, walls, removed)
+
+    def __mergeWall(self, wall):
+        """
+        Fusion d'un mur de station dans les murs de la carte.
+
+        Les murs de la carte candidats à la fusion sont recherchés avec
+        l'index spatial au voisinage du mur. Un mur qui relie deux murs
+        de la carte provoque leur fusion.
+
+        :param wall: Wall relevé par une station.
+        """
+        merged = MapWall(self, wall)
+        margin = MapWall.MERGE_GAP + MapWall.MERGE_DISTANCE
+        candidates = self.__index.wallsInBox(
+            min(wall.Pt1.X, wall.Pt2.X) - margin, min(wall.Pt1.Y, wall.Pt2.Y) - margin,
+            max(wall.Pt1.X, wall.Pt2.X) + margin, max(wall.Pt1.Y, wall.Pt2.Y) + margin)
+        for candidate in candidates:
+            if candidate.canMerge(merged):
+                self.__index.removeWall(candidate)
+                del self.__walls[id(candidate)]
+                self.__addedWalls.pop(id(candidate), None)
+                self.__removedWalls.add(id(candidate))
+                candidate.merge(merged)
+                merged = candidate
+        self.__walls[id(merged)] = merged
+        self.__index.insertWall(merged)
+        self.__addedWalls[id(merged)] = merged
+        self.__removedWalls.discard(id(merged))
+
+    def getPointsInBox(self, minX, minY, maxX, maxY):
+        """
+        :return: Liste des points de toutes les stations contenus dans le
+        rectangle.
+        """
+        return self.__index.pointsInBox(minX, minY, maxX, maxY)
+
+    def getWallsInBox(self, minX, minY, maxX, maxY):
+        """
+        :return: Liste des murs de la carte (MapWall) qui intersectent le
+        rectangle.
+        """
+        return self.__index.wallsInBox(minX, minY, maxX, maxY)
+
+    def getNearestPoint(self, x, y, maxRadius=None):
+        """
+        Recherche, parmi toutes les stations, du point le plus proche de (x, y).
+
+        :param x: Abscisse de la position.
+        :param y: Ordonnée de la position.
+        :param maxRadius: Distance maximale de recherche (illimitée par défaut).
+        :return: Point le plus proche ou None.
+        """
+        return self.__index.nearestPoint(x, y, maxRadius)
+
+    def getNearestWall(self, x, y, maxRadius=None):
+        """
+        Recherche, parmi les murs de la carte, du mur le plus proche de (x, y).
+
+        :param x: Abscisse de la position.
+        :param y: Ordonnée de la position.
+        :param maxRadius: Distance maximale de recherche (illimitée par défaut).
+        :return: MapWall le plus proche ou None.
+        """
+        return self.__index.nearestWall(x, y, maxRadius)
 
 
 #
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+"""
+Ce module définit le planificateur de trajectoire du robot explorer.
+
+Le planificateur recherche un chemin dans la grille d'occupation de la
+SurveyMap avec l'algorithme D* Lite (Koenig et Likhachev). Cet algorithme
+est incrémental : tant que la destination ne change pas, un nouveau départ
+ou une nouvelle station ne provoque que la mise à jour des cellules dont
+l'état a changé, au lieu d'une nouvelle recherche complète. Le robot en
+tire parti en replanifiant après chaque point de passage, depuis la
+position réellement atteinte.
+
+Auteur : André-Pierre LIMOUZIN
+Version : 1.0 - 10.2026
+"""
+
+from collections import deque
+import heapq
+import math
+
+from survey_grid import OccupancyGrid
+
+
+#
+#
+##############################################################################
+class DStarLitePlanner:
+    """
+    Cette classe modélise un planificateur D* Lite sur une OccupancyGrid.
+
+    Les cellules sont reliées à leurs huit voisines. Une cellule est
+    infranchissable si une cellule occupée se trouve à moins de
+    robotRadius, ou si elle est en dehors de la grille (agrandie de MARGIN
+    cellules). Les cellules inconnues sont considérées comme franchissables.
+
+    Le planificateur s'abonne aux mises à jour de la grille. Les cellules
+    dont l'état change sont mémorisées et ne sont prises en compte qu'au
+    prochain appel de plan().
+
+    Un départ ou une destination infranchissable (robot arrêté près d'un
+    mur, destination au bord d'un obstacle) est déplacé vers la cellule
+    franchissable la plus proche, à moins de RELOCATION_RADIUS.
+    """
+    ROBOT_RADIUS = 12
+    MARGIN = 10
+    RELOCATION_RADIUS = 30
+
+    def __init__(self, grid, robotRadius=ROBOT_RADIUS):
+        """
+        Initialisation du planificateur.
+
+        :param grid: OccupancyGrid dans laquelle les chemins sont recherchés.
+        :param robotRadius: Rayon du robot en cm, utilisé pour éloigner les
+        chemins des obstacles.
+        """
+        self.__grid = grid
+        self.__inflation = int(math.ceil(robotRadius / grid.cellSize))
+        self.__occupied = set()
+        self.__blocking = {}
+        self.__pending = set()
+        self.__goal = None
+        self.__bounds = None
+        self.__lastStart = None
+        self.__km = 0.0
+        self.__g = {}
+        self.__rhs = {}
+        self.__queue = []
+        self.__queued = {}
+        self.__expansions = 0
+        iMin, jMin, iMax, jMax = grid.bounds
+        self.__onGridChanged([(i, j) for i in range(iMin, iMax + 1) for j in range(jMin, jMax + 1)])
+        grid.addChangeListener(self.__onGridChanged)
+
+    @property
+    def expansions(self):
+        """
+        :return: Nombre de cellules développées lors du dernier appel de plan().
+        """
+        return self.__expansions
+
+    def __onGridChanged(self, changes):
+        """
+        Prise en compte des cellules modifiées par une station.
+        Seules les cellules dont l'état infranchissable change sont
+        mémorisées pour la prochaine planification.
+        """
+        radius = self.__inflation
+        for cell in changes:
+            occupied = self.__grid.cellState(cell[0], cell[1]) == OccupancyGrid.OCCUPIED
+            if occupied == (cell in self.__occupied):
+                continue
+            delta = 1 if occupied else -1
+            if occupied:
+                self.__occupied.add(cell)
+            else:
+                self.__occupied.discard(cell)
+            for di in range(-radius, radius + 1):
+                for dj in range(-radius, radius + 1):
+                    if di * di + dj * dj > radius * radius:
+                        continue
+                    key = (cell[0] + di, cell[1] + dj)
+                    count = self.__blocking.get(key, 0) + delta
+                    if count == 0:
+                        del self.__blocking[key]
+                        self.__pending.add(key)
+                    else:
+                        self.__blocking[key] = count
+                        if count == delta:
+                            self.__pending.add(key)
+
+    def isBlocked(self, cell):
+        """
+        :return: Vrai si la cellule est infranchissable.
+        """
+        if self.__bounds is not None:
+            iMin, jMin, iMax, jMax = self.__bounds
+            if not (iMin <= cell[0] <= iMax and jMin <= cell[1] <= jMax):
+                return True
+        return cell in self.__blocking
+
+    def nearestFreeCell(self, cell, maxDistance=RELOCATION_RADIUS):
+        """
+        Recherche de la cellule franchissable la plus proche d'une cellule.
+        Le parcours en largeur ne traverse que des cellules non occupées :
+        la cellule retenue n'est jamais de l'autre côté d'un mur.
+
+        :param cell: Indices (i, j) de la cellule.
+        :param maxDistance: Distance maximale de recherche en cm.
+        :return: La cellule elle-même si elle est franchissable, la cellule
+        franchissable la plus proche, ou None si aucune n'est à moins de
+        maxDistance.
+        """
+        if not self.isBlocked(cell):
+            return cell
+        limit = (maxDistance / self.__grid.cellSize) ** 2
+        visited = {cell}
+        cells = deque([cell])
+        while len(cells) > 0:
+            i, j = cells.popleft()
+            for neighbor in ((i + 1, j), (i - 1, j), (i, j + 1), (i, j - 1)):
+                if neighbor in visited or \
+                        (neighbor[0] - cell[0]) ** 2 + (neighbor[1] - cell[1]) ** 2 > limit:
+                    continue
+                visited.add(neighbor)
+                if self.__grid.cellState(neighbor[0], neighbor[1]) == OccupancyGrid.OCCUPIED:
+                    continue
+                if not self.isBlocked(neighbor):
+                    return neighbor
+                cells.append(neighbor)
+        return None
+
+    def __heuristic(self, a, b):
+        """
+        Distance octogonale entre deux cellules (en cm).
+        """
+        di = abs(a[0] - b[0])
+        dj = abs(a[1] - b[1])
+        return (max(di, dj) + (math.sqrt(2.0) - 1.0) * min(di, dj)) * self.__grid.cellSize
+
+    def __neighbors(self, cell):
+        """
+        Enumère les cellules voisines avec le coût du déplacement.
+        """
+        blocked = self.isBlocked(cell)
+        size = self.__grid.cellSize
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                if di == 0 and dj == 0:
+                    continue
+                neighbor = (cell[0] + di, cell[1] + dj)
+                if blocked or self.isBlocked(neighbor):
+                    cost = math.inf
+                elif di != 0 and dj != 0:
+                    cost = size * math.sqrt(2.0)
+                else:
+                    cost = size
+                yield neighbor, cost
+
+    def __key(self, cell):
+        value = min(self.__g.get(cell, math.inf), self.__rhs.get(cell, math.inf))
+        return (value + self.__heuristic(self.__lastStart, cell) + self.__km, value)
+
+    def __push(self, cell):
+        key = self.__key(cell)
+        self.__queued[cell] = key
+        heapq.heappush(self.__queue, (key, cell))
+
+    def __topKey(self):
+        """
+        :return: Plus petite clé de la file (les entrées périmées sont supprimées).
+        """
+        while len(self.__queue) > 0:
+            key, cell = self.__queue[0]
+            if self.__queued.get(cell) == key:
+                return key
+            heapq.heappop(self.__queue)
+        return (math.inf, math.inf)
+
+    def __updateVertex(self, cell):
+        if cell != self.__goal:
+            rhs = math.inf
+            for neighbor, cost in self.__neighbors(cell):
+                rhs = min(rhs, cost + self.__g.get(neighbor, math.inf))
+            self.__rhs[cell] = rhs
+        self.__queued.pop(cell, None)
+        if self.__g.get(cell, math.inf) != self.__rhs.get(cell, math.inf):
+            self.__push(cell)
+
+    def __computeShortestPath(self, start):
+        while True:
+            topKey = self.__topKey()
+            g = self.__g.get(start, math.inf)
+            rhs = self.__rhs.get(start, math.inf)
+            if not (topKey < self.__key(start) or rhs != g):
+                return
+            if topKey == (math.inf, math.inf):
+                return
+            key, cell = heapq.heappop(self.__queue)
+            del self.__queued[cell]
+            self.__expansions += 1
+            newKey = self.__key(cell)
+            gCell = self.__g.get(cell, math.inf)
+            rhsCell = self.__rhs.get(cell, math.inf)
+            if key < newKey:
+                self.__push(cell)
+            elif gCell > rhsCell:
+                self.__g[cell] = rhsCell
+                for neighbor, cost in self.__neighbors(cell):
+                    self.__updateVertex(neighbor)
+            else:
+                self.__g[cell] = math.inf
+                self.__updateVertex(cell)
+                for neighbor, cost in self.__neighbors(cell):
+                    self.__updateVertex(neighbor)
+
+    def __initialize(self, start, goal, bounds):
+        self.__goal = goal
+        self.__bounds = bounds
+        self.__lastStart = start
+        self.__km = 0.0
+        self.__g = {}
+        self.__rhs = {goal: 0.0}
+        self.__queue = []
+        self.__queued = {}
+        self.__pending = set()
+        self.__push(goal)
+
+    def plan(self, start, goal):
+        """
+        Recherche d'un chemin entre deux positions.
+
+        Si la destination est la même qu'au précédent appel, la recherche
+        reprend là où elle s'était arrêtée en ne traitant que les cellules
+        modifiées depuis, quel que soit le nouveau départ. Sinon (ou si la
+        grille s'est agrandie au-delà des bornes de la recherche), une
+        nouvelle recherche est initialisée.
+
+        Si la cellule de départ est infranchissable, le chemin commence par
+        le centre de la cellule franchissable la plus proche. Si la cellule
+        de destination est infranchissable, le chemin se termine au centre
+        de la cellule franchissable la plus proche (voir nearestFreeCell).
+
+        :param start: Position (x, y) de départ.
+        :param goal: Position (x, y) de destination.
+        :return: Liste des points de passage (x, y), destination comprise,
+        ou None si aucun chemin n'a été trouvé.
+        """
+        grid = self.__grid
+        startCell = grid.cellOf(start[0], start[1])
+        goalCell = grid.cellOf(goal[0], goal[1])
+        iMin, jMin, iMax, jMax = grid.bounds
+        margin = DStarLitePlanner.MARGIN
+        iMin = min(iMin, startCell[0], goalCell[0]) - margin
+        jMin = min(jMin, startCell[1], goalCell[1]) - margin
+        iMax = max(iMax, startCell[0], goalCell[0]) + margin
+        jMax = max(jMax, startCell[1], goalCell[1]) + margin
+        bounds = (iMin, jMin, iMax, jMax)
+        self.__expansions = 0
+        # Les bornes courantes sont conservées tant qu'elles couvrent le
+        # départ, la destination et la grille : un déplacement du robot ne
+        # provoque donc pas de nouvelle recherche.
+        reset = self.__bounds is None or not (
+            self.__bounds[0] <= iMin and self.__bounds[1] <= jMin and
+            self.__bounds[2] >= iMax and self.__bounds[3] >= jMax)
+        if reset:
+            self.__bounds = bounds
+        freeStart = self.nearestFreeCell(startCell)
+        freeGoal = self.nearestFreeCell(goalCell)
+        if freeStart is None or freeGoal is None:
+            # Les bornes ont pu changer : la prochaine recherche repartira
+            # de zéro.
+            self.__goal = None
+            return None
+        if reset or freeGoal != self.__goal:
+            self.__initialize(freeStart, freeGoal, self.__bounds)
+        else:
+            self.__km += self.__heuristic(self.__lastStart, freeStart)
+            self.__lastStart = freeStart
+            pending = self.__pending
+            self.__pending = set()
+            for cell in pending:
+                self.__updateVertex(cell)
+                for neighbor, cost in self.__neighbors(cell):
+                    self.__updateVertex(neighbor)
+        self.__computeShortestPath(freeStart)
+        if self.__g.get(freeStart, math.inf) == math.inf:
+            return None
+        cells = [freeStart]
+        cell = freeStart
+        while cell != freeGoal:
+            best = None
+            bestCost = math.inf
+            for neighbor, cost in self.__neighbors(cell):
+                total = cost + self.__g.get(neighbor, math.inf)
+                if total < bestCost:
+                    best = neighbor
+                    bestCost = total
+            if best is None or best in cells:
+                return None
+            cells.append(best)
+            cell = best
+        end = (goal[0], goal[1]) if freeGoal == goalCell else grid.cellCenter(freeGoal[0], freeGoal[1])
+        waypoints = self.__smooth(end, cells)
+        if freeStart != startCell:
+            waypoints.insert(0, grid.cellCenter(freeStart[0], freeStart[1]))
+        return waypoints
+
+    def __lineOfSight(self, a, b):
+        """
+        :return: Vrai si aucune cellule infranchissable ne sépare les cellules a et b.
+        """
+        i, j = a
+        di = abs(b[0] - i)
+        dj = -abs(b[1] - j)
+        si = 1 if i < b[0] else -1
+        sj = 1 if j < b[1] else -1
+        error = di + dj
+        while (i, j) != b:
+            if self.isBlocked((i, j)) and (i, j) != a:
+                return False
+            e2 = 2 * error
+            if e2 >= dj:
+                error += dj
+                i += si
+            if e2 <= di:
+                error += di
+                j += sj
+        return True
+
+    def __smooth(self, goal, cells):
+        """
+        Réduction du chemin aux seuls points de passage nécessaires : une
+        cellule n'est conservée que si la ligne droite depuis le point de
+        passage précédent est obstruée.
+        """
+        waypoints = []
+        anchor = cells[0]
+        for k in range(1, len(cells) - 1):
+            if not self.__lineOfSight(anchor, cells[k + 1]):
+                waypoints.append(self.__grid.cellCenter(cells[k][0], cells[k][1]))
+                anchor = cells[k]
+        waypoints.append(goal)
+        return waypoints
@@ -8,9 +8,11 @@ robot.
 Auteur : André Pierre LIMOUZIN
 Version : 1.1 - 05.2020
 """
+import io
 import sys
 import xml.dom.minidom as XMLDOM
-from common_apl.xmlio import XmlDocumentLoader, XmlObjectAdapter, XmlParser
+from common_apl.xmlio import XmlDocumentLoader, XmlJournal, XmlObjectAdapter, XmlParser
+from common_apl.xmlio import XmlStreamLoader, XmlStreamWriter
 from survey_model import SurveyMap, SurveyNode, SurveyPoint, Wall, Angle
 
 
@@ -51,6 +53,23 @@ class SurveyPointAdapter(XmlObjectAdapter):
         surveyPoint.isValid = XmlParser.get_bool_attribute(element, SurveyPointAdapter.ATTR_VALID, False)
         return surveyPoint
 
+    def readStart(self, attributes):
+        """
+        Lecture au fil de l'eau du SurveyPoint.
+        :param attributes: Attributs SAX de l'élément du SurveyPoint.
+        """
+        x = XmlStreamLoader.get_float_attribute(attributes, SurveyPointAdapter.ATTR_X, 0.0)
+        y = XmlStreamLoader.get_float_attribute(attributes, SurveyPointAdapter.ATTR_Y, 0.0)
+        angle = XmlStreamLoader.get_float_attribute(attributes, SurveyPointAdapter.ATTR_ANGLE, 0.0)
+        dist = XmlStreamLoader.get_float_attribute(attributes, SurveyPointAdapter.ATTR_DISTANCE, 0.0)
+        self.__point = SurveyPoint(self.__node, angle, dist, x, y)
+        self.__point.isValid = XmlStreamLoader.get_bool_attribute(attributes, SurveyPointAdapter.ATTR_VALID, False)
+
+    def readEnd(self):
+        """
+        :return: SurveyPoint lu.
+        """
+        return self.__point
 
     def write(self, xmlDocument, surveyPoint):
         """
@@ -67,6 +86,19 @@ class SurveyPointAdapter(XmlObjectAdapter):
         XmlParser.set_bool_attribute(elPoint, SurveyPointAdapter.ATTR_VALID, surveyPoint.isValid)
         return elPoint
 
+    def writeStream(self, xmlWriter, surveyPoint):
+        """
+        Ecriture au fil de l'eau d'un SurveyPoint.
+        :param xmlWriter: XmlStreamWriter dans lequel doit être écrit le SurveyPoint.
+        :param surveyPoint: Objet SurveyPoint à écrire.
+        """
+        xmlWriter.element(SurveyPointAdapter.TAG_NAME, {
+            SurveyPointAdapter.ATTR_X: float(surveyPoint.X),
+            SurveyPointAdapter.ATTR_Y: float(surveyPoint.Y),
+            SurveyPointAdapter.ATTR_ANGLE: float(surveyPoint.rawAngle),
+            SurveyPointAdapter.ATTR_DISTANCE: float(surveyPoint.rawDistance),
+            SurveyPointAdapter.ATTR_VALID: surveyPoint.isValid})
+
 #
 #
 ##############################################################################
@@ -133,6 +165,99 @@ class WallAdapter(XmlObjectAdapter):
         elWall.appendChild(elPt2)
         return elWall
 
+    def writeStream(self, xmlWriter, wall):
+        """
+        Ecriture au fil de l'eau d'un Wall.
+        :param xmlWriter: XmlStreamWriter dans lequel doit être écrit le Wall.
+        :param wall: Objet Wall à écrire.
+        """
+        xmlWriter.startElement(WallAdapter.TAG_NAME, {
+            WallAdapter.ATTR_A: float(wall.A),
+            WallAdapter.ATTR_B: float(wall.B),
+            WallAdapter.ATTR_C: float(wall.C),
+            WallAdapter.ATTR_Q: float(wall.Q),
+            WallAdapter.ATTR_ISLEFTWALL: wall.isLeftWall,
+            WallAdapter.ATTR_ISFRONTWALL: wall.isFrontWall,
+            WallAdapter.ATTR_ISRIGHTWALL: wall.isRightWall})
+        pointAdapter = SurveyPointAdapter(wall)
+        for iPoint in range(len(wall)):
+            pointAdapter.writeStream(xmlWriter, wall[iPoint])
+        xmlWriter.element(WallAdapter.PT1_TAG_NAME, {
+            SurveyPointAdapter.ATTR_X: float(wall.Pt1.X),
+            SurveyPointAdapter.ATTR_Y: float(wall.Pt1.Y)})
+        xmlWriter.element(WallAdapter.PT2_TAG_NAME, {
+            SurveyPointAdapter.ATTR_X: float(wall.Pt2.X),
+            SurveyPointAdapter.ATTR_Y: float(wall.Pt2.Y)})
+        xmlWriter.endElement(WallAdapter.TAG_NAME)
+
+
+#
+#
+##############################################################################
+class MapWallAdapter(XmlObjectAdapter):
+    """
+    Cette classe est un adaptateur pour permettre l'écriture d'un MapWall.
+
+    Seules la droite et les extrémités du mur sont écrites : les points
+    appartiennent aux stations. Comme les Wall, les MapWall ne sont pas
+    lus, mais reconstruits par la SurveyMap à l'ajout des stations.
+
+    L'identifiant écrit permet à un client de remplacer ou de supprimer
+    le mur lors de l'application d'un delta (voir SurveyMapDeltaAdapter).
+    Il n'est valable que pendant l'exécution du robot.
+    """
+    TAG_NAME = "wall"
+    ATTR_ID = "id"
+    ATTR_COUNT = "count"
+    ATTR_WALLS = "walls"
+
+    def read(self, element):
+        return None
+
+    def write(self, xmlDocument, wall):
+        """
+        Ecriture d'un MapWall.
+        :param xmlDocument: Document XML dans lequel doit être écrit le MapWall.
+        :param wall: Objet MapWall à écrire.
+        :return: Element XML créé pour l'objet MapWall.
+        """
+        elWall = xmlDocument.createElement(MapWallAdapter.TAG_NAME)
+        XmlParser.set_int_attribute(elWall, MapWallAdapter.ATTR_ID, id(wall))
+        XmlParser.set_float_attribute(elWall, WallAdapter.ATTR_A, float(wall.A))
+        XmlParser.set_float_attribute(elWall, WallAdapter.ATTR_B, float(wall.B))
+        XmlParser.set_float_attribute(elWall, WallAdapter.ATTR_C, float(wall.C))
+        XmlParser.set_float_attribute(elWall, WallAdapter.ATTR_Q, float(wall.Q))
+        XmlParser.set_int_attribute(elWall, MapWallAdapter.ATTR_COUNT, len(wall))
+        XmlParser.set_int_attribute(elWall, MapWallAdapter.ATTR_WALLS, len(wall.walls))
+        for tagName, end in ((WallAdapter.PT1_TAG_NAME, wall.Pt1), (WallAdapter.PT2_TAG_NAME, wall.Pt2)):
+            elPt = xmlDocument.createElement(tagName)
+            XmlParser.set_float_attribute(elPt, SurveyPointAdapter.ATTR_X, float(end.X))
+            XmlParser.set_float_attribute(elPt, SurveyPointAdapter.ATTR_Y, float(end.Y))
+            elWall.appendChild(elPt)
+        return elWall
+
+    def writeStream(self, xmlWriter, wall):
+        """
+        Ecriture au fil de l'eau d'un MapWall.
+        :param xmlWriter: XmlStreamWriter dans lequel doit être écrit le MapWall.
+        :param wall: Objet MapWall à écrire.
+        """
+        xmlWriter.startElement(MapWallAdapter.TAG_NAME, {
+            MapWallAdapter.ATTR_ID: id(wall),
+            WallAdapter.ATTR_A: float(wall.A),
+            WallAdapter.ATTR_B: float(wall.B),
+            WallAdapter.ATTR_C: float(wall.C),
+            WallAdapter.ATTR_Q: float(wall.Q),
+            MapWallAdapter.ATTR_COUNT: len(wall),
+            MapWallAdapter.ATTR_WALLS: len(wall.walls)})
+        xmlWriter.element(WallAdapter.PT1_TAG_NAME, {
+            SurveyPointAdapter.ATTR_X: float(wall.Pt1.X),
+            SurveyPointAdapter.ATTR_Y: float(wall.Pt1.Y)})
+        xmlWriter.element(WallAdapter.PT2_TAG_NAME, {
+            SurveyPointAdapter.ATTR_X: float(wall.Pt2.X),
+            SurveyPointAdapter.ATTR_Y: float(wall.Pt2.Y)})
+        xmlWriter.endElement(MapWallAdapter.TAG_NAME)
+
 
 #
 #
@@ -166,15 +291,49 @@ class SurveyNodeAdapter(XmlObjectAdapter):
         x = XmlParser.get_float_attribute(element, SurveyNodeAdapter.ATTR_X, 0.0)
         y = XmlParser.get_float_attribute(element, SurveyNodeAdapter.ATTR_Y, 0.0)
         orientation = Angle(degrees=XmlParser.get_float_attribute(element, SurveyNodeAdapter.ATTR_ORIENTATION, 0.0))
-        offset = XmlParser.get_tuple_attribute(element, SurveyNodeAdapter.ATTR_OFFSET, (0,0))
+        offset = tuple(float(value) for value in
+                       XmlParser.get_tuple_attribute(element, SurveyNodeAdapter.ATTR_OFFSET, (0,0)))
         surveyNode = SurveyNode(self.__map, x, y, orientation, offset)
-        elPoints = element.getElementsByTagName(SurveyPointAdapter.TAG_NAME)
-        for iPoint in range(elPoints.length):
-            pointAdapter = SurveyPointAdapter(surveyNode)
-            surveyNode.addPoint(pointAdapter.read(elPoints[iPoint]))
+        pointAdapter = SurveyPointAdapter(surveyNode)
+        XmlParser(element, None,
+                  lambda elPoint: surveyNode.addPoint(pointAdapter.read(elPoint))
+                  if elPoint.tagName == SurveyPointAdapter.TAG_NAME else None)
         surveyNode.computeWallData()
         return surveyNode
 
+    def readStart(self, attributes):
+        """
+        Lecture au fil de l'eau du SurveyNode.
+        :param attributes: Attributs SAX de l'élément du SurveyNode.
+        """
+        x = XmlStreamLoader.get_float_attribute(attributes, SurveyNodeAdapter.ATTR_X, 0.0)
+        y = XmlStreamLoader.get_float_attribute(attributes, SurveyNodeAdapter.ATTR_Y, 0.0)
+        orientation = Angle(degrees=XmlStreamLoader.get_float_attribute(
+            attributes, SurveyNodeAdapter.ATTR_ORIENTATION, 0.0))
+        offset = tuple(float(value) for value in
+                       XmlStreamLoader.get_tuple_attribute(attributes, SurveyNodeAdapter.ATTR_OFFSET, (0,0)))
+        self.__node = SurveyNode(self.__map, x, y, orientation, offset)
+        self.__pointAdapter = SurveyPointAdapter(self.__node)
+
+    def getChildAdapter(self, name):
+        """
+        Seuls les points de la station sont lus. Les murs sont recalculés
+        à la fin de la lecture et les points qu'ils contiennent sont ignorés.
+        """
+        if name == SurveyPointAdapter.TAG_NAME:
+            return self.__pointAdapter
+        return None
+
+    def readChild(self, name, surveyPoint):
+        self.__node.addPoint(surveyPoint)
+
+    def readEnd(self):
+        """
+        :return: SurveyNode lu.
+        """
+        self.__node.computeWallData()
+        return self.__node
+
     def write(self, xmlDocument, surveyNode):
         """
         Ecriture d'un SurveyNode.
@@ -191,12 +350,25 @@ class SurveyNodeAdapter(XmlObjectAdapter):
             pointAdapter = SurveyPointAdapter(surveyNode)
             elPoint =  pointAdapter.write(xmlDocument, surveyNode[iPoint])
             elNode.appendChild(elPoint)
-        for iWall in range(len(surveyNode.walls)):
-            wallAdapter = WallAdapter(surveyNode)
-            elWall = wallAdapter.write(xmlDocument, surveyNode.walls[iWall])
-            elNode.appendChild(elWall)
         return elNode
 
+    def writeStream(self, xmlWriter, surveyNode):
+        """
+        Ecriture au fil de l'eau d'un SurveyNode.
+        :param xmlWriter: XmlStreamWriter dans lequel doit être écrit le SurveyNode.
+        :param surveyNode: Objet SurveyNode à écrire.
+        """
+        offset = ",".join(str(value) for value in surveyNode.offset)
+        xmlWriter.startElement(SurveyNodeAdapter.TAG_NAME, {
+            SurveyNodeAdapter.ATTR_X: float(surveyNode.X),
+            SurveyNodeAdapter.ATTR_Y: float(surveyNode.Y),
+            SurveyNodeAdapter.ATTR_ORIENTATION: float(surveyNode.orientation.degrees),
+            SurveyNodeAdapter.ATTR_OFFSET: offset})
+        pointAdapter = SurveyPointAdapter(surveyNode)
+        for iPoint in range(len(surveyNode)):
+            pointAdapter.writeStream(xmlWriter, surveyNode[iPoint])
+        xmlWriter.endElement(SurveyNodeAdapter.TAG_NAME)
+
 
 #
 #
@@ -211,12 +383,19 @@ class SurveyMapAdapter(XmlObjectAdapter):
     ATTR_MAXX = "maxX"
     ATTR_MINY = "minY"
     ATTR_MAXY = "maxY"
+    ATTR_VERSION = "version"
 
-    def __init__(self):
+    def __init__(self, retainNodes=True, compact=False):
         """
         Constructeur de l'adaptateur.
+
+        :param retainNodes: Si faux, la lecture au fil de l'eau n'ajoute pas
+        les SurveyNode à la SurveyMap. Seules ses dimensions sont mises à jour.
+        :param compact: Si vrai, les points sont stockés en colonnes.
         """
         super().__init__()
+        self.__retainNodes = retainNodes
+        self.__compact = compact
 
     def read(self, element):
         """
@@ -224,13 +403,37 @@ class SurveyMapAdapter(XmlObjectAdapter):
         :param element: Elément XML du SurveyMap.
         :return: Objet SurveyMap lu.
         """
-        surveyMap = SurveyMap()
+        surveyMap = SurveyMap(self.__compact)
         elNodes = element.getElementsByTagName(SurveyNodeAdapter.TAG_NAME)
         for iNode in range(elNodes.length):
             nodeAdapter = SurveyNodeAdapter(surveyMap)
             surveyMap.addNode(nodeAdapter.read(elNodes[iNode]))
         return surveyMap
 
+    def readStart(self, attributes):
+        """
+        Lecture au fil de l'eau d'une SurveyMap.
+        :param attributes: Attributs SAX de l'élément de la SurveyMap.
+        """
+        self.__map = SurveyMap(self.__compact)
+
+    def getChildAdapter(self, name):
+        if name == SurveyNodeAdapter.TAG_NAME:
+            return SurveyNodeAdapter(self.__map)
+        return None
+
+    def readChild(self, name, surveyNode):
+        if self.__retainNodes:
+            self.__map.addNode(surveyNode)
+        else:
+            self.__map.updateSize(surveyNode.X, surveyNode.Y)
+
+    def readEnd(self):
+        """
+        :return: SurveyMap lue.
+        """
+        return self.__map
+
     def write(self, xmlDocument, surveyMap):
         """
         Ecriture d'une SurveyMap.
@@ -248,12 +451,101 @@ class SurveyMapAdapter(XmlObjectAdapter):
             XmlParser.set_float_attribute(elMap, SurveyMapAdapter.ATTR_MINY, float(surveyMap.minY))
         if (surveyMap.maxY != None):
             XmlParser.set_float_attribute(elMap, SurveyMapAdapter.ATTR_MAXY, float(surveyMap.maxY))
+        XmlParser.set_int_attribute(elMap, SurveyMapAdapter.ATTR_VERSION, surveyMap.version)
         for iNode in range(len(surveyMap)):
             nodeAdapter = SurveyNodeAdapter(surveyMap)
             elNode =  nodeAdapter.write(xmlDocument, surveyMap[iNode])
             elMap.appendChild(elNode)
+        wallAdapter = MapWallAdapter()
+        for wall in surveyMap.walls:
+            elMap.appendChild(wallAdapter.write(xmlDocument, wall))
         return elMap
 
+    @staticmethod
+    def getBounds(surveyMap):
+        """
+        :param surveyMap: Objet SurveyMap.
+        :return: Dictionnaire des attributs de dimension de la SurveyMap.
+        """
+        bounds = {}
+        if surveyMap.minX != None:
+            bounds[SurveyMapAdapter.ATTR_MINX] = float(surveyMap.minX)
+        if surveyMap.maxX != None:
+            bounds[SurveyMapAdapter.ATTR_MAXX] = float(surveyMap.maxX)
+        if surveyMap.minY != None:
+            bounds[SurveyMapAdapter.ATTR_MINY] = float(surveyMap.minY)
+        if surveyMap.maxY != None:
+            bounds[SurveyMapAdapter.ATTR_MAXY] = float(surveyMap.maxY)
+        return bounds
+
+    def writeStream(self, xmlWriter, surveyMap):
+        """
+        Ecriture au fil de l'eau d'une SurveyMap.
+
+        :param xmlWriter: XmlStreamWriter dans lequel doit être écrite la SurveyMap.
+        :param surveyMap: Objet SurveyMap à écrire.
+        """
+        attributes = SurveyMapAdapter.getBounds(surveyMap)
+        attributes[SurveyMapAdapter.ATTR_VERSION] = surveyMap.version
+        xmlWriter.startElement(SurveyMapAdapter.TAG_NAME, attributes)
+        nodeAdapter = SurveyNodeAdapter(surveyMap)
+        for iNode in range(len(surveyMap)):
+            nodeAdapter.writeStream(xmlWriter, surveyMap[iNode])
+        wallAdapter = MapWallAdapter()
+        for wall in surveyMap.walls:
+            wallAdapter.writeStream(xmlWriter, wall)
+        xmlWriter.endElement(SurveyMapAdapter.TAG_NAME)
+
+
+
+#
+#
+##############################################################################
+class SurveyMapDeltaAdapter(XmlObjectAdapter):
+    """
+    Cette classe est un adaptateur pour permettre l'écriture d'une
+    modification de la SurveyMap (voir SurveyMap.addChangeListener).
+
+    Le delta est un tuple (rangs, murs, murs supprimés). Il contient la
+    nouvelle version et les nouvelles dimensions de la carte, les stations
+    ajoutées ou déplacées avec leur rang, les murs de la carte créés ou
+    modifiés et les identifiants des murs supprimés.
+    """
+    TAG_NAME = "delta"
+    STATION_TAG_NAME = "station"
+    REMOVED_TAG_NAME = "removed"
+    ATTR_RANK = "rank"
+
+    def __init__(self, surveyMap):
+        """
+        Constructeur de l'adaptateur.
+
+        :param surveyMap: SurveyMap modifiée.
+        """
+        super().__init__()
+        self.__map = surveyMap
+
+    def writeStream(self, xmlWriter, delta):
+        """
+        Ecriture au fil de l'eau d'un delta de la SurveyMap.
+        :param xmlWriter: XmlStreamWriter dans lequel doit être écrit le delta.
+        :param delta: Tuple (rangs, murs, murs supprimés).
+        """
+        ranks, walls, removed = delta
+        attributes = SurveyMapAdapter.getBounds(self.__map)
+        attributes[SurveyMapAdapter.ATTR_VERSION] = self.__map.version
+        xmlWriter.startElement(SurveyMapDeltaAdapter.TAG_NAME, attributes)
+        nodeAdapter = SurveyNodeAdapter(self.__map)
+        for rank in ranks:
+            xmlWriter.startElement(SurveyMapDeltaAdapter.STATION_TAG_NAME, {SurveyMapDeltaAdapter.ATTR_RANK: rank})
+            nodeAdapter.writeStream(xmlWriter, self.__map[rank])
+            xmlWriter.endElement(SurveyMapDeltaAdapter.STATION_TAG_NAME)
+        wallAdapter = MapWallAdapter()
+        for wall in walls:
+            wallAdapter.writeStream(xmlWriter, wall)
+        for wallId in removed:
+            xmlWriter.element(SurveyMapDeltaAdapter.REMOVED_TAG_NAME, {MapWallAdapter.ATTR_ID: wallId})
+        xmlWriter.endElement(SurveyMapDeltaAdapter.TAG_NAME)
 
 
 #
@@ -278,7 +570,7 @@ class SurveyMapDocument(XmlDocumentLoader):
         :return: Objet SurveyMap chargé.
         """
         mapAdapter = SurveyMapAdapter()
-        return mapAdapter.read(doc.rootElement)
+        return mapAdapter.read(self.rootElement)
 
     def save(self, surveyMap, mapDocumentName=None):
         """
@@ -293,6 +585,164 @@ class SurveyMapDocument(XmlDocumentLoader):
         super().save(mapDocumentName)
 
 
+#
+#
+##############################################################################
+class SurveyMapStreamDocument(XmlStreamLoader):
+    """
+    Cette classe permet de lire au fil de l'eau un document XML contenant
+    une SurveyMap.
+
+    Contrairement au SurveyMapDocument, aucun DOM n'est construit. Elle est
+    destinée à recharger les relevés volumineux sur la brique EV3.
+    """
+
+    def __init__(self, xml_document_name, compact=False):
+        """
+        Constructeur du chargeur de document XML.
+
+        :param xml_document_name: Nom du fichier du document XML.
+        :param compact: Si vrai, les points sont stockés en colonnes.
+        """
+        super().__init__(xml_document_name)
+        self.__docName = xml_document_name
+        self.__compact = compact
+
+    def load(self):
+        """
+        Charge un objet SurveyMap à partir du document XML.
+        :return: Objet SurveyMap chargé.
+        """
+        return super().load(SurveyMapAdapter(compact=self.__compact))
+
+    def iterNodes(self):
+        """
+        Enumère les stations du document XML au fur et à mesure de leur
+        lecture. Les stations ne sont pas conservées par la SurveyMap, ce
+        qui permet de traiter un relevé avec une mémoire bornée.
+
+        :return: Générateur des SurveyNode du document.
+        """
+        return self.iterload(SurveyMapAdapter(retainNodes=False, compact=self.__compact))
+
+    def save(self, surveyMap, mapDocumentName=None):
+        """
+        Enregistrement au fil de l'eau d'une SurveyMap dans un document XML.
+        Par défaut, le fichier est enregistré avec le nom utilisé à
+        l'initialisation.
+
+        :param surveyMap: Objet SurveyMap à enregistrer.
+        :param mapDocumentName: Nom du fichier à enregistrer.
+        """
+        if mapDocumentName == None:
+            mapDocumentName = self.__docName
+        XmlStreamWriter.save(mapDocumentName, SurveyMapAdapter(), surveyMap)
+
+
+#
+#
+##############################################################################
+class SurveyMapJournal(XmlJournal):
+    """
+    Cette classe permet d'enregistrer une SurveyMap de façon incrémentale.
+
+    Chaque station est ajoutée au journal dès qu'elle est relevée. Seul le
+    SurveyNode ajouté est sérialisé, si bien que le coût d'un
+    enregistrement est proportionnel au nombre de points de la station et
+    non à la taille de la carte.
+    Le document XML de la carte (www/map.xml) est une vue du journal,
+    reconstituée par la méthode materialize sans reconstruire de DOM. Les
+    murs de la carte, qui évoluent à chaque station, ne sont pas
+    journalisés : ils sont écrits à la suite des stations lors de la
+    reconstitution.
+    """
+
+    def __init__(self, journalName, mapDocumentName, reset=False):
+        """
+        Constructeur du journal.
+
+        :param journalName: Nom du fichier du journal.
+        :param mapDocumentName: Nom du document XML de la carte.
+        :param reset: Si vrai, le journal est vidé à l'ouverture.
+        """
+        super().__init__(journalName, SurveyMapAdapter.TAG_NAME, reset)
+        self.__mapDocumentName = mapDocumentName
+        self.__bounds = {}
+        self.__map = None
+
+    @property
+    def mapDocumentName(self):
+        return self.__mapDocumentName
+
+    def append(self, surveyMap, surveyNode):
+        """
+        Ajout d'une station au journal.
+
+        :param surveyMap: SurveyMap à laquelle appartient la station.
+        :param surveyNode: SurveyNode à ajouter.
+        """
+        fragment = io.StringIO()
+        SurveyNodeAdapter(surveyMap).writeStream(XmlStreamWriter(fragment), surveyNode)
+        super().append(fragment.getvalue())
+        self.__bounds = SurveyMapAdapter.getBounds(surveyMap)
+        self.__map = surveyMap
+
+    def rewrite(self, surveyMap):
+        """
+        Réécriture de toutes les stations de la carte dans le journal,
+        lorsque des stations anciennes ont été déplacées.
+
+        :param surveyMap: SurveyMap à enregistrer.
+        """
+        adapter = SurveyNodeAdapter(surveyMap)
+        fragments = []
+        for iNode in range(len(surveyMap)):
+            fragment = io.StringIO()
+            adapter.writeStream(XmlStreamWriter(fragment), surveyMap[iNode])
+            fragments.append(fragment.getvalue())
+        super().rewrite(fragments)
+        self.__bounds = SurveyMapAdapter.getBounds(surveyMap)
+        self.__map = surveyMap
+
+    def materialize(self, force=False):
+        """
+        Reconstitution du document XML de la carte à partir du journal.
+
+        :param force: Si vrai, le document est reconstitué même si le journal n'a pas changé.
+        :return: Vrai si le document a été reconstitué.
+        """
+        trailer = None
+        if self.__map is not None:
+            walls = io.StringIO()
+            writer = XmlStreamWriter(walls)
+            wallAdapter = MapWallAdapter()
+            for wall in self.__map.walls:
+                wallAdapter.writeStream(writer, wall)
+                walls.write("\n")
+            trailer = walls.getvalue()
+        return super().materialize(self.__mapDocumentName, self.__bounds, force, trailer)
+
+    def load(self, surveyMap=None):
+        """
+        Rejoue le journal pour reconstruire la SurveyMap.
+        Cette méthode permet de reprendre un relevé après un arrêt du robot.
+        Les stations suivantes sont ajoutées au journal à la suite des
+        stations rejouées.
+
+        :param surveyMap: SurveyMap (vide) à laquelle les stations sont
+        ajoutées. Par défaut, une nouvelle SurveyMap est créée.
+        :return: Objet SurveyMap reconstruit.
+        """
+        if surveyMap is None:
+            surveyMap = SurveyMap()
+        nodeAdapter = SurveyNodeAdapter(surveyMap)
+        for fragment in self.fragments():
+            surveyMap.addNode(nodeAdapter.read(XMLDOM.parseString(fragment).documentElement))
+        self.__bounds = SurveyMapAdapter.getBounds(surveyMap)
+        self.__map = surveyMap
+        return surveyMap
+
+
 #
 #
 ##############################################################################
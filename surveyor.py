@@ -10,22 +10,23 @@ Version : 1.1 - 05.2020
 import sys
 import time
 import math
-
-from ev3dev2.motor import MoveTank, MoveSteering, OUTPUT_B, OUTPUT_C
-from ev3dev2.motor import MediumMotor, OUTPUT_A
-from ev3dev2.sensor.lego import InfraredSensor
-from ev3dev2.sensor import INPUT_4
-from ev3dev2.sensor.lego import UltrasonicSensor
-from ev3dev2.sensor import INPUT_3
+import queue
+from threading import Thread
 
 import lego
-from httpd import WebServerTask
+from httpd import MapWebServerTask
 from robot import Robot, RobotTask
 from explorer import RobotExplorer
 from explorer_tasks import IRControlledTankTask, StartStopTask
+from odometry import Odometry, OdometryTask
 from survey_model import SurveyMap, SurveyNode, SurveyPoint, Wall
 from survey_model import Angle, RIGHT_ANGLE, FLAT_ANGLE
-from survey_xmlio import SurveyMapDocument
+from survey_frontier import FrontierDetector
+from survey_graph import SurveyPoseGraph
+from survey_matching import ScanMatcher
+from survey_planner import DStarLitePlanner
+from survey_xmlio import SurveyMapJournal
+from telemetry import Telemeter
 
 
 #
@@ -51,31 +52,101 @@ class RobotSurveyor(RobotExplorer):
     Le capteur Ultra-Son est également excentré de US_DISTORTION par
     rapport à son axe de rotation.
     """
-    DEFAULT_MOVING_MOTORS = MoveSteering(OUTPUT_B, OUTPUT_C)
     US_SPEED = 25
+    US_SWEEP_SPEED = 10
+    TELEMETRY_BURST = 5
+    SWEEP_BURST = 3
+    SWEEP_TOLERANCE = 0.5
+    SWEEP_POLL = 0.01
+    ADAPTIVE_COARSE_STEP = 30
+    ADAPTIVE_SETTLE = 0.1
+    ADAPTIVE_MIN_ALIGNMENT = 0.95
     MOTORS_SPEED = 25
+    MAP_DOCUMENT_NAME = "www/map.xml"
+    MAP_JOURNAL_NAME = "www/map.journal"
+    MATERIALIZE_PERIOD = 10
+    GOTO_MAX_MOVES = 20
 
-    def __init__(self, motors=DEFAULT_MOVING_MOTORS,
-                usmotor=RobotExplorer.DEFAULT_US_MOTOR,
-                irsensor=RobotExplorer.DEFAULT_IR_SENSOR,
-                ussensor=RobotExplorer.DEFAULT_US_SENSOR):
+    def __init__(self, motors=None, usmotor=None, irsensor=None, ussensor=None, devices=None,
+                 mapDocumentName=MAP_DOCUMENT_NAME, mapJournalName=MAP_JOURNAL_NAME,
+                 pipelined=True, adaptive=False, matching=True, loopClosure=True, resume=False):
         """
         Construction du robot.
+        Les équipements non précisés sont fournis par la fabrique devices.
         :param motors: Jeu de moteurs utilisés pour déplacer le robot.
         :param usmotors:  Moteur utilisé pour la rotation du capteur Ultra-sons.
         :param irsensor: Capteur Infra-rouge utilisé par la télécommande.
         :param ussensor: Capteur Ultra-son uutilisé pour la télémetrie.
+        :param devices: Fabrique RobotDevices (EV3Devices par défaut).
+        :param mapDocumentName: Nom du document XML de la carte.
+        :param mapJournalName: Nom du journal de la carte.
+        :param pipelined: Mode de balayage par défaut des tours d'horizon.
+        :param adaptive: Résolution angulaire adaptative par défaut des
+        tours d'horizon.
+        :param matching: Si vrai, chaque station est recalée sur la carte
+        avant d'y être ajoutée (voir survey_matching).
+        :param loopClosure: Si vrai (et si matching est vrai), les boucles
+        sont détectées et les stations anciennes corrigées (voir
+        survey_graph).
+        :param resume: Si vrai, le relevé enregistré dans le journal est
+        repris (voir SurveyMapJournal.load) : le robot est supposé replacé
+        à la pose de la dernière station. Sinon, le journal est vidé.
         """
-        super().__init__(motors, usmotor, irsensor, ussensor)
-        self._motors = motors
-        self._usmotor = usmotor
-        self._ussensor = ussensor
-        self._irsensor = irsensor
+        super().__init__(motors, usmotor, irsensor, ussensor, devices)
+        self._pipelined = pipelined
+        self._adaptive = adaptive
+        self._motors = self.Motors
+        self._usmotor = self.USMotor
+        self._ussensor = self.USSensor
+        self._irsensor = self.IRSensor
+        self._telemeter = Telemeter(self._ussensor, self.devices, RobotExplorer.US_DISTORTION,
+                                    RobotSurveyor.TELEMETRY_BURST)
+        self._odometry = Odometry(self._motors.left_motor, self._motors.right_motor, self.devices,
+                                  RobotExplorer.CATERPILLAR_SPACING, RobotExplorer.CATERPILLAR_RADIUS)
+        OdometryTask(self, self._odometry)
         self._map = SurveyMap()
+        self._matcher = ScanMatcher(self._map) if matching else None
+        self._poseGraph = SurveyPoseGraph(self._map, self._matcher) if matching and loopClosure else None
         self._position = (0, 0)
         self._orientation = Angle()
-        doc2 = SurveyMapDocument()
-        doc2.save(self._map, "www/map.xml")
+        self._planner = DStarLitePlanner(self._map.grid)
+        self._journal = SurveyMapJournal(mapJournalName, mapDocumentName, reset=not resume)
+        if resume:
+            self._journal.load(self._map)
+            self.__resume()
+        self._journal.materialize(force=True)
+
+    def __resume(self):
+        """
+        Reprise du relevé à la dernière station de la carte rejouée.
+        """
+        if len(self._map) == 0:
+            return
+        if self._poseGraph is not None:
+            for rank in range(len(self._map)):
+                self._poseGraph.restoreNode(self._map[rank])
+        station = self._map[len(self._map) - 1]
+        self._position = station.position
+        self._orientation = Angle(station.orientation.radians)
+        self._odometry.reset(station.X, station.Y, station.orientation)
+
+    @property
+    def map(self):
+        return self._map
+
+    @property
+    def telemetry(self):
+        """
+        :return: Telemeter du capteur ultra-son (et ses statistiques).
+        """
+        return self._telemeter
+
+    @property
+    def odometry(self):
+        """
+        :return: Odometry du robot (pose datée et historique des poses).
+        """
+        return self._odometry
 
     @property
     def position(self):
@@ -85,38 +156,279 @@ class RobotSurveyor(RobotExplorer):
     def orientation(self):
         return self._orientation
 
-    def surveyTour(self, a1=-180, a2=+180, step=10):
+    def surveyTour(self, a1=-180, a2=+180, step=10, pipelined=None, adaptive=None):
         """
         Effectue un tour d'horizon.
 
         La télémetrie du tour d'horizon est assurée par un capteur Ultra-Son.
-        Chaque tour d'horizon est enregistré dans www/map.xml.
+        Chaque tour d'horizon est ajouté au journal www/map.journal. La vue
+        www/map.xml n'est reconstituée à partir du journal que toutes les
+        MATERIALIZE_PERIOD stations (voir saveMap) : le serveur Web sert la
+        carte depuis la mémoire.
+
+        Avant son ajout à la carte, la station est recalée sur les stations
+        précédentes : la position et l'orientation du robot, estimées à
+        partir des commandes de déplacement, sont corrigées d'autant.
+        Lorsque la station ferme une boucle, le graphe des poses est
+        optimisé : les stations déplacées sont reconstruites et le journal
+        est réécrit.
+
+        En mode pipeline, le capteur tourne en continu pendant les mesures
+        (voir sweepTour). Sinon, le capteur s'arrête à chaque pas (voir
+        stepTour). En mode adaptatif, la résolution angulaire n'est affinée
+        que là où elle améliore la carte (voir adaptiveTour).
 
         :param a1: angle de départ (-180° par défaut)
         :param a2: angel de fin (+180° par défaut)
         :param step: pas de rotation (10° par défaut)
+        :param pipelined: Mode de balayage (celui du robot par défaut).
+        :param adaptive: Mode adaptatif (celui du robot par défaut).
         :return: Objet station
         """
+        if pipelined is None:
+            pipelined = self._pipelined
+        if adaptive is None:
+            adaptive = self._adaptive
+        self.__syncOdometry()
         station = SurveyNode(self._map, self._position[0], self._position[1],
             self._orientation, RobotExplorer.US_ECCENTRICITY)
+        if adaptive:
+            self.adaptiveTour(station, a1, a2, step)
+        elif pipelined:
+            self.sweepTour(station, a1, a2, step)
+        else:
+            self.stepTour(station, a1, a2, step)
+        station.computeWallData()
+        odometry = (station.X, station.Y, station.orientation)
+        match = None
+        if self._matcher is not None:
+            match = self._matcher.match(station)
+            if match is not None:
+                print("Recalage : {0}".format(match), file=sys.stderr)
+                station = match.apply(station)
+        self._map.addNode(station)
+        moved = []
+        if self._poseGraph is not None:
+            moved = self._poseGraph.addNode(station, odometry, match is not None)
+            station = self._map[len(self._map) - 1]
+        self._position = station.position
+        self._orientation = Angle(station.orientation.radians)
+        self._odometry.reset(station.X, station.Y, station.orientation)
+        if len(moved) > 0:
+            self._journal.rewrite(self._map)
+        else:
+            self._journal.append(self._map, station)
+        if len(self._map) % RobotSurveyor.MATERIALIZE_PERIOD == 0:
+            self.saveMap()
+        self._usmotor.wait_until_not_moving()
+        return station
+
+    def saveMap(self, force=False):
+        """
+        Reconstitution du document www/map.xml à partir du journal.
+
+        :param force: Si vrai, le document est reconstitué même si le journal n'a pas changé.
+        :return: Vrai si le document a été reconstitué.
+        """
+        return self._journal.materialize(force)
+
+    def stop(self):
+        """
+        Arrêt des tâches du robot, puis reconstitution du document de la
+        carte.
+        """
+        super().stop()
+        self.saveMap()
+
+    def stepTour(self, station, a1, a2, step):
+        """
+        Balayage pas à pas : le capteur est tourné de step, puis la mesure
+        est effectuée une fois le capteur immobilisé.
+
+        :param station: Station dans laquelle les mesures sont ajoutées.
+        :param a1: angle de départ.
+        :param a2: angle de fin (exclu).
+        :param step: pas de rotation.
+        """
         for a in range(a1, a2, step):
             if a == a1:
                 self._usmotor.on_for_degrees(
                     RobotSurveyor.US_SPEED, a * RobotExplorer.US_GEARS_REDUCTION)
             else:
                 self._usmotor.on_for_degrees(
-                    RobotSurveyor.US_SPEED, 10 * RobotExplorer.US_GEARS_REDUCTION)
-            time.sleep(0.5)
-            r = self.telemeter()
-            station.addPolarPoint(a, r)
-            time.sleep(0.3)
+                    RobotSurveyor.US_SPEED, step * RobotExplorer.US_GEARS_REDUCTION)
+            self.devices.sleep(0.5)
+            RobotSurveyor.__addReading(station, a, self.measure())
+            self.devices.sleep(0.3)
         self._usmotor.on_for_degrees(RobotSurveyor.US_SPEED,
             (step - a2) * RobotExplorer.US_GEARS_REDUCTION)
-        station.computeWallData()
-        self._map.addNode(station)
-        doc2 = SurveyMapDocument()
-        doc2.save(self._map, "www/map.xml")
-        return station
+
+    def sweepTour(self, station, a1, a2, step):
+        """
+        Balayage en pipeline : le capteur tourne en continu de a1 à a2 - step
+        pendant que les mesures sont effectuées.
+
+        L'angle de chaque mesure est déduit de la position du codeur du
+        moteur, relevée avant et après la lecture du capteur. Une mesure
+        est retenue à chaque fois que l'angle franchit un multiple de step.
+        Une rafale n'est lancée que lorsque son milieu, estimé d'après
+        l'angle parcouru pendant la rafale précédente, atteint le multiple
+        de step suivant : les mesures sont ainsi espacées d'environ step.
+        Les mesures sont transmises par une file à un thread qui construit
+        la station pendant que le capteur continue de tourner. Le retour du
+        capteur en position initiale n'est pas attendu.
+
+        :param station: Station dans laquelle les mesures sont ajoutées.
+        :param a1: angle de départ.
+        :param a2: angle de fin (exclu).
+        :param step: pas de rotation.
+        """
+        reduction = RobotExplorer.US_GEARS_REDUCTION
+        origin = self._usmotor.position
+        self._usmotor.on_for_degrees(RobotSurveyor.US_SPEED, a1 * reduction)
+        start = self._usmotor.position
+        samples = queue.Queue()
+        consumer = Thread(target=self.__consumeSamples, args=(station, samples))
+        consumer.start()
+        try:
+            self._usmotor.on_for_degrees(RobotSurveyor.US_SWEEP_SPEED,
+                (a2 - step - a1) * reduction, block=False)
+            target = a1
+            span = 0.0
+            while target < a2:
+                before = self._usmotor.position
+                if a1 + (before - start) / reduction + span / 2.0 < target - RobotSurveyor.SWEEP_TOLERANCE and \
+                        self._usmotor.is_running:
+                    self.devices.sleep(RobotSurveyor.SWEEP_POLL)
+                    continue
+                reading = self.measure(RobotSurveyor.SWEEP_BURST)
+                after = self._usmotor.position
+                span = (after - before) / reduction
+                a = a1 + ((before + after) / 2.0 - start) / reduction
+                if a >= target - RobotSurveyor.SWEEP_TOLERANCE:
+                    samples.put((round(a, 1), reading))
+                    while target <= a + RobotSurveyor.SWEEP_TOLERANCE:
+                        target += step
+                elif not self._usmotor.is_running:
+                    samples.put((round(a, 1), reading))
+                    break
+        finally:
+            samples.put(None)
+            self._usmotor.on_for_degrees(RobotSurveyor.US_SPEED,
+                origin - self._usmotor.position, block=False)
+            consumer.join()
+
+    def adaptiveTour(self, station, a1, a2, step):
+        """
+        Balayage à résolution angulaire adaptative.
+
+        Un premier balayage grossier est effectué tous les
+        ADAPTIVE_COARSE_STEP degrés. Chaque intervalle entre deux mesures
+        consécutives est ensuite coupé en deux, par passes successives,
+        tant que l'intervalle est plus grand que step / 2 et que :
+        * l'écart entre les deux distances dépasse SurveyNode.THRESHOLD
+          (bord d'obstacle) ;
+        * ou les deux points sont trop éloignés pour être chaînés dans un
+          mur ;
+        * ou les points voisins sont mal alignés (coin ou obstacle
+          courbe, voir Wall.alignment).
+        Les intervalles dont les deux mesures sont saturées (espace libre)
+        ne sont pas affinés. Les passes sont effectuées alternativement
+        dans un sens puis dans l'autre pour limiter la rotation du capteur.
+
+        :param station: Station dans laquelle les mesures sont ajoutées.
+        :param a1: angle de départ.
+        :param a2: angle de fin (exclu).
+        :param step: pas de rotation le plus fin.
+        """
+        origin = self._usmotor.position
+        coarse = max(step, RobotSurveyor.ADAPTIVE_COARSE_STEP)
+        angles = sorted(set(list(range(a1, a2 - step, coarse)) + [a2 - step]))
+        samples = {}
+        forward = True
+        while len(angles) > 0:
+            for a in (angles if forward else reversed(angles)):
+                samples[a] = self.__measureAt(origin, a)
+            forward = not forward
+            angles = self.__refinementAngles(samples, step / 2.0)
+        self._usmotor.on_for_degrees(RobotSurveyor.US_SPEED,
+            origin - self._usmotor.position, block=False)
+        angles = sorted(a for a in samples if not samples[a].isOutOfRange)
+        station.addPolarPoints(angles, [samples[a].distance for a in angles])
+        for a in sorted(a for a in samples if samples[a].isOutOfRange):
+            station.addOutOfRange(a)
+
+    def __measureAt(self, origin, angle):
+        """
+        Mesure télémétrique après rotation du capteur vers angle.
+        :param origin: Position du codeur du moteur pour l'angle 0.
+        :param angle: Angle de mesure dans le référentiel du robot.
+        :return: TelemetryReading.
+        """
+        degrees = origin + angle * RobotExplorer.US_GEARS_REDUCTION - self._usmotor.position
+        if round(degrees) != 0:
+            self._usmotor.on_for_degrees(RobotSurveyor.US_SPEED, degrees)
+        self.devices.sleep(RobotSurveyor.ADAPTIVE_SETTLE)
+        return self.measure()
+
+    def __refinementAngles(self, samples, minStep):
+        """
+        Recherche des intervalles à affiner (voir adaptiveTour).
+        :param samples: Dictionnaire des TelemetryReading par angle.
+        :param minStep: Taille minimale d'un intervalle.
+        :return: Liste des angles à mesurer lors de la passe suivante.
+        """
+        angles = sorted(samples)
+        distances = [samples[a].distance for a in angles]
+        xs = [d * math.sin(math.radians(a)) for a, d in zip(angles, distances)]
+        ys = [d * math.cos(math.radians(a)) for a, d in zip(angles, distances)]
+        saturated = [samples[a].isOutOfRange for a in angles]
+        refine = set()
+        for k in range(len(angles) - 1):
+            if saturated[k] and saturated[k + 1]:
+                continue
+            if abs(distances[k + 1] - distances[k]) > SurveyNode.THRESHOLD or \
+                    math.hypot(xs[k + 1] - xs[k], ys[k + 1] - ys[k]) > SurveyNode.THRESHOLD:
+                refine.add(k)
+        for k in range(1, len(angles) - 1):
+            if saturated[k - 1] or saturated[k] or saturated[k + 1]:
+                continue
+            if Wall.alignment(xs[k - 1:k + 2], ys[k - 1:k + 2]) < RobotSurveyor.ADAPTIVE_MIN_ALIGNMENT:
+                refine.add(k - 1)
+                refine.add(k)
+        return [(angles[k] + angles[k + 1]) / 2.0 for k in sorted(refine)
+                if angles[k + 1] - angles[k] > minStep]
+
+    @staticmethod
+    def __consumeSamples(station, samples):
+        """
+        Construction de la station à partir des mesures de la file, jusqu'à
+        la réception de None.
+        """
+        while True:
+            sample = samples.get()
+            if sample is None:
+                return
+            RobotSurveyor.__addReading(station, sample[0], sample[1])
+
+    @staticmethod
+    def __addReading(station, angle, reading):
+        """
+        Ajout d'une mesure dans la station. Une mesure hors de portée ne
+        devient pas un point : seule sa direction est mémorisée.
+        """
+        if reading.isOutOfRange:
+            station.addOutOfRange(angle)
+        else:
+            station.addPolarPoint(angle, reading.distance)
+
+    def measure(self, burst=None):
+        """
+        Effectue une mesure télémetrique par rafale (voir Telemeter).
+        :param burst: Nombre de lectures (TELEMETRY_BURST par défaut).
+        :return: TelemetryReading.
+        """
+        return self._telemeter.measure(burst)
 
     def telemeter(self):
         """
@@ -124,20 +436,19 @@ class RobotSurveyor(RobotExplorer):
         La distance est calculée par rapport à l'axe de rotation du capteur.
         :return: Distance mesurée.
         """
-        r = self._ussensor.distance_centimeters + RobotExplorer.US_DISTORTION
-        return r
+        return self.measure().distance
 
     def turn(self, angle):
         """
         Effectue une rotation horizontale de angle.
         Si angle est positif, le robot tourne vers la droite.
         Si angle est négatif, le robot tourne vers la gauche.
-        L'orientation du robot est mise à jour par cette méthode.
+        L'orientation du robot est mise à jour par cette méthode, à partir
+        de l'odométrie des moteurs (et non de l'angle commandé).
         :param angle: Angle de rotation.
         :return: Nouvelle orientation.
         """
         print("Tourne de {0} degres".format(angle.degrees), file=sys.stderr)
-        self._orientation += angle
         angleMotors = angle.degrees
         steering = 100
         if (angle.radians < 0):
@@ -145,33 +456,77 @@ class RobotSurveyor(RobotExplorer):
             angleMotors = -angleMotors
         angleMotors *= RobotExplorer.CATERPILLAR_SPACING /(2 * RobotExplorer.CATERPILLAR_RADIUS)
         self._motors.on_for_degrees(steering, 25, angleMotors)
+        self.__syncOdometry()
         return self._orientation
 
     def moveForward(self, distance):
         """
         Avance de de distance.
-        La position du robot est  mise à jour par cette méthode.
+        La position du robot est  mise à jour par cette méthode, à partir
+        de l'odométrie des moteurs (et non de la distance commandée).
         :param distance: Distance à parcourir en cm.
         :return: Nouvelle position.        """
         print("Avance de {0}cm".format(distance), file=sys.stderr)
-        dx = distance * self._orientation.sin
-        dy = distance * self._orientation.cos
-        self._position = (self._position[0] + dx, self._position[1] + dy)
         angleMotors = math.degrees(distance / RobotExplorer.CATERPILLAR_RADIUS)
         self._motors.on_for_degrees(0, RobotSurveyor.MOTORS_SPEED, angleMotors)
+        self.__syncOdometry()
         return self._position
 
+    def __syncOdometry(self):
+        """
+        Mise à jour de la pose du robot à partir d'un dernier échantillon
+        de l'odométrie (le déplacement est terminé, l'échantillon est donc
+        exact même si la tâche d'odométrie n'est pas lancée).
+        """
+        pose = self._odometry.update()
+        self._position = pose.position
+        self._orientation = pose.orientation
+
     def goto(self, x=0, y=0, position=None):
         """
         Le robot se deplace vers la position absolue (x, y).
         L'orientation et la position du robot sont modifiées.
         Le déplacement (x,y) est exprimé dans le référentiel de l'espace.
+        Le chemin est recherché par le planificateur dans la grille
+        d'occupation de la carte pour contourner les obstacles connus.
+        Après chaque point de passage, le chemin est replanifié depuis la
+        position atteinte (mesurée par l'odométrie) vers la même
+        destination : le planificateur D* Lite ne réévalue alors que les
+        cellules dont le coût a changé. Si aucun chemin n'est trouvé, le
+        robot ne se déplace pas : c'est à l'appelant de choisir une autre
+        destination.
         :param x: Abscisse (en cm) dans l'espace d'évolution du robot.
         :param y: Ordonnée (en cm) dans l'espace d'évolution du robot.
+        :return: Liste des points de passage suivis, ou None si aucun
+        chemin n'a été trouvé.
         """
         if (position != None):
             x = position[0]
             y = position[1]
+        waypoints = self._planner.plan(self._position, (x, y))
+        if waypoints is None:
+            print("No path found to ({0},{1}) !".format(x, y), file=sys.stderr)
+            return None
+        followed = []
+        for move in range(RobotSurveyor.GOTO_MAX_MOVES):
+            waypoint = waypoints[0]
+            self.__moveTo(waypoint[0], waypoint[1])
+            followed.append(waypoint)
+            if len(waypoints) == 1:
+                break
+            waypoints = self._planner.plan(self._position, (x, y))
+            if waypoints is None:
+                print("No path found from ({0},{1}) !".format(self._position[0], self._position[1]),
+                      file=sys.stderr)
+                break
+        return followed
+
+    def __moveTo(self, x, y):
+        """
+        Le robot se déplace en ligne droite vers la position absolue (x, y).
+        :param x: Abscisse (en cm) dans l'espace d'évolution du robot.
+        :param y: Ordonnée (en cm) dans l'espace d'évolution du robot.
+        """
         dx = x - self._position[0]
         dy = y - self._position[1]
         direction = Angle(radians=math.atan2(dx, dy))
@@ -198,8 +553,10 @@ class SurveyTask(RobotTask):
     DEFAULT_NAME = "Survey"
     THRESHOLD = 50
     STATION_STEP = 50
+    FRONTIER_STRATEGY = "frontier"
+    WALL_STRATEGY = "wall"
 
-    def __init__(self, robot, name=DEFAULT_NAME, auto=False):
+    def __init__(self, robot, name=DEFAULT_NAME, auto=False, strategy=FRONTIER_STRATEGY):
         """
         Constructeur du robot.
 
@@ -213,23 +570,53 @@ class SurveyTask(RobotTask):
         :param irsenseor: Capteur infra-rouge utilisé.
         :param channel: Canal de la télécommande infra-rouge utilisé.
         :param speed: Vitesse de moteur.
+        :param strategy: Stratégie d'exploration : FRONTIER_STRATEGY (par
+        défaut) pour se diriger vers la frontière la plus intéressante,
+        WALL_STRATEGY pour suivre les murs de la station courante.
         """
         super().__init__(robot, name, auto)
         self.__motors = robot.Motors
         self.__ussensor = robot.USSensor
         self.__usmotor = robot.USMotor
+        self.__strategy = strategy
+        self.__frontiers = FrontierDetector(robot.map.grid, planner=DStarLitePlanner(robot.map.grid))
 
     def loop(self):
         """
         Instructions exécutées dans la boucle de façon répétitives.
+        Avec la stratégie des frontières, le suivi des murs n'est utilisé
+        que lorsqu'aucune frontière n'est disponible.
         """
         station = self.robot.surveyTour()
+        if self.__strategy == SurveyTask.FRONTIER_STRATEGY and self.gotoNextFrontier():
+            return
         self.gotoNextStation(station)
 
+    def gotoNextFrontier(self):
+        """
+        Déplacement vers la frontière entre espace exploré et inexploré qui
+        offre le meilleur gain d'information par centimètre parcouru.
+        Une frontière inaccessible est marquée visitée et la suivante est
+        essayée.
+        :return: Faux si aucune frontière accessible n'est disponible.
+        """
+        for score, frontier in self.__frontiers.rankFrontiers(self.robot.position):
+            print("Frontier of {0} cells at ({1},{2})".format(
+                len(frontier), frontier.target[0], frontier.target[1]), file=sys.stderr)
+            self.__frontiers.markVisited(frontier.target)
+            if self.robot.goto(position=frontier.target) is not None:
+                return True
+            print("Frontier unreachable !", file=sys.stderr)
+        print("No frontier found !", file=sys.stderr)
+        return False
 
     def gotoNextStation(self, station):
         print("Station-Orientation={0}".format(station.orientation.degrees), file=sys.stderr)
         nearestWall = station.getNearestWall()
+        if nearestWall is None:
+            # La station ne voit aucun mur : on recherche dans toute la
+            # carte un mur déjà relevé à proximité.
+            nearestWall = self.robot.map.getNearestWall(station.X, station.Y, SurveyTask.THRESHOLD)
         if nearestWall is None:
             nearestPoint = station.getNearestPoint()
             if nearestPoint is None:
@@ -237,31 +624,42 @@ class SurveyTask(RobotTask):
                 self.robot.moveForward(SurveyTask.STATION_STEP)
             else:
                 print("No wall, but at least one point found !", file=sys.stderr)
-                self.robot.turn(nearestPoint.rawAngle - robot.orientation)
+                self.robot.turn(Angle(degrees=nearestPoint.rawAngle))
                 self.robot.moveForward(nearestPoint.rawDistance - SurveyTask.STATION_STEP)
         else:
             if nearestWall.isLeftWall:
                 print("A wall was found on the left !", file=sys.stderr)
-                self.robot.goto(position=self.__onLeftWall(nearestWall.Pt1, nearestWall.Pt2))
+                self.__gotoAlongWall(self.__onLeftWall(nearestWall.Pt1, nearestWall.Pt2))
             elif nearestWall.isRightWall:
                 print("A wall was found on the right !", file=sys.stderr)
-                self.robot.goto(position=self.__onRightWall(nearestWall.Pt1, nearestWall.Pt2))
+                self.__gotoAlongWall(self.__onRightWall(nearestWall.Pt1, nearestWall.Pt2))
             elif nearestWall.isFrontWall:
                 if station.hasRightWall and station.hasLeftWall:
                     print("Dead end found ! Go back !", file=sys.stderr)
-                    robot.turn(FLAT_ANGLE)
+                    self.robot.turn(FLAT_ANGLE)
                 elif station.hasRightWall :
                     print("A wall was found straight ahead with a wall on the right !", file=sys.stderr)
-                    self.robot.goto(position=self.__onRightWall(nearestWall.Pt1, nearestWall.Pt2))
+                    self.__gotoAlongWall(self.__onRightWall(nearestWall.Pt1, nearestWall.Pt2))
                 elif station.hasLeftWall:
                     print("A wall was found straight ahead with a wall on the left !", file=sys.stderr)
-                    self.robot.goto(position=self.__onLeftWall(nearestWall.Pt1, nearestWall.Pt2))
+                    self.__gotoAlongWall(self.__onLeftWall(nearestWall.Pt1, nearestWall.Pt2))
                 else:
                     print("A wall was found straight ahead !", file=sys.stderr)
                     self.robot.turn(RIGHT_ANGLE)
             else:
                 print("Un mur bizare a ete trouve. Que faire ?", file=sys.stderr)
 
+    def __gotoAlongWall(self, destination):
+        """
+        Déplacement vers la destination calculée le long d'un mur. Si elle
+        est inaccessible, le robot tourne d'un angle droit : la station
+        suivante verra les murs sous un autre angle.
+        :param destination: Position (x, y) à atteindre.
+        """
+        if self.robot.goto(position=destination) is None:
+            print("Destination unreachable ! Turn right !", file=sys.stderr)
+            self.robot.turn(RIGHT_ANGLE)
+
     def __onRightWall(self, p1, p2):
         """
         Calcul de la destination suivante lorqu'un mur est rencontré à droite.
@@ -314,7 +712,7 @@ class SurveyTask(RobotTask):
 if __name__ == '__main__':
     import time
     robot = RobotSurveyor()
-    WebServerTask(robot)
+    MapWebServerTask(robot)
     survey = SurveyTask(robot)
     StartStopTask(robot, survey)
     #IRControlledTankTask(robot)
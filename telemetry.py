@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+"""
+Ce module définit la télémétrie du robot explorer.
+
+Une mesure télémétrique est une rafale de lectures du capteur ultra-son,
+effectuées avec un délai minimal, et réduites à une seule distance par un
+filtre robuste (médiane ou moyenne tronquée). Les échos hors de portée
+(capteur saturé ou lecture nulle) sont signalés avant que la mesure ne
+devienne un SurveyPoint. La durée de chaque lecture et la dispersion des
+rafales sont comptabilisées dans des statistiques.
+
+Auteur : André-Pierre LIMOUZIN
+Version : 1.0 - 10.2026
+"""
+
+import math
+
+
+#
+#
+##############################################################################
+class TelemetryReading:
+    """
+    Cette classe modélise une mesure télémétrique issue d'une rafale de
+    lectures.
+    """
+    def __init__(self, distance, samples, variance, latency, timestamp, isOutOfRange):
+        """
+        :param distance: Distance filtrée, corrigée de l'excentricité du capteur.
+        :param samples: Lectures brutes de la rafale.
+        :param variance: Variance des lectures à portée.
+        :param latency: Durée moyenne d'une lecture en secondes.
+        :param timestamp: Instant du milieu de la rafale.
+        :param isOutOfRange: Vrai si aucun écho n'a été reçu à portée.
+        """
+        self.__distance = distance
+        self.__samples = samples
+        self.__variance = variance
+        self.__latency = latency
+        self.__timestamp = timestamp
+        self.__isOutOfRange = isOutOfRange
+
+    @property
+    def distance(self):
+        return self.__distance
+
+    @property
+    def samples(self):
+        return self.__samples
+
+    @property
+    def variance(self):
+        return self.__variance
+
+    @property
+    def latency(self):
+        return self.__latency
+
+    @property
+    def timestamp(self):
+        return self.__timestamp
+
+    @property
+    def isOutOfRange(self):
+        return self.__isOutOfRange
+
+    def __str__(self):
+        return "TelemetryReading(distance={0}, variance={1}, outOfRange={2})".format(
+            self.__distance, self.__variance, self.__isOutOfRange)
+
+
+#
+#
+##############################################################################
+class TelemetryStatistics:
+    """
+    Cette classe cumule les statistiques des mesures télémétriques : nombre
+    de mesures et de lectures, proportion d'échos hors de portée, durée des
+    lectures et dispersion des rafales.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Remise à zéro des statistiques.
+        """
+        self.__readings = 0
+        self.__samples = 0
+        self.__outOfRange = 0
+        self.__latencySum = 0.0
+        self.__latencyMax = 0.0
+        self.__varianceSum = 0.0
+        self.__varianceCount = 0
+
+    def add(self, reading):
+        """
+        Prise en compte d'une mesure.
+
+        :param reading: TelemetryReading à comptabiliser.
+        """
+        self.__readings += 1
+        self.__samples += len(reading.samples)
+        self.__latencySum += reading.latency * len(reading.samples)
+        self.__latencyMax = max(self.__latencyMax, reading.latency)
+        if reading.isOutOfRange:
+            self.__outOfRange += 1
+        else:
+            self.__varianceSum += reading.variance
+            self.__varianceCount += 1
+
+    @property
+    def readings(self):
+        return self.__readings
+
+    @property
+    def samples(self):
+        return self.__samples
+
+    @property
+    def outOfRange(self):
+        return self.__outOfRange
+
+    @property
+    def meanLatency(self):
+        """
+        :return: Durée moyenne d'une lecture du capteur en secondes.
+        """
+        return self.__latencySum / self.__samples if self.__samples > 0 else 0.0
+
+    @property
+    def maxLatency(self):
+        """
+        :return: Plus grande durée moyenne de lecture d'une rafale en secondes.
+        """
+        return self.__latencyMax
+
+    @property
+    def meanVariance(self):
+        """
+        :return: Variance moyenne des rafales à portée (en cm²).
+        """
+        return self.__varianceSum / self.__varianceCount if self.__varianceCount > 0 else 0.0
+
+    def toDict(self):
+        """
+        :return: Dictionnaire des statistiques.
+        """
+        return {
+            "readings": self.__readings,
+            "samples": self.__samples,
+            "outOfRange": self.__outOfRange,
+            "meanLatency": self.meanLatency,
+            "maxLatency": self.maxLatency,
+            "meanVariance": self.meanVariance,
+            "meanDeviation": math.sqrt(self.meanVariance)}
+
+
+#
+#
+##############################################################################
+class Telemeter:
+    """
+    Cette classe effectue les mesures télémétriques par rafales sur un
+    capteur ultra-son (UltrasonicSensor ou sa simulation).
+
+    Une mesure est hors de portée lorsque la majorité des lectures de la
+    rafale sont saturées (au moins MAX_RANGE) ou nulles (moins de
+    MIN_RANGE). Sa distance vaut alors MAX_RANGE.
+    """
+    MEDIAN = "median"
+    TRIMMED_MEAN = "trimmed-mean"
+    DEFAULT_BURST = 5
+    DEFAULT_TRIM = 0.2
+    MIN_RANGE = 3.0
+    MAX_RANGE = 255.0
+
+    def __init__(self, sensor, devices, distortion=0.0, burst=DEFAULT_BURST, method=MEDIAN,
+                 trim=DEFAULT_TRIM, interval=0.0):
+        """
+        Initialisation du télémètre.
+
+        :param sensor: Capteur ultra-son exposant distance_centimeters.
+        :param devices: RobotDevices fournissant l'horloge du robot.
+        :param distortion: Distance ajoutée aux mesures (excentricité du capteur).
+        :param burst: Nombre de lectures par mesure.
+        :param method: Filtre appliqué à la rafale (MEDIAN ou TRIMMED_MEAN).
+        :param trim: Proportion des lectures écartées à chaque extrémité
+        par la moyenne tronquée.
+        :param interval: Délai entre deux lectures en secondes.
+        """
+        self.__sensor = sensor
+        self.__devices = devices
+        self.__distortion = distortion
+        self.__burst = burst
+        self.__method = method
+        self.__trim = trim
+        self.__interval = interval
+        self.__statistics = TelemetryStatistics()
+
+    @property
+    def burst(self):
+        return self.__burst
+
+    @property
+    def statistics(self):
+        return self.__statistics
+
+    def isOutOfRange(self, value):
+        """
+        :return: Vrai si la lecture brute value correspond à un écho hors de portée.
+        """
+        return value < Telemeter.MIN_RANGE or value >= Telemeter.MAX_RANGE
+
+    def measure(self, burst=None):
+        """
+        Mesure télémétrique par rafale.
+
+        :param burst: Nombre de lectures (celui du télémètre par défaut).
+        :return: TelemetryReading.
+        """
+        if burst is None:
+            burst = self.__burst
+        samples = []
+        start = self.__devices.time()
+        for k in range(burst):
+            if k > 0 and self.__interval > 0:
+                self.__devices.sleep(self.__interval)
+            samples.append(self.__sensor.distance_centimeters)
+        end = self.__devices.time()
+        latency = (end - start - self.__interval * (burst - 1)) / burst
+        inRange = sorted(value for value in samples if not self.isOutOfRange(value))
+        if 2 * len(inRange) <= len(samples):
+            reading = TelemetryReading(Telemeter.MAX_RANGE + self.__distortion, samples, 0.0,
+                                       latency, (start + end) / 2, True)
+        else:
+            mean = sum(inRange) / len(inRange)
+            variance = sum((value - mean) * (value - mean) for value in inRange) / len(inRange)
+            reading = TelemetryReading(self.__filter(inRange) + self.__distortion, samples, variance,
+                                       latency, (start + end) / 2, False)
+        self.__statistics.add(reading)
+        return reading
+
+    def __filter(self, values):
+        """
+        Réduction d'une liste triée de lectures à une seule valeur.
+        """
+        n = len(values)
+        if self.__method == Telemeter.TRIMMED_MEAN:
+            k = min(int(n * self.__trim), (n - 1) // 2)
+            kept = values[k:n - k]
+            return sum(kept) / len(kept)
+        if n % 2 == 1:
+            return values[n // 2]
+        return (values[n // 2 - 1] + values[n // 2]) / 2
@@ -0,0 +1,77 @@
+# _*_ coding: utf-8 _*_
+"""
+Construction de stations synthétiques pour les tests : les mesures sont
+obtenues par lancer de rayons dans un SimWorld.
+"""
+
+import math
+import random
+
+from simulator import SimWorld, SimUltrasonicSensor
+from survey_model import Angle, SurveyMap, SurveyNode
+
+
+def room(obstacles=()):
+    """
+    :return: Pièce de 400 x 300 cm centrée sur l'origine.
+    """
+    return SimWorld.room(400, 300, obstacles)
+
+
+BOX = ((60, 40), (120, 40), (120, 90), (60, 90))
+
+SURVEY_POSES = ((0, 0, 0), (-80, -60, 35), (-150, 40, -120))
+
+
+def scan(surveyMap, world, pose, estimate=None, step=10, noise=0.0, rng=None):
+    """
+    Tour d'horizon depuis la pose réelle pose, enregistré à la pose
+    estimée estimate (pose réelle par défaut).
+
+    :param surveyMap: SurveyMap de la station (la station n'y est pas ajoutée).
+    :param world: SimWorld observé.
+    :param pose: Pose réelle (x, y, orientation en degrés).
+    :param estimate: Pose estimée (x, y, orientation en degrés).
+    :param step: Pas angulaire en degrés.
+    :param noise: Ecart-type du bruit de mesure en cm.
+    :param rng: Générateur aléatoire du bruit.
+    :return: SurveyNode dont les murs sont calculés.
+    """
+    if estimate is None:
+        estimate = pose
+    node = SurveyNode(surveyMap, estimate[0], estimate[1], Angle(degrees=estimate[2]), (0, 0))
+    angles = []
+    distances = []
+    for a in range(-180, 180, step):
+        distance = world.raycast(pose[0], pose[1], pose[2] + a, SimUltrasonicSensor.MAX_RANGE)
+        if distance is None:
+            node.addOutOfRange(a)
+            continue
+        if noise > 0:
+            distance += rng.gauss(0.0, noise)
+        angles.append(a)
+        distances.append(distance)
+    node.addPolarPoints(angles, distances)
+    node.computeWallData()
+    return node
+
+
+def surveyedMap(compact=False):
+    """
+    :param compact: Si vrai, les points sont stockés en colonnes.
+    :return: SurveyMap des stations relevées aux poses SURVEY_POSES dans la
+    pièce contenant BOX, avec un bruit de mesure de 0,5 cm.
+    """
+    world = room([BOX])
+    rng = random.Random(11)
+    surveyMap = SurveyMap(compact)
+    for pose in SURVEY_POSES:
+        surveyMap.addNode(scan(surveyMap, world, pose, noise=0.5, rng=rng))
+    return surveyMap
+
+
+def distance(a, b):
+    """
+    :return: Distance entre deux positions (x, y).
+    """
+    return math.hypot(a[0] - b[0], a[1] - b[1])
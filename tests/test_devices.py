@@ -0,0 +1,36 @@
+# _*_ coding: utf-8 _*_
+"""
+Tests de la couche d'abstraction matérielle (module devices).
+"""
+
+import unittest
+
+from devices import RobotDevices, EV3Devices
+from simulator import SimWorld, SimulatedDevices
+
+
+class RobotDevicesTest(unittest.TestCase):
+
+    def test_abstract_factory_cannot_be_instantiated(self):
+        with self.assertRaises(TypeError):
+            RobotDevices()
+
+    def test_incomplete_factory_cannot_be_instantiated(self):
+        class PartialDevices(RobotDevices):
+            def _createUSMotor(self):
+                return object()
+        with self.assertRaises(TypeError):
+            PartialDevices()
+
+    def test_devices_are_created_once(self):
+        devices = SimulatedDevices(SimWorld.room(100, 100))
+        self.assertIs(devices.usMotor(), devices.usMotor())
+        self.assertIs(devices.movingMotors(), devices.movingMotors())
+
+    def test_ev3_factory_is_complete(self):
+        # L'import d'ev3dev2 n'a lieu qu'à la création d'un équipement.
+        self.assertIsInstance(EV3Devices(), RobotDevices)
+
+
+if __name__ == '__main__':
+    unittest.main()
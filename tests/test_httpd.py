@@ -0,0 +1,425 @@
+# _*_ coding: utf-8 _*_
+"""
+Tests du serveur de la carte (module httpd) : lecture cohérente de la carte,
+flux des modifications, connexions maintenues et compression.
+"""
+
+import functools
+import gzip
+import http.client
+import os
+import socket
+import tempfile
+import time
+import unittest
+from threading import Thread
+from unittest import mock
+
+from common_apl.xmlio import XmlStreamWriter
+from httpd import CompressedAssets, GzipHTTPRequestHandler, MapEventChannel, MapHTTPRequestHandler, MapRegions, \
+    MapSnapshot, PooledHTTPServer
+from survey_codec import SurveyMapBinaryAdapter, SurveyMapJsonAdapter
+from survey_model import SurveyMap
+from survey_xmlio import SurveyMapAdapter
+from tests.synthetic import room, scan
+
+
+def serializeXml(surveyMap):
+    return XmlStreamWriter.dumps(SurveyMapAdapter(), surveyMap)
+
+
+class MapReadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.map = SurveyMap()
+        self.map.addNode(scan(self.map, room(), (0, 0, 0)))
+
+    def test_revision_is_odd_during_change(self):
+        revisions = []
+        integrateNode = self.map.grid.integrateNode
+        self.map.grid.integrateNode = lambda node: (revisions.append(self.map.revision), integrateNode(node))
+        self.map.addNode(scan(self.map, room(), (50, 0, 0)))
+        self.map.relocateNodes({1: (60, 0, self.map[1].orientation)})
+        self.assertEqual(len(revisions), 1)
+        self.assertEqual(revisions[0] % 2, 1)
+        self.assertEqual(self.map.revision % 2, 0)
+        self.assertEqual(self.map.revision, 2 * self.map.version)
+
+    def test_change_during_serialization_is_retried(self):
+        calls = []
+
+        def serialize(surveyMap):
+            calls.append(surveyMap.version)
+            if len(calls) == 1:
+                # La tâche du robot ajoute une station pendant la sérialisation.
+                surveyMap.addNode(scan(surveyMap, room(), (50, 0, 0)))
+            return serializeXml(surveyMap)
+
+        body, version = MapSnapshot.read(self.map, serialize, 3, 0.0)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(version, self.map.version)
+        self.assertEqual(body, serializeXml(self.map))
+
+    def test_map_being_modified_is_not_read(self):
+        class ChangingMap:
+            revision = 3
+            version = 1
+        self.assertIsNone(MapSnapshot.read(ChangingMap(), serializeXml, 3, 0.0))
+
+    def test_snapshot_keeps_previous_document(self):
+        failing = []
+
+        def serialize(surveyMap):
+            if len(failing) > 0:
+                raise RuntimeError("Map changed during iteration")
+            return serializeXml(surveyMap)
+
+        snapshot = MapSnapshot(self.map, serialize, "text/xml; charset=utf-8")
+        previous = snapshot.get()
+        failing.append(True)
+        self.map.addNode(scan(self.map, room(), (50, 0, 0)))
+        self.assertEqual(snapshot.get(), previous)
+        self.assertIsNone(MapSnapshot(self.map, serialize, "text/xml; charset=utf-8").get())
+
+    def test_region_etag_matches_content_version(self):
+        regions = MapRegions(self.map)
+        region = regions.region(None, 0)
+        body, etag = regions.get(region)
+        self.assertEqual(etag, regions.etag(region))
+
+
+class MapEventsTest(unittest.TestCase):
+
+    WORKERS = 2
+    MAX_STREAMS = 4
+
+    def setUp(self):
+        self.map = SurveyMap()
+        self.events = MapEventChannel(self.map, maxStreams=MapEventsTest.MAX_STREAMS)
+        snapshot = MapSnapshot(self.map, lambda surveyMap: XmlStreamWriter.dumps(SurveyMapAdapter(), surveyMap),
+                               "text/xml; charset=utf-8")
+        handler = type("MapHTTPRequestHandler", (MapHTTPRequestHandler,),
+                       {"mapPath": "/www/map.xml", "mapSnapshots": [snapshot],
+                        "eventsPath": "/www/map.events", "mapEvents": self.events,
+                        "protocol_version": "HTTP/1.1", "timeout": 5})
+        self.httpd = PooledHTTPServer(("127.0.0.1", 0), handler, workers=MapEventsTest.WORKERS, timeout=5)
+        Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.port = self.httpd.server_address[1]
+        self.sockets = []
+
+    def tearDown(self):
+        self.events.close()
+        for client in self.sockets:
+            client.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def openStream(self):
+        """
+        :return: Tuple (socket, en-tête de la réponse) d'un flux ouvert.
+        """
+        client = socket.create_connection(("127.0.0.1", self.port), timeout=5)
+        self.sockets.append(client)
+        client.sendall(b"GET /www/map.events?since=0 HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        head = b""
+        while b"\r\n\r\n" not in head:
+            head += client.recv(1024)
+        return client, head
+
+    def get(self, path):
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        try:
+            connection.request("GET", path)
+            response = connection.getresponse()
+            return response.status, response.read()
+        finally:
+            connection.close()
+
+    def test_streams_do_not_hold_workers(self):
+        for k in range(MapEventsTest.WORKERS + 1):
+            client, head = self.openStream()
+            self.assertIn(b" 200 ", head.split(b"\r\n")[0])
+        status, body = self.get("/www/map.xml")
+        self.assertEqual(status, 200)
+        self.assertIn(b"<", body)
+
+    def test_streams_are_capped(self):
+        for k in range(MapEventsTest.MAX_STREAMS):
+            self.openStream()
+        client, head = self.openStream()
+        self.assertIn(b" 503 ", head.split(b"\r\n")[0])
+        self.assertEqual(self.get("/www/map.xml")[0], 200)
+
+    def test_delta_is_streamed(self):
+        client, head = self.openStream()
+        self.map.addNode(scan(self.map, room(), (0, 0, 0)))
+        data = head.partition(b"\r\n\r\n")[2]
+        while b"event: delta" not in data or not data.endswith(b"\n\n"):
+            data += client.recv(4096)
+        self.assertIn("id: {0}".format(self.map.version).encode(), data)
+
+    def test_closed_stream_is_released(self):
+        client, head = self.openStream()
+        client.close()
+        self.map.addNode(scan(self.map, room(), (0, 0, 0)))
+        self.map.addNode(scan(self.map, room(), (50, 0, 0)))
+        for k in range(50):
+            if self.events.streams == 0:
+                break
+            time.sleep(0.1)
+        self.assertEqual(self.events.streams, 0)
+
+
+class KeepAliveTest(unittest.TestCase):
+
+    WORKERS = 2
+
+    def setUp(self):
+        self.map = SurveyMap()
+        self.map.addNode(scan(self.map, room(), (0, 0, 0)))
+        snapshot = MapSnapshot(self.map, serializeXml, "text/xml; charset=utf-8")
+        handler = type("MapHTTPRequestHandler", (MapHTTPRequestHandler,),
+                       {"mapPath": "/www/map.xml", "mapSnapshots": [snapshot],
+                        "protocol_version": "HTTP/1.1", "timeout": 5})
+        self.httpd = PooledHTTPServer(("127.0.0.1", 0), handler, workers=KeepAliveTest.WORKERS, timeout=5)
+        Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.port = self.httpd.server_address[1]
+        self.connections = []
+
+    def tearDown(self):
+        for connection in self.connections:
+            connection.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def get(self, connection=None):
+        """
+        :return: Tuple (connexion, statut de la réponse) d'une requête sur la carte.
+        """
+        if connection is None:
+            connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+            self.connections.append(connection)
+        connection.request("GET", "/www/map.xml")
+        response = connection.getresponse()
+        response.read()
+        return connection, response.status
+
+    def test_idle_connections_do_not_block_clients(self):
+        for k in range(2 * KeepAliveTest.WORKERS):
+            self.get()
+        start = time.monotonic()
+        connection, status = self.get()
+        self.assertEqual(status, 200)
+        self.assertLess(time.monotonic() - start, 1.0)
+
+    def test_connection_is_kept_alive(self):
+        connection, status = self.get()
+        client = connection.sock
+        time.sleep(0.2)
+        self.assertEqual(self.get(connection)[1], 200)
+        self.assertIs(connection.sock, client)
+
+    def test_pipelined_requests_are_served(self):
+        client = socket.create_connection(("127.0.0.1", self.port), timeout=5)
+        self.connections.append(client)
+        request = b"GET /www/map.xml HTTP/1.1\r\nHost: localhost\r\n\r\n"
+        client.sendall(request + request)
+        data = b""
+        while data.count(b"HTTP/1.1 200") < 2 or b"\r\n\r\n" not in data.rpartition(b"HTTP/1.1 200")[2]:
+            chunk = client.recv(65536)
+            self.assertNotEqual(chunk, b"")
+            data += chunk
+
+
+class AcceptEncodingTest(unittest.TestCase):
+
+    def acceptsGzip(self, accept):
+        handler = GzipHTTPRequestHandler.__new__(GzipHTTPRequestHandler)
+        handler.headers = {} if accept is None else {"Accept-Encoding": accept}
+        return handler._acceptsGzip()
+
+    def test_accept_encoding(self):
+        self.assertTrue(self.acceptsGzip("gzip, deflate, br"))
+        self.assertTrue(self.acceptsGzip("deflate, x-gzip"))
+        self.assertTrue(self.acceptsGzip("*"))
+        self.assertTrue(self.acceptsGzip("br;q=1.0, GZIP;q=0.5"))
+        self.assertFalse(self.acceptsGzip(None))
+        self.assertFalse(self.acceptsGzip("identity"))
+        self.assertFalse(self.acceptsGzip("gzip;q=0"))
+        self.assertFalse(self.acceptsGzip("gzip;q=x"))
+
+    def test_explicit_gzip_overrides_wildcard(self):
+        self.assertTrue(self.acceptsGzip("*;q=0, gzip"))
+        self.assertFalse(self.acceptsGzip("*, gzip;q=0"))
+        self.assertFalse(self.acceptsGzip("*;q=0, br"))
+
+
+class CompressedFilesTest(unittest.TestCase):
+
+    CONTENT = b"<html>" + b"carte du robot " * 200 + b"</html>"
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "map.html")
+        with open(self.path, "wb") as file:
+            file.write(CompressedFilesTest.CONTENT)
+        with open(os.path.join(self.directory.name, "map.png"), "wb") as file:
+            file.write(b"\x89PNG")
+        handler = type("GzipHTTPRequestHandler", (GzipHTTPRequestHandler,),
+                       {"assets": CompressedAssets(self.directory.name),
+                        "protocol_version": "HTTP/1.1", "timeout": 5})
+        handler.log_message = lambda *args: None
+        self.httpd = PooledHTTPServer(("127.0.0.1", 0), functools.partial(handler, directory=self.directory.name),
+                                      workers=2, timeout=5)
+        Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.directory.cleanup()
+
+    def get(self, path, headers, method="GET"):
+        connection = http.client.HTTPConnection("127.0.0.1", self.httpd.server_address[1], timeout=5)
+        try:
+            connection.request(method, path, headers=headers)
+            response = connection.getresponse()
+            return response, response.read()
+        finally:
+            connection.close()
+
+    def test_compressed_file(self):
+        response, body = self.get("/map.html", {"Accept-Encoding": "gzip"})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+        self.assertEqual(response.getheader("Vary"), "Accept-Encoding")
+        self.assertEqual(response.getheader("Content-Type"), "text/html")
+        self.assertTrue(response.getheader("ETag").endswith('-gz"'))
+        self.assertLess(len(body), len(CompressedFilesTest.CONTENT))
+        self.assertEqual(gzip.decompress(body), CompressedFilesTest.CONTENT)
+
+    def test_head_has_no_body(self):
+        response, body = self.get("/map.html", {"Accept-Encoding": "gzip"}, "HEAD")
+        self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+        self.assertEqual(body, b"")
+
+    def test_not_modified(self):
+        response, body = self.get("/map.html", {"Accept-Encoding": "gzip"})
+        etag = response.getheader("ETag")
+        lastModified = response.getheader("Last-Modified")
+        response, body = self.get("/map.html", {"Accept-Encoding": "gzip", "If-None-Match": etag})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(response.getheader("ETag"), etag)
+        self.assertEqual(response.getheader("Vary"), "Accept-Encoding")
+        self.assertEqual(body, b"")
+        response, body = self.get("/map.html", {"Accept-Encoding": "gzip", "If-Modified-Since": lastModified})
+        self.assertEqual(response.status, 304)
+
+    def test_modified_file_is_compressed_again(self):
+        response, body = self.get("/map.html", {"Accept-Encoding": "gzip"})
+        with open(self.path, "ab") as file:
+            file.write(b"<!-- fin -->")
+        response, body = self.get("/map.html", {"Accept-Encoding": "gzip", "If-None-Match": response.getheader("ETag")})
+        self.assertEqual(response.status, 200)
+        self.assertTrue(gzip.decompress(body).endswith(b"<!-- fin -->"))
+
+    def test_uncompressed_responses(self):
+        response, body = self.get("/map.html", {"Accept-Encoding": "identity"})
+        self.assertIsNone(response.getheader("Content-Encoding"))
+        self.assertEqual(body, CompressedFilesTest.CONTENT)
+        response, body = self.get("/map.png", {"Accept-Encoding": "gzip"})
+        self.assertIsNone(response.getheader("Content-Encoding"))
+        self.assertEqual(body, b"\x89PNG")
+
+
+class CompressedMapTest(unittest.TestCase):
+
+    def test_snapshot_is_compressed_once_per_version(self):
+        surveyMap = SurveyMap()
+        surveyMap.addNode(scan(surveyMap, room(), (0, 0, 0)))
+        snapshot = MapSnapshot(surveyMap, serializeXml, "text/xml; charset=utf-8")
+        with mock.patch("gzip.compress", wraps=gzip.compress) as compress:
+            body, etag, lastModified = snapshot.get(True)
+            self.assertIs(snapshot.get(True)[0], body)
+            self.assertEqual(compress.call_count, 1)
+            self.assertEqual(gzip.decompress(body), snapshot.get()[0])
+            self.assertEqual(etag, snapshot.get()[1][:-1] + '-gz"')
+            surveyMap.addNode(scan(surveyMap, room(), (50, 0, 0)))
+            self.assertNotEqual(snapshot.get(True)[1], etag)
+            snapshot.get(True)
+            self.assertEqual(compress.call_count, 2)
+
+
+class MapNegotiationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.map = SurveyMap()
+        self.map.addNode(scan(self.map, room(), (0, 0, 0)))
+        snapshots = [MapSnapshot(self.map, serializeXml, "text/xml; charset=utf-8", "xml"),
+                     MapSnapshot(self.map, SurveyMapJsonAdapter().dumps, "application/json", "json"),
+                     MapSnapshot(self.map, SurveyMapBinaryAdapter().dumps, SurveyMapBinaryAdapter.MEDIA_TYPE, "bin")]
+        handler = type("MapHTTPRequestHandler", (MapHTTPRequestHandler,),
+                       {"mapPath": "/www/map.xml", "mapSnapshots": snapshots,
+                        "protocol_version": "HTTP/1.1", "timeout": 5})
+        handler.log_message = lambda *args: None
+        self.httpd = PooledHTTPServer(("127.0.0.1", 0), handler, workers=2, timeout=5)
+        Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def contentType(self, path, accept=None):
+        """
+        :return: Type MIME de la carte servie, après vérification de son contenu.
+        """
+        connection = http.client.HTTPConnection("127.0.0.1", self.httpd.server_address[1], timeout=5)
+        try:
+            connection.request("GET", path, headers={} if accept is None else {"Accept": accept})
+            response = connection.getresponse()
+            body = response.read()
+        finally:
+            connection.close()
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("Vary"), "Accept, Accept-Encoding")
+        contentType = response.getheader("Content-Type").split(";")[0]
+        if contentType == "application/json":
+            self.assertEqual(body, SurveyMapJsonAdapter().dumps(self.map))
+        elif contentType == SurveyMapBinaryAdapter.MEDIA_TYPE:
+            self.assertEqual(body, SurveyMapBinaryAdapter().dumps(self.map))
+        else:
+            self.assertEqual(body, serializeXml(self.map))
+        return contentType
+
+    def test_format_parameter(self):
+        self.assertEqual(self.contentType("/www/map.xml?format=json"), "application/json")
+        self.assertEqual(self.contentType("/www/map.xml?format=bin", "application/json"),
+                         SurveyMapBinaryAdapter.MEDIA_TYPE)
+        self.assertEqual(self.contentType("/www/map.xml?format=xml", "application/json"), "text/xml")
+        self.assertEqual(self.contentType("/www/map.xml?format=svg", "application/json"), "application/json")
+
+    def test_accept_header(self):
+        self.assertEqual(self.contentType("/www/map.xml"), "text/xml")
+        self.assertEqual(self.contentType("/www/map.xml", "application/json"), "application/json")
+        self.assertEqual(self.contentType("/www/map.xml", SurveyMapBinaryAdapter.MEDIA_TYPE),
+                         SurveyMapBinaryAdapter.MEDIA_TYPE)
+        self.assertEqual(self.contentType("/www/map.xml", "image/png"), "text/xml")
+
+    def test_wildcards_give_xml(self):
+        self.assertEqual(self.contentType("/www/map.xml", "*/*"), "text/xml")
+        self.assertEqual(self.contentType("/www/map.xml", "text/*"), "text/xml")
+        self.assertEqual(self.contentType("/www/map.xml", "application/*"), "application/json")
+
+    def test_quality_ordering(self):
+        self.assertEqual(self.contentType("/www/map.xml", "text/xml;q=0.2, application/json;q=0.9"),
+                         "application/json")
+        self.assertEqual(self.contentType("/www/map.xml", "application/json;q=0.5, text/xml"), "text/xml")
+        self.assertEqual(self.contentType("/www/map.xml", "*/*;q=0.8, application/json;q=0.5"), "text/xml")
+        # Un type explicitement refusé n'est pas servi au titre du joker.
+        self.assertEqual(self.contentType("/www/map.xml", "text/xml;q=0, */*"), "application/json")
+        # A qualité égale, le type explicite l'emporte sur le joker.
+        self.assertEqual(self.contentType("/www/map.xml", "*/*, application/json"), "application/json")
+        self.assertEqual(self.contentType("/www/map.xml", "application/json;q=0, text/xml;q=0.1"), "text/xml")
+
+
+if __name__ == '__main__':
+    unittest.main()
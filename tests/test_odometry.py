@@ -0,0 +1,116 @@
+# _*_ coding: utf-8 _*_
+"""
+Tests de l'odométrie (module odometry) : intégration des compteurs des
+moteurs et interpolation de l'historique des poses.
+"""
+
+import math
+import unittest
+
+from odometry import Odometry
+from survey_model import Angle
+
+
+class StubMotor:
+    """
+    Moteur dont le compteur de position est fixé par le test.
+    """
+    def __init__(self):
+        self.position = 0
+
+
+class StubDevices:
+    """
+    Horloge simulée du robot.
+    """
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+
+class OdometryTest(unittest.TestCase):
+
+    SPACING = 12.0
+    RADIUS = 360 / (2 * math.pi)
+
+    def setUp(self):
+        # Un degré de rotation d'une roue fait avancer sa chenille d'un cm.
+        self.left = StubMotor()
+        self.right = StubMotor()
+        self.devices = StubDevices()
+        self.odometry = Odometry(self.left, self.right, self.devices, OdometryTest.SPACING, OdometryTest.RADIUS)
+
+    def move(self, left, right, steps=1, duration=1.0):
+        """
+        Avance des chenilles de left et right cm en steps échantillons.
+        """
+        for k in range(steps):
+            self.left.position += left / steps
+            self.right.position += right / steps
+            self.devices.now += duration / steps
+            pose = self.odometry.update()
+        return pose
+
+    def assertPose(self, pose, x, y, degrees):
+        self.assertAlmostEqual(pose.X, x, 6)
+        self.assertAlmostEqual(pose.Y, y, 6)
+        self.assertAlmostEqual(math.degrees(pose.orientation.radians), degrees, 6)
+
+    def test_straight_move(self):
+        self.assertPose(self.move(50, 50, 5), 0, 50, 0)
+        self.odometry.reset(0, 0, Angle(degrees=90))
+        self.assertPose(self.move(20, 20), 20, 0, 90)
+
+    def test_turn_in_place(self):
+        # Quart de tour vers la droite : chaque chenille parcourt un quart
+        # du cercle de diamètre SPACING.
+        quarter = math.pi * OdometryTest.SPACING / 4
+        self.assertPose(self.move(quarter, -quarter, 4), 0, 0, 90)
+        self.assertPose(self.move(-2 * quarter, 2 * quarter, 3), 0, 0, -90)
+
+    def test_arc_matches_closed_form(self):
+        left, right = 60.0, 40.0
+        ds = (left + right) / 2
+        dTheta = (left - right) / OdometryTest.SPACING
+        radius = ds / dTheta
+        pose = self.move(left, right, 7)
+        self.assertPose(pose, radius * (1 - math.cos(dTheta)), radius * math.sin(dTheta),
+                        math.degrees(math.atan2(math.sin(dTheta), math.cos(dTheta))))
+
+    def test_pose_at_interpolates(self):
+        self.move(10, 10)
+        self.move(10, 10)
+        self.assertPose(self.odometry.poseAt(1.5), 0, 15, 0)
+        self.assertPose(self.odometry.poseAt(-1.0), 0, 0, 0)
+        self.assertPose(self.odometry.poseAt(5.0), 0, 20, 0)
+        self.assertEqual(len(self.odometry.history(1.0)), 2)
+
+    def test_pose_at_interpolates_orientation(self):
+        self.odometry.reset(0, 0, Angle(degrees=170))
+        quarter = math.pi * OdometryTest.SPACING / 4
+        self.move(quarter * 2 / 9, -quarter * 2 / 9)
+        # De 170° à -170° : l'interpolation passe par 180°.
+        self.assertAlmostEqual(math.degrees(self.odometry.poseAt(0.5).orientation.radians) % 360, 180, 6)
+
+    def test_reset(self):
+        self.move(10, 10)
+        self.devices.now += 1.0
+        self.odometry.reset(100, 50, Angle(degrees=90))
+        self.assertTrue(self.odometry.pose.isReset)
+        self.assertPose(self.odometry.pose, 100, 50, 90)
+        self.assertPose(self.move(10, 10), 110, 50, 90)
+
+    def test_pose_at_does_not_interpolate_across_reset(self):
+        self.move(10, 10)
+        self.devices.now += 1.0
+        self.odometry.reset(100, 50, Angle(degrees=90))
+        self.assertPose(self.odometry.poseAt(1.9), 0, 10, 0)
+        self.assertPose(self.odometry.poseAt(2.0), 100, 50, 90)
+        self.move(10, 10)
+        self.assertPose(self.odometry.poseAt(2.5), 105, 50, 90)
+
+
+if __name__ == '__main__':
+    unittest.main()
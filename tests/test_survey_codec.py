@@ -0,0 +1,160 @@
+# _*_ coding: utf-8 _*_
+"""
+Tests des formats compacts JSON et binaire des cartes (module survey_codec).
+"""
+
+import json
+import math
+import unittest
+
+from common_apl.xmlio import XmlStreamWriter
+from survey_codec import SurveyMapBinaryAdapter, SurveyMapJsonAdapter, SurveyMapRegionJsonAdapter, SurveyNodeJsonAdapter
+from survey_lod import SurveyMapDecimator
+from survey_model import SurveyMap
+from survey_xmlio import SurveyMapAdapter
+from tests.synthetic import surveyedMap
+
+
+class CodecTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.map = surveyedMap()
+
+    def assertSameMap(self, surveyMap, expected, tolerance):
+        """
+        Les stations et leurs points sont identiques à tolerance près.
+        """
+        self.assertEqual(len(surveyMap), len(expected))
+        for rank in range(len(expected)):
+            node = surveyMap[rank]
+            reference = expected[rank]
+            self.assertLessEqual(abs(node.X - reference.X), tolerance)
+            self.assertLessEqual(abs(node.Y - reference.Y), tolerance)
+            self.assertLessEqual(abs(node.orientation.degrees - reference.orientation.degrees), tolerance)
+            self.assertEqual(tuple(node.offset), tuple(reference.offset))
+            self.assertEqual(len(node), len(reference))
+            for iPoint in range(len(reference)):
+                point = node[iPoint]
+                other = reference[iPoint]
+                for value, original in ((point.X, other.X), (point.Y, other.Y), (point.rawAngle, other.rawAngle),
+                                        (point.rawDistance, other.rawDistance)):
+                    self.assertLessEqual(abs(value - original), tolerance)
+                self.assertEqual(point.isValid, other.isValid)
+            self.assertEqual(len(node.walls), len(reference.walls))
+
+
+class SurveyMapJsonAdapterTest(CodecTestCase):
+
+    def test_round_trip(self):
+        document = SurveyMapJsonAdapter().dumps(self.map)
+        self.assertSameMap(SurveyMapJsonAdapter().loads(document), self.map,
+                           0.5 * 10 ** -SurveyNodeJsonAdapter.DIGITS)
+
+    def test_compact_read(self):
+        surveyMap = SurveyMapJsonAdapter(compact=True).loads(SurveyMapJsonAdapter().dumps(self.map))
+        self.assertTrue(surveyMap.compact)
+        self.assertSameMap(surveyMap, self.map, 0.005)
+
+    def test_document_content(self):
+        data = json.loads(SurveyMapJsonAdapter().dumps(self.map))
+        self.assertEqual(data[SurveyMapAdapter.ATTR_VERSION], self.map.version)
+        self.assertEqual(data[SurveyMapAdapter.ATTR_MAXX], round(self.map.maxX, 2))
+        self.assertEqual(len(data[SurveyMapJsonAdapter.ATTR_WALLS]), len(self.map.walls))
+
+    def test_empty_map(self):
+        surveyMap = SurveyMapJsonAdapter().loads(SurveyMapJsonAdapter().dumps(SurveyMap()))
+        self.assertEqual(len(surveyMap), 0)
+
+
+class SurveyMapBinaryAdapterTest(CodecTestCase):
+
+    def test_round_trip(self):
+        # Les valeurs sont codées en float32 : moins de 1e-4 cm d'écart à 500 cm.
+        surveyMap = SurveyMapBinaryAdapter().loads(SurveyMapBinaryAdapter().dumps(self.map))
+        self.assertSameMap(surveyMap, self.map, 1e-4)
+        self.assertEqual(len(surveyMap.walls), len(self.map.walls))
+
+    def test_validity_bits(self):
+        self.assertTrue(any(len(self.map[rank]) % 8 != 0 for rank in range(len(self.map))))
+        self.assertTrue(any(self.map[0][iPoint].isValid for iPoint in range(len(self.map[0]))))
+        self.assertFalse(all(self.map[0][iPoint].isValid for iPoint in range(len(self.map[0]))))
+        compact = SurveyMapBinaryAdapter(compact=True).loads(SurveyMapBinaryAdapter().dumps(self.map))
+        self.assertTrue(compact.compact)
+        self.assertSameMap(compact, self.map, 1e-4)
+
+    def test_header(self):
+        document = SurveyMapBinaryAdapter().dumps(self.map)
+        magic, fmt, version, minX, maxX, minY, maxY, nodes, walls = \
+            SurveyMapBinaryAdapter.HEADER.unpack_from(document, 0)
+        self.assertEqual((magic, fmt, version), (SurveyMapBinaryAdapter.MAGIC, SurveyMapBinaryAdapter.FORMAT,
+                                                 self.map.version))
+        self.assertEqual((nodes, walls), (len(self.map), len(self.map.walls)))
+        self.assertAlmostEqual(maxX, self.map.maxX, places=4)
+        points = sum(len(self.map[rank]) for rank in range(len(self.map)))
+        self.assertEqual(len(document), SurveyMapBinaryAdapter.HEADER.size +
+                         len(self.map) * SurveyMapBinaryAdapter.NODE.size + 16 * points +
+                         sum((len(self.map[rank]) + 7) // 8 for rank in range(len(self.map))) +
+                         len(self.map.walls) * SurveyMapBinaryAdapter.WALL.size)
+
+    def test_empty_map(self):
+        document = SurveyMapBinaryAdapter().dumps(SurveyMap())
+        self.assertTrue(math.isnan(SurveyMapBinaryAdapter.HEADER.unpack_from(document, 0)[3]))
+        self.assertEqual(len(SurveyMapBinaryAdapter().loads(document)), 0)
+
+    def test_invalid_document(self):
+        document = bytearray(SurveyMapBinaryAdapter().dumps(self.map))
+        document[0:4] = b"XMAP"
+        with self.assertRaises(ValueError):
+            SurveyMapBinaryAdapter().loads(bytes(document))
+
+    def test_formats_are_compact(self):
+        xml = XmlStreamWriter.dumps(SurveyMapAdapter(), self.map)
+        self.assertLess(len(SurveyMapJsonAdapter().dumps(self.map)), len(xml) / 2)
+        self.assertLess(len(SurveyMapBinaryAdapter().dumps(self.map)), len(xml) / 4)
+
+
+class SurveyMapRegionJsonAdapterTest(CodecTestCase):
+
+    BOX = (-210.0, -160.0, 0.0, 20.0)
+
+    def region(self, lod):
+        return json.loads(SurveyMapRegionJsonAdapter(self.map).dumps(SurveyMapRegionJsonAdapterTest.BOX + (lod,)))
+
+    def test_points_in_box(self):
+        minX, minY, maxX, maxY = SurveyMapRegionJsonAdapterTest.BOX
+        data = self.region(0)
+        self.assertEqual(data[SurveyMapRegionJsonAdapter.ATTR_BOX], list(SurveyMapRegionJsonAdapterTest.BOX))
+        count = 0
+        for node in data[SurveyMapJsonAdapter.ATTR_NODES]:
+            points = node["points"]
+            for x, y in zip(points["x"], points["y"]):
+                self.assertTrue(minX - 0.005 <= x <= maxX + 0.005 and minY - 0.005 <= y <= maxY + 0.005)
+                count += 1
+        expected = sum(1 for rank in range(len(self.map)) for iPoint in range(len(self.map[rank]))
+                       if minX <= self.map[rank][iPoint].X <= maxX and minY <= self.map[rank][iPoint].Y <= maxY)
+        self.assertGreater(count, 0)
+        self.assertEqual(count, expected)
+
+    def test_nodes_in_box_are_listed(self):
+        ranks = [node[SurveyMapRegionJsonAdapter.ATTR_RANK] for node in self.region(0)[SurveyMapJsonAdapter.ATTR_NODES]]
+        self.assertIn(0, ranks)
+        self.assertIn(1, ranks)
+        self.assertEqual(ranks, sorted(ranks))
+
+    def test_walls_in_box(self):
+        adapter = SurveyMapRegionJsonAdapter(self.map)
+        for box in ((-210.0, -100.0, -150.0, 20.0), (0.0, -150.0, 200.0, 0.0)):
+            walls = json.loads(adapter.dumps(box + (0,)))[SurveyMapJsonAdapter.ATTR_WALLS]
+            self.assertEqual(len(walls), len(self.map.getWallsInBox(*box)))
+        self.assertEqual(len(self.map.getWallsInBox(-210.0, -100.0, -150.0, 20.0)), 1)
+        self.assertEqual(len(self.map.getWallsInBox(0.0, -150.0, 200.0, 0.0)), 0)
+
+    def test_level_of_detail(self):
+        counts = [sum(len(node["points"]["x"]) for node in self.region(lod)[SurveyMapJsonAdapter.ATTR_NODES])
+                  for lod in (0, 10, SurveyMapDecimator.WALLS_ONLY)]
+        self.assertLess(counts[1], counts[0])
+        self.assertEqual(counts[2], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+# _*_ coding: utf-8 _*_
+"""
+Tests de la détection des frontières d'exploration (module survey_frontier).
+"""
+
+import unittest
+
+from survey_frontier import Frontier, FrontierDetector
+from survey_model import SurveyMap
+from survey_planner import DStarLitePlanner
+from simulator import SimWorld
+from tests.synthetic import BOX, distance, room, scan
+
+
+class FrontierDetectorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.world = room([BOX])
+        self.map = SurveyMap()
+        self.detector = FrontierDetector(self.map.grid, DStarLitePlanner.ROBOT_RADIUS)
+        self.planner = DStarLitePlanner(self.map.grid)
+        for pose in ((-100, 0, 0), (20, -60, 0)):
+            self.map.addNode(scan(self.map, self.world, pose))
+
+    def test_targets_are_reachable_by_the_planner(self):
+        frontiers = self.detector.getFrontiers()
+        self.assertGreater(len(frontiers), 0)
+        for frontier in frontiers:
+            if frontier.target is None:
+                continue
+            cell = self.map.grid.cellOf(frontier.target[0], frontier.target[1])
+            self.assertFalse(self.planner.isBlocked(cell))
+            self.assertIsNotNone(self.planner.plan((-100, 0), frontier.target))
+
+    def test_targets_stay_near_their_frontier(self):
+        size = self.map.grid.cellSize
+        for frontier in self.detector.getFrontiers():
+            if frontier.target is None:
+                continue
+            nearest = min(distance(frontier.target, self.map.grid.cellCenter(i, j)) for i, j in frontier.cells)
+            self.assertLessEqual(nearest, (Frontier.TARGET_DEPTH + 1) * size)
+
+    def test_visited_frontiers_are_not_proposed_again(self):
+        position = (-100, 0)
+        best = self.detector.bestFrontier(position)
+        self.assertIsNotNone(best)
+        self.detector.markVisited(best.target)
+        for score, frontier in self.detector.rankFrontiers(position):
+            self.assertGreaterEqual(distance(frontier.target, best.target), FrontierDetector.VISITED_RADIUS)
+
+    def test_frontiers_shrink_as_the_room_is_explored(self):
+        before = len(self.detector.frontierCells)
+        for pose in ((150, -100, 0), (150, 120, 0), (-150, 110, 0), (0, 120, 0)):
+            self.map.addNode(scan(self.map, self.world, pose, step=2))
+        self.assertLess(len(self.detector.frontierCells), before)
+
+
+
+class FrontierRankingTest(unittest.TestCase):
+
+    # Cloison qui sépare la pièce, sauf sur 50 cm en haut.
+    WALL = ((-20, -150), (-10, -150), (-10, 100), (-20, 100))
+    POSITION = (-36, 86)
+
+    def setUp(self):
+        self.map = SurveyMap()
+        world = SimWorld.room(400, 300, [FrontierRankingTest.WALL])
+        for pose in (FrontierRankingTest.POSITION + (0,), (104, 12, 0)):
+            self.map.addNode(scan(self.map, world, pose))
+
+    def test_frontiers_are_ranked_by_path_length(self):
+        # A vol d'oiseau, la frontière située derrière la cloison est la
+        # meilleure ; par le chemin qui la contourne, elle ne l'est plus.
+        position = FrontierRankingTest.POSITION
+        straight = FrontierDetector(self.map.grid).rankFrontiers(position)
+        detector = FrontierDetector(self.map.grid, planner=DStarLitePlanner(self.map.grid))
+        ranking = detector.rankFrontiers(position)
+        self.assertEqual(len(ranking), len(straight))
+        self.assertGreater(straight[0][1].target[0], -10)
+        self.assertLess(ranking[0][1].target[0], -20)
+        for score, frontier in ranking:
+            length = detector.pathLength(position, frontier.target)
+            self.assertGreaterEqual(length, distance(position, frontier.target))
+            self.assertLessEqual(score, ranking[0][0])
+        self.assertAlmostEqual(ranking[0][0], ranking[0][1].gain / detector.pathLength(position,
+                                                                                      ranking[0][1].target))
+
+    def test_unreachable_frontiers_are_marked_visited(self):
+        class Blocked:
+            def plan(self, start, goal):
+                return None
+        self.assertGreater(len(FrontierDetector(self.map.grid).rankFrontiers(FrontierRankingTest.POSITION)), 0)
+        detector = FrontierDetector(self.map.grid, planner=Blocked())
+        self.assertEqual(detector.rankFrontiers(FrontierRankingTest.POSITION), [])
+        self.assertIsNone(detector.bestFrontier(FrontierRankingTest.POSITION))
+
+
+if __name__ == '__main__':
+    unittest.main()
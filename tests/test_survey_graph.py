@@ -0,0 +1,147 @@
+# _*_ coding: utf-8 _*_
+"""
+Tests du graphe des poses et de la fermeture de boucle (module survey_graph).
+"""
+
+import math
+import random
+import unittest
+
+from survey_graph import PoseGraph, SurveyPoseGraph
+from survey_matching import ScanMatcher
+from survey_model import Angle, SurveyMap
+from tests.synthetic import BOX, distance, room, scan
+
+# Parcours carré qui revient à son point de départ.
+SQUARE = [(-140, -100), (-60, -100), (20, -100), (20, -20), (20, 60), (-60, 60), (-140, 60), (-140, -20),
+          (-140, -100)]
+
+
+def compose(pose, relative):
+    """
+    :return: Pose atteinte depuis pose par le déplacement relatif relative
+    (inverse de PoseGraph.relativePose).
+    """
+    x, y, o = pose
+    dx, dy, dTheta = relative
+    c = math.cos(o)
+    s = math.sin(o)
+    return (x + c * dx + s * dy, y - s * dx + c * dy, o + dTheta)
+
+
+def angleError(a, b):
+    """
+    :return: Ecart absolu en radians entre deux orientations.
+    """
+    return abs(math.atan2(math.sin(a - b), math.cos(a - b)))
+
+
+def squarePoses():
+    """
+    :return: Poses réelles (x, y, orientation) du parcours SQUARE, chaque
+    station étant orientée vers la suivante.
+    """
+    poses = []
+    for k, (x, y) in enumerate(SQUARE):
+        nx, ny = SQUARE[k + 1] if k + 1 < len(SQUARE) else SQUARE[1]
+        poses.append((x, y, math.atan2(nx - x, ny - y)))
+    return poses
+
+
+def drifted(truth, rotation, scale):
+    """
+    :return: Poses estimées : chaque déplacement est allongé de scale et
+    chaque changement de cap est faussé de rotation radians.
+    """
+    estimates = [truth[0]]
+    for k in range(1, len(truth)):
+        dx, dy, dTheta = PoseGraph.relativePose(truth[k - 1], truth[k])
+        estimates.append(compose(estimates[-1], (dx * scale, dy * scale, dTheta + rotation)))
+    return estimates
+
+
+class PoseGraphTest(unittest.TestCase):
+
+    def test_relative_pose_round_trip(self):
+        pose1 = (10.0, -20.0, math.radians(30))
+        pose2 = (-35.0, 42.0, math.radians(-110))
+        x, y, o = compose(pose1, PoseGraph.relativePose(pose1, pose2))
+        self.assertAlmostEqual(x, pose2[0])
+        self.assertAlmostEqual(y, pose2[1])
+        self.assertAlmostEqual(angleError(o, pose2[2]), 0.0)
+
+    def test_relative_pose_is_in_robot_frame(self):
+        # Orienté à l'est, le robot voit au nord un point à sa gauche.
+        dx, dy, dTheta = PoseGraph.relativePose((0, 0, math.pi / 2), (0, 10, math.pi / 2))
+        self.assertAlmostEqual(dx, -10.0)
+        self.assertAlmostEqual(dy, 0.0)
+
+    def test_loop_edge_corrects_drift(self):
+        truth = squarePoses()
+        estimates = drifted(truth, math.radians(2), 1.05)
+        graph = PoseGraph()
+        for x, y, o in estimates:
+            graph.addPose(x, y, Angle(radians=o))
+        odometry = (1.0 / 25.0, 1.0 / math.radians(5) ** 2)
+        for k in range(1, len(truth)):
+            graph.addEdge(k - 1, k, PoseGraph.relativePose(estimates[k - 1], estimates[k]), odometry)
+        last = len(truth) - 1
+        graph.addEdge(0, last, PoseGraph.relativePose(truth[0], truth[last]), (100.0, 10000.0))
+        before = graph.error()
+        graph.optimize()
+        self.assertLess(graph.error(), before / 100)
+        x, y, o = graph.pose(last)
+        self.assertLess(distance((x, y), truth[last]), 1.0)
+        self.assertLess(angleError(o, truth[last][2]), math.radians(0.5))
+        self.assertEqual(graph.pose(0), truth[0])
+
+
+class SurveyPoseGraphTest(unittest.TestCase):
+
+    def survey(self, rotation, scale):
+        """
+        Parcours du carré à l'estime faussée, sans recalage séquentiel :
+        seule la fermeture de boucle peut corriger les poses.
+
+        :return: Tuple (carte, graphe, poses réelles, poses estimées).
+        """
+        world = room([BOX])
+        rng = random.Random(5)
+        truth = squarePoses()
+        estimates = drifted(truth, rotation, scale)
+        surveyMap = SurveyMap()
+        poseGraph = SurveyPoseGraph(surveyMap, ScanMatcher(surveyMap))
+        for rank, (pose, estimate) in enumerate(zip(truth, estimates)):
+            node = scan(surveyMap, world, (pose[0], pose[1], math.degrees(pose[2])),
+                        (estimate[0], estimate[1], math.degrees(estimate[2])), noise=0.5, rng=rng)
+            surveyMap.addNode(node)
+            poseGraph.addNode(surveyMap[rank], (estimate[0], estimate[1], Angle(radians=estimate[2])))
+        return surveyMap, poseGraph, truth, estimates
+
+    def test_drifted_square_is_closed(self):
+        surveyMap, poseGraph, truth, estimates = self.survey(math.radians(1), 1.03)
+        last = len(truth) - 1
+        self.assertGreater(distance(estimates[last], truth[last]), 15.0)
+        self.assertGreater(poseGraph.loops, 0)
+        self.assertLess(distance(surveyMap[last].position, truth[last]), 5.0)
+        self.assertLess(angleError(surveyMap[last].orientation.radians, truth[last][2]), math.radians(1.5))
+        for rank in range(len(truth)):
+            before = distance(estimates[rank], truth[rank])
+            after = distance(surveyMap[rank].position, truth[rank])
+            self.assertLess(after, max(8.0, before), "station {0}".format(rank))
+
+    def test_graph_follows_relocated_map(self):
+        surveyMap, poseGraph, truth, estimates = self.survey(math.radians(1), 1.03)
+        for rank in range(len(truth)):
+            x, y, o = poseGraph.graph.pose(rank)
+            self.assertLess(distance((x, y), surveyMap[rank].position), SurveyPoseGraph.MOVE_TOLERANCE + 1e-6)
+            self.assertLess(angleError(o, surveyMap[rank].orientation.radians), SurveyPoseGraph.MOVE_ANGLE + 1e-6)
+
+    def test_accurate_estimate_is_kept(self):
+        surveyMap, poseGraph, truth, estimates = self.survey(0.0, 1.0)
+        for rank in range(len(truth)):
+            self.assertLess(distance(surveyMap[rank].position, truth[rank]), 3.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+# _*_ coding: utf-8 _*_
+"""
+Tests de la grille d'occupation (module survey_grid) : le calcul numpy et
+le calcul scalaire construisent la même grille.
+"""
+
+import unittest
+from unittest import mock
+
+import survey_grid
+from survey_grid import OccupancyGrid
+from survey_model import SurveyMap
+from tests.synthetic import BOX, room, scan
+
+
+class OccupancyGridTest(unittest.TestCase):
+
+    def build(self, nodes, repeat=1):
+        """
+        :return: Tuple (cellules de la grille, cellules modifiées notifiées).
+        """
+        grid = OccupancyGrid()
+        changes = []
+        grid.addChangeListener(lambda cells: changes.append(sorted(cells)))
+        for n in range(repeat):
+            for node in nodes:
+                grid.integrateNode(node)
+        iMin, jMin, iMax, jMax = grid.bounds
+        cells = {(i, j): grid.cellLogOdds(i, j) for i in range(iMin, iMax + 1) for j in range(jMin, jMax + 1)}
+        return cells, changes
+
+    def stations(self):
+        surveyMap = SurveyMap()
+        world = room([BOX])
+        return [scan(surveyMap, world, pose) for pose in ((0, 0, 0), (-80, -60, 35), (150, 100, -120))]
+
+    def test_scalar_grid(self):
+        node = self.stations()[0]
+        with mock.patch.object(survey_grid, "numpy", None):
+            grid = OccupancyGrid()
+            grid.integrateNode(node)
+            self.assertEqual(grid.state(*node.sensorOrigin), OccupancyGrid.FREE)
+            for k in range(len(node)):
+                if node[k].rawDistance < OccupancyGrid.MAX_RANGE:
+                    self.assertEqual(grid.state(node[k].X, node[k].Y), OccupancyGrid.OCCUPIED)
+
+    @unittest.skipIf(survey_grid.numpy is None, "numpy n'est pas installé")
+    def test_backends_build_the_same_grid(self):
+        nodes = self.stations()
+        with mock.patch.object(survey_grid, "numpy", None):
+            expected = self.build(nodes)
+        self.assertEqual(self.build(nodes), expected)
+
+    @unittest.skipIf(survey_grid.numpy is None, "numpy n'est pas installé")
+    def test_backends_clamp_the_same_way(self):
+        # Stations répétées : des cellules atteignent les bornes des log-odds.
+        nodes = self.stations()
+        with mock.patch.object(survey_grid, "numpy", None):
+            expected = self.build(nodes, 12)
+        self.assertIn(OccupancyGrid.LOG_ODDS_MIN, expected[0].values())
+        self.assertIn(OccupancyGrid.LOG_ODDS_MAX, expected[0].values())
+        self.assertEqual(self.build(nodes, 12), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
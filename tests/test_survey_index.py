@@ -0,0 +1,66 @@
+# _*_ coding: utf-8 _*_
+"""
+Tests de l'index spatial en grille uniforme (module survey_index).
+"""
+
+from collections import namedtuple
+import random
+import unittest
+
+from survey_index import SurveyGridIndex
+
+
+Point = namedtuple("Point", "X Y")
+Segment = namedtuple("Segment", "Pt1 Pt2")
+
+
+class SurveyGridIndexTest(unittest.TestCase):
+
+    def test_wall_found_in_every_crossed_cell(self):
+        # Une petite zone de recherche centrée sur un point du mur ne
+        # recouvre qu'une cellule : le mur doit y être référencé.
+        rng = random.Random(3)
+        for n in range(300):
+            index = SurveyGridIndex(25)
+            x1, y1, x2, y2 = [rng.uniform(-300, 300) for k in range(4)]
+            wall = Segment(Point(x1, y1), Point(x2, y2))
+            index.insertWall(wall)
+            for k in range(201):
+                t = k / 200
+                x = x1 + t * (x2 - x1)
+                y = y1 + t * (y2 - y1)
+                self.assertEqual(index.wallsInBox(x - 0.01, y - 0.01, x + 0.01, y + 0.01), [wall])
+
+    def test_wall_through_cell_corner(self):
+        index = SurveyGridIndex(10)
+        wall = Segment(Point(5, 5), Point(35, 35))
+        index.insertWall(wall)
+        self.assertEqual(index.wallsInBox(19.99, 19.99, 20.01, 20.01), [wall])
+        self.assertIs(index.nearestWall(30, 10), wall)
+
+    def test_axis_aligned_and_degenerate_walls(self):
+        index = SurveyGridIndex(10)
+        horizontal = Segment(Point(-42, 7), Point(58, 7))
+        vertical = Segment(Point(-13, -40), Point(-13, 60))
+        dot = Segment(Point(3, 3), Point(3, 3))
+        for wall in (horizontal, vertical, dot):
+            index.insertWall(wall)
+        self.assertEqual(index.wallsInBox(40, 0, 45, 10), [horizontal])
+        self.assertEqual(index.wallsInBox(-15, 40, -10, 45), [vertical])
+        self.assertEqual(index.wallsInBox(2, 2, 4, 4), [dot])
+        index.removeWall(horizontal)
+        self.assertEqual(index.wallsInBox(40, 0, 45, 10), [])
+        self.assertEqual(index.wallCount, 2)
+
+    def test_nearest_point(self):
+        index = SurveyGridIndex(25)
+        points = [Point(x, y) for x in range(-100, 101, 20) for y in range(-100, 101, 20)]
+        for point in points:
+            index.insertPoint(point)
+        self.assertEqual(index.nearestPoint(41, -59), Point(40, -60))
+        self.assertIsNone(index.nearestPoint(500, 500, maxRadius=50))
+        self.assertEqual(len(index.pointsInRadius(0, 0, 20)), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
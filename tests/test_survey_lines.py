@@ -0,0 +1,166 @@
+# _*_ coding: utf-8 _*_
+"""
+Tests de l'extraction incrémentale des murs (module survey_lines).
+"""
+
+from collections import namedtuple
+import math
+import random
+import unittest
+
+from survey_lines import LineExtractor, LineMoments
+
+Point = namedtuple("Point", ("X", "Y"))
+
+
+def batchMoments(points):
+    """
+    :return: Tuple (Mx, My, Vx, Vy, Cxy) calculé directement sur les points.
+    """
+    n = len(points)
+    mx = sum(p.X for p in points) / n
+    my = sum(p.Y for p in points) / n
+    return (mx, my, sum((p.X - mx) ** 2 for p in points) / n, sum((p.Y - my) ** 2 for p in points) / n,
+            sum((p.X - mx) * (p.Y - my) for p in points) / n)
+
+
+def wall(start, end, count, noise=0.0, rng=None):
+    """
+    :return: count points régulièrement espacés de start à end (inclus).
+    """
+    points = []
+    for k in range(count):
+        t = k / (count - 1)
+        x = start[0] + t * (end[0] - start[0])
+        y = start[1] + t * (end[1] - start[1])
+        if noise > 0:
+            x += rng.gauss(0.0, noise)
+            y += rng.gauss(0.0, noise)
+        points.append(Point(x, y))
+    return points
+
+
+class LineMomentsTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(3)
+        self.points = [Point(rng.uniform(-100, 100), rng.uniform(-50, 50)) for k in range(40)]
+
+    def assertMoments(self, moments, points):
+        expected = batchMoments(points)
+        self.assertEqual(moments.count, len(points))
+        for value, reference in zip(moments.mean + moments.variances, expected):
+            self.assertAlmostEqual(value, reference, places=6)
+
+    def test_incremental_moments(self):
+        moments = LineMoments()
+        for point in self.points:
+            moments.add(point.X, point.Y)
+        self.assertMoments(moments, self.points)
+
+    def test_remove(self):
+        moments = LineMoments()
+        for point in self.points:
+            moments.add(point.X, point.Y)
+        for point in self.points[30:]:
+            moments.remove(point.X, point.Y)
+        self.assertMoments(moments, self.points[:30])
+
+    def test_merge(self):
+        first = LineMoments()
+        second = LineMoments()
+        for point in self.points[:15]:
+            first.add(point.X, point.Y)
+        for point in self.points[15:]:
+            second.add(point.X, point.Y)
+        copy = first.copy()
+        first.merge(second)
+        self.assertMoments(first, self.points)
+        self.assertMoments(copy, self.points[:15])
+        empty = LineMoments()
+        empty.merge(second)
+        self.assertMoments(empty, self.points[15:])
+
+    def test_line_fit(self):
+        moments = LineMoments()
+        for x in range(-50, 51, 5):
+            moments.add(x, 0.5 * x + 3)
+        a, b, c = moments.line
+        self.assertAlmostEqual(math.hypot(a, b), 1.0)
+        self.assertAlmostEqual(moments.distance(10, 8), 0.0)
+        self.assertAlmostEqual(moments.distance(10, 8 + math.hypot(1, 0.5)), 1.0)
+        self.assertAlmostEqual(abs(moments.direction[1] / moments.direction[0]), 0.5)
+        self.assertAlmostEqual(moments.alignment, 1.0)
+        self.assertAlmostEqual(moments.rms, 0.0, places=6)
+        x, y = moments.project(0, 13)
+        self.assertAlmostEqual(y, 0.5 * x + 3)
+
+    def test_vertical_line(self):
+        moments = LineMoments()
+        for y in range(0, 100, 10):
+            moments.add(25, y)
+        self.assertAlmostEqual(moments.distance(25, 500), 0.0)
+        self.assertAlmostEqual(moments.distance(30, 0), 5.0)
+
+    def test_isotropic_cloud(self):
+        moments = LineMoments()
+        for x, y in ((0, 0), (10, 0), (10, 10), (0, 10)):
+            moments.add(x, y)
+        self.assertAlmostEqual(moments.alignment, 0.0)
+
+
+class LineExtractorTest(unittest.TestCase):
+
+    def extract(self, points, threshold=15.0):
+        """
+        :return: Liste des segments publiés et non retirés.
+        """
+        published = []
+
+        def publish(segment, moments):
+            published.append((segment, moments))
+            return len(published) - 1
+
+        retracted = set()
+        extractor = LineExtractor(publish, retracted.add, threshold)
+        for point in points:
+            extractor.add(point)
+        extractor.finish()
+        return [published[k] for k in range(len(published)) if k not in retracted]
+
+    def test_single_wall(self):
+        rng = random.Random(1)
+        segments = self.extract(wall((-100, 50), (100, 60), 21, 0.5, rng))
+        self.assertEqual(len(segments), 1)
+        points, moments = segments[0]
+        self.assertEqual(len(points), 21)
+        self.assertLess(moments.rms, 1.0)
+
+    def test_corner_is_split(self):
+        points = wall((-100, 100), (0, 100), 11) + wall((0, 100), (0, 0), 11)[1:]
+        segments = self.extract(points)
+        self.assertEqual(len(segments), 2)
+        first, second = segments[0][0], segments[1][0]
+        self.assertIs(first[-1], second[0])
+        self.assertAlmostEqual(segments[0][1].distance(-50, 100), 0.0, places=6)
+        self.assertAlmostEqual(segments[1][1].distance(0, 50), 0.0, places=6)
+
+    def test_gap_separates_walls(self):
+        points = wall((-100, 100), (-40, 100), 7) + wall((40, 100), (100, 100), 7)
+        segments = self.extract(points)
+        self.assertEqual([len(segment[0]) for segment in segments], [7, 7])
+
+    def test_outlier_is_merged_back(self):
+        points = wall((-100, 100), (100, 100), 21)
+        points[10] = Point(points[10].X, points[10].Y - 6)
+        segments = self.extract(points)
+        self.assertEqual(len(segments), 1)
+        self.assertEqual(len(segments[0][0]), 21)
+
+    def test_short_runs_are_ignored(self):
+        points = [Point(0, 0), Point(5, 0), Point(100, 0), Point(200, 0), Point(205, 0)]
+        self.assertEqual(self.extract(points), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+# _*_ coding: utf-8 _*_
+"""
+Tests des niveaux de détail d'une carte (module survey_lod).
+"""
+
+import unittest
+
+from survey_lod import SurveyMapDecimator
+from survey_model import Angle, SurveyMap, SurveyNode
+from tests.synthetic import surveyedMap
+
+
+class SurveyMapDecimatorTest(unittest.TestCase):
+
+    def station(self, surveyMap, x, y, angles, distances):
+        node = SurveyNode(surveyMap, x, y, Angle(degrees=0), (0, 0))
+        node.addPolarPoints(angles, distances)
+        node.computeWallData()
+        surveyMap.addNode(node)
+        return node
+
+    def test_points_stay_with_their_station(self):
+        # Les deux stations, distantes de 200 cm, voient chacune un point
+        # de la même cellule de 10 cm.
+        surveyMap = SurveyMap()
+        self.station(surveyMap, 0, 0, [0], [100])
+        self.station(surveyMap, 0, 200, [180], [98])
+        level = SurveyMapDecimator(surveyMap).level(10)
+        xs, ys, valids = level.columns(0)
+        self.assertEqual(len(xs), 1)
+        self.assertAlmostEqual(ys[0], 100, 6)
+        xs, ys, valids = level.columns(1)
+        self.assertEqual(len(xs), 1)
+        self.assertAlmostEqual(ys[0], 102, 6)
+
+    def test_points_of_a_station_are_merged(self):
+        surveyMap = SurveyMap()
+        self.station(surveyMap, 0, 0, [0, 1], [100, 101])
+        xs, ys, valids = SurveyMapDecimator(surveyMap).level(10).columns(0)
+        self.assertEqual(len(xs), 1)
+
+    def test_levels(self):
+        surveyMap = surveyedMap()
+        decimator = SurveyMapDecimator(surveyMap)
+        self.assertIsNone(decimator.level(1))
+        self.assertIs(decimator.level(12), decimator.level(10))
+        counts = [decimator.level(lod).pointCount for lod in SurveyMapDecimator.RESOLUTIONS]
+        self.assertEqual(counts, sorted(counts, reverse=True))
+        self.assertLessEqual(counts[0], sum(len(surveyMap[rank]) for rank in range(len(surveyMap))))
+        self.assertTrue(decimator.level(SurveyMapDecimator.WALLS_ONLY).wallsOnly)
+        self.assertEqual(decimator.level(SurveyMapDecimator.WALLS_ONLY).pointCount, 0)
+
+    def test_douglas_peucker(self):
+        points = [(x, 0.1 * (x % 2)) for x in range(10)] + [(10, 5)]
+        self.assertEqual(SurveyMapDecimator.douglasPeucker(points, 1.0), [(0, 0.0), (9, 0.1), (10, 5)])
+        self.assertEqual(SurveyMapDecimator.douglasPeucker(points[:2], 1.0), points[:2])
+
+
+if __name__ == '__main__':
+    unittest.main()
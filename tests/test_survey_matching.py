@@ -0,0 +1,106 @@
+# _*_ coding: utf-8 _*_
+"""
+Tests du recalage ICP des stations (module survey_matching).
+"""
+
+import math
+import os
+import random
+import tempfile
+import unittest
+
+from simulator import SimWorld, SimulatedDevices
+from survey_matching import ScanMatcher
+from survey_model import Angle, SurveyMap
+from surveyor import RobotSurveyor
+from tests.synthetic import BOX, distance, room, scan
+
+
+def angleError(a, b):
+    """
+    :return: Ecart absolu en degrés entre deux orientations.
+    """
+    return abs((a - b + 180.0) % 360.0 - 180.0)
+
+
+class ScanMatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.world = room([BOX])
+        self.rng = random.Random(7)
+
+    def drifted(self, reference, pose, drift):
+        """
+        :return: Tuple (carte, station) : la station relevée depuis pose est
+        enregistrée à la pose décalée de drift (dx, dy, dOrientation).
+        """
+        surveyMap = SurveyMap()
+        surveyMap.addNode(scan(surveyMap, self.world, reference, noise=0.5, rng=self.rng))
+        estimate = (pose[0] + drift[0], pose[1] + drift[1], pose[2] + drift[2])
+        return surveyMap, scan(surveyMap, self.world, pose, estimate, noise=0.5, rng=self.rng)
+
+    def test_drifted_scan_is_corrected(self):
+        pose = (-60, -40, 30)
+        surveyMap, node = self.drifted((-100, 0, 0), pose, (7, -5, 3))
+        match = ScanMatcher(surveyMap).match(node)
+        self.assertIsNotNone(match)
+        self.assertTrue(match.converged)
+        corrected = match.apply(node)
+        self.assertLess(distance(corrected.position, pose), 2.0)
+        self.assertLess(angleError(corrected.orientation.degrees, pose[2]), 1.0)
+
+    def test_apply_matches_transform(self):
+        surveyMap, node = self.drifted((-100, 0, 0), (-60, -40, 30), (7, -5, 3))
+        match = ScanMatcher(surveyMap).match(node)
+        corrected = match.apply(node)
+        for iPoint in range(len(node)):
+            x, y = match.transform(node[iPoint].X, node[iPoint].Y)
+            self.assertAlmostEqual(corrected[iPoint].X, x, places=6)
+            self.assertAlmostEqual(corrected[iPoint].Y, y, places=6)
+
+    def test_estimate_already_right(self):
+        pose = (-60, -40, 30)
+        surveyMap, node = self.drifted((-100, 0, 0), pose, (0, 0, 0))
+        match = ScanMatcher(surveyMap).match(node)
+        self.assertIsNotNone(match)
+        self.assertLess(distance(match.apply(node).position, pose), 1.0)
+
+    def test_single_wall_is_rejected(self):
+        # Le long d'un mur unique, la pose n'est pas contrainte.
+        world = SimWorld([((-300, 0), (300, 0))])
+        surveyMap = SurveyMap()
+        surveyMap.addNode(scan(surveyMap, world, (0, -60, 0), step=2))
+        node = scan(surveyMap, world, (10, -60, 0), (20, -60, 0), step=2)
+        self.assertIsNone(ScanMatcher(surveyMap).match(node))
+
+    def test_scan_without_overlap_is_rejected(self):
+        surveyMap = SurveyMap()
+        surveyMap.addNode(scan(surveyMap, SimWorld.room(100, 100), (0, 0, 0)))
+        node = scan(surveyMap, SimWorld.room(100, 100, [((900, 900), (950, 900), (950, 950))]), (900, 0, 0))
+        self.assertIsNone(ScanMatcher(surveyMap).match(node))
+
+
+class SimulatedDriftTest(unittest.TestCase):
+
+    def test_robot_pose_is_corrected_by_matching(self):
+        # L'odométrie est faussée avant le second tour d'horizon : le
+        # recalage doit ramener la pose estimée vers la pose réelle.
+        world = SimWorld.room(400, 300, [BOX])
+        directory = tempfile.mkdtemp()
+        devices = SimulatedDevices(world, seed=3)
+        robot = RobotSurveyor(devices=devices, mapDocumentName=os.path.join(directory, "map.xml"),
+                              mapJournalName=os.path.join(directory, "map.journal"), loopClosure=False)
+        robot.surveyTour()
+        robot.turn(Angle(degrees=40))
+        robot.moveForward(40)
+        pose = robot.odometry.update()
+        robot.odometry.reset(pose.X + 8, pose.Y - 6, Angle(radians=pose.orientation.radians + math.radians(3)))
+        drift = distance((pose.X + 8, pose.Y - 6), devices.body.pose)
+        station = robot.surveyTour()
+        error = distance(station.position, devices.body.pose)
+        self.assertLess(error, drift / 3)
+        self.assertLess(distance(robot.position, devices.body.pose), drift / 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
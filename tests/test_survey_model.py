@@ -0,0 +1,93 @@
+# _*_ coding: utf-8 _*_
+"""
+Tests du modèle de la carte (module survey_model) : l'ajout d'un lot de
+points polaires équivaut à des ajouts successifs, avec ou sans numpy.
+"""
+
+import random
+import unittest
+from unittest import mock
+
+import survey_model
+from common_apl.errors import MethodError
+from survey_model import Angle, SurveyMap, SurveyNode
+
+
+class AddPolarPointsTest(unittest.TestCase):
+
+    def measures(self, seed):
+        """
+        :return: Lots (angles, distances) d'un tour d'horizon : des suites
+        de points proches, séparées de points isolés.
+        """
+        rng = random.Random(seed)
+        angles = list(range(-180, 180, 5))
+        distances = []
+        distance = 100.0
+        for a in angles:
+            if rng.random() < 0.2:
+                distance = rng.uniform(20.0, 250.0)
+            else:
+                distance += rng.uniform(-8.0, 8.0)
+            distances.append(distance)
+        return angles, distances
+
+    def survey(self, batches, compact, batch):
+        """
+        :return: Tuple (SurveyMap, SurveyNode) du tour d'horizon relevé par
+        lots (addPolarPoints) ou point par point (addPolarPoint).
+        """
+        surveyMap = SurveyMap(compact)
+        node = SurveyNode(surveyMap, 37.5, -12.0, Angle(degrees=23), (2.0, -3.0))
+        for angles, distances in batches:
+            if batch:
+                node.addPolarPoints(angles, distances)
+            else:
+                for angle, distance in zip(angles, distances):
+                    node.addPolarPoint(angle, distance)
+        node.computeWallData()
+        return surveyMap, node
+
+    def assertSameSurvey(self, batches, compact):
+        expectedMap, expected = self.survey(batches, compact, False)
+        surveyMap, node = self.survey(batches, compact, True)
+        self.assertEqual(len(node), len(expected))
+        for k in range(len(expected)):
+            point = node[k]
+            other = expected[k]
+            self.assertEqual((point.rawAngle, point.rawDistance, point.isValid),
+                             (other.rawAngle, other.rawDistance, other.isValid))
+            self.assertAlmostEqual(point.X, other.X, 9)
+            self.assertAlmostEqual(point.Y, other.Y, 9)
+        for bound in ("minX", "minY", "maxX", "maxY"):
+            self.assertAlmostEqual(getattr(surveyMap, bound), getattr(expectedMap, bound), 9)
+        self.assertEqual([(len(wall), wall[0].rawAngle) for wall in node.walls],
+                         [(len(wall), wall[0].rawAngle) for wall in expected.walls])
+
+    def check(self):
+        for seed in range(5):
+            angles, distances = self.measures(seed)
+            for compact in (False, True):
+                self.assertSameSurvey([(angles, distances)], compact)
+                # Le premier point du second lot peut rendre valide le dernier du premier.
+                self.assertSameSurvey([(angles[:30], distances[:30]), (angles[30:], distances[30:])], compact)
+
+    def test_python_batch_matches_single_points(self):
+        with mock.patch.object(survey_model, "numpy", None):
+            self.check()
+
+    @unittest.skipIf(survey_model.numpy is None, "numpy n'est pas installé")
+    def test_numpy_batch_matches_single_points(self):
+        self.check()
+
+    def test_empty_and_invalid_batches(self):
+        surveyMap = SurveyMap()
+        node = SurveyNode(surveyMap, 0, 0, Angle(degrees=0), (0, 0))
+        node.addPolarPoints([], [])
+        self.assertEqual(len(node), 0)
+        with self.assertRaises(MethodError):
+            node.addPolarPoints([0, 10], [100])
+
+
+if __name__ == '__main__':
+    unittest.main()
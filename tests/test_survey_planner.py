@@ -0,0 +1,118 @@
+# _*_ coding: utf-8 _*_
+"""
+Tests du planificateur D* Lite (module survey_planner).
+"""
+
+import unittest
+
+from survey_index import SurveyGridIndex
+from survey_model import SurveyMap
+from survey_planner import DStarLitePlanner
+from tests.synthetic import BOX, distance, room, scan
+
+
+def surveyedRoom(poses, step=10):
+    """
+    :return: SurveyMap de la pièce avec obstacle, relevée depuis poses.
+    """
+    world = room([BOX])
+    surveyMap = SurveyMap()
+    for pose in poses:
+        surveyMap.addNode(scan(surveyMap, world, pose, step=step))
+    return surveyMap
+
+
+def pathLength(start, waypoints):
+    """
+    :return: Longueur du chemin.
+    """
+    length = 0.0
+    for waypoint in waypoints:
+        length += distance(start, waypoint)
+        start = waypoint
+    return length
+
+
+def crossesBox(start, waypoints):
+    """
+    :return: Vrai si le chemin traverse l'obstacle.
+    """
+    previous = start
+    for waypoint in waypoints:
+        if SurveyGridIndex.segmentIntersectsBox(previous[0], previous[1], waypoint[0], waypoint[1],
+                                                BOX[0][0], BOX[0][1], BOX[2][0], BOX[2][1]):
+            return True
+        previous = waypoint
+    return False
+
+
+class DStarLitePlannerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.map = surveyedRoom([(-100, 0, 0), (0, 100, 0), (0, -100, 0), (150, -50, 0), (150, 120, 0)], 2)
+        self.planner = DStarLitePlanner(self.map.grid)
+
+    def test_path_avoids_obstacle(self):
+        start = (30, 65)
+        waypoints = self.planner.plan(start, (150, 65))
+        self.assertIsNotNone(waypoints)
+        self.assertEqual(waypoints[-1], (150, 65))
+        self.assertGreater(len(waypoints), 1)
+        self.assertFalse(crossesBox(start, waypoints))
+
+    def test_blocked_goal_is_moved_to_nearest_free_cell(self):
+        goal = (195, 0)
+        cell = self.map.grid.cellOf(goal[0], goal[1])
+        self.assertTrue(self.planner.isBlocked(cell))
+        waypoints = self.planner.plan((0, 0), goal)
+        self.assertIsNotNone(waypoints)
+        end = waypoints[-1]
+        self.assertFalse(self.planner.isBlocked(self.map.grid.cellOf(end[0], end[1])))
+        self.assertLess(abs(end[0] - goal[0]) + abs(end[1] - goal[1]), DStarLitePlanner.RELOCATION_RADIUS * 1.5)
+        self.assertLess(end[0], 200)
+
+    def test_blocked_start_is_moved_to_nearest_free_cell(self):
+        start = (0, 145)
+        self.assertTrue(self.planner.isBlocked(self.map.grid.cellOf(start[0], start[1])))
+        waypoints = self.planner.plan(start, (0, 0))
+        self.assertIsNotNone(waypoints)
+        first = waypoints[0]
+        self.assertFalse(self.planner.isBlocked(self.map.grid.cellOf(first[0], first[1])))
+        self.assertLess(first[1], start[1])
+
+    def test_goal_beyond_walls_is_unreachable(self):
+        self.assertIsNone(self.planner.plan((0, 0), (300, 0)))
+        # L'échec ne perturbe pas les recherches suivantes.
+        self.assertIsNotNone(self.planner.plan((0, 0), (-150, -100)))
+
+    def test_replanning_from_a_waypoint_is_incremental(self):
+        start = (-150, -100)
+        goal = (160, 65)
+        waypoints = self.planner.plan(start, goal)
+        initial = self.planner.expansions
+        self.assertGreater(initial, 0)
+        replanned = self.planner.plan(waypoints[0], goal)
+        self.assertLess(self.planner.expansions, initial / 4)
+        self.assertEqual(replanned[-1], goal)
+        self.assertAlmostEqual(pathLength(waypoints[0], replanned), pathLength(start, waypoints)
+                               - distance(start, waypoints[0]), delta=15)
+
+    def test_replanning_after_grid_update(self):
+        # Une cloison inconnue au premier appel barre le chemin direct.
+        partition = ((-200, -10), (-100, -10), (-100, 0), (-200, 0))
+        world = room([BOX, partition])
+        surveyMap = SurveyMap()
+        surveyMap.addNode(scan(surveyMap, world, (150, -50, 0), step=2))
+        planner = DStarLitePlanner(surveyMap.grid)
+        start = (-150, -100)
+        goal = (-150, 100)
+        self.assertEqual(planner.plan(start, goal), [goal])
+        surveyMap.addNode(scan(surveyMap, world, (-150, -100, 0), step=2))
+        waypoints = planner.plan(start, goal)
+        self.assertGreater(len(waypoints), 1)
+        self.assertGreater(waypoints[0][0], -100)
+        expected = DStarLitePlanner(surveyMap.grid).plan(start, goal)
+        self.assertAlmostEqual(pathLength(start, waypoints), pathLength(start, expected), delta=1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,222 @@
+# _*_ coding: utf-8 _*_
+"""
+Tests de la sérialisation XML des cartes (modules survey_xmlio et
+common_apl.xmlio).
+"""
+
+import io
+import os
+import tempfile
+import unittest
+import xml.dom.minidom as XMLDOM
+
+from common_apl.xmlio import XmlJournal, XmlStreamLoader, XmlStreamWriter
+from survey_model import Angle
+from survey_xmlio import MapWallAdapter, SurveyMapAdapter, SurveyMapDocument, SurveyMapJournal, SurveyMapStreamDocument, \
+    SurveyNodeAdapter
+from tests.synthetic import BOX, room, scan, surveyedMap
+
+
+class XmlTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.map = surveyedMap()
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def assertSameMap(self, surveyMap, expected):
+        """
+        Les stations, leurs points et les murs recalculés sont identiques.
+        """
+        self.assertEqual(len(surveyMap), len(expected))
+        for rank in range(len(expected)):
+            node = surveyMap[rank]
+            reference = expected[rank]
+            self.assertEqual((node.X, node.Y, node.offset), (reference.X, reference.Y, reference.offset))
+            self.assertAlmostEqual(node.orientation.degrees, reference.orientation.degrees, places=9)
+            self.assertEqual(len(node), len(reference))
+            for iPoint in range(len(reference)):
+                point = node[iPoint]
+                other = reference[iPoint]
+                self.assertEqual((point.X, point.Y, point.rawAngle, point.rawDistance, point.isValid),
+                                 (other.X, other.Y, other.rawAngle, other.rawDistance, other.isValid))
+            self.assertEqual(len(node.walls), len(reference.walls))
+        self.assertEqual(len(surveyMap.walls), len(expected.walls))
+        self.assertEqual((surveyMap.minX, surveyMap.minY, surveyMap.maxX, surveyMap.maxY),
+                         (expected.minX, expected.minY, expected.maxX, expected.maxY))
+
+
+class XmlStreamWriterTest(XmlTestCase):
+
+    def test_stream_matches_dom(self):
+        document = SurveyMapDocument()
+        document.save(self.map, self.path("dom.xml"))
+        dom = XMLDOM.parse(self.path("dom.xml")).documentElement
+        stream = XMLDOM.parseString(XmlStreamWriter.dumps(SurveyMapAdapter(), self.map)).documentElement
+        self.assertEqual(stream.tagName, SurveyMapAdapter.TAG_NAME)
+        for name in (SurveyMapAdapter.ATTR_MINX, SurveyMapAdapter.ATTR_MAXY, SurveyMapAdapter.ATTR_VERSION):
+            self.assertEqual(stream.getAttribute(name), dom.getAttribute(name))
+        domNodes = dom.getElementsByTagName(SurveyNodeAdapter.TAG_NAME)
+        streamNodes = stream.getElementsByTagName(SurveyNodeAdapter.TAG_NAME)
+        self.assertEqual(streamNodes.length, domNodes.length)
+        for k in range(domNodes.length):
+            streamPoints = streamNodes[k].getElementsByTagName("point")
+            domPoints = domNodes[k].getElementsByTagName("point")
+            self.assertEqual([dict(p.attributes.items()) for p in streamPoints],
+                             [dict(p.attributes.items()) for p in domPoints])
+
+    def test_saved_document_has_xml_declaration(self):
+        # L'en-tête est celui qu'écrit minidom pour un document encodé en UTF-8.
+        SurveyMapDocument().save(self.map, self.path("dom.xml"))
+        XmlStreamWriter.save(self.path("stream.xml"), SurveyMapAdapter(), self.map)
+        dom = XMLDOM.parse(self.path("dom.xml"))
+        expected = dom.toprettyxml(encoding="utf-8").decode("utf-8").split("\n")[0]
+        with open(self.path("stream.xml"), encoding="utf-8") as document:
+            self.assertEqual(document.readline().rstrip("\n"), expected)
+        stream = XMLDOM.parse(self.path("stream.xml"))
+        self.assertEqual((stream.version, stream.encoding), ("1.0", "utf-8"))
+
+    def test_stream_save_is_read_by_dom(self):
+        XmlStreamWriter.save(self.path("stream.xml"), SurveyMapAdapter(), self.map)
+        self.assertSameMap(SurveyMapDocument(self.path("stream.xml")).load(), self.map)
+        self.assertFalse(os.path.exists(self.path("stream.xml.tmp")))
+
+    def test_indented_document(self):
+        text = XmlStreamWriter.dumps(SurveyMapAdapter(), self.map, indent="\t").decode("utf-8")
+        self.assertIn("\n\t<node", text)
+        self.assertIn("\n\t\t<point", text)
+        self.assertSameMap(SurveyMapAdapter().read(XMLDOM.parseString(text).documentElement), self.map)
+
+    def test_special_characters_are_escaped(self):
+        output = io.StringIO()
+        writer = XmlStreamWriter(output)
+        writer.startElement("root", {"name": 'a<b & "c">'})
+        writer.characters("x < y & z")
+        writer.element("empty")
+        writer.endElement("root")
+        writer.endDocument()
+        root = XMLDOM.parseString(output.getvalue()).documentElement
+        self.assertEqual(root.getAttribute("name"), 'a<b & "c">')
+        self.assertEqual(root.firstChild.data, "x < y & z")
+        self.assertEqual(root.getElementsByTagName("empty").length, 1)
+
+
+class SurveyMapStreamDocumentTest(XmlTestCase):
+
+    def setUp(self):
+        super().setUp()
+        SurveyMapDocument().save(self.map, self.path("map.xml"))
+
+    def test_stream_load_matches_dom_load(self):
+        surveyMap = SurveyMapStreamDocument(self.path("map.xml")).load()
+        self.assertSameMap(surveyMap, self.map)
+        self.assertSameMap(surveyMap, SurveyMapDocument(self.path("map.xml")).load())
+
+    def test_compact_load(self):
+        surveyMap = SurveyMapStreamDocument(self.path("map.xml"), compact=True).load()
+        self.assertTrue(surveyMap.compact)
+        self.assertSameMap(surveyMap, self.map)
+
+    def test_small_buffers(self):
+        # Les blocs lus coupent les éléments et les attributs.
+        surveyMap = XmlStreamLoader(self.path("map.xml"), buffer_size=7).load(SurveyMapAdapter())
+        self.assertSameMap(surveyMap, self.map)
+
+    def test_iter_nodes(self):
+        nodes = list(SurveyMapStreamDocument(self.path("map.xml")).iterNodes())
+        self.assertEqual([(node.X, node.Y) for node in nodes],
+                         [(self.map[rank].X, self.map[rank].Y) for rank in range(len(self.map))])
+        self.assertEqual([len(node) for node in nodes], [len(self.map[rank]) for rank in range(len(self.map))])
+
+    def test_round_trip_through_stream(self):
+        document = SurveyMapStreamDocument(self.path("map.xml"))
+        document.save(document.load(), self.path("copy.xml"))
+        self.assertSameMap(SurveyMapStreamDocument(self.path("copy.xml")).load(), self.map)
+
+    def test_bool_attributes(self):
+        self.assertTrue(XmlStreamLoader.get_bool_attribute({"valid": "true"}, "valid", False))
+        self.assertTrue(XmlStreamLoader.get_bool_attribute({"valid": "1"}, "valid", False))
+        self.assertFalse(XmlStreamLoader.get_bool_attribute({"valid": "false"}, "valid", True))
+        self.assertTrue(XmlStreamLoader.get_bool_attribute({}, "valid", True))
+
+
+class SurveyMapJournalTest(XmlTestCase):
+
+    def journal(self, reset=False):
+        return SurveyMapJournal(self.path("map.journal"), self.path("map.xml"), reset)
+
+    def record(self, journal, surveyMap):
+        for rank in range(len(surveyMap)):
+            journal.append(surveyMap, surveyMap[rank])
+
+    def test_replay(self):
+        journal = self.journal(True)
+        self.record(journal, self.map)
+        journal.close()
+        self.assertSameMap(self.journal().load(), self.map)
+
+    def test_materialized_document(self):
+        journal = self.journal(True)
+        self.record(journal, self.map)
+        self.assertTrue(journal.materialize())
+        self.assertFalse(journal.materialize())
+        self.assertSameMap(SurveyMapDocument(self.path("map.xml")).load(), self.map)
+        self.assertSameMap(SurveyMapStreamDocument(self.path("map.xml")).load(), self.map)
+        document = XMLDOM.parse(self.path("map.xml"))
+        self.assertEqual((document.version, document.encoding), ("1.0", "utf-8"))
+        root = document.documentElement
+        walls = [child for child in root.childNodes if getattr(child, "tagName", None) == MapWallAdapter.TAG_NAME]
+        self.assertEqual(len(walls), len(self.map.walls))
+        self.assertEqual(float(root.getAttribute(SurveyMapAdapter.ATTR_MAXX)), self.map.maxX)
+
+    def test_rewrite_after_relocation(self):
+        journal = self.journal(True)
+        self.record(journal, self.map)
+        self.map.relocateNodes({1: (-75.0, -62.0, Angle(degrees=33))})
+        journal.rewrite(self.map)
+        journal.append(self.map, scan(self.map, room([BOX]), (60, -100, 0)))
+        surveyMap = self.journal().load()
+        self.assertEqual(len(surveyMap), len(self.map) + 1)
+        self.assertEqual((surveyMap[1].X, surveyMap[1].Y), (-75.0, -62.0))
+        self.assertEqual((surveyMap[3].X, surveyMap[3].Y), (60, -100))
+
+    def test_reopen_appends(self):
+        journal = self.journal(True)
+        journal.append(self.map, self.map[0])
+        journal.close()
+        journal = self.journal()
+        journal.append(self.map, self.map[1])
+        self.assertEqual(len(journal.load()), 2)
+        journal.close()
+        self.assertEqual(len(self.journal(True).load()), 0)
+
+    def test_incomplete_fragment_is_dropped(self):
+        journal = self.journal(True)
+        self.record(journal, self.map)
+        journal.close()
+        with open(self.path("map.journal"), "a", encoding="utf-8") as crashed:
+            crashed.write('<node x="1.0" y="2.0"><point')
+        journal = self.journal()
+        self.assertSameMap(journal.load(), self.map)
+        journal.append(self.map, self.map[0])
+        self.assertEqual(len(journal.load()), len(self.map) + 1)
+
+    def test_fragment_with_newlines(self):
+        journal = XmlJournal(self.path("notes.journal"), "notes", True)
+        journal.append('<note text="a&#10;b">first\nsecond</note>')
+        journal.append(XMLDOM.parseString('<note text="c"/>').documentElement)
+        fragments = list(journal.fragments())
+        self.assertEqual(len(fragments), 2)
+        note = XMLDOM.parseString(fragments[0]).documentElement
+        self.assertEqual(note.getAttribute("text"), "a\nb")
+        self.assertEqual(note.firstChild.data, "first\nsecond")
+        journal.materialize(self.path("notes.xml"), {"count": 2})
+        root = XMLDOM.parse(self.path("notes.xml")).documentElement
+        self.assertEqual(root.getAttribute("count"), "2")
+        self.assertEqual(root.getElementsByTagName("note").length, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
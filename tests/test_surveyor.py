@@ -0,0 +1,135 @@
+# _*_ coding: utf-8 _*_
+"""
+Tests du robot Surveyor simulé (module surveyor) : reprise d'un relevé et
+modes de balayage des tours d'horizon.
+"""
+
+import os
+import tempfile
+import unittest
+
+from simulator import SimWorld, SimulatedDevices
+from survey_model import Angle, SurveyNode
+from survey_xmlio import SurveyMapDocument, SurveyMapJournal
+from surveyor import RobotSurveyor
+from telemetry import Telemeter
+from tests.synthetic import BOX
+
+
+class RobotSurveyorResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.documentName = os.path.join(directory, "map.xml")
+        self.journalName = os.path.join(directory, "map.journal")
+        self.world = SimWorld.room(400, 300, [BOX])
+
+    def robot(self, resume, seed=1):
+        return RobotSurveyor(devices=SimulatedDevices(self.world, seed=seed), mapDocumentName=self.documentName,
+                             mapJournalName=self.journalName, resume=resume)
+
+    def survey(self):
+        robot = self.robot(False)
+        robot.surveyTour()
+        robot.turn(Angle(degrees=60))
+        robot.moveForward(50)
+        robot.surveyTour()
+        robot.saveMap(True)
+        return robot
+
+    def test_resume_replays_journal(self):
+        first = self.survey()
+        robot = self.robot(True, seed=2)
+        self.assertEqual(len(robot.map), len(first.map))
+        for rank in range(len(first.map)):
+            self.assertAlmostEqual(robot.map[rank].X, first.map[rank].X, places=1)
+            self.assertAlmostEqual(robot.map[rank].Y, first.map[rank].Y, places=1)
+            self.assertEqual(len(robot.map[rank]), len(first.map[rank]))
+        self.assertEqual(len(robot.map.walls), len(first.map.walls))
+        last = robot.map[len(robot.map) - 1]
+        self.assertEqual(robot.position, last.position)
+        self.assertAlmostEqual(robot.odometry.pose.X, last.X)
+        self.assertAlmostEqual(robot.odometry.pose.Y, last.Y)
+        self.assertEqual(len(SurveyMapDocument(self.documentName).load()), len(first.map))
+
+    def test_resumed_survey_is_continued(self):
+        first = self.survey()
+        robot = self.robot(True, seed=2)
+        robot.surveyTour()
+        robot.saveMap(True)
+        self.assertEqual(len(robot.map), len(first.map) + 1)
+        self.assertEqual(len(SurveyMapJournal(self.journalName, self.documentName).load()), len(robot.map))
+        self.assertEqual(len(SurveyMapDocument(self.documentName).load()), len(robot.map))
+
+    def test_start_without_resume_resets_journal(self):
+        self.survey()
+        robot = self.robot(False)
+        self.assertEqual(len(robot.map), 0)
+        self.assertEqual(len(SurveyMapJournal(self.journalName, self.documentName).load()), 0)
+
+
+
+class SurveyTourTest(unittest.TestCase):
+
+    STEP = 10
+    # Obstacle à l'ouest du robot, dans une pièce assez longue pour que
+    # les mesures vers l'est soient hors de portée.
+    OBSTACLE = ((-200, -40), (-160, -40), (-160, 0), (-200, 0))
+
+    def tour(self, world, mode):
+        """
+        :return: Tuple (durée simulée, dictionnaire angle -> distance ou
+        None si hors de portée) d'un tour d'horizon.
+        """
+        directory = tempfile.mkdtemp()
+        devices = SimulatedDevices(world, seed=1)
+        robot = RobotSurveyor(devices=devices, mapDocumentName=os.path.join(directory, "map.xml"),
+                              mapJournalName=os.path.join(directory, "map.journal"))
+        station = SurveyNode(robot.map, 0, 0, robot.orientation, (0, 0))
+        start = devices.time()
+        getattr(robot, mode)(station, -180, 180, SurveyTourTest.STEP)
+        duration = devices.time() - start
+        samples = {station[k].rawAngle: station[k].rawDistance for k in range(len(station))}
+        samples.update((angle, None) for angle in station.outOfRangeAngles)
+        return duration, samples
+
+    def test_sweep_tour_is_faster_and_regular(self):
+        world = SimWorld.room(400, 300, [BOX])
+        stepDuration, stepSamples = self.tour(world, "stepTour")
+        duration, samples = self.tour(world, "sweepTour")
+        self.assertLess(duration, stepDuration / 3)
+        self.assertEqual(len(samples), len(stepSamples))
+        angles = sorted(samples)
+        self.assertLess(angles[0], -180 + SurveyTourTest.STEP / 2)
+        self.assertGreater(angles[-1], 180 - 2 * SurveyTourTest.STEP)
+        gaps = [b - a for a, b in zip(angles, angles[1:])]
+        self.assertLessEqual(max(gaps), SurveyTourTest.STEP + 1.0)
+        self.assertGreaterEqual(min(gaps), SurveyTourTest.STEP / 2)
+
+    def test_adaptive_tour_refines_edges_only(self):
+        world = SimWorld.room(800, 300, [SurveyTourTest.OBSTACLE])
+        duration, samples = self.tour(world, "adaptiveTour")
+        angles = sorted(samples)
+        coarse = RobotSurveyor.ADAPTIVE_COARSE_STEP
+        # Bords de l'obstacle et limites de portée : l'intervalle est
+        # affiné jusqu'à la moitié du pas.
+        edges = 0
+        for a, b in zip(angles, angles[1:]):
+            d1 = Telemeter.MAX_RANGE if samples[a] is None else samples[a]
+            d2 = Telemeter.MAX_RANGE if samples[b] is None else samples[b]
+            if (samples[a] is None) != (samples[b] is None) or abs(d2 - d1) > 2 * SurveyNode.THRESHOLD:
+                edges += 1
+                self.assertLessEqual(b - a, SurveyTourTest.STEP / 2, (a, b))
+        self.assertGreaterEqual(edges, 4)
+        # Les intervalles du balayage grossier dont les deux mesures sont
+        # hors de portée ne sont pas affinés.
+        skipped = 0
+        for c in range(-180, 180 - coarse, coarse):
+            if samples.get(c, 0) is None and samples.get(c + coarse, 0) is None:
+                skipped += 1
+                self.assertEqual([a for a in angles if c < a < c + coarse], [])
+        self.assertGreaterEqual(skipped, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
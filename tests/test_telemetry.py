@@ -0,0 +1,115 @@
+# _*_ coding: utf-8 _*_
+"""
+Tests des mesures télémétriques par rafales (module telemetry).
+"""
+
+import unittest
+
+from telemetry import Telemeter, TelemetryStatistics
+
+
+class StubSensor:
+    """
+    Capteur ultra-son dont les lectures successives sont données. Chaque
+    lecture dure duration secondes de l'horloge clock.
+    """
+    def __init__(self, values, clock, duration=0.0):
+        self.__values = list(values)
+        self.__clock = clock
+        self.__duration = duration
+
+    @property
+    def distance_centimeters(self):
+        self.__clock.now += self.__duration
+        return self.__values.pop(0)
+
+
+class StubDevices:
+    """
+    Horloge simulée du robot.
+    """
+    def __init__(self):
+        self.now = 100.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TelemeterTest(unittest.TestCase):
+
+    def telemeter(self, values, duration=0.0, **options):
+        devices = StubDevices()
+        return Telemeter(StubSensor(values, devices, duration), devices, burst=len(values), **options)
+
+    def test_median(self):
+        reading = self.telemeter([52, 50, 90, 51, 49]).measure()
+        self.assertFalse(reading.isOutOfRange)
+        self.assertEqual(reading.distance, 51)
+        self.assertEqual(reading.samples, [52, 50, 90, 51, 49])
+
+    def test_median_of_even_burst(self):
+        self.assertEqual(self.telemeter([50, 53, 51, 90]).measure().distance, 52)
+
+    def test_trimmed_mean(self):
+        # 20 % des 10 lectures sont écartées à chaque extrémité.
+        values = [10, 50, 51, 52, 53, 54, 55, 56, 57, 200]
+        reading = self.telemeter(values, method=Telemeter.TRIMMED_MEAN, trim=0.2).measure()
+        self.assertEqual(reading.distance, (51 + 52 + 53 + 54 + 55 + 56) / 6)
+
+    def test_trimmed_mean_keeps_a_value(self):
+        reading = self.telemeter([40, 60], method=Telemeter.TRIMMED_MEAN, trim=0.5).measure()
+        self.assertEqual(reading.distance, 50)
+
+    def test_distortion_and_variance(self):
+        reading = self.telemeter([48, 52, 50], distortion=4.0).measure()
+        self.assertEqual(reading.distance, 54)
+        self.assertAlmostEqual(reading.variance, 8 / 3)
+
+    def test_out_of_range_samples_are_ignored(self):
+        reading = self.telemeter([50, 255, 52, 0, 51]).measure()
+        self.assertFalse(reading.isOutOfRange)
+        self.assertEqual(reading.distance, 51)
+        self.assertAlmostEqual(reading.variance, 2 / 3)
+
+    def test_half_out_of_range_is_out_of_range(self):
+        reading = self.telemeter([50, 255, 52, 2.5], distortion=4.0).measure()
+        self.assertTrue(reading.isOutOfRange)
+        self.assertEqual(reading.distance, Telemeter.MAX_RANGE + 4.0)
+        self.assertEqual(reading.variance, 0.0)
+        self.assertTrue(self.telemeter([255, 255, 255, 50, 51]).measure().isOutOfRange)
+
+    def test_latency_excludes_interval(self):
+        telemeter = self.telemeter([50, 51, 52, 53], duration=0.03, interval=0.1)
+        reading = telemeter.measure()
+        self.assertAlmostEqual(reading.latency, 0.03)
+        # Milieu de la rafale : 4 lectures et 3 délais à partir de l'instant 100.
+        self.assertAlmostEqual(reading.timestamp, 100.0 + (4 * 0.03 + 3 * 0.1) / 2)
+
+    def test_statistics(self):
+        telemeter = self.telemeter([48, 52, 50, 255, 255, 255, 30, 30, 31], duration=0.02, interval=0.05)
+        telemeter.measure(3)
+        telemeter.measure(3)
+        telemeter.measure(3)
+        statistics = telemeter.statistics
+        self.assertEqual(statistics.readings, 3)
+        self.assertEqual(statistics.samples, 9)
+        self.assertEqual(statistics.outOfRange, 1)
+        self.assertAlmostEqual(statistics.meanLatency, 0.02)
+        self.assertAlmostEqual(statistics.maxLatency, 0.02)
+        self.assertAlmostEqual(statistics.meanVariance, (8 / 3 + 2 / 9) / 2)
+        self.assertAlmostEqual(statistics.toDict()["meanDeviation"] ** 2, statistics.meanVariance)
+        statistics.reset()
+        self.assertEqual(statistics.toDict()["readings"], 0)
+        self.assertEqual(statistics.meanLatency, 0.0)
+
+    def test_empty_statistics(self):
+        statistics = TelemetryStatistics()
+        self.assertEqual(statistics.meanLatency, 0.0)
+        self.assertEqual(statistics.meanVariance, 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
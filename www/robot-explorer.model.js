@@ -10,20 +10,75 @@ var GRID = 100;
 // Définition de la classe XMAP.
 //
 // Un objet XMAP est créé par un robot qui explore sont environnement.
-// Il est constitué d'un tableau de plusieurs objets XNODE.
+// Il est constitué d'un tableau de plusieurs objets XNODE et des murs
+// fusionnés de toutes les stations (XWALL).
 //
-// Paramètre elMap : Elément XML dont le tagName est <map>.
+// Paramètre elMap : Elément XML dont le tagName est <map>, ou objet JSON
+// de la carte ou d'une région de la carte (voir survey_codec). Les stations
+// d'une région sont rangées selon leur rang (tableau à trous).
+// Propriété version : Version de la carte relevée par le robot.
+// Propriété bounds : Dimensions de la carte relevée (minX, maxX, minY, maxY).
 // Propriété nodes : Tableau d'objets XNODE.
+// Propriété walls : Tableau d'objets XWALL.
+// Méthode applyDelta : Application d'une modification de la carte.
 // Méthode draw : Représentation graphique de l'objet XMAP
 function XMAP(elMap) {
-    this.minX = getFloatAttribute(elMap, "minX");
-    this.maxX = getFloatAttribute(elMap, "maxX");
-    this.minY = getFloatAttribute(elMap, "minY");
-    this.maxY = getFloatAttribute(elMap, "maxY");
-    this.nodes = getArrayContent(elMap, "node", XNODE, this);
+    this.setBounds = function(el) {
+        this.version = getIntAttribute(el, "version");
+        this.bounds = {
+            minX: getFloatAttribute(el, "minX"),
+            maxX: getFloatAttribute(el, "maxX"),
+            minY: getFloatAttribute(el, "minY"),
+            maxY: getFloatAttribute(el, "maxY")};
+        this.minX = this.bounds.minX;
+        this.maxX = this.bounds.maxX;
+        this.minY = this.bounds.minY;
+        this.maxY = this.bounds.maxY;
+    }
+    this.setBounds(elMap);
+    if (isXmlElement(elMap)) {
+        this.nodes = getArrayContent(elMap, "node", XNODE, this);
+        this.walls = getArrayContent(elMap, "wall", XWALL, this);
+    } else {
+        var map = this;
+        this.nodes = [];
+        elMap.nodes.forEach(function(node, k) {
+            map.nodes["rank" in node ? node.rank : k] = new XNODE(node, map);
+        });
+        this.walls = elMap.walls.map(function(wall) { return new XWALL(wall, map); });
+    }
+    // Les stations ajoutées ou déplacées remplacent celles de même rang,
+    // les murs créés ou modifiés remplacent ceux de même identifiant.
+    // Un delta déjà pris en compte par la carte est ignoré.
+    //
+    // Paramètre elDelta : Elément XML dont le tagName est <delta>.
+    // return : Vrai si le delta a été appliqué.
+    this.applyDelta = function(elDelta) {
+        if (getIntAttribute(elDelta, "version") <= this.version) {
+            return false;
+        }
+        this.setBounds(elDelta);
+        var stations = elDelta.getElementsByTagName("station");
+        for (var k = 0; k < stations.length; k++) {
+            var elNode = stations[k].getElementsByTagName("node")[0];
+            this.nodes[getIntAttribute(stations[k], "rank")] = new XNODE(elNode, this);
+        }
+        var replaced = {};
+        var walls = getArrayContent(elDelta, "wall", XWALL, this);
+        for (var k = 0; k < walls.length; k++) {
+            replaced[walls[k].id] = true;
+        }
+        var removed = elDelta.getElementsByTagName("removed");
+        for (var k = 0; k < removed.length; k++) {
+            replaced[removed[k].getAttribute("id")] = true;
+        }
+        this.walls = this.walls.filter(function(wall) { return !replaced[wall.id]; }).concat(walls);
+        return true;
+    }
     this.draw = function(context) {
-        for (iNode = 0; iNode < this.nodes.length; iNode++) {
-            this.nodes[iNode].draw(context);
+        this.nodes.forEach(function(node) { node.draw(context); });
+        for (iWall = 0; iWall < this.walls.length; iWall++) {
+            this.walls[iWall].draw(context);
         }
     }
     this.robot2canvas = function(xPoint) {
@@ -40,7 +95,8 @@ function XMAP(elMap) {
 // Les points relevés par le tour d'horizon sont rangés dans une tableau d'objet XPOINT.
 // Les coordonnées sont exprimées en Float dans le référentiel du robot.
 // 
-// Paramètre elNode : Elément XML dont le tagName est <node>.
+// Paramètre elNode : Elément XML dont le tagName est <node>, ou objet JSON
+// de la station (points en colonnes).
 // Paramètre map : Objet MAP auquel appartient l'objet XNODE.
 // Propriété x : Abscisse de la station XNODE.
 // Propriété y : Ordonnée de la station XNODE.
@@ -51,8 +107,15 @@ function XNODE(elNode, map) {
     this.x = getFloatAttribute(elNode, "x");
     this.y = getFloatAttribute(elNode, "y");
     this.orientation = getFloatAttribute(elNode, "orientation") * Math.PI /180.0;
-    this.points = getArrayContent(elNode, "point", XPOINT, this);
-    this.walls = getArrayContent(elNode, "wall", XWALL, this);
+    if (isXmlElement(elNode)) {
+        this.points = getArrayContent(elNode, "point", XPOINT, this);
+    } else {
+        var columns = elNode.points;
+        this.points = new Array(columns.x.length);
+        for (var k = 0; k < columns.x.length; k++) {
+            this.points[k] = new XPOINT({x: columns.x[k], y: columns.y[k], valid: columns.valid[k]}, this);
+        }
+    }
     this.draw = function(context) {
         var pt = this.map.robot2canvas(this);
         for(iPoint = 0; iPoint < this.points.length; iPoint++) {
@@ -64,23 +127,29 @@ function XNODE(elNode, map) {
         drawCircle(context, pt.x, pt.y, 10, "#FF0000", "#FFFFFF");
         drawCircle(context, pt.x, pt.y, 6, "#FF0000", null);
         drawArrow(context, pt.x, pt.y, 5, this.orientation, "#FF000");
-        for(iWall = 0; iWall < this.walls.length; iWall++) {
-            this.walls[iWall].draw(context);
-        }
     }
 }
 
 // Définition de la classe XWALL
 //
-// Un objet XWALL correspond à un mur relevé lors d'un tour d'horizon par le robot.
-// Il est constittué d'une succession de points valides.
-function XWALL(elWall, node) {
-    this.node = node;
-    this.map = node.map;
-    var elPt1 = elWall.getElementsByTagName("Pt1")[0];
-    var elPt2= elWall.getElementsByTagName("Pt2")[0];
-    this.pt1 = new XPOINT(elPt1, this);
-    this.pt2 = new XPOINT(elPt2, this);
+// Un objet XWALL correspond à un mur de la carte, issu de la fusion des murs
+// relevés lors des tours d'horizon du robot.
+//
+// Paramètre elWall : Elément XML dont le tagName est <wall>, ou objet JSON
+// du mur.
+// Paramètre map : Objet XMAP auquel appartient l'objet XWALL.
+// Propriété id : Identifiant du mur, utilisé par les deltas de la carte.
+function XWALL(elWall, map) {
+    this.map = map;
+    if (isXmlElement(elWall)) {
+        this.id = elWall.getAttribute("id");
+        this.pt1 = new XPOINT(elWall.getElementsByTagName("Pt1")[0], this);
+        this.pt2 = new XPOINT(elWall.getElementsByTagName("Pt2")[0], this);
+    } else {
+        this.id = String(elWall.id);
+        this.pt1 = new XPOINT({x: elWall.Pt1[0], y: elWall.Pt1[1]}, this);
+        this.pt2 = new XPOINT({x: elWall.Pt2[0], y: elWall.Pt2[1]}, this);
+    }
     this.draw = function(context) {
         p1 = this.map.robot2canvas(this.pt1);
         p2 = this.map.robot2canvas(this.pt2);
@@ -97,7 +166,8 @@ function XWALL(elWall, node) {
 // Un objet XPOINT correspond à un point relevé lors d'un tour d'horizon par le robot.
 // Les coordonnées sont exprimées en Float dans le référentiel du robot.
 //
-// Paramètre elPoint : Elément XML dont le tagName est <point>.
+// Paramètre elPoint : Elément XML dont le tagName est <point>, ou objet
+// {x, y, valid}.
 // Propriété x : Abscisse de l'objet XPOINT.
 // Propriété y : Ordonnée de l'objet XPOINT.
 // Méthode draw : Représentation graphique de l'objet XPOINT.
@@ -121,13 +191,19 @@ function XPOINT(elPoint, node) {
     }
 }
 
+// Test si un objet est un élément XML (et non un objet JSON).
+function isXmlElement(el) {
+    return el != null && el.nodeType == 1;
+}
+
 // Récupération d'un attribut XML de type Float.
+// Pour un objet JSON, l'attribut est la propriété de même nom.
 // 
 // el : Elément XML dans lequel se trouve l'attribut.
 // name : Nom de l'attribut. 
 // return : Valeur convertie en Float de l'attribut. 
 function getFloatAttribute(el, name) {
-    var attrValue = el.getAttribute(name);
+    var attrValue = isXmlElement(el) ? el.getAttribute(name) : el[name];
     return attrValue == null ? 0.0 : parseFloat(attrValue);
 }
 
@@ -137,7 +213,7 @@ function getFloatAttribute(el, name) {
 // name : Nom de l'attribut. 
 // return : Valeur convertie en Int de l'attribut. 
 function getIntAttribute(el, name) {
-    var attrValue = el.getAttribute(name);
+    var attrValue = isXmlElement(el) ? el.getAttribute(name) : el[name];
     return attrValue == null ? 0 : parseInt(attrValue);
 }
 
@@ -147,8 +223,8 @@ function getIntAttribute(el, name) {
 // name : Nom de l'attribut. 
 // return : Valeur convertie en Bool de l'attribut. 
 function getBooleanAttribute(el, name) {
-    var attrValue = el.getAttribute(name);
-    return attrValue == "true" || attrValue == "True" || attrValue == "TRUE" || attrValue == "1";
+    var attrValue = isXmlElement(el) ? el.getAttribute(name) : el[name];
+    return attrValue === true || attrValue === 1 || attrValue == "true" || attrValue == "True" || attrValue == "TRUE" || attrValue == "1";
 }
 
 // Récupération d'un tableau d'objets contenus dans un élément XML.
@@ -161,7 +237,9 @@ function getArrayContent(el, name, ctor, parent) {
     var content = new Array();
     var childs = el.getElementsByTagName(name);
     for (var j = 0; j < childs.length; j++) {
-        content[j] = new ctor(childs[j], parent);
+        if (childs[j].parentNode === el) {
+            content.push(new ctor(childs[j], parent));
+        }
     }
     return content;
 }